@@ -0,0 +1,80 @@
+// Cold index build throughput for 1..N hash threads and both digests.
+//
+//   node overleaf-sync/bench/hash-index.mjs [--files 400] [--file-size 256KiB] [--max-threads N] [--dir <tree>]
+//
+// Without --dir a synthetic tree of random files is written to a temp dir
+// (and removed afterwards). Each configuration runs twice and the faster run
+// is reported, so both see a warm page cache.
+
+import os from 'node:os'
+import path from 'node:path'
+import { randomBytes } from 'node:crypto'
+import { mkdir, mkdtemp, rm, writeFile } from 'node:fs/promises'
+
+import { HashPool, INDEX_DIGESTS, buildFileIndex, defaultHashThreads, parseByteSize } from '../lib.mjs'
+
+function parseArgs(argv) {
+  const opts = {}
+  for (let i = 2; i < argv.length; i++) {
+    if (!argv[i].startsWith('--')) continue
+    const next = argv[i + 1]
+    if (next == null || next.startsWith('--')) opts[argv[i].slice(2)] = true
+    else opts[argv[i].slice(2)] = argv[++i]
+  }
+  return opts
+}
+
+async function writeTree(dir, files, fileSize) {
+  for (let i = 0; i < files; i++) {
+    const sub = path.join(dir, `chapter-${i % 16}`)
+    await mkdir(sub, { recursive: true })
+    await writeFile(path.join(sub, `asset-${i}.bin`), randomBytes(fileSize))
+  }
+}
+
+async function timeBuild(dir, threads, digest) {
+  let best = Infinity
+  let result = null
+  for (let run = 0; run < 2; run++) {
+    const pool = new HashPool({ size: threads })
+    const started = performance.now()
+    result = await buildFileIndex(dir, { pool, digest })
+    best = Math.min(best, performance.now() - started)
+    await pool.close()
+  }
+  return { ms: best, files: result.index.size, bytes: result.bytes }
+}
+
+const opts = parseArgs(process.argv)
+const maxThreads = Number.parseInt(String(opts['max-threads'] || ''), 10) || defaultHashThreads()
+const threadCounts = [1]
+for (let n = 2; n < maxThreads; n *= 2) threadCounts.push(n)
+if (maxThreads > 1) threadCounts.push(maxThreads)
+
+const ownDir = typeof opts.dir !== 'string'
+const dir = ownDir ? await mkdtemp(path.join(os.tmpdir(), 'ol-sync-bench-')) : path.resolve(opts.dir)
+try {
+  if (ownDir) {
+    await writeTree(
+      dir,
+      Number.parseInt(String(opts.files || ''), 10) || 400,
+      parseByteSize(opts['file-size'], 256 * 1024)
+    )
+  }
+  process.stdout.write(`cpus=${os.availableParallelism?.() ?? os.cpus().length} dir=${dir}\n`)
+  process.stdout.write('digest  threads    files       MiB       ms     MiB/s  speedup\n')
+  for (const digest of INDEX_DIGESTS) {
+    let baseline = null
+    for (const threads of threadCounts) {
+      const { ms, files, bytes } = await timeBuild(dir, threads, digest)
+      baseline ??= ms
+      const mib = bytes / 1024 / 1024
+      process.stdout.write(
+        `${digest.padEnd(6)} ${String(threads).padStart(8)} ${String(files).padStart(8)} ${mib.toFixed(1).padStart(9)}` +
+          ` ${ms.toFixed(0).padStart(8)} ${(mib / (ms / 1000)).toFixed(0).padStart(9)} ${(baseline / ms).toFixed(2).padStart(7)}x\n`
+      )
+    }
+  }
+} finally {
+  if (ownDir) await rm(dir, { recursive: true, force: true })
+}
@@ -1,17 +1,30 @@
 from __future__ import annotations
 
+import ctypes
+import ctypes.util
+import errno
+import hashlib
 import json
 import os
+import queue
 import re
+import select
+import selectors
 import shutil
+import sqlite3
+import struct
 import subprocess
 import sys
 import threading
 import time
 import tkinter as tk
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 from tkinter import filedialog, messagebox, ttk
+from typing import Any, Callable
 from urllib.parse import urlparse
 
 
@@ -22,10 +35,68 @@ PROJECT_ID_RE = re.compile(r"^Created\s+([0-9a-f]{24})\s*$", re.IGNORECASE | re.
 GUI_STATE_PATH = Path.home() / ".config" / "overleaf-sync" / "gui.json"
 INBOX_ROOT = Path.home() / ".config" / "overleaf-sync" / "inbox"
 BACKUP_ROOT = Path.home() / ".config" / "overleaf-sync" / "backups"
+MONITOR_INDEX_ROOT = Path.home() / ".config" / "overleaf-sync" / "monitor"
+JOURNAL_PATH = Path.home() / ".config" / "overleaf-sync" / "journal.ndjson"
+VERSION_INDEX_PATH = Path.home() / ".config" / "overleaf-sync" / "versions.sqlite3"
+BACKUP_MANIFEST_FILENAME = ".ol-sync.backup.json"
 
 REMOTE_POLL_INTERVAL_SEC = 30
 BACKUP_INTERVAL_SEC = 120
+# Only used when `remote-status` can't read the project tree (no Mongo access or
+# WEB_API credentials): a lastUpdated change this soon after our own push is
+# assumed to be ours.
 OUTGOING_SUPPRESS_SEC = 90
+REMOTE_ORIGIN_WORKERS = 4  # remote-status runs in parallel for projects that changed in one poll
+
+# Background prefetch of remote changes into the inbox (see _prefetch_loop).
+PREFETCH_KEEP_BATCHES = 3
+PREFETCH_DISK_BUDGET_BYTES = 512 * 1024 * 1024  # per project inbox
+PREFETCH_BANDWIDTH_BUDGET_BYTES = 1024 * 1024 * 1024  # per rolling hour, all projects
+PREFETCH_BANDWIDTH_WINDOW_SEC = 3600
+
+# Local change monitor for linked folders (see _ChangeMonitor).
+MONITOR_POLL_INTERVAL_SEC = 15
+MONITOR_INDEX_SAVE_SEC = 30
+
+# Write-ahead journal for dirty files / outgoing pushes / apply tasks (see _Journal).
+JOURNAL_FSYNC_INTERVAL_SEC = 0.5
+JOURNAL_FSYNC_BATCH = 64
+# Oldest spans are dropped beyond this so a long traced session stays bounded.
+TRACE_MAX_EVENTS = 200_000
+
+# Watch process output is collected by one selector thread (see _WatchIO)
+# and handed to the UI at most this often.
+WATCH_IO_BATCH_SEC = 0.1
+WATCH_IO_READ_SIZE = 64 * 1024
+WATCH_IO_REAP_SEC = 0.2  # how often a child whose pipe closed is checked for exit
+
+# Apply backups written by the CLI are indexed once their manifest exists, or
+# (for backups from older versions) once the directory has been quiet this long.
+VERSION_INDEX_SETTLE_SEC = 60
+
+# Backup snapshots older than this are rolled into per-project pack files
+# (see _BackupPacker); the packer runs at most once per interval.
+BACKUP_PACK_AGE_SEC = 7 * 24 * 3600
+BACKUP_PACK_INTERVAL_SEC = 3600
+BACKUP_PACK_MANIFEST = ".ol-sync.pack.json"
+VERSION_INDEX_OPEN_PACKS = 4
+
+# Multi-project download queue (see _pump_downloads).
+DOWNLOAD_QUEUE_CONCURRENCY = 3
+DOWNLOAD_STAGING_SUFFIX = ".partial"  # pull runs in "<dest>.partial", renamed to dest when done
+DOWNLOAD_RATE_WINDOW_SEC = 5.0
+DOWNLOAD_VIEW_REFRESH_MS = 500
+TRANSFER_KEEP_SEC = 60  # finished background zip downloads stay listed this long
+
+# Tk main-loop instrumentation (see _LoopMonitor). A stall is a heartbeat
+# that runs this late; OL_SYNC_GUI_PROFILE=1 samples stacks during stalls.
+LOOP_HEARTBEAT_MS = 100
+LOOP_STALL_SEC = 0.5
+LOOP_SAMPLE_INTERVAL_SEC = 0.01
+LOOP_LAG_WINDOW = 600  # heartbeats, about one minute
+LOOP_SLOWEST_KEPT = 50
+LOOP_STALLS_KEPT = 20
+LOOP_DIAGNOSTICS_REFRESH_MS = 1000
 
 
 def _build_env(email: str, password: str) -> dict[str, str]:
@@ -34,19 +105,534 @@ def _build_env(email: str, password: str) -> dict[str, str]:
         env["OVERLEAF_SYNC_EMAIL"] = email.strip()
     if password:
         env["OVERLEAF_SYNC_PASSWORD"] = password
+    # Every run reports its per-route HTTP latency for the Diagnostics view.
+    env["OL_SYNC_HTTP_STATS"] = "1"
     return env
 
 
+class _TraceRecorder:
+    """Span events from traced ol-sync runs plus the GUI's own spawn/wait time.
+
+    Exported in Chrome trace-event format (chrome://tracing, Perfetto): one
+    process per ol-sync invocation, one thread per span lane.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = os.environ.get("OL_SYNC_TRACE") == "1"
+        self._lock = threading.Lock()
+        self._events: deque[dict] = deque(maxlen=TRACE_MAX_EVENTS)
+        self._process_names: dict[int, str] = {os.getpid(): "gui.py"}
+        self._thread_ids: dict[int, int] = {}
+        self._thread_names: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+    def _gui_tid(self) -> int:
+        ident = threading.get_ident()
+        tid = self._thread_ids.get(ident)
+        if tid is None:
+            tid = len(self._thread_ids) + 1
+            self._thread_ids[ident] = tid
+            self._thread_names[tid] = threading.current_thread().name
+        return tid
+
+    def add_gui_span(self, name: str, start: float, end: float, args: dict | None = None) -> None:
+        """Record a span measured in the GUI process (start/end from time.time())."""
+        with self._lock:
+            self._events.append(
+                {
+                    "name": name,
+                    "cat": "gui",
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": max(0.0, end - start) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": self._gui_tid(),
+                    "args": args or {},
+                }
+            )
+
+    def add_cli_span(self, event: dict, label: str) -> None:
+        try:
+            pid = int(event.get("pid") or 0)
+            span = {
+                "name": str(event.get("name") or "span"),
+                "cat": "ol-sync",
+                "ph": "X",
+                "ts": float(event["start"]) * 1e3,
+                "dur": float(event.get("dur") or 0) * 1e3,
+                "pid": pid,
+                "tid": int(event.get("lane") or 0),
+                "args": event.get("attrs") or {},
+            }
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            self._process_names.setdefault(pid, f"{label} [{pid}]")
+            self._events.append(span)
+
+    def consume_stderr(self, stderr: str, label: str) -> str:
+        """Record span lines from a traced run and return the remaining stderr."""
+        kept: list[str] = []
+        for line in stderr.splitlines(keepends=True):
+            if not line.startswith(EVENT_PREFIX):
+                kept.append(line)
+                continue
+            try:
+                event = json.loads(line[len(EVENT_PREFIX) :])
+            except Exception:
+                continue
+            if isinstance(event, dict) and event.get("type") == "span":
+                self.add_cli_span(event, label)
+        return "".join(kept)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+
+    def export(self, path: Path) -> int:
+        with self._lock:
+            events = list(self._events)
+            process_names = dict(self._process_names)
+            thread_names = dict(self._thread_names)
+        meta: list[dict] = []
+        for pid, name in process_names.items():
+            meta.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}})
+        for tid, name in thread_names.items():
+            meta.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}})
+        payload = {"traceEvents": meta + events, "displayTimeUnit": "ms"}
+        path.write_text(json.dumps(payload) + "\n", encoding="utf-8")
+        return len(events)
+
+
+_TRACE = _TraceRecorder()
+
+
+class _HttpStatsRecorder:
+    """Per-route HTTP latency reported by ol-sync runs (`http-stats` events).
+
+    Counts add up across runs; percentiles are those of the latest report
+    for the route, since runs only hand over summaries.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: dict[tuple[str, str], dict] = {}
+        self._peak: dict[str, int] = {}
+
+    def record(self, event: dict) -> None:
+        origin = str(event.get("origin") or "")
+        with self._lock:
+            self._peak[origin] = max(self._peak.get(origin, 0), int(event.get("peakInFlight") or 0))
+            for route in event.get("routes") or []:
+                if not isinstance(route, dict):
+                    continue
+                key = (origin, str(route.get("route") or ""))
+                count = int(route.get("count") or 0)
+                entry = self._routes.setdefault(key, {"count": 0, "errors": 0, "retries": 0, "totalMs": 0.0, "maxMs": 0})
+                entry["count"] += count
+                entry["errors"] += int(route.get("errors") or 0)
+                entry["retries"] += int(route.get("retries") or 0)
+                entry["totalMs"] += float(route.get("meanMs") or 0) * count
+                entry["maxMs"] = max(entry["maxMs"], int(route.get("maxMs") or 0))
+                entry["p50Ms"] = int(route.get("p50Ms") or 0)
+                entry["p95Ms"] = int(route.get("p95Ms") or 0)
+                entry["at"] = time.time()
+
+    def consume_stderr(self, stderr: str) -> str:
+        """Record http-stats lines and return the remaining stderr."""
+        kept: list[str] = []
+        for line in stderr.splitlines(keepends=True):
+            if line.startswith(EVENT_PREFIX) and '"type":"http-stats"' in line:
+                try:
+                    event = json.loads(line[len(EVENT_PREFIX) :])
+                except Exception:
+                    continue
+                if isinstance(event, dict):
+                    self.record(event)
+                continue
+            kept.append(line)
+        return "".join(kept)
+
+    def format_report(self, limit: int = 20) -> str:
+        with self._lock:
+            rows = sorted(self._routes.items(), key=lambda kv: kv[1]["count"], reverse=True)
+            peaks = dict(self._peak)
+        if not rows:
+            return "HTTP: no requests reported yet"
+        lines = [
+            "HTTP requests by route (p50/p95 of the latest run; peak in flight: "
+            + ", ".join(f"{origin} {n}" for origin, n in peaks.items())
+            + ")",
+            f"{'route':<50} {'calls':>7} {'errors':>7} {'retries':>8} {'mean ms':>8} {'p50':>6} {'p95':>6} {'max':>6}",
+        ]
+        for (_origin, route), e in rows[:limit]:
+            mean = e["totalMs"] / e["count"] if e["count"] else 0.0
+            lines.append(
+                f"{route[:50]:<50} {e['count']:>7} {e['errors']:>7} {e['retries']:>8} "
+                f"{mean:>8.0f} {e['p50Ms']:>6} {e['p95Ms']:>6} {e['maxMs']:>6}"
+            )
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._peak.clear()
+
+
+_HTTP_STATS = _HttpStatsRecorder()
+
+
+def _callback_name(func: Callable) -> str:
+    name = getattr(func, "__qualname__", None) or getattr(func, "__name__", None) or repr(func)
+    return name.replace(".<locals>", "")
+
+
+class _LoopMonitor:
+    """Responsiveness of the Tk main loop, for the Diagnostics view.
+
+    install() swaps root.after/after_idle for versions that time every
+    callback under its qualified name (and how long it waited past its due
+    time). A heartbeat timer measures how late the loop gets to run it; a
+    heartbeat later than LOOP_STALL_SEC is recorded as a stall together with
+    the slow callbacks that ran during it. With sampling on, a watchdog
+    thread also samples the main thread's stack while a heartbeat is overdue,
+    which catches stalls in Tk event handlers that after() never sees.
+    """
+
+    def __init__(self, root: tk.Tk, sampling: bool = False) -> None:
+        self.root = root
+        self.sampling = sampling
+        self._lock = threading.Lock()
+        self._main_ident = threading.get_ident()
+        self._original_after = root.after
+        self._original_after_idle = root.after_idle
+        self._started = time.time()
+        self._last_beat = time.perf_counter()
+        self._lags: deque[float] = deque(maxlen=LOOP_LAG_WINDOW)
+        self._max_lag = 0.0
+        self._beats = 0
+        self._callbacks: dict[str, list[float]] = {}  # name -> [count, total, max, max_wait]
+        self._slowest: list[tuple[float, float, str, float]] = []  # (dur, at, name, wait)
+        self._recent: deque[tuple[float, str, float]] = deque(maxlen=256)  # (end, name, dur)
+        self._stalls: deque[dict] = deque(maxlen=LOOP_STALLS_KEPT)
+        self._open_stall: dict | None = None  # being sampled by the watchdog
+        self._current: str | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def install(self) -> None:
+        self.root.after = self._after  # type: ignore[method-assign]
+        self.root.after_idle = self._after_idle  # type: ignore[method-assign]
+        self._last_beat = time.perf_counter()
+        self._original_after(LOOP_HEARTBEAT_MS, self._heartbeat)
+        if self.sampling:
+            self.set_sampling(True)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def set_sampling(self, enabled: bool) -> None:
+        self.sampling = enabled
+        if enabled and (self._watchdog is None or not self._watchdog.is_alive()):
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def _wrap(self, func: Callable, due: float) -> Callable:
+        name = _callback_name(func)
+
+        def timed(*args: Any) -> Any:
+            started = time.perf_counter()
+            self._current = name
+            try:
+                return func(*args)
+            finally:
+                self._current = None
+                self._record(name, time.perf_counter() - started, max(0.0, started - due))
+
+        return timed
+
+    def _after(self, ms: int | str, func: Callable | None = None, *args: Any) -> str:
+        if func is None:
+            return self._original_after(ms)
+        due = time.perf_counter() + (int(ms) / 1000 if str(ms).isdigit() else 0.0)
+        return self._original_after(ms, self._wrap(func, due), *args)
+
+    def _after_idle(self, func: Callable, *args: Any) -> str:
+        return self._original_after_idle(self._wrap(func, time.perf_counter()), *args)
+
+    def _record(self, name: str, dur: float, wait: float) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            stats = self._callbacks.setdefault(name, [0, 0.0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += dur
+            stats[2] = max(stats[2], dur)
+            stats[3] = max(stats[3], wait)
+            self._recent.append((now, name, dur))
+            if len(self._slowest) < LOOP_SLOWEST_KEPT or dur > self._slowest[-1][0]:
+                self._slowest.append((dur, time.time(), name, wait))
+                self._slowest.sort(reverse=True)
+                del self._slowest[LOOP_SLOWEST_KEPT:]
+
+    def _heartbeat(self) -> None:
+        now = time.perf_counter()
+        lag = max(0.0, now - self._last_beat - LOOP_HEARTBEAT_MS / 1000)
+        with self._lock:
+            self._beats += 1
+            self._lags.append(lag)
+            self._max_lag = max(self._max_lag, lag)
+            if lag >= LOOP_STALL_SEC:
+                since = self._last_beat
+                culprits = sorted(
+                    ((dur, name) for end, name, dur in self._recent if end >= since and dur >= LOOP_STALL_SEC / 5),
+                    reverse=True,
+                )
+                stall = self._open_stall if self.sampling and self._open_stall else {}
+                stall.update(
+                    {
+                        "at": time.time() - lag,
+                        "lagMs": round(lag * 1000, 1),
+                        "callbacks": [{"name": name, "ms": round(dur * 1000, 1)} for dur, name in culprits[:5]],
+                    }
+                )
+                self._stalls.append(stall)
+            self._open_stall = None
+            self._last_beat = now
+        if not self._stop.is_set():
+            self._original_after(LOOP_HEARTBEAT_MS, self._heartbeat)
+
+    def _watch(self) -> None:
+        """Sample the main thread's stack while the heartbeat is overdue."""
+        overdue = LOOP_HEARTBEAT_MS / 1000 + LOOP_STALL_SEC
+        while not self._stop.is_set() and self.sampling:
+            if time.perf_counter() - self._last_beat < overdue:
+                self._stop.wait(LOOP_HEARTBEAT_MS / 1000)
+                continue
+            frame = sys._current_frames().get(self._main_ident)
+            stack: list[str] = []
+            while frame is not None and len(stack) < 40:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{frame.f_lineno} {code.co_name}")
+                frame = frame.f_back
+            key = " <- ".join(stack)
+            with self._lock:
+                if self._open_stall is None:
+                    self._open_stall = {"samples": 0, "stacks": {}, "current": self._current}
+                self._open_stall["samples"] += 1
+                stacks = self._open_stall["stacks"]
+                stacks[key] = stacks.get(key, 0) + 1
+            self._stop.wait(LOOP_SAMPLE_INTERVAL_SEC)
+
+    def report(self) -> dict:
+        with self._lock:
+            lags = sorted(self._lags)
+            callbacks = [
+                {
+                    "name": name,
+                    "count": int(count),
+                    "totalMs": round(total * 1000, 1),
+                    "maxMs": round(peak * 1000, 1),
+                    "maxWaitMs": round(wait * 1000, 1),
+                }
+                for name, (count, total, peak, wait) in self._callbacks.items()
+            ]
+            slowest = [
+                {"name": name, "ms": round(dur * 1000, 1), "waitMs": round(wait * 1000, 1), "at": at}
+                for dur, at, name, wait in self._slowest
+            ]
+            stalls = []
+            for stall in self._stalls:
+                entry = {k: v for k, v in stall.items() if k != "stacks"}
+                if "stacks" in stall:
+                    top = sorted(stall["stacks"].items(), key=lambda kv: kv[1], reverse=True)[:5]
+                    entry["stacks"] = [{"samples": n, "stack": key.split(" <- ")} for key, n in top]
+                stalls.append(entry)
+            beats = self._beats
+            max_lag = self._max_lag
+
+        def pct(q: float) -> float:
+            return round(lags[min(len(lags) - 1, int(q * len(lags)))] * 1000, 1) if lags else 0.0
+
+        callbacks.sort(key=lambda c: c["maxMs"], reverse=True)
+        return {
+            "startedAt": self._started,
+            "uptimeSec": round(time.time() - self._started, 1),
+            "heartbeatMs": LOOP_HEARTBEAT_MS,
+            "stallThresholdMs": LOOP_STALL_SEC * 1000,
+            "sampling": self.sampling,
+            "heartbeats": beats,
+            "lagMs": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": round(max_lag * 1000, 1)},
+            "callbacks": callbacks,
+            "slowest": slowest,
+            "stalls": stalls,
+        }
+
+    def format_report(self, limit: int = 15) -> str:
+        r = self.report()
+        lag = r["lagMs"]
+        lines = [
+            f"Main loop lag (last {len(self._lags)} heartbeats): p50 {lag['p50']} ms, "
+            f"p95 {lag['p95']} ms, p99 {lag['p99']} ms; max since start {lag['max']} ms",
+            f"Stalls over {r['stallThresholdMs']:.0f} ms: {len(r['stalls'])}"
+            + (" (stack sampling on)" if r["sampling"] else ""),
+            "",
+            f"{'callback':<60} {'calls':>7} {'total ms':>10} {'max ms':>8} {'max wait':>9}",
+        ]
+        for c in r["callbacks"][:limit]:
+            lines.append(f"{c['name'][:60]:<60} {c['count']:>7} {c['totalMs']:>10.1f} {c['maxMs']:>8.1f} {c['maxWaitMs']:>9.1f}")
+        lines += ["", "Slowest callbacks:"]
+        for c in r["slowest"][:limit]:
+            stamp = datetime.fromtimestamp(c["at"]).strftime("%H:%M:%S")
+            lines.append(f"  {stamp}  {c['ms']:>8.1f} ms  {c['name']}")
+        for stall in reversed(r["stalls"]):
+            stamp = datetime.fromtimestamp(stall["at"]).strftime("%H:%M:%S")
+            names = ", ".join(f"{c['name']} ({c['ms']} ms)" for c in stall.get("callbacks") or []) or "no timed callback"
+            lines += ["", f"Stall at {stamp}: {stall['lagMs']} ms late; {names}"]
+            if stall.get("current"):
+                lines.append(f"  running: {stall['current']}")
+            for sample in (stall.get("stacks") or [])[:1]:
+                lines.append(f"  hottest stack ({sample['samples']} of {stall.get('samples')} samples):")
+                lines += [f"    {frame}" for frame in sample["stack"][:12]]
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._lags.clear()
+            self._max_lag = 0.0
+            self._callbacks.clear()
+            self._slowest.clear()
+            self._stalls.clear()
+
+    def export(self, path: Path) -> None:
+        payload = {
+            "generatedAt": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version,
+            "platform": sys.platform,
+            "tk": str(self.root.tk.call("info", "patchlevel")),
+            **self.report(),
+        }
+        path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+
+
 def _run_node(args: list[str], env: dict[str, str]) -> tuple[int, str, str]:
     cmd = ["node", str(OL_SYNC), *args]
-    proc = subprocess.run(
+    if not _TRACE.enabled:
+        proc = subprocess.run(
+            cmd,
+            cwd=str(REPO_ROOT),
+            env=env,
+            text=True,
+            capture_output=True,
+        )
+        return proc.returncode, proc.stdout, _HTTP_STATS.consume_stderr(proc.stderr)
+
+    label = f"ol-sync {args[0]}" if args else "ol-sync"
+    started = time.time()
+    popen = subprocess.Popen(
+        cmd,
+        cwd=str(REPO_ROOT),
+        env={**env, "OL_SYNC_TRACE": "1"},
+        text=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    spawned = time.time()
+    stdout, stderr = popen.communicate()
+    finished = time.time()
+    _TRACE.add_gui_span(label, started, finished, {"pid": popen.pid, "returncode": popen.returncode})
+    _TRACE.add_gui_span("spawn", started, spawned, {"pid": popen.pid})
+    _TRACE.add_gui_span("wait", spawned, finished, {"pid": popen.pid})
+    return popen.returncode, stdout, _TRACE.consume_stderr(_HTTP_STATS.consume_stderr(stderr), label)
+
+
+def _stream_node(
+    args: list[str],
+    env: dict[str, str],
+    on_line: Callable[[str], None],
+    stdin_text: str | None = None,
+    on_event: Callable[[dict], None] | None = None,
+) -> tuple[int, str]:
+    """Run ol-sync, handing each stdout line to on_line as it arrives.
+
+    Returns (returncode, stderr). stdin and stderr are serviced on helper
+    threads so neither pipe can fill up and stall the child. With on_event,
+    stderr is read line by line and structured events (other than trace
+    spans) are handed over as they arrive instead of being returned.
+    """
+    cmd = ["node", str(OL_SYNC), *args]
+    traced = _TRACE.enabled
+    label = f"ol-sync {args[0]}" if args else "ol-sync"
+    started = time.time()
+    proc = subprocess.Popen(
         cmd,
         cwd=str(REPO_ROOT),
-        env=env,
+        env={**env, "OL_SYNC_TRACE": "1"} if traced else env,
         text=True,
-        capture_output=True,
+        stdin=subprocess.PIPE if stdin_text is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
     )
-    return proc.returncode, proc.stdout, proc.stderr
+    spawned = time.time()
+    err_chunks: list[str] = []
+
+    def feed() -> None:
+        assert proc.stdin is not None
+        try:
+            proc.stdin.write(stdin_text or "")
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    def drain_stderr() -> None:
+        assert proc.stderr is not None
+        if on_event is None:
+            err_chunks.append(_HTTP_STATS.consume_stderr(proc.stderr.read()))
+            return
+        for line in proc.stderr:
+            if not line.startswith(EVENT_PREFIX):
+                err_chunks.append(line)
+                continue
+            try:
+                event = json.loads(line[len(EVENT_PREFIX) :])
+            except Exception:
+                continue
+            if not isinstance(event, dict):
+                continue
+            if event.get("type") == "span":
+                if traced:
+                    _TRACE.add_cli_span(event, label)
+                continue
+            if event.get("type") == "http-stats":
+                _HTTP_STATS.record(event)
+                continue
+            on_event(event)
+
+    helpers = [threading.Thread(target=drain_stderr, daemon=True)]
+    if stdin_text is not None:
+        helpers.append(threading.Thread(target=feed, daemon=True))
+    for helper in helpers:
+        helper.start()
+    assert proc.stdout is not None
+    for line in proc.stdout:
+        on_line(line.rstrip("\n"))
+    rc = proc.wait()
+    for helper in helpers:
+        helper.join()
+    stderr = "".join(err_chunks)
+    if traced:
+        finished = time.time()
+        _TRACE.add_gui_span(label, started, finished, {"pid": proc.pid, "returncode": rc})
+        _TRACE.add_gui_span("spawn", started, spawned, {"pid": proc.pid})
+        _TRACE.add_gui_span("wait", spawned, finished, {"pid": proc.pid})
+        stderr = _TRACE.consume_stderr(stderr, label)
+    return rc, stderr
 
 
 def _load_gui_state() -> dict:
@@ -60,7 +646,9 @@ def _load_gui_state() -> dict:
 
 def _save_gui_state(state: dict) -> None:
     GUI_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    tmp_path = GUI_STATE_PATH.with_suffix(f".json.tmp-{os.getpid()}-{int(time.time()*1000)}")
+    tmp_path = GUI_STATE_PATH.with_suffix(
+        f".json.tmp-{os.getpid()}-{threading.get_ident()}-{int(time.time()*1000)}"
+    )
     tmp_path.write_text(json.dumps(state, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
     tmp_path.replace(GUI_STATE_PATH)
     try:
@@ -77,17 +665,31 @@ def _sanitize_folder_name(name: str, fallback: str) -> str:
     return cleaned or fallback
 
 
-def _unique_child_dir(parent: Path, name: str) -> Path:
+def _unique_child_dir(parent: Path, name: str, sibling_suffix: str = "") -> Path:
+    """A free child folder name; with sibling_suffix, "<name><suffix>" must be free too."""
+
+    def free(cand: Path) -> bool:
+        return not cand.exists() and not (sibling_suffix and (parent / f"{cand.name}{sibling_suffix}").exists())
+
     candidate = parent / name
-    if not candidate.exists():
+    if free(candidate):
         return candidate
     for i in range(1, 1000):
         cand = parent / f"{name} ({i})"
-        if not cand.exists():
+        if free(cand):
             return cand
     raise RuntimeError("Could not find a free folder name.")
 
 
+def _format_bytes(n: int) -> str:
+    value = float(n)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{n} B"
+
+
 def _normalize_base_url(base_url: str) -> str:
     return str(base_url or "").rstrip("/")
 
@@ -109,9 +711,1136 @@ def _project_key(base_url: str, project_id: str) -> str:
     return f"{_normalize_base_url(base_url)}|{project_id}"
 
 
+def _dir_size_bytes(root: Path) -> int:
+    total = 0
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _load_inbox_manifest(manifest_path: str) -> dict | None:
+    try:
+        parsed = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+# Mirrors DEFAULT_IGNORE_DIRS / DEFAULT_IGNORE_FILES / shouldIgnore in lib.mjs.
+IGNORE_FILENAME = ".olsyncignore"
+CONFIG_FILENAME = ".ol-sync.json"
+EVENT_PREFIX = "@ol-sync-event "
+DEFAULT_IGNORE_DIRS = frozenset({".git", ".vscode", ".idea", "node_modules", "__pycache__", "__MACOSX"})
+DEFAULT_IGNORE_FILES = frozenset({".DS_Store", CONFIG_FILENAME, IGNORE_FILENAME})
+
+
+def _glob_to_regex(glob: str) -> str:
+    out: list[str] = []
+    i = 0
+    n = len(glob)
+    while i < n:
+        c = glob[i]
+        if c == "*":
+            if i + 1 < n and glob[i + 1] == "*":
+                at_start = i == 0 or glob[i - 1] == "/"
+                at_end = i + 2 == n or glob[i + 2] == "/"
+                if at_start and at_end:
+                    if i + 2 == n:
+                        out.append(".*")
+                        i += 2
+                    else:
+                        out.append("(?:.*/)?")
+                        i += 3
+                    continue
+                i += 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            close = glob.find("]", i + 2)
+            if close == -1:
+                out.append(r"\[")
+            else:
+                body = glob[i + 1 : close].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = close
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class _IgnoreMatcher:
+    """Python port of IgnoreMatcher in lib.mjs (gitignore-style .olsyncignore rules)."""
+
+    def __init__(self, rules: list[tuple[bool, bool, bool, str | None, str | None, re.Pattern[str] | None]]) -> None:
+        self._rules = rules
+        self._dir_cache: dict[str, bool] = {}
+
+    @classmethod
+    def compile(cls, text: str) -> _IgnoreMatcher:
+        rules = []
+        for raw in str(text or "").split("\n"):
+            line = raw.rstrip("\r")
+            if not line.strip() or line.startswith("#"):
+                continue
+            negate = False
+            if line.startswith("!"):
+                negate = True
+                line = line[1:]
+            elif line.startswith("\\!") or line.startswith("\\#"):
+                line = line[1:]
+            line = re.sub(r"(?<!\\)\s+$", "", line)
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            if anchored:
+                line = line.lstrip("/")
+            literal = suffix = None
+            regex = None
+            if not anchored and not re.search(r"[*?\[\\]", line):
+                literal = line
+            elif not anchored and re.fullmatch(r"\*\.[^*?\[\\/]+", line):
+                suffix = line[1:]
+            else:
+                regex = re.compile(_glob_to_regex(line) + r"\Z")
+            rules.append((negate, dir_only, anchored, literal, suffix, regex))
+        return cls(rules)
+
+    def matches(self, rel_posix: str, is_dir: bool) -> bool:
+        base = rel_posix.rsplit("/", 1)[-1]
+        for negate, dir_only, anchored, literal, suffix, regex in reversed(self._rules):
+            if dir_only and not is_dir:
+                continue
+            if literal is not None:
+                hit = base == literal
+            elif suffix is not None:
+                hit = base.endswith(suffix)
+            else:
+                hit = regex.match(rel_posix if anchored else base) is not None  # type: ignore[union-attr]
+            if hit:
+                return not negate
+        return False
+
+    def ignores(self, rel_posix: str, is_dir: bool) -> bool:
+        if not self._rules:
+            return False
+        parts = rel_posix.split("/")
+        prefix = ""
+        for part in parts[:-1]:
+            prefix = f"{prefix}/{part}" if prefix else part
+            ignored = self._dir_cache.get(prefix)
+            if ignored is None:
+                ignored = self.matches(prefix, True)
+                self._dir_cache[prefix] = ignored
+            if ignored:
+                return True
+        return self.matches(rel_posix, is_dir)
+
+
+def _load_ignore_matcher(root: str | Path) -> _IgnoreMatcher | None:
+    try:
+        text = (Path(root) / IGNORE_FILENAME).read_text(encoding="utf-8")
+    except Exception:
+        return None
+    return _IgnoreMatcher.compile(text)
+
+
+def _should_ignore(rel_posix: str, is_dir: bool, matcher: _IgnoreMatcher | None = None) -> bool:
+    parts = [p for p in str(rel_posix).replace(os.sep, "/").split("/") if p]
+    if not parts:
+        return True
+    last = parts[-1]
+    if last.startswith(".ol-sync."):
+        return True
+    if not is_dir and last in DEFAULT_IGNORE_FILES:
+        return True
+    if any(part in DEFAULT_IGNORE_DIRS for part in parts):
+        return True
+    return matcher.ignores("/".join(parts), is_dir) if matcher else False
+
+
+def _scan_tree(root: str, matcher: _IgnoreMatcher | None = None) -> dict[str, list[int]]:
+    """Return {rel_posix: [mtime_ns, size]} for every non-ignored file under root."""
+    out: dict[str, list[int]] = {}
+    stack = [("", root)]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        try:
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            continue
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if _should_ignore(rel, is_dir, matcher):
+                    continue
+                if is_dir:
+                    stack.append((rel, entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    out[rel] = [st.st_mtime_ns, st.st_size]
+            except OSError:
+                continue
+    return out
+
+
+class _Inotify:
+    """Minimal ctypes binding for Linux inotify (raises OSError when unavailable)."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+        | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+    )
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self) -> None:
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("libc has no inotify_init1")
+        self._libc = libc
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+
+    def add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float) -> list[tuple[int, int, str]]:
+        ready, _w, _x = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events: list[tuple[int, int, str]] = []
+        offset = 0
+        while offset + self._EVENT.size <= len(buf):
+            wd, mask, _cookie, length = self._EVENT.unpack_from(buf, offset)
+            offset += self._EVENT.size
+            raw_name = buf[offset : offset + length].split(b"\0", 1)[0]
+            offset += length
+            events.append((wd, mask, os.fsdecode(raw_name)))
+        return events
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class _LinkedFolders:
+    """Parsed .ol-sync.json per folder, with the project key derived from it.
+
+    get() only reads memory, so the Tk thread can call it for every row of a
+    refresh. lookup() stats the config and re-reads it only when its
+    (mtime_ns, size, inode) signature, or the default base URL used for
+    configs without one, changed; it belongs on background threads and in
+    explicit user actions.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # folder -> (signature or None when missing, info or None)
+        self._entries: dict[str, tuple[tuple | None, tuple[str, str, str, str] | None]] = {}
+
+    def get(self, folder: str) -> tuple[str, str, str, str] | None:
+        with self._lock:
+            entry = self._entries.get(folder)
+        return entry[1] if entry else None
+
+    def lookup(self, folder: str, default_base_url: str) -> tuple[str, str, str, str] | None:
+        """(base_url, project_id, key, host) for a linked folder, or None."""
+        try:
+            st = os.stat(os.path.join(folder, CONFIG_FILENAME))
+            sig: tuple | None = (st.st_mtime_ns, st.st_size, st.st_ino, default_base_url)
+        except OSError:
+            sig = None
+        with self._lock:
+            entry = self._entries.get(folder)
+        if entry is not None and entry[0] == sig:
+            return entry[1]
+        info = self._read(folder, default_base_url) if sig is not None else None
+        with self._lock:
+            self._entries[folder] = (sig, info)
+        return info
+
+    @staticmethod
+    def _read(folder: str, default_base_url: str) -> tuple[str, str, str, str] | None:
+        try:
+            cfg = json.loads((Path(folder) / CONFIG_FILENAME).read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        if not isinstance(cfg, dict):
+            return None
+        base_url = _normalize_base_url(str(cfg.get("baseUrl") or default_base_url))
+        project_id = str(cfg.get("projectId") or "").strip()
+        if not base_url or not project_id:
+            return None
+        return base_url, project_id, _project_key(base_url, project_id), _safe_host(base_url)
+
+
+class _ChangeMonitor:
+    """Feeds dirty paths for linked folders, via inotify or periodic rescans.
+
+    Each folder keeps a stored index ({rel: [mtime_ns, size]}) under
+    MONITOR_INDEX_ROOT so changes made while the GUI was closed are picked up
+    by the first rescan, and inotify queue overflows fall back to a rescan.
+    """
+
+    def __init__(self, on_dirty, on_log, on_config=None) -> None:
+        self._on_dirty = on_dirty
+        self._on_log = on_log
+        self._on_config = on_config
+        self._lock = threading.Lock()
+        self._wanted: set[str] = set()
+        self._folders: dict[str, dict[str, list[int]]] = {}
+        self._matchers: dict[str, _IgnoreMatcher | None] = {}
+        self._index_dirty: set[str] = set()
+        self._last_index_save = 0.0
+        self._wd_map: dict[int, tuple[str, str]] = {}
+        self._dir_wds: dict[tuple[str, str], int] = {}
+        self._polling_folders: set[str] = set()
+        self._last_poll = 0.0
+        try:
+            self._inotify: _Inotify | None = _Inotify()
+        except OSError as exc:
+            self._inotify = None
+            self._on_log(f"[monitor] inotify unavailable ({exc}); polling every {MONITOR_POLL_INTERVAL_SEC}s")
+
+    def set_folders(self, folders: set[str]) -> None:
+        with self._lock:
+            self._wanted = set(folders)
+
+    def run(self, stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            self._sync_folders()
+            if self._inotify is not None:
+                self._handle_events(self._inotify.read_events(timeout=1.0))
+            else:
+                stop_event.wait(1.0)
+            now = time.time()
+            if self._polling_folders and now - self._last_poll >= MONITOR_POLL_INTERVAL_SEC:
+                self._last_poll = now
+                for folder in list(self._polling_folders):
+                    self._rescan(folder)
+            if self._index_dirty and now - self._last_index_save >= MONITOR_INDEX_SAVE_SEC:
+                self._save_indexes()
+        self._save_indexes()
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def _sync_folders(self) -> None:
+        with self._lock:
+            wanted = set(self._wanted)
+        for folder in sorted(wanted - set(self._folders)):
+            self._add_folder(folder)
+        for folder in sorted(set(self._folders) - wanted):
+            self._remove_folder(folder)
+
+    @staticmethod
+    def _index_path(folder: str) -> Path:
+        digest = hashlib.sha1(folder.encode("utf-8")).hexdigest()[:16]
+        return MONITOR_INDEX_ROOT / f"{_safe_component(Path(folder).name)}-{digest}.json"
+
+    def _add_folder(self, folder: str) -> None:
+        try:
+            stored = json.loads(self._index_path(folder).read_text(encoding="utf-8"))
+            index = stored.get("files") if isinstance(stored, dict) else None
+        except Exception:
+            index = None
+        self._folders[folder] = index if isinstance(index, dict) else {}
+        self._matchers[folder] = _load_ignore_matcher(folder)
+        if self._inotify is None or not self._watch_tree(folder, ""):
+            self._polling_folders.add(folder)
+        if index is None:
+            # First sighting: record a baseline without flagging every file.
+            self._folders[folder] = _scan_tree(folder, self._matchers[folder])
+            self._index_dirty.add(folder)
+        else:
+            self._rescan(folder)
+
+    def _remove_folder(self, folder: str) -> None:
+        for key, wd in list(self._dir_wds.items()):
+            if key[0] != folder:
+                continue
+            self._dir_wds.pop(key, None)
+            self._wd_map.pop(wd, None)
+            if self._inotify is not None:
+                self._inotify.rm_watch(wd)
+        self._polling_folders.discard(folder)
+        self._save_index(folder)
+        self._folders.pop(folder, None)
+        self._matchers.pop(folder, None)
+
+    def _watch_tree(self, folder: str, rel_dir: str) -> bool:
+        assert self._inotify is not None
+        matcher = self._matchers.get(folder)
+        stack = [rel_dir]
+        while stack:
+            rel = stack.pop()
+            abs_path = os.path.join(folder, *rel.split("/")) if rel else folder
+            try:
+                wd = self._inotify.add_watch(abs_path)
+            except OSError as exc:
+                if exc.errno == errno.ENOSPC:
+                    self._on_log(f"[monitor] inotify watch limit reached; polling {folder}")
+                    return False
+                continue
+            self._wd_map[wd] = (folder, rel)
+            self._dir_wds[(folder, rel)] = wd
+            try:
+                for entry in os.scandir(abs_path):
+                    child = f"{rel}/{entry.name}" if rel else entry.name
+                    if entry.is_dir(follow_symlinks=False) and not _should_ignore(child, True, matcher):
+                        stack.append(child)
+            except OSError:
+                continue
+        return True
+
+    def _handle_events(self, events: list[tuple[int, int, str]]) -> None:
+        dirty: dict[str, set[str]] = {}
+        for wd, mask, name in events:
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                self._on_log("[monitor] inotify queue overflow; rescanning")
+                for folder in list(self._folders):
+                    self._rescan(folder)
+                continue
+            if mask & _Inotify.IN_IGNORED:
+                target = self._wd_map.pop(wd, None)
+                if target:
+                    self._dir_wds.pop(target, None)
+                continue
+            target = self._wd_map.get(wd)
+            if not target or not name:
+                continue
+            folder, rel_dir = target
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            is_dir = bool(mask & _Inotify.IN_ISDIR)
+            if rel == IGNORE_FILENAME:
+                self._matchers[folder] = _load_ignore_matcher(folder)
+                continue
+            if rel == CONFIG_FILENAME:
+                if self._on_config is not None:
+                    self._on_config(folder)
+                continue
+            if _should_ignore(rel, is_dir, self._matchers.get(folder)):
+                continue
+            index = self._folders.get(folder)
+            if index is None:
+                continue
+            if is_dir:
+                if mask & (_Inotify.IN_CREATE | _Inotify.IN_MOVED_TO):
+                    self._watch_tree(folder, rel)
+                    for sub_rel, sig in _scan_tree(os.path.join(folder, *rel.split("/"))).items():
+                        full = f"{rel}/{sub_rel}"
+                        if _should_ignore(full, False, self._matchers.get(folder)):
+                            continue
+                        index[full] = sig
+                        dirty.setdefault(folder, set()).add(full)
+                    self._index_dirty.add(folder)
+                elif mask & (_Inotify.IN_DELETE | _Inotify.IN_MOVED_FROM):
+                    prefix = rel + "/"
+                    for key in [k for k in index if k.startswith(prefix)]:
+                        index.pop(key, None)
+                    self._index_dirty.add(folder)
+                continue
+            if mask & (_Inotify.IN_DELETE | _Inotify.IN_MOVED_FROM):
+                if index.pop(rel, None) is not None:
+                    self._index_dirty.add(folder)
+                continue
+            try:
+                st = os.stat(os.path.join(folder, *rel.split("/")))
+            except OSError:
+                continue
+            sig = [st.st_mtime_ns, st.st_size]
+            if index.get(rel) != sig:
+                index[rel] = sig
+                self._index_dirty.add(folder)
+                dirty.setdefault(folder, set()).add(rel)
+        for folder, rels in dirty.items():
+            self._on_dirty(folder, rels)
+
+    def _rescan(self, folder: str) -> None:
+        old = self._folders.get(folder)
+        if old is None:
+            return
+        self._matchers[folder] = _load_ignore_matcher(folder)
+        if self._on_config is not None:
+            self._on_config(folder)
+        new = _scan_tree(folder, self._matchers[folder])
+        changed = {rel for rel, sig in new.items() if old.get(rel) != sig}
+        if changed or len(new) != len(old):
+            self._index_dirty.add(folder)
+        self._folders[folder] = new
+        if changed:
+            self._on_dirty(folder, changed)
+
+    def _save_index(self, folder: str) -> None:
+        index = self._folders.get(folder)
+        if index is None:
+            return
+        path = self._index_path(folder)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".json.tmp-{os.getpid()}")
+            tmp.write_text(json.dumps({"dir": folder, "files": index}) + "\n", encoding="utf-8")
+            tmp.replace(path)
+        except OSError as exc:
+            self._on_log(f"[monitor] could not save index for {folder}: {exc}")
+            return
+        self._index_dirty.discard(folder)
+
+    def _save_indexes(self) -> None:
+        self._last_index_save = time.time()
+        for folder in list(self._index_dirty):
+            self._save_index(folder)
+
+
+class _Journal:
+    """Append-only write-ahead journal for GUI work that must survive a crash.
+
+    Records are NDJSON lines: dirty/clean local paths, outgoing push times and
+    apply tasks. Every append reaches the kernel immediately (so a killed
+    process loses nothing); fsync is batched on a short timer. compact()
+    rewrites the file as a single snapshot record once the live state is small.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._appended_since_compact = 0
+        self._fh = None
+
+    def _open(self):
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, "a", encoding="utf-8")
+            try:
+                os.chmod(self.path, 0o600)
+            except Exception:
+                pass
+        return self._fh
+
+    def append(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            fh = self._open()
+            fh.write(line)
+            fh.flush()
+            self._unsynced += 1
+            self._appended_since_compact += 1
+            if self._unsynced >= JOURNAL_FSYNC_BATCH:
+                self._fsync_locked()
+
+    def _fsync_locked(self) -> None:
+        if self._fh is not None and self._unsynced:
+            os.fsync(self._fh.fileno())
+            self._unsynced = 0
+
+    def sync(self) -> None:
+        with self._lock:
+            self._fsync_locked()
+
+    def run_flusher(self, stop_event: threading.Event) -> None:
+        while not stop_event.wait(JOURNAL_FSYNC_INTERVAL_SEC):
+            try:
+                self.sync()
+            except OSError:
+                pass
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._fsync_locked()
+            except OSError:
+                pass
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def replay(self) -> dict:
+        """Fold the journal into {"dirty": {dir: set}, "outgoing": {key: ts}, "tasks": {id: task}}."""
+        state: dict = {"dirty": {}, "outgoing": {}, "tasks": {}}
+        try:
+            raw = self.path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return state
+        for line in raw.splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn tail from a crash mid-write
+            if not isinstance(rec, dict):
+                continue
+            op = rec.get("op")
+            if op == "snapshot":
+                state = {
+                    "dirty": {d: set(p) for d, p in (rec.get("dirty") or {}).items()},
+                    "outgoing": dict(rec.get("outgoing") or {}),
+                    "tasks": dict(rec.get("tasks") or {}),
+                }
+            elif op == "dirty":
+                state["dirty"].setdefault(str(rec.get("dir")), set()).update(rec.get("paths") or [])
+            elif op == "clean":
+                rels = state["dirty"].get(str(rec.get("dir")))
+                if rels is not None:
+                    rels.difference_update(rec.get("paths") or [])
+            elif op == "outgoing":
+                state["outgoing"][str(rec.get("key"))] = float(rec.get("ts") or 0.0)
+            elif op == "task":
+                state["tasks"][str(rec.get("id"))] = rec.get("task") or {}
+            elif op == "done":
+                state["tasks"].pop(str(rec.get("id")), None)
+        state["dirty"] = {d: p for d, p in state["dirty"].items() if p}
+        return state
+
+    def needs_compaction(self) -> bool:
+        return self._appended_since_compact > 0
+
+    def compact(self, snapshot: dict) -> None:
+        record = {
+            "op": "snapshot",
+            "at": datetime.now(timezone.utc).isoformat(),
+            "dirty": {d: sorted(p) for d, p in (snapshot.get("dirty") or {}).items() if p},
+            "outgoing": snapshot.get("outgoing") or {},
+            "tasks": snapshot.get("tasks") or {},
+        }
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".tmp-{os.getpid()}")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+            tmp.replace(self.path)
+            try:
+                dir_fd = os.open(self.path.parent, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError:
+                pass
+            self._unsynced = 0
+            self._appended_since_compact = 0
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _VersionIndex:
+    """SQLite index of backed-up file versions: (project, path) -> versions.
+
+    project is "<host>/<projectId>" and snapshot is the backup directory
+    relative to BACKUP_ROOT, e.g. "localhost/<id>/local/<timestamp>", so a
+    version's bytes live at BACKUP_ROOT / snapshot / path until the packer
+    moves the snapshot into a pack (see open_version). _backup_once adds its
+    snapshots as it writes them; scan() picks up anything else under
+    BACKUP_ROOT (apply backups from the CLI, backups made before the index).
+    """
+
+    SOURCES = ("local", "remote")
+
+    def __init__(self, path: Path, backup_root: Path) -> None:
+        self.path = path
+        self.backup_root = backup_root
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._open_packs: dict[str, zipfile.ZipFile] = {}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS versions (
+                    project TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    source TEXT NOT NULL,
+                    snapshot TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (snapshot, path)
+                );
+                CREATE INDEX IF NOT EXISTS versions_by_path ON versions (project, path, ts);
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    snapshot TEXT PRIMARY KEY,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS packs (
+                    snapshot TEXT PRIMARY KEY,
+                    pack TEXT NOT NULL
+                );
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def add_snapshot(self, snapshot_dir: Path, source: str, files: list[tuple[str, str, int, float]]) -> None:
+        """Record (rel_posix, hash, size, ts) rows for one backup directory."""
+        snapshot = snapshot_dir.relative_to(self.backup_root).as_posix()
+        project = "/".join(snapshot.split("/")[:2])
+        rows = [(project, rel, ts, source, snapshot, digest, size) for rel, digest, size, ts in files]
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany("INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?)", (snapshot, time.time()))
+
+    def index_snapshot_dir(self, snapshot_dir: Path, source: str) -> bool:
+        """Index a backup directory from its manifest, or by hashing its files."""
+        manifest_path = snapshot_dir / BACKUP_MANIFEST_FILENAME
+        files: list[tuple[str, str, int, float]] = []
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            manifest = None
+        except Exception:
+            return False
+        if isinstance(manifest, dict) and isinstance(manifest.get("files"), dict):
+            for rel, meta in manifest["files"].items():
+                try:
+                    files.append((rel, str(meta["hash"]), int(meta["size"]), float(meta["mtimeMs"]) / 1000))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        else:
+            if source not in self.SOURCES and time.time() - snapshot_dir.stat().st_mtime < VERSION_INDEX_SETTLE_SEC:
+                return False  # an apply may still be writing into it
+            for dirpath, _dirnames, filenames in os.walk(snapshot_dir):
+                for name in filenames:
+                    abs_path = Path(dirpath) / name
+                    if name == BACKUP_MANIFEST_FILENAME:
+                        continue
+                    st = abs_path.stat()
+                    rel = abs_path.relative_to(snapshot_dir).as_posix()
+                    files.append((rel, _sha256_file(abs_path), st.st_size, st.st_mtime))
+        self.add_snapshot(snapshot_dir, source, files)
+        return True
+
+    def scan(self, project: str | None = None) -> int:
+        """Index backup directories not seen before; returns how many were added."""
+        with self._lock:
+            known = {row[0] for row in self._db().execute("SELECT snapshot FROM snapshots")}
+        if project:
+            project_dirs = [self.backup_root / project]
+        else:
+            project_dirs = [p for host in _iter_dirs(self.backup_root) for p in _iter_dirs(host)]
+        added = 0
+        for project_dir in project_dirs:
+            for child in _iter_dirs(project_dir):
+                if child.name in self.SOURCES:
+                    candidates = [(snap, child.name) for snap in _iter_dirs(child)]
+                elif child.name == "packs":
+                    self._register_packs(child)
+                    continue
+                elif child.name == "mirror":
+                    continue  # whole-instance mirror snapshots have their own store
+                else:
+                    candidates = [(child, "apply")]
+                for snapshot_dir, source in candidates:
+                    if snapshot_dir.relative_to(self.backup_root).as_posix() in known:
+                        continue
+                    try:
+                        added += int(self.index_snapshot_dir(snapshot_dir, source))
+                    except OSError:
+                        continue
+        return added
+
+    def _register_packs(self, packs_dir: Path) -> None:
+        """Record packs whose snapshots were not yet marked packed (e.g. after a crash)."""
+        with self._lock:
+            known = {row[0] for row in self._db().execute("SELECT DISTINCT pack FROM packs")}
+        for pack in sorted(packs_dir.glob("*.zip")):
+            rel_pack = pack.relative_to(self.backup_root).as_posix()
+            if rel_pack in known:
+                continue
+            try:
+                with zipfile.ZipFile(pack) as zf:
+                    manifest = json.loads(zf.read(BACKUP_PACK_MANIFEST))
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+                continue
+            self.mark_packed(list(manifest.get("snapshots") or []), rel_pack)
+
+    def mark_packed(self, snapshots: list[str], rel_pack: str) -> None:
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany("INSERT OR REPLACE INTO packs VALUES (?, ?)", [(s, rel_pack) for s in snapshots])
+
+    def packed_snapshots(self) -> set[str]:
+        with self._lock:
+            return {row[0] for row in self._db().execute("SELECT snapshot FROM packs")}
+
+    def indexed_snapshots(self) -> set[str]:
+        with self._lock:
+            return {row[0] for row in self._db().execute("SELECT snapshot FROM snapshots")}
+
+    def open_version(self, snapshot: str, rel_posix: str):
+        """Open one backed-up file for reading, from its directory or its pack."""
+        loose = self.backup_root / snapshot / Path(*rel_posix.split("/"))
+        if loose.is_file():
+            return open(loose, "rb")
+        with self._lock:
+            row = self._db().execute("SELECT pack FROM packs WHERE snapshot = ?", (snapshot,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(str(loose))
+        # The zip central directory is the offset index: only this member is
+        # located and decompressed, never the whole pack. Parsing that
+        # directory is the expensive part, so recently used packs stay open.
+        with self._lock:
+            zf = self._open_packs.pop(row[0], None)
+            if zf is None:
+                zf = zipfile.ZipFile(self.backup_root / row[0])
+            self._open_packs[row[0]] = zf
+            while len(self._open_packs) > VERSION_INDEX_OPEN_PACKS:
+                self._open_packs.pop(next(iter(self._open_packs))).close()
+            try:
+                return zf.open(_pack_member(snapshot, rel_posix))
+            except KeyError:
+                raise FileNotFoundError(f"{row[0]}:{snapshot}/{rel_posix}") from None
+
+    def history(self, project: str, rel_posix: str) -> list[dict]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT ts, source, snapshot, hash, size FROM versions"
+                " WHERE project = ? AND path = ? ORDER BY ts DESC",
+                (project, rel_posix),
+            ).fetchall()
+        return [
+            {"ts": ts, "source": source, "snapshot": snapshot, "hash": digest, "size": size}
+            for ts, source, snapshot, digest, size in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            for zf in self._open_packs.values():
+                zf.close()
+            self._open_packs.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _pack_member(snapshot: str, rel_posix: str) -> str:
+    # Members are stored relative to the project: "local/<timestamp>/<path>".
+    return "/".join(snapshot.split("/")[2:] + [rel_posix])
+
+
+class _BackupPacker:
+    """Roll aged backup snapshots of a project into one LZMA-compressed zip.
+
+    Thousands of small timestamped directories cost inodes and make every
+    scan of BACKUP_ROOT slower. Only snapshots already in the version index
+    are packed, so history and restore keep working through open_version().
+    Each pack carries a manifest member listing its snapshots; a pack is
+    written under a temporary name, renamed, recorded, and only then are the
+    snapshot directories removed.
+    """
+
+    def __init__(self, index: _VersionIndex, backup_root: Path) -> None:
+        self.index = index
+        self.backup_root = backup_root
+
+    def _aged_snapshots(self, project_dir: Path, cutoff: float, indexed: set[str]) -> list[Path]:
+        found: list[Path] = []
+        for child in _iter_dirs(project_dir):
+            if child.name in ("packs", "mirror"):
+                continue
+            candidates = _iter_dirs(child) if child.name in _VersionIndex.SOURCES else [child]
+            for snapshot_dir in candidates:
+                rel = snapshot_dir.relative_to(self.backup_root).as_posix()
+                try:
+                    aged = snapshot_dir.stat().st_mtime < cutoff
+                except OSError:
+                    continue
+                if aged and rel in indexed:
+                    found.append(snapshot_dir)
+        return found
+
+    def run(self, older_than_sec: float = BACKUP_PACK_AGE_SEC) -> list[dict]:
+        cutoff = time.time() - older_than_sec
+        indexed = self.index.indexed_snapshots()
+        packed = self.index.packed_snapshots()
+        reports: list[dict] = []
+        for host in _iter_dirs(self.backup_root):
+            for project_dir in _iter_dirs(host):
+                snapshots = self._aged_snapshots(project_dir, cutoff, indexed)
+                # Left behind by a run that stopped after recording its pack.
+                for snapshot_dir in [d for d in snapshots if d.relative_to(self.backup_root).as_posix() in packed]:
+                    shutil.rmtree(snapshot_dir, ignore_errors=True)
+                    snapshots.remove(snapshot_dir)
+                if snapshots:
+                    reports.append(self._pack_project(project_dir, snapshots))
+        return reports
+
+    def _pack_project(self, project_dir: Path, snapshots: list[Path]) -> dict:
+        scan_before = _time_scan(project_dir)
+        packs_dir = project_dir / "packs"
+        packs_dir.mkdir(exist_ok=True)
+        name = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M-%SZ")
+        pack = packs_dir / f"{name}.zip"
+        tmp = packs_dir / f".{name}.zip.tmp"
+        rel_snapshots = [d.relative_to(self.backup_root).as_posix() for d in snapshots]
+        files = 0
+        raw_bytes = 0
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_LZMA) as zf:
+            for snapshot_dir, rel_snapshot in zip(snapshots, rel_snapshots):
+                for dirpath, _dirnames, filenames in os.walk(snapshot_dir):
+                    for filename in sorted(filenames):
+                        abs_path = Path(dirpath) / filename
+                        rel = abs_path.relative_to(snapshot_dir).as_posix()
+                        zf.write(abs_path, _pack_member(rel_snapshot, rel))
+                        files += 1
+                        raw_bytes += abs_path.stat().st_size
+            zf.writestr(
+                BACKUP_PACK_MANIFEST,
+                json.dumps({"version": 1, "snapshots": rel_snapshots}, indent=2) + "\n",
+            )
+        with open(tmp, "rb") as fh:
+            os.fsync(fh.fileno())
+        os.replace(tmp, pack)
+        rel_pack = pack.relative_to(self.backup_root).as_posix()
+        self.index.mark_packed(rel_snapshots, rel_pack)
+        for snapshot_dir in snapshots:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+        for source in _VersionIndex.SOURCES:
+            try:
+                (project_dir / source).rmdir()  # only succeeds once empty
+            except OSError:
+                pass
+        packed_bytes = pack.stat().st_size
+        return {
+            "project": project_dir.relative_to(self.backup_root).as_posix(),
+            "pack": rel_pack,
+            "snapshots": len(snapshots),
+            "files": files,
+            "raw_bytes": raw_bytes,
+            "packed_bytes": packed_bytes,
+            "ratio": raw_bytes / packed_bytes if packed_bytes else 0.0,
+            "scan_before_ms": scan_before,
+            "scan_after_ms": _time_scan(project_dir),
+        }
+
+
+def _time_scan(root: Path) -> float:
+    """Milliseconds to walk a directory tree and stat every entry."""
+    started = time.perf_counter()
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            try:
+                os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return (time.perf_counter() - started) * 1000
+
+
+def _iter_dirs(parent: Path) -> list[Path]:
+    try:
+        return sorted(p for p in parent.iterdir() if p.is_dir() and not p.name.startswith("."))
+    except OSError:
+        return []
+
+
+class _WatchIO:
+    """One selector thread that owns the stdout pipes of every watch process.
+
+    Output is split into lines as it arrives and handed to on_batch as
+    [(key, line), ...] at most every WATCH_IO_BATCH_SEC, so a chatty child
+    costs one callback per batch rather than a thread and a Tk call per
+    line. on_exit(key, proc, returncode) runs once a child's pipe has closed
+    and it has exited; a child that closes stdout but lingers is polled
+    rather than waited for, so it cannot stall the other pipes.
+    """
+
+    def __init__(
+        self,
+        on_batch: Callable[[list[tuple[str, str]]], None],
+        on_exit: Callable[[str, subprocess.Popen[bytes], int], None],
+    ) -> None:
+        self._on_batch = on_batch
+        self._on_exit = on_exit
+        self._lock = threading.Lock()
+        self._incoming: list[tuple[str, subprocess.Popen[bytes]]] = []
+        self._procs: set[subprocess.Popen[bytes]] = set()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+
+    def add(self, key: str, proc: subprocess.Popen[bytes]) -> None:
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("watch I/O loop is shutting down")
+            self._incoming.append((key, proc))
+            self._procs.add(proc)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watch-io", daemon=True)
+                self._thread.start()
+        self._wake()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Terminate every child, deliver their last output and join the loop."""
+        with self._lock:
+            self._stopping = True
+            procs = list(self._procs)
+            thread = self._thread
+        for proc in procs:
+            if proc.poll() is None:
+                try:
+                    proc.terminate()
+                except Exception:
+                    pass
+        self._wake()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # a wake-up is already pending
+
+    def _run(self) -> None:
+        sel = selectors.DefaultSelector()
+        sel.register(self._wake_r, selectors.EVENT_READ, None)
+        batch: list[tuple[str, str]] = []
+        deadline: float | None = None
+        reaping: list[tuple[str, subprocess.Popen[bytes]]] = []
+        try:
+            while True:
+                with self._lock:
+                    incoming, self._incoming = self._incoming, []
+                    stopping = self._stopping
+                for key, proc in incoming:
+                    assert proc.stdout is not None
+                    os.set_blocking(proc.stdout.fileno(), False)
+                    sel.register(proc.stdout, selectors.EVENT_READ, (key, proc, bytearray()))
+                if stopping and len(sel.get_map()) == 1 and not reaping:
+                    break
+
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if reaping:
+                    timeout = WATCH_IO_REAP_SEC if timeout is None else min(timeout, WATCH_IO_REAP_SEC)
+                exited: list[tuple[str, subprocess.Popen[bytes]]] = []
+                for sel_key, _mask in sel.select(timeout):
+                    if sel_key.data is None:
+                        try:
+                            while os.read(self._wake_r, 4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        continue
+                    key, proc, buf = sel_key.data
+                    try:
+                        chunk = os.read(sel_key.fd, WATCH_IO_READ_SIZE)
+                    except BlockingIOError:
+                        continue
+                    if chunk:
+                        buf.extend(chunk)
+                        cut = buf.rfind(b"\n")
+                        if cut >= 0:
+                            text = buf[:cut].decode("utf-8", errors="replace")
+                            del buf[: cut + 1]
+                            batch.extend((key, line.rstrip("\r")) for line in text.split("\n"))
+                        continue
+                    if buf:
+                        batch.append((key, buf.decode("utf-8", errors="replace")))
+                    sel.unregister(sel_key.fileobj)
+                    sel_key.fileobj.close()
+                    exited.append((key, proc))
+
+                if batch and deadline is None:
+                    deadline = time.monotonic() + WATCH_IO_BATCH_SEC
+                if batch and (exited or stopping or time.monotonic() >= deadline):
+                    self._deliver(batch)
+                    batch, deadline = [], None
+                reaping.extend(exited)
+                lingering = []
+                for key, proc in reaping:
+                    rc = proc.poll()
+                    if rc is None:
+                        lingering.append((key, proc))
+                        continue
+                    with self._lock:
+                        self._procs.discard(proc)
+                    self._on_exit(key, proc, rc)
+                reaping = lingering
+            if batch:
+                self._deliver(batch)
+        finally:
+            sel.close()
+
+    def _deliver(self, batch: list[tuple[str, str]]) -> None:
+        try:
+            self._on_batch(batch)
+        except Exception:
+            pass  # a UI-side failure must not stop the pipes from draining
+
+
 class OverleafSyncGui:
     def __init__(self, root: tk.Tk) -> None:
         self.root = root
+        # Installed first so every root.after() callback below is timed.
+        self._loop = _LoopMonitor(root, sampling=os.environ.get("OL_SYNC_GUI_PROFILE") == "1")
+        self._loop.install()
+        self._diagnostics_window: tk.Toplevel | None = None
         self.root.title("Overleaf Local Sync (Unofficial)")
         self.root.geometry("980x720")
 
@@ -134,19 +1863,46 @@ class OverleafSyncGui:
         self.init_main_tex = tk.BooleanVar(value=True)
         self.push_after_create = tk.BooleanVar(value=True)
         self.auto_watch_after_create = tk.BooleanVar(value=True)
+        self.record_trace = tk.BooleanVar(value=_TRACE.enabled)
 
         self.remote_pending_var = tk.StringVar(value="Remote pending: 0")
+        self.bulk_status_var = tk.StringVar(value="")
 
         self._projects: list[dict] = []
-        self._watches: dict[str, subprocess.Popen[str]] = {}
-        self._watch_threads: dict[str, threading.Thread] = {}
+        self._watches: dict[str, subprocess.Popen[bytes]] = {}
+        self._watch_io = _WatchIO(self._on_watch_output, self._on_watch_exit)
+        self._watch_stats: dict[str, dict[str, Any]] = {}
         self._inbox_manifest: dict | None = None
-        self._dirty_files: dict[str, set[str]] = {}
-        self._dir_project_key: dict[str, str] = {}
-        self._last_outgoing: dict[str, float] = {}
+        self._journal = _Journal(JOURNAL_PATH)
+        self._versions = _VersionIndex(VERSION_INDEX_PATH, BACKUP_ROOT)
+        self._packer = _BackupPacker(self._versions, BACKUP_ROOT)
+        self._last_pack_at = 0.0
+        replayed = self._journal.replay()
+        self._dirty_files: dict[str, set[str]] = replayed["dirty"]
+        self._linked = _LinkedFolders()
+        self._last_outgoing: dict[str, float] = replayed["outgoing"]
+        # Guards _dirty_files, _last_outgoing and self._state (remote_projects above all); watch output, the poller,
+        # backups and the UI all touch them from different threads. Persist the state via _save_state().
+        self._sync_lock = threading.RLock()
+        # Worker threads never read Tk variables: they use this copy, refreshed on the Tk thread on every edit.
+        self._settings: dict[str, str] = {}
+        for var in (self.base_url, self.email, self.password, self.local_dir):
+            var.trace_add("write", self._snapshot_settings)
+        self._snapshot_settings()
+        self._journal_tasks: dict[str, dict] = replayed["tasks"]
         self._stop_event = threading.Event()
         self._last_remote_poll_error_at = 0.0
         self._last_backup_error_at = 0.0
+        self._prefetch_queue: queue.Queue[str] = queue.Queue()
+        self._prefetch_queued: set[str] = set()
+        self._prefetch_transfers: list[tuple[float, int]] = []
+        self._monitor = _ChangeMonitor(self._on_local_changes, self._append_log_safe, self._on_config_changed)
+        self._download_lock = threading.Lock()
+        self._downloads: list[dict] = self._restore_download_queue()
+        self._download_samples: deque[tuple[float, int]] = deque()
+        # Zip downloads of background fetches, by "<purpose>:<projectId>".
+        self._transfers: dict[str, dict] = {}
+        self._downloads_window: tk.Toplevel | None = None
 
         self._build_ui()
         self._start_background_tasks()
@@ -183,7 +1939,7 @@ class OverleafSyncGui:
         projects.columnconfigure(0, weight=1)
 
         cols = ("name", "id", "access", "archived", "trashed")
-        self.tree = ttk.Treeview(projects, columns=cols, show="headings", selectmode="browse")
+        self.tree = ttk.Treeview(projects, columns=cols, show="headings", selectmode="extended")
         self.tree.heading("name", text="Name")
         self.tree.heading("id", text="Project ID")
         self.tree.heading("access", text="Access")
@@ -201,6 +1957,24 @@ class OverleafSyncGui:
         scroll.grid(row=0, column=1, sticky="ns")
         self.tree.configure(yscrollcommand=scroll.set)
 
+        bulk_row = ttk.Frame(projects)
+        bulk_row.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+        self._bulk_buttons: list[ttk.Button] = []
+        for text, action in (
+            ("Archive", "archive"),
+            ("Unarchive", "unarchive"),
+            ("Trash", "trash"),
+            ("Restore", "untrash"),
+            ("Delete…", "delete"),
+        ):
+            btn = ttk.Button(bulk_row, text=text, command=lambda a=action: self.bulk_project_action(a))
+            btn.pack(side="left", padx=(0, 6))
+            self._bulk_buttons.append(btn)
+        ttk.Button(bulk_row, text="Downloads", command=self.show_downloads).pack(side="right")
+        self.btn_mirror = ttk.Button(bulk_row, text="Mirror all…", command=self.mirror_instance)
+        self.btn_mirror.pack(side="right", padx=(0, 6))
+        ttk.Label(bulk_row, textvariable=self.bulk_status_var).pack(side="right", padx=(0, 8))
+
         actions = ttk.LabelFrame(frm, text="Sync actions", padding=10)
         actions.grid(row=0, column=1, rowspan=2, sticky="nsew", pady=(0, 8))
         actions.columnconfigure(1, weight=1)
@@ -235,14 +2009,20 @@ class OverleafSyncGui:
         watches.columnconfigure(0, weight=1)
         watches.rowconfigure(0, weight=1)
 
-        watch_cols = ("path", "pid", "remote_pending")
+        watch_cols = ("path", "pid", "queue", "last_drain", "outbox", "remote_pending")
         self.watch_tree = ttk.Treeview(watches, columns=watch_cols, show="headings", selectmode="browse", height=6)
         self.watch_tree.heading("path", text="Folder")
         self.watch_tree.heading("pid", text="PID")
+        self.watch_tree.heading("queue", text="Queue")
+        self.watch_tree.heading("last_drain", text="Last drain")
+        self.watch_tree.heading("outbox", text="Outbox")
         self.watch_tree.heading("remote_pending", text="Remote")
-        self.watch_tree.column("path", width=460)
-        self.watch_tree.column("pid", width=80, anchor="center")
-        self.watch_tree.column("remote_pending", width=80, anchor="center")
+        self.watch_tree.column("path", width=380)
+        self.watch_tree.column("pid", width=70, anchor="center")
+        self.watch_tree.column("queue", width=70, anchor="center")
+        self.watch_tree.column("last_drain", width=110, anchor="center")
+        self.watch_tree.column("outbox", width=70, anchor="center")
+        self.watch_tree.column("remote_pending", width=70, anchor="center")
         self.watch_tree.grid(row=0, column=0, sticky="nsew")
 
         watch_scroll = ttk.Scrollbar(watches, orient="vertical", command=self.watch_tree.yview)
@@ -269,13 +2049,16 @@ class OverleafSyncGui:
         ttk.Button(inbox_btns, text="Open inbox folder", command=self.open_inbox_folder).pack(
             side="right"
         )
+        ttk.Button(inbox_btns, text="File history…", command=self.show_file_history).pack(
+            side="right", padx=(0, 8)
+        )
 
         inbox_cols = ("path", "kind")
         self.inbox_tree = ttk.Treeview(inbox, columns=inbox_cols, show="headings", selectmode="browse", height=6)
         self.inbox_tree.heading("path", text="Path")
         self.inbox_tree.heading("kind", text="Kind")
         self.inbox_tree.column("path", width=520)
-        self.inbox_tree.column("kind", width=120, anchor="center")
+        self.inbox_tree.column("kind", width=200, anchor="center")
         self.inbox_tree.grid(row=1, column=0, sticky="nsew", pady=(8, 0))
 
         inbox_scroll = ttk.Scrollbar(inbox, orient="vertical", command=self.inbox_tree.yview)
@@ -314,6 +2097,14 @@ class OverleafSyncGui:
         log_scroll.grid(row=0, column=1, sticky="ns")
         self.log_text.configure(yscrollcommand=log_scroll.set)
 
+        trace_row = ttk.Frame(logs)
+        trace_row.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+        ttk.Checkbutton(
+            trace_row, text="Record trace", variable=self.record_trace, command=self._toggle_trace
+        ).pack(side="left")
+        ttk.Button(trace_row, text="Export trace…", command=self.export_trace).pack(side="right")
+        ttk.Button(trace_row, text="Diagnostics…", command=self.show_diagnostics).pack(side="right", padx=(0, 8))
+
         self._set_buttons_enabled(False)
 
     def _start_background_tasks(self) -> None:
@@ -321,37 +2112,218 @@ class OverleafSyncGui:
         remote_thread.start()
         backup_thread = threading.Thread(target=self._backup_loop, daemon=True)
         backup_thread.start()
+        prefetch_thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        prefetch_thread.start()
+        candidates = self._linked_candidates()
+        threading.Thread(target=self._warm_linked_folders, args=(candidates,), daemon=True).start()
+        monitor_thread = threading.Thread(target=self._monitor.run, args=(self._stop_event,), daemon=True)
+        monitor_thread.start()
+        journal_thread = threading.Thread(target=self._journal.run_flusher, args=(self._stop_event,), daemon=True)
+        journal_thread.start()
+        if self._journal_tasks or self._dirty_files:
+            threading.Thread(target=self._resume_journal_tasks, daemon=True).start()
+        pending = sum(1 for item in self._downloads if item["status"] == "queued")
+        if pending:
+            self._append_log(f"[download] resuming {pending} queued download(s)")
+            self._pump_downloads()
 
     def shutdown(self) -> None:
         self._stop_event.set()
-        self.stop_all_watches()
+        self._prefetch_queue.put("")
+        self._watch_io.stop()
+        self._versions.close()
+        self._loop.stop()
+
+    def _warm_linked_folders(self, candidates: set[str]) -> None:
+        linked = sorted(self._linked_dirs(candidates))
+        self._monitor.set_folders(set(linked))
+        self.root.after(0, self._refresh_watch_list)
+        if linked:
+            self._warm_root_folders(linked)
+
+    def _warm_root_folders(self, dirs: list[str]) -> None:
+        """Fill the CLI's rootFolderId cache for linked folders, so push/watch starts skip the lookup."""
+        env = self._cli_env()
+        args = ["root-folders", "--stdin", "--json", "--base-url", self._setting("base_url")]
+        counts: dict[str, int] = {}
+
+        def on_line(line: str) -> None:
+            try:
+                item = json.loads(line)
+            except Exception:
+                return
+            if not isinstance(item, dict) or item.get("done"):
+                return
+            if item.get("error"):
+                counts["failed"] = counts.get("failed", 0) + 1
+                self._append_log_safe(f"[root-folders] {item.get('dir')}: {item['error']}")
+                return
+            via = str(item.get("via") or "?")
+            counts[via] = counts.get(via, 0) + 1
+
+        code, err = _stream_node(args, env, on_line, stdin_text="".join(d + "\n" for d in dirs))
+        if code not in (0, 1):
+            self._append_log_safe(err.strip() or f"[root-folders] failed: code={code}")
+            return
+        summary = ", ".join(f"{via}={n}" for via, n in sorted(counts.items()))
+        self._append_log_safe(f"[root-folders] {len(dirs)} linked folder(s): {summary}")
+
+    def _linked_candidates(self) -> set[str]:
+        """Folders that may be linked: watched, selected, or previously seen by the poller."""
+        candidates: set[str] = set(self._watches.keys())
+        local = self._dir_for_local_selection()
+        if local:
+            candidates.add(local)
+        with self._sync_lock:
+            entries = list((self._state.get("remote_projects") or {}).values())
+        for entry in entries:
+            abs_dir = str((entry or {}).get("dir") or "")
+            if abs_dir:
+                candidates.add(abs_dir)
+        return candidates
+
+    def _linked_dirs(self, candidates: set[str] | None = None) -> set[str]:
+        """The candidates that have a readable .ol-sync.json (stats each config; not for the Tk thread)."""
+        if candidates is None:
+            candidates = self._linked_candidates()
+        return {d for d in candidates if self._sync_info_for_dir(d)}
+
+    def _on_config_changed(self, abs_dir: str) -> None:
+        """Runs on the change monitor thread when a folder's .ol-sync.json may have changed."""
+        before = self._linked.get(abs_dir)
+        if self._sync_info_for_dir(abs_dir) != before:
+            self.root.after(0, self._refresh_watch_list)
+
+    def _on_local_changes(self, abs_dir: str, rel_paths: set[str]) -> None:
+        self._mark_dirty(abs_dir, rel_paths)
+
+    def _mark_dirty(self, abs_dir: str, rel_paths: set[str]) -> None:
+        with self._sync_lock:
+            known = self._dirty_files.setdefault(abs_dir, set())
+            fresh = set(rel_paths) - known
+            if not fresh:
+                return
+            self._journal.append({"op": "dirty", "dir": abs_dir, "paths": sorted(fresh)})
+            known.update(fresh)
+
+    def _mark_outgoing(self, key: str) -> None:
+        now = time.time()
+        with self._sync_lock:
+            self._journal.append({"op": "outgoing", "key": key, "ts": now})
+            self._last_outgoing[key] = now
+
+    def _journal_snapshot(self) -> dict:
+        cutoff = time.time() - OUTGOING_SUPPRESS_SEC
+        with self._sync_lock:
+            return {
+                "dirty": {d: set(p) for d, p in self._dirty_files.items() if p},
+                "outgoing": {k: ts for k, ts in self._last_outgoing.items() if ts >= cutoff},
+                "tasks": dict(self._journal_tasks),
+            }
+
+    def _compact_journal(self) -> None:
+        # Every append happens under _sync_lock, so none can land between
+        # taking the snapshot and replacing the file with it.
+        with self._sync_lock:
+            self._journal.compact(self._journal_snapshot())
+
+    def _begin_task(self, kind: str, **fields: str) -> str:
+        task_id = f"{kind}:{int(time.time() * 1000)}:{os.getpid()}"
+        task = {"kind": kind, **fields}
+        with self._sync_lock:
+            self._journal.append({"op": "task", "id": task_id, "task": task})
+            self._journal.sync()
+            self._journal_tasks[task_id] = task
+        return task_id
+
+    def _end_task(self, task_id: str) -> None:
+        with self._sync_lock:
+            self._journal.append({"op": "done", "id": task_id})
+            self._journal_tasks.pop(task_id, None)
+
+    def _resume_journal_tasks(self) -> None:
+        dirty = sum(len(p) for p in self._dirty_files.values())
+        if dirty:
+            self._append_log_safe(f"[journal] recovered {dirty} pending local backup path(s)")
+        env = self._cli_env()
+        with self._sync_lock:
+            pending = list(self._journal_tasks.items())
+        for task_id, task in pending:
+            if task.get("kind") != "apply":
+                self._end_task(task_id)
+                continue
+            dir_path = str(task.get("dir") or "")
+            batch_id = str(task.get("batch") or "")
+            base = str(task.get("baseUrl") or self._setting("base_url"))
+            if not dir_path or not batch_id or not Path(dir_path).is_dir():
+                self._end_task(task_id)
+                continue
+            self._append_log_safe(f"[journal] resuming interrupted apply of {batch_id} into {dir_path}")
+            code, out, err = _run_node(
+                ["apply", "--base-url", base, "--dir", dir_path, "--batch", batch_id], env
+            )
+            self._append_log_safe(out or err)
+            self._end_task(task_id)
+
+    def _snapshot_settings(self, *_args: object) -> None:
+        settings = {
+            "base_url": self.base_url.get().strip(),
+            "email": self.email.get(),
+            "password": self.password.get(),
+            "local_dir": self.local_dir.get().strip(),
+        }
+        with self._sync_lock:
+            self._settings = settings
+
+    def _setting(self, name: str) -> str:
+        """A connection setting as last seen on the Tk thread; safe from any thread."""
+        with self._sync_lock:
+            return self._settings[name]
+
+    def _cli_env(self) -> dict[str, str]:
+        with self._sync_lock:
+            settings = self._settings
+        return _build_env(settings["email"], settings["password"])
 
     def _sync_info_for_dir(self, abs_dir: str) -> tuple[str, str, str, str] | None:
-        cfg_path = Path(abs_dir) / ".ol-sync.json"
-        try:
-            cfg = json.loads(cfg_path.read_text(encoding="utf-8"))
-        except Exception:
+        """Linked-folder info via the registry; stats .ol-sync.json, so keep it off the Tk thread."""
+        info = self._linked.lookup(abs_dir, self._setting("base_url"))
+        if not info:
             return None
+        base_url, project_id, key, _host = info
+        with self._sync_lock:
+            remote_projects = self._state.setdefault("remote_projects", {})
+            entry = remote_projects.setdefault(key, {})
+            entry["baseUrl"] = base_url
+            entry["projectId"] = project_id
+            entry["dir"] = abs_dir
+        return info
+
+    def _save_state(self, **updates: Any) -> None:
+        """Apply top-level updates to the GUI state and persist it.
+
+        Worker threads change the state too, so it is only touched and
+        serialized under _sync_lock.
+        """
+        with self._sync_lock:
+            self._state.update(updates)
+            _save_gui_state(self._state)
 
-        base_url = _normalize_base_url(str(cfg.get("baseUrl") or self.base_url.get().strip()))
-        project_id = str(cfg.get("projectId") or "").strip()
-        if not base_url or not project_id:
-            return None
-        key = _project_key(base_url, project_id)
-        host = _safe_host(base_url)
-        self._dir_project_key[abs_dir] = key
+    def _remote_entry(self, key: str) -> dict:
+        """A copy of one remote_projects entry, safe to read off the lock."""
+        with self._sync_lock:
+            return dict((self._state.get("remote_projects") or {}).get(key) or {})
 
-        remote_projects = self._state.setdefault("remote_projects", {})
-        entry = remote_projects.setdefault(key, {})
-        entry["baseUrl"] = base_url
-        entry["projectId"] = project_id
-        entry["dir"] = abs_dir
-        return base_url, project_id, key, host
+    def _update_remote_entry(self, key: str, **fields: Any) -> None:
+        with self._sync_lock:
+            self._state.setdefault("remote_projects", {}).setdefault(key, {}).update(fields)
+            _save_gui_state(self._state)
 
     def _remote_pending_total(self) -> int:
-        remote_projects = self._state.get("remote_projects") or {}
+        with self._sync_lock:
+            entries = [dict(e or {}) for e in (self._state.get("remote_projects") or {}).values()]
         total = 0
-        for entry in remote_projects.values():
+        for entry in entries:
             try:
                 total += int(entry.get("pending") or 0)
             except Exception:
@@ -359,11 +2331,13 @@ class OverleafSyncGui:
         return total
 
     def _remote_pending_for_dir(self, abs_dir: str) -> int:
-        info = self._sync_info_for_dir(abs_dir)
+        # Called per row while refreshing the watch list: memory only, no disk access.
+        info = self._linked.get(abs_dir)
         if not info:
             return 0
         _base_url, _project_id, key, _host = info
-        entry = (self._state.get("remote_projects") or {}).get(key) or {}
+        with self._sync_lock:
+            entry = dict((self._state.get("remote_projects") or {}).get(key) or {})
         try:
             return int(entry.get("pending") or 0)
         except Exception:
@@ -385,8 +2359,9 @@ class OverleafSyncGui:
             self._stop_event.wait(REMOTE_POLL_INTERVAL_SEC)
 
     def _poll_remote_once(self) -> None:
+        self._monitor.set_folders(self._linked_dirs())
         dirs: set[str] = set(self._watches.keys())
-        local = self.local_dir.get().strip()
+        local = self._setting("local_dir")
         if local:
             try:
                 dirs.add(str(Path(local).resolve()))
@@ -404,7 +2379,7 @@ class OverleafSyncGui:
         if not tracked:
             return
 
-        env = _build_env(self.email.get(), self.password.get())
+        env = self._cli_env()
 
         by_base: dict[str, set[str]] = {}
         for info in tracked.values():
@@ -412,6 +2387,7 @@ class OverleafSyncGui:
 
         now = time.time()
         changed_any = False
+        changed: list[str] = []
 
         for base_url in sorted(by_base.keys()):
             code, out, err = _run_node(["projects", "--base-url", base_url, "--json"], env)
@@ -437,44 +2413,208 @@ class OverleafSyncGui:
                 if last:
                     id_to_last[pid] = last
 
-            remote_projects = self._state.setdefault("remote_projects", {})
-            for key, info in tracked.items():
-                if info["baseUrl"] != base_url:
-                    continue
-                project_id = info["projectId"]
-                last = id_to_last.get(project_id)
-                if not last:
-                    continue
-                entry = remote_projects.setdefault(key, {})
-                prev = str(entry.get("lastUpdated") or "")
-                entry["lastCheckedAt"] = datetime.now(timezone.utc).isoformat()
-                entry["baseUrl"] = base_url
-                entry["projectId"] = project_id
-                entry["dir"] = info["dir"]
-
-                if not prev:
-                    entry["lastUpdated"] = last
-                    changed_any = True
-                    continue
-                if last == prev:
-                    continue
+            with self._sync_lock:
+                remote_projects = self._state.setdefault("remote_projects", {})
+                for key, info in tracked.items():
+                    if info["baseUrl"] != base_url:
+                        continue
+                    project_id = info["projectId"]
+                    last = id_to_last.get(project_id)
+                    if not last:
+                        continue
+                    entry = remote_projects.setdefault(key, {})
+                    prev = str(entry.get("lastUpdated") or "")
+                    entry["lastCheckedAt"] = datetime.now(timezone.utc).isoformat()
+                    entry["baseUrl"] = base_url
+                    entry["projectId"] = project_id
+                    entry["dir"] = info["dir"]
+
+                    if not prev:
+                        entry["lastUpdated"] = last
+                        changed_any = True
+                        continue
+                    if last == prev:
+                        continue
 
-                entry["lastUpdated"] = last
-                outgoing_ts = float(self._last_outgoing.get(key) or 0.0)
-                if now - outgoing_ts <= OUTGOING_SUPPRESS_SEC:
+                    entry["lastUpdated"] = last
                     changed_any = True
-                    continue
-
-                pending = int(entry.get("pending") or 0) + 1
-                entry["pending"] = pending
+                    changed.append(key)
+
+        # Who made the change is decided outside the lock: it runs a node process per
+        # project, several at a time so one slow project doesn't hold up the others.
+        origins: dict[str, dict | None] = {}
+        if changed:
+            with ThreadPoolExecutor(max_workers=min(REMOTE_ORIGIN_WORKERS, len(changed))) as pool:
+                origins = dict(zip(changed, pool.map(lambda key: self._remote_origin(tracked[key], env), changed)))
+        for key in changed:
+            info = tracked[key]
+            origin = origins[key]
+            with self._sync_lock:
+                entry = self._state.setdefault("remote_projects", {}).setdefault(key, {})
+                if origin is None:
+                    outgoing_ts = float(self._last_outgoing.get(key) or 0.0)
+                    if now - outgoing_ts <= OUTGOING_SUPPRESS_SEC:
+                        continue
+                else:
+                    foreign = origin.get("foreign") or []
+                    entry["lastOrigin"] = {
+                        "foreign": len(foreign),
+                        "own": len(origin.get("own") or []),
+                        "checkedAt": datetime.now(timezone.utc).isoformat(),
+                    }
+                    if not foreign:
+                        continue
+                    paths = ", ".join(str(item.get("path")) for item in foreign[:5])
+                    more = f" (+{len(foreign) - 5} more)" if len(foreign) > 5 else ""
+                    self._append_log_safe(f"[remote] {info['dir']}: changed on the web: {paths}{more}")
+                entry["pending"] = int(entry.get("pending") or 0) + 1
                 entry["dirty"] = True
                 entry["lastChangedAt"] = datetime.now(timezone.utc).isoformat()
-                changed_any = True
 
         if changed_any:
-            _save_gui_state(self._state)
+            self._save_state()
             self.root.after(0, self._update_remote_ui)
 
+        # Retry on every poll so projects deferred by the budget catch up later.
+        for key in tracked:
+            entry = self._remote_entry(key)
+            if int(entry.get("pending") or 0) > 0 and not self._prefetch_is_current(entry):
+                self._schedule_prefetch(key)
+
+    def _remote_origin(self, info: dict, env: dict[str, str]) -> dict | None:
+        """Classify a remote change with `remote-status`; None when the tree can't be read."""
+        code, out, err = _run_node(
+            ["remote-status", "--dir", info["dir"], "--base-url", info["baseUrl"], "--json"], env
+        )
+        if code != 0:
+            self._append_log_safe(err or out or f"[remote poll] remote-status failed: code={code}")
+            return None
+        try:
+            result = json.loads(out)
+        except Exception:
+            return None
+        return result if result.get("available") else None
+
+    def _prefetch_is_current(self, entry: dict) -> bool:
+        prefetched = entry.get("prefetched") or {}
+        last = str(entry.get("lastUpdated") or "")
+        return bool(last) and str(prefetched.get("lastUpdated") or "") == last
+
+    def _schedule_prefetch(self, key: str) -> None:
+        if key in self._prefetch_queued:
+            return
+        self._prefetch_queued.add(key)
+        self._prefetch_queue.put(key)
+
+    def _prefetch_loop(self) -> None:
+        while not self._stop_event.is_set():
+            key = self._prefetch_queue.get()
+            self._prefetch_queued.discard(key)
+            if not key or self._stop_event.is_set():
+                continue
+            try:
+                self._prefetch_once(key)
+            except Exception as exc:  # noqa: BLE001 - best-effort background loop
+                self._append_log_safe(f"[prefetch error] {exc}")
+
+    def _prefetch_bandwidth_used(self) -> int:
+        cutoff = time.time() - PREFETCH_BANDWIDTH_WINDOW_SEC
+        self._prefetch_transfers = [t for t in self._prefetch_transfers if t[0] >= cutoff]
+        return sum(n for _ts, n in self._prefetch_transfers)
+
+    def _prune_inbox(self, project_inbox: Path, keep: set[str]) -> None:
+        try:
+            batches = sorted(p for p in project_inbox.iterdir() if p.is_dir())
+        except FileNotFoundError:
+            return
+        for batch in batches[:-PREFETCH_KEEP_BATCHES]:
+            if batch.name in keep:
+                continue
+            shutil.rmtree(batch, ignore_errors=True)
+
+    def _prefetch_once(self, key: str) -> None:
+        entry = self._remote_entry(key)
+        abs_dir = str(entry.get("dir") or "")
+        base_url = str(entry.get("baseUrl") or "").strip()
+        project_id = str(entry.get("projectId") or "").strip()
+        if not abs_dir or not base_url or not project_id or self._prefetch_is_current(entry):
+            return
+
+        project_inbox = INBOX_ROOT / _safe_host(base_url) / project_id
+        keep = {str((self._inbox_manifest or {}).get("batchId") or "")}
+        self._prune_inbox(project_inbox, keep)
+        if project_inbox.is_dir() and _dir_size_bytes(project_inbox) >= PREFETCH_DISK_BUDGET_BYTES:
+            self._append_log_safe(f"[prefetch] {project_id} skipped: inbox over disk budget")
+            return
+        if self._prefetch_bandwidth_used() >= PREFETCH_BANDWIDTH_BUDGET_BYTES:
+            # Deferred; the next poll re-queues it once the window has room.
+            return
+
+        last = str(entry.get("lastUpdated") or "")
+        env = self._cli_env()
+        code, out, err = self._run_fetch(
+            ["fetch", "--base-url", base_url, "--dir", abs_dir, "--json", "--skip-empty", "--delta"], env, "prefetch"
+        )
+        if code != 0:
+            self._append_log_safe(err or out or f"[prefetch] fetch failed: code={code}")
+            return
+        try:
+            manifest = json.loads(out)
+        except Exception:
+            self._append_log_safe(out)
+            return
+
+        inbox_dir = str(manifest.get("inboxDir") or "")
+        # What fetch reports as downloaded, also when --skip-empty dropped the batch and its zip.
+        transferred = int((manifest.get("transfer") or {}).get("bytes") or 0)
+        self._prefetch_transfers.append((time.time(), transferred))
+
+        self._update_remote_entry(
+            key,
+            prefetched={
+                "lastUpdated": last,
+                "fetchedAt": datetime.now(timezone.utc).isoformat(),
+                "batchId": manifest.get("batchId") if inbox_dir else None,
+                "manifestPath": str(Path(inbox_dir) / ".ol-sync.inbox.json") if inbox_dir else None,
+                "bytes": transferred,
+            },
+        )
+
+        changes = manifest.get("changes") or {}
+        counts = sum(len(changes.get(k) or []) for k in ("added", "modified", "deleted", "renamed"))
+        self._append_log_safe(f"[prefetch] {project_id} changes={counts} bytes={transferred}")
+
+        if self._dir_for_local_selection() == abs_dir:
+            self.root.after(0, lambda: self._show_inbox_manifest(manifest))
+
+    def _prefetched_manifest(self, entry: dict) -> dict | None:
+        """Return the prefetched inbox manifest if it matches the current remote state."""
+        if not self._prefetch_is_current(entry):
+            return None
+        prefetched = entry.get("prefetched") or {}
+        manifest_path = prefetched.get("manifestPath")
+        if not manifest_path:
+            # Prefetch found no differences; synthesize the empty --skip-empty manifest.
+            return {
+                "version": 1,
+                "baseUrl": entry.get("baseUrl"),
+                "projectId": entry.get("projectId"),
+                "batchId": None,
+                "inboxDir": None,
+                "changes": {"added": [], "modified": [], "deleted": [], "renamed": []},
+                "saved": False,
+            }
+        return _load_inbox_manifest(str(manifest_path))
+
+    def _dir_for_local_selection(self) -> str:
+        local = self._setting("local_dir")
+        if not local:
+            return ""
+        try:
+            return str(Path(local).resolve())
+        except Exception:
+            return local
+
     def _backup_loop(self) -> None:
         while not self._stop_event.is_set():
             try:
@@ -487,58 +2627,87 @@ class OverleafSyncGui:
             self._stop_event.wait(BACKUP_INTERVAL_SEC)
 
     def _backup_once(self) -> None:
+        # 0) pick up backups written outside this loop (CLI applies, older runs)
+        try:
+            added = self._versions.scan()
+            if added:
+                self._append_log_safe(f"[versions] indexed {added} backup snapshot(s)")
+        except sqlite3.Error as exc:
+            self._append_log_safe(f"[versions] index update failed: {exc}")
+        if time.time() - self._last_pack_at >= BACKUP_PACK_INTERVAL_SEC:
+            self._last_pack_at = time.time()
+            self._pack_backups()
+
         # 1) local incremental backups (changed files since last run)
-        if self._dirty_files:
-            for abs_dir, rel_set in list(self._dirty_files.items()):
-                if not rel_set:
-                    continue
+        with self._sync_lock:
+            dirty = {d: set(p) for d, p in self._dirty_files.items() if p}
+        if dirty:
+            for abs_dir, batch in dirty.items():
                 info = self._sync_info_for_dir(abs_dir)
                 if not info:
                     continue
                 base_url, project_id, _key, host = info
                 timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M-%SZ")
                 dest_root = BACKUP_ROOT / host / project_id / "local" / timestamp
-                copied = 0
-                for rel_posix in sorted(rel_set):
+                matcher = _load_ignore_matcher(abs_dir)
+                copied: list[tuple[str, str, int, float]] = []
+                for rel_posix in sorted(batch):
+                    if _should_ignore(rel_posix, False, matcher):
+                        continue
                     src = Path(abs_dir) / Path(*str(rel_posix).split("/"))
                     if not src.is_file():
                         continue
                     dst = dest_root / Path(*str(rel_posix).split("/"))
                     dst.parent.mkdir(parents=True, exist_ok=True)
                     shutil.copy2(src, dst)
-                    copied += 1
+                    st = dst.stat()
+                    copied.append((rel_posix, _sha256_file(dst), st.st_size, st.st_mtime))
                 if copied:
-                    self._append_log_safe(f"[backup local] {project_id} files={copied} -> {dest_root}")
-                rel_set.clear()
+                    self._index_backup(dest_root, "local", copied)
+                    self._append_log_safe(f"[backup local] {project_id} files={len(copied)} -> {dest_root}")
+                with self._sync_lock:
+                    self._journal.append({"op": "clean", "dir": abs_dir, "paths": sorted(batch)})
+                    self._dirty_files.get(abs_dir, set()).difference_update(batch)
+            # Everything marked clean is now durable in the backup snapshot.
+            if self._journal.needs_compaction():
+                self._compact_journal()
 
         # 2) remote snapshot backups (when remote changed)
-        remote_projects = self._state.get("remote_projects") or {}
-        dirty_keys = [k for k, v in remote_projects.items() if v.get("dirty")]
+        with self._sync_lock:
+            remote_projects = self._state.get("remote_projects") or {}
+            dirty_keys = [k for k, v in remote_projects.items() if v.get("dirty")]
         if not dirty_keys:
             return
 
-        env = _build_env(self.email.get(), self.password.get())
+        env = self._cli_env()
         for key in sorted(dirty_keys):
-            entry = remote_projects.get(key) or {}
+            entry = self._remote_entry(key)
             abs_dir = str(entry.get("dir") or "")
             base_url = str(entry.get("baseUrl") or "").strip()
             project_id = str(entry.get("projectId") or "").strip()
             if not abs_dir or not base_url or not project_id:
                 continue
 
-            code, out, err = _run_node(["fetch", "--base-url", base_url, "--dir", abs_dir, "--json"], env)
-            if code != 0:
-                self._append_log_safe(err or out or f"[backup remote] fetch failed: code={code}")
-                continue
-            try:
-                manifest = json.loads(out)
-            except Exception:
-                self._append_log_safe(out)
-                continue
+            manifest = self._prefetched_manifest(entry)
+            if manifest is None:
+                code, out, err = self._run_fetch(
+                    ["fetch", "--base-url", base_url, "--dir", abs_dir, "--json", "--delta"], env, "backup"
+                )
+                if code != 0:
+                    self._append_log_safe(err or out or f"[backup remote] fetch failed: code={code}")
+                    continue
+                try:
+                    manifest = json.loads(out)
+                except Exception:
+                    self._append_log_safe(out)
+                    continue
 
             batch_id = str(manifest.get("batchId") or "")
             inbox_dir = str(manifest.get("inboxDir") or "")
             if not batch_id or not inbox_dir:
+                if manifest.get("saved") is False:
+                    # Prefetch saw no differences: nothing to back up.
+                    self._update_remote_entry(key, dirty=False)
                 continue
 
             host = _safe_host(base_url)
@@ -547,22 +2716,44 @@ class OverleafSyncGui:
             files = list(changes.get("added") or []) + [
                 (e or {}).get("path") for e in (changes.get("modified") or [])
             ]
-            copied = 0
+            matcher = _load_ignore_matcher(abs_dir)
+            copied = []
             for rel_posix in sorted({f for f in files if f}):
+                if _should_ignore(rel_posix, False, matcher):
+                    continue
                 src = Path(inbox_dir) / Path(*str(rel_posix).split("/"))
                 if not src.is_file():
                     continue
                 dst = dest_root / Path(*str(rel_posix).split("/"))
                 dst.parent.mkdir(parents=True, exist_ok=True)
                 shutil.copy2(src, dst)
-                copied += 1
+                st = dst.stat()
+                copied.append((rel_posix, _sha256_file(dst), st.st_size, st.st_mtime))
+            if copied:
+                self._index_backup(dest_root, "remote", copied)
 
-            entry["dirty"] = False
-            entry["lastRemoteBackupAt"] = datetime.now(timezone.utc).isoformat()
-            remote_projects[key] = entry
-            _save_gui_state(self._state)
+            self._update_remote_entry(key, dirty=False, lastRemoteBackupAt=datetime.now(timezone.utc).isoformat())
             if copied:
-                self._append_log_safe(f"[backup remote] {project_id} files={copied} -> {dest_root}")
+                self._append_log_safe(f"[backup remote] {project_id} files={len(copied)} -> {dest_root}")
+
+    def _pack_backups(self) -> None:
+        try:
+            reports = self._packer.run()
+        except (OSError, sqlite3.Error, zipfile.BadZipFile) as exc:
+            self._append_log_safe(f"[pack] failed: {exc}")
+            return
+        for r in reports:
+            self._append_log_safe(
+                f"[pack] {r['project']}: {r['snapshots']} snapshot(s), {r['files']} file(s), "
+                f"{_format_bytes(r['raw_bytes'])} -> {_format_bytes(r['packed_bytes'])} ({r['ratio']:.1f}x); "
+                f"backup scan {r['scan_before_ms']:.0f} ms -> {r['scan_after_ms']:.0f} ms"
+            )
+
+    def _index_backup(self, dest_root: Path, source: str, files: list[tuple[str, str, int, float]]) -> None:
+        try:
+            self._versions.add_snapshot(dest_root, source, files)
+        except sqlite3.Error as exc:
+            self._append_log_safe(f"[versions] could not index {dest_root}: {exc}")
 
     def _mark_outgoing_for_dir(self, dir_path: str) -> None:
         try:
@@ -573,7 +2764,7 @@ class OverleafSyncGui:
         if not info:
             return
         _base_url, _project_id, key, _host = info
-        self._last_outgoing[key] = time.time()
+        self._mark_outgoing(key)
 
     def _append_log(self, text: str) -> None:
         self.log_text.insert("end", text)
@@ -591,9 +2782,18 @@ class OverleafSyncGui:
         self.btn_pull.configure(state=state)
         self.btn_watch.configure(state=state)
 
+    def _selected_project_ids(self) -> list[str]:
+        ids: list[str] = []
+        for iid in self.tree.selection():
+            values = self.tree.item(iid).get("values") or []
+            if len(values) >= 2:
+                ids.append(str(values[1]))
+        return ids
+
     def _selected_project_id(self) -> str | None:
+        # Link/pull act on one project; with several selected there is no single target.
         sel = self.tree.selection()
-        if not sel:
+        if len(sel) != 1:
             return None
         item = self.tree.item(sel[0])
         values = item.get("values") or []
@@ -603,7 +2803,7 @@ class OverleafSyncGui:
 
     def _selected_project_name(self) -> str | None:
         sel = self.tree.selection()
-        if not sel:
+        if len(sel) != 1:
             return None
         item = self.tree.item(sel[0])
         values = item.get("values") or []
@@ -620,16 +2820,15 @@ class OverleafSyncGui:
     def _set_local_dir(self, path: str) -> None:
         self.local_dir.set(path)
         if path:
-            self._state["local_dir"] = path
-            _save_gui_state(self._state)
+            self._save_state(local_dir=path)
 
     def _on_select_project(self, _event: object) -> None:
         self._set_buttons_enabled(True)
 
     def load_projects(self) -> None:
         def work() -> None:
-            env = _build_env(self.email.get(), self.password.get())
-            base = self.base_url.get().strip()
+            env = self._cli_env()
+            base = self._setting("base_url")
             args = ["projects", "--base-url", base, "--json"]
             if self.active_only.get():
                 args.append("--active-only")
@@ -665,6 +2864,7 @@ class OverleafSyncGui:
                     self.tree.insert(
                         "",
                         "end",
+                        iid=str(p.get("id", "")) or None,
                         values=(
                             p.get("name", ""),
                             p.get("id", ""),
@@ -679,10 +2879,136 @@ class OverleafSyncGui:
 
         threading.Thread(target=work, daemon=True).start()
 
+    def bulk_project_action(self, action: str) -> None:
+        project_ids = self._selected_project_ids()
+        if not project_ids:
+            messagebox.showwarning("No project selected", "Select one or more projects first.")
+            return
+        if action == "delete" and not messagebox.askyesno(
+            "Delete projects",
+            f"Permanently delete {len(project_ids)} project(s)?\n\nThis cannot be undone.",
+        ):
+            return
+
+        total = len(project_ids)
+        conc = self.concurrency.get().strip() or "4"
+        for btn in self._bulk_buttons:
+            btn.configure(state="disabled")
+        self.bulk_status_var.set(f"{action}: 0/{total}")
+        self._append_log(f"[bulk] {action} {total} project(s), concurrency={conc}")
+
+        def work() -> None:
+            env = self._cli_env()
+            base = self._setting("base_url")
+            args = ["project-bulk", "--action", action, "--stdin", "--json", "--concurrency", conc, "--base-url", base]
+            counts = {"ok": 0, "failed": 0}
+
+            def on_line(line: str) -> None:
+                try:
+                    item = json.loads(line)
+                except Exception:
+                    self._append_log_safe(line)
+                    return
+                if not isinstance(item, dict) or item.get("done"):
+                    return
+                counts["ok" if item.get("ok") else "failed"] += 1
+                done = counts["ok"] + counts["failed"]
+                status = f"{action}: {done}/{total} ok={counts['ok']} failed={counts['failed']}"
+                if not item.get("ok"):
+                    self._append_log_safe(f"[bulk] {item.get('projectId') or '?'}: {item.get('error')}")
+                self.root.after(0, lambda: self._apply_bulk_result(item, status))
+
+            stdin_text = "".join(pid + "\n" for pid in project_ids)
+            code, err = _stream_node(args, env, on_line, stdin_text=stdin_text)
+            # Exit code 1 only means some projects failed; those are logged above.
+            if code not in (0, 1):
+                self._append_log_safe(err or f"[bulk] project-bulk failed: code={code}")
+            self._append_log_safe(f"[bulk] {action} done: ok={counts['ok']} failed={counts['failed']}")
+
+            def finish() -> None:
+                for btn in self._bulk_buttons:
+                    btn.configure(state="normal")
+
+            self.root.after(0, finish)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def mirror_instance(self) -> None:
+        base = self.base_url.get().strip()
+        initial = self._state.get("mirror_dir") or str(BACKUP_ROOT / _safe_host(base))
+        mirror_dir = filedialog.askdirectory(title="Select mirror folder", initialdir=initial)
+        if not mirror_dir:
+            return
+        self._save_state(mirror_dir=mirror_dir)
+        self.btn_mirror.configure(state="disabled")
+        self.bulk_status_var.set("mirror: listing projects…")
+        self._append_log(f"[mirror] {base} -> {mirror_dir}")
+
+        def work() -> None:
+            env = self._cli_env()
+            args = ["mirror", "--json", "--dir", mirror_dir, "--base-url", base]
+            counts = {"ok": 0, "failed": 0}
+
+            def on_line(line: str) -> None:
+                try:
+                    item = json.loads(line)
+                except Exception:
+                    self._append_log_safe(line)
+                    return
+                if not isinstance(item, dict):
+                    return
+                if item.get("done"):
+                    self._append_log_safe(
+                        f"[mirror] synced={item.get('synced')} skipped={item.get('skipped')} "
+                        f"failed={item.get('failed')} transferred={_format_bytes(int(item.get('transferredBytes') or 0))} "
+                        f"skipped={_format_bytes(int(item.get('skippedBytes') or 0))} "
+                        f"deduplicated={_format_bytes(int(item.get('dedupedBytes') or 0))}"
+                    )
+                    return
+                counts["ok" if item.get("ok") else "failed"] += 1
+                name = item.get("name") or item.get("projectId") or "?"
+                if item.get("ok"):
+                    self._append_log_safe(f"[mirror] {name}: {_format_bytes(int(item.get('zipBytes') or 0))}")
+                else:
+                    self._append_log_safe(f"[mirror] {name} failed: {item.get('error')}")
+                status = f"mirror: ok={counts['ok']} failed={counts['failed']}"
+                self.root.after(0, lambda: self.bulk_status_var.set(status))
+
+            code, err = _stream_node(args, env, on_line)
+            if code != 0 and err:
+                self._append_log_safe(err)
+
+            def finish() -> None:
+                self.btn_mirror.configure(state="normal")
+                if code != 0 and not counts["ok"] and not counts["failed"]:
+                    self.bulk_status_var.set("mirror failed (see logs)")
+                else:
+                    self.bulk_status_var.set(f"mirror done: ok={counts['ok']} failed={counts['failed']}")
+
+            self.root.after(0, finish)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _apply_bulk_result(self, item: dict, status: str) -> None:
+        self.bulk_status_var.set(status)
+        project_id = str(item.get("projectId") or "")
+        if not item.get("ok") or not self.tree.exists(project_id):
+            return
+        action = item.get("action")
+        if action == "delete":
+            self.tree.delete(project_id)
+            self._projects = [p for p in self._projects if str(p.get("id")) != project_id]
+            return
+        column = {"archive": "archived", "unarchive": "archived", "trash": "trashed", "untrash": "trashed"}.get(
+            str(action)
+        )
+        if column:
+            self.tree.set(project_id, column, "yes" if action in ("archive", "trash") else "no")
+
     def link_selected(self) -> None:
         project_id = self._selected_project_id()
         if not project_id:
-            messagebox.showwarning("No project selected", "Please select a project first.")
+            messagebox.showwarning("No project selected", "Please select exactly one project.")
             return
         dir_path = self.local_dir.get().strip()
         if not dir_path:
@@ -690,8 +3016,8 @@ class OverleafSyncGui:
             return
 
         def work() -> None:
-            env = _build_env(self.email.get(), self.password.get())
-            base = self.base_url.get().strip()
+            env = self._cli_env()
+            base = self._setting("base_url")
             args = ["link", "--base-url", base, "--project-id", project_id, "--dir", dir_path]
             if self.force.get():
                 args.append("--force")
@@ -717,8 +3043,8 @@ class OverleafSyncGui:
         conc = self.concurrency.get().strip() or "4"
 
         def work() -> None:
-            env = _build_env(self.email.get(), self.password.get())
-            base = self.base_url.get().strip()
+            env = self._cli_env()
+            base = self._setting("base_url")
             args = ["push", "--base-url", base, "--dir", dir_path, "--concurrency", conc]
             if self.dry_run.get():
                 args.append("--dry-run")
@@ -738,17 +3064,17 @@ class OverleafSyncGui:
         threading.Thread(target=work, daemon=True).start()
 
     def pull_selected(self) -> None:
-        project_id = self._selected_project_id()
-        project_name = self._selected_project_name()
-        if not project_id or not project_name:
-            messagebox.showwarning("No project selected", "Please select a project first.")
+        project_ids = self._selected_project_ids()
+        if not project_ids:
+            messagebox.showwarning("No project selected", "Select one or more projects first.")
             return
+        names = {str(p.get("id")): str(p.get("name") or "") for p in self._projects}
 
-        ok = messagebox.askyesno(
-            "Download project",
-            f"Download '{project_name}' ({project_id}) to a local folder?",
-        )
-        if not ok:
+        if len(project_ids) == 1:
+            prompt = f"Download '{names.get(project_ids[0]) or project_ids[0]}' ({project_ids[0]}) to a local folder?"
+        else:
+            prompt = f"Download {len(project_ids)} projects into one parent folder?"
+        if not messagebox.askyesno("Download projects", prompt):
             return
 
         initial = self.download_parent_dir.get().strip() or self.create_parent_dir.get().strip() or None
@@ -760,46 +3086,309 @@ class OverleafSyncGui:
             return
 
         self.download_parent_dir.set(base_dir)
-        self._state["download_parent_dir"] = base_dir
-        _save_gui_state(self._state)
+        self._save_state(download_parent_dir=base_dir)
 
-        safe_name = _sanitize_folder_name(project_name, project_id)
         dest_parent = Path(base_dir).expanduser().resolve()
-        dest_dir = _unique_child_dir(dest_parent, safe_name)
+        base = self.base_url.get().strip()
+        added: list[dict] = []
+        for project_id in project_ids:
+            name = names.get(project_id) or project_id
+            # Reserve each folder now so parallel pulls never pick the same name.
+            dest_dir = _unique_child_dir(
+                dest_parent, _sanitize_folder_name(name, project_id), DOWNLOAD_STAGING_SUFFIX
+            )
+            try:
+                dest_dir.mkdir(parents=True, exist_ok=False)
+            except Exception as exc:  # noqa: BLE001 - UI surface
+                messagebox.showerror("Create folder failed", str(exc))
+                break
+            added.append(
+                {
+                    "projectId": project_id,
+                    "name": name,
+                    "baseUrl": base,
+                    "dest": str(dest_dir),
+                    "status": "queued",
+                    "bytes": 0,
+                    "total": None,
+                    "error": "",
+                }
+            )
+        if not added:
+            return
 
+        if len(added) == 1:
+            self._set_local_dir(added[0]["dest"])
+        with self._download_lock:
+            self._downloads.extend(added)
+        self._save_download_queue()
+        self._append_log(f"[download] queued {len(added)} project(s) into {dest_parent}")
+        self._pump_downloads()
+        self.show_downloads()
+
+    def _restore_download_queue(self) -> list[dict]:
+        """Reload the persisted queue; downloads cut off by a restart start over."""
+        saved = self._state.get("download_queue")
+        items: list[dict] = []
+        for raw in saved if isinstance(saved, list) else []:
+            if not isinstance(raw, dict) or not raw.get("projectId") or not raw.get("dest"):
+                continue
+            item = {
+                "projectId": str(raw["projectId"]),
+                "name": str(raw.get("name") or raw["projectId"]),
+                "baseUrl": str(raw.get("baseUrl") or ""),
+                "dest": str(raw["dest"]),
+                "status": str(raw.get("status") or "queued"),
+                "bytes": int(raw.get("bytes") or 0),
+                "total": raw.get("total"),
+                "error": str(raw.get("error") or ""),
+            }
+            if item["status"] == "running":
+                item["status"] = "queued"
+                item["bytes"] = 0
+            items.append(item)
+        return items
+
+    def _save_download_queue(self) -> None:
+        with self._download_lock:
+            queue_items = [dict(item) for item in self._downloads]
+        self._save_state(download_queue=queue_items)
+
+    def _pump_downloads(self) -> None:
+        """Start queued downloads until DOWNLOAD_QUEUE_CONCURRENCY are running."""
+        started: list[dict] = []
+        with self._download_lock:
+            running = sum(1 for item in self._downloads if item["status"] == "running")
+            for item in self._downloads:
+                if running >= DOWNLOAD_QUEUE_CONCURRENCY:
+                    break
+                if item["status"] != "queued":
+                    continue
+                item.update(status="running", bytes=0, total=None, rate=None, resumedFrom=0, error="")
+                running += 1
+                started.append(item)
+        if not started:
+            return
+        self._save_download_queue()
+        for item in started:
+            threading.Thread(target=self._download_worker, args=(item,), daemon=True).start()
+
+    def _download_worker(self, item: dict) -> None:
+        dest = Path(item["dest"])
+        project_id = item["projectId"]
+        status, error = "done", ""
+        if (dest / ".ol-sync.json").is_file():
+            # Finished just before the GUI went away; nothing left to do.
+            self._finish_download(item, status, error)
+            return
+        # pull runs in a sibling staging folder that only this queue writes to (the
+        # name was free when the item was queued), so what a cut-off run left there
+        # can be discarded; dest itself is never cleared, only checked to be empty.
+        partial = dest.with_name(f"{dest.name}{DOWNLOAD_STAGING_SUFFIX}")
+        if dest.is_dir() and any(dest.iterdir()):
+            self._finish_download(item, "failed", f"Destination is not empty: {dest}")
+            return
+        if (partial / ".ol-sync.json").is_file():
+            # Pulled before the GUI went away, but not moved into place yet.
+            self._finish_download(item, *self._promote_download(partial, dest))
+            return
         try:
-            dest_dir.mkdir(parents=True, exist_ok=False)
-        except Exception as exc:  # noqa: BLE001 - UI surface
-            messagebox.showerror("Create folder failed", str(exc))
+            if partial.exists():
+                shutil.rmtree(partial)
+            partial.mkdir(parents=True)
+        except OSError as exc:
+            self._finish_download(item, "failed", str(exc))
             return
 
-        self._set_local_dir(str(dest_dir))
+        env = self._cli_env()
+        base = item["baseUrl"] or self._setting("base_url")
+        args = ["pull", "--events", "--base-url", base, "--project-id", project_id, "--dir", str(partial)]
+        out_lines: list[str] = []
 
-        def work() -> None:
-            env = _build_env(self.email.get(), self.password.get())
-            base = self.base_url.get().strip()
-            args = ["pull", "--base-url", base, "--project-id", project_id, "--dir", str(dest_dir)]
-            code, out, err = _run_node(args, env)
-            self._append_log_safe(out or err)
-            if code != 0:
-                self.root.after(
-                    0,
-                    lambda: messagebox.showerror(
-                        "Pull failed",
-                        err or out or f"Exit code: {code}",
-                    ),
-                )
+        def on_event(event: dict) -> None:
+            if event.get("type") != "download-progress":
                 return
+            received = int(event.get("bytes") or 0)
+            resumed = int(event.get("resumedFrom") or 0)
+            with self._download_lock:
+                # Bytes an earlier run left in the partial file don't count toward the rate.
+                delta = received - max(int(item["bytes"] or 0), resumed)
+                item["bytes"] = received
+                item["total"] = event.get("total")
+                item["rate"] = event.get("bytesPerSec")
+                item["resumedFrom"] = resumed
+                if delta > 0:
+                    self._download_samples.append((time.time(), delta))
+
+        code, err = _stream_node(args, env, out_lines.append, on_event=on_event)
+        if code != 0:
+            status = "failed"
+            error = (err or "\n".join(out_lines) or f"Exit code: {code}").strip()
+        else:
+            status, error = self._promote_download(partial, dest)
+        self._append_log_safe("\n".join(out_lines) or err)
+        self._finish_download(item, status, error)
 
-            self.root.after(
-                0,
-                lambda: messagebox.showinfo(
-                    "Download complete",
-                    f"Downloaded to:\n{dest_dir}",
-                ),
-            )
+    def _promote_download(self, partial: Path, dest: Path) -> tuple[str, str]:
+        """Move a finished pull from its staging folder to dest, which must be missing or empty."""
+        try:
+            try:
+                dest.rmdir()  # only the empty folder reserved when the item was queued
+            except FileNotFoundError:
+                pass
+            os.replace(partial, dest)
+        except OSError as exc:
+            return "failed", f"Could not move {partial} to {dest}: {exc}"
+        return "done", ""
+
+    def _finish_download(self, item: dict, status: str, error: str) -> None:
+        with self._download_lock:
+            item["status"] = status
+            item["error"] = error
+        self._save_download_queue()
+        if status == "failed":
+            reason = error.splitlines()[-1] if error else "unknown error"
+            self._append_log_safe(f"[download] {item['name']} failed: {reason}")
+        else:
+            self._append_log_safe(f"[download] {item['name']} -> {item['dest']}")
+        self._pump_downloads()
+
+    def _download_rate(self) -> float:
+        cutoff = time.time() - DOWNLOAD_RATE_WINDOW_SEC
+        with self._download_lock:
+            while self._download_samples and self._download_samples[0][0] < cutoff:
+                self._download_samples.popleft()
+            received = sum(n for _, n in self._download_samples)
+        return received / DOWNLOAD_RATE_WINDOW_SEC
+
+    def _run_fetch(self, args: list[str], env: dict[str, str], purpose: str) -> tuple[int, str, str]:
+        """Like _run_node for "fetch", listing a zip download in the Downloads view."""
+        key = f"{purpose}:{args[args.index('--dir') + 1]}"
+        out_lines: list[str] = []
+
+        def on_event(event: dict) -> None:
+            if event.get("type") != "download-progress":
+                return
+            received = int(event.get("bytes") or 0)
+            resumed = int(event.get("resumedFrom") or 0)
+            with self._download_lock:
+                transfer = self._transfers.get(key)
+                if transfer is None or transfer["status"] != "running":
+                    transfer = {"purpose": purpose, "bytes": 0, "status": "running", "error": "", "finishedAt": 0.0}
+                    self._transfers[key] = transfer
+                delta = received - max(transfer["bytes"], resumed)
+                transfer.update(
+                    projectId=str(event.get("projectId") or ""),
+                    bytes=received,
+                    total=event.get("total"),
+                    rate=event.get("bytesPerSec"),
+                    resumedFrom=resumed,
+                )
+                if delta > 0:
+                    self._download_samples.append((time.time(), delta))
+
+        code, err = _stream_node([*args, "--events"], env, out_lines.append, on_event=on_event)
+        with self._download_lock:
+            transfer = self._transfers.get(key)
+            if transfer is not None and transfer["status"] == "running":
+                transfer["status"] = "done" if code == 0 else "failed"
+                transfer["error"] = "" if code == 0 else (err.strip().splitlines() or [""])[-1]
+                transfer["finishedAt"] = time.time()
+        return code, "\n".join(out_lines), err
+
+    def show_downloads(self) -> None:
+        if self._downloads_window is not None and self._downloads_window.winfo_exists():
+            self._downloads_window.lift()
+            return
+        win = tk.Toplevel(self.root)
+        win.title("Downloads")
+        win.geometry("820x320")
+        self._downloads_window = win
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+        frame.rowconfigure(0, weight=1)
+        frame.columnconfigure(0, weight=1)
+
+        cols = ("project", "status", "progress", "rate", "dest")
+        tree = ttk.Treeview(frame, columns=cols, show="headings", selectmode="browse")
+        tree.heading("project", text="Project")
+        tree.heading("status", text="Status")
+        tree.heading("progress", text="Progress")
+        tree.heading("dest", text="Destination")
+        tree.column("project", width=200)
+        tree.column("status", width=80, anchor="center")
+        tree.column("progress", width=160, anchor="center")
+        tree.column("dest", width=340)
+        tree.heading("rate", text="Rate")
+        tree.column("rate", width=90, anchor="e")
+        tree.grid(row=0, column=0, sticky="nsew")
+        scroll = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        scroll.grid(row=0, column=1, sticky="ns")
+        tree.configure(yscrollcommand=scroll.set)
 
-        threading.Thread(target=work, daemon=True).start()
+        summary = tk.StringVar(value="")
+        row = ttk.Frame(frame)
+        row.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+        ttk.Label(row, textvariable=summary).pack(side="left")
+        ttk.Button(row, text="Clear finished", command=self._clear_finished_downloads).pack(side="right")
+        ttk.Button(row, text="Retry failed", command=self._retry_failed_downloads).pack(side="right", padx=(0, 8))
+
+        def refresh() -> None:
+            if not win.winfo_exists():
+                return
+            rate = self._download_rate()
+            cutoff = time.time() - TRANSFER_KEEP_SEC
+            with self._download_lock:
+                items = [dict(item, key=str(i)) for i, item in enumerate(self._downloads)]
+                for key, transfer in list(self._transfers.items()):
+                    if transfer["status"] != "running" and transfer["finishedAt"] < cutoff:
+                        del self._transfers[key]
+                        continue
+                    items.append(
+                        dict(
+                            transfer,
+                            key=f"transfer:{key}",
+                            name=f"{transfer['projectId']} ({transfer['purpose']})",
+                            dest=key.split(":", 1)[1],
+                        )
+                    )
+            tree.delete(*tree.get_children())
+            counts: dict[str, int] = {}
+            for item in items:
+                counts[item["status"]] = counts.get(item["status"], 0) + 1
+                if item["status"] == "running" or item["bytes"]:
+                    progress = _format_bytes(item["bytes"])
+                    if item["total"]:
+                        pct = 100 * item["bytes"] / max(1, int(item["total"]))
+                        progress = f"{progress} / {_format_bytes(int(item['total']))} ({pct:.0f}%)"
+                    if item.get("resumedFrom"):
+                        progress += f", resumed at {_format_bytes(int(item['resumedFrom']))}"
+                else:
+                    progress = ""
+                rate = item.get("rate")
+                rate_text = f"{_format_bytes(int(rate))}/s" if item["status"] == "running" and rate else ""
+                status = item["status"]
+                if status == "failed" and item["error"]:
+                    status = f"failed: {item['error'].splitlines()[-1]}"
+                tree.insert("", "end", iid=item["key"], values=(item["name"], status, progress, rate_text, item["dest"]))
+            parts = [f"{counts[k]} {k}" for k in ("running", "queued", "done", "failed") if counts.get(k)]
+            summary.set(f"{', '.join(parts) or 'No downloads'} · {_format_bytes(int(rate))}/s")
+            self.root.after(DOWNLOAD_VIEW_REFRESH_MS, refresh)
+
+        refresh()
+
+    def _retry_failed_downloads(self) -> None:
+        with self._download_lock:
+            for item in self._downloads:
+                if item["status"] == "failed":
+                    item.update(status="queued", bytes=0, total=None, rate=None, resumedFrom=0, error="")
+        self._save_download_queue()
+        self._pump_downloads()
+
+    def _clear_finished_downloads(self) -> None:
+        with self._download_lock:
+            self._downloads = [item for item in self._downloads if item["status"] not in ("done", "failed")]
+        self._save_download_queue()
 
     def watch(self) -> None:
         dir_path = self.local_dir.get().strip()
@@ -813,17 +3402,21 @@ class OverleafSyncGui:
             messagebox.showinfo("Watch running", "This folder is already being watched.")
             return
 
-        env = _build_env(self.email.get(), self.password.get())
+        env = self._cli_env()
         base = self.base_url.get().strip()
-        args = ["watch", "--base-url", base, "--dir", abs_dir]
+        args = ["watch", "--base-url", base, "--dir", abs_dir, "--events"]
+        if _TRACE.enabled:
+            args.append("--trace")
         cmd = ["node", str(OL_SYNC), *args]
+        # Resolve the project key now so the I/O thread never reads .ol-sync.json.
+        self._sync_info_for_dir(abs_dir)
 
         try:
-            proc: subprocess.Popen[str] = subprocess.Popen(
+            proc: subprocess.Popen[bytes] = subprocess.Popen(
                 cmd,
                 cwd=str(REPO_ROOT),
                 env=env,
-                text=True,
+                stdin=subprocess.DEVNULL,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
             )
@@ -832,35 +3425,78 @@ class OverleafSyncGui:
             return
 
         self._watches[abs_dir] = proc
+        self._watch_stats[abs_dir] = {}
+        self._watch_io.add(abs_dir, proc)
         self._refresh_watch_list()
+        self._append_log(f"[watch started] {abs_dir}")
+
+    def _on_watch_output(self, batch: list[tuple[str, str]]) -> None:
+        """Runs on the watch I/O thread with every line read since the last batch."""
+        log_lines: list[str] = []
+        events: list[tuple[str, dict]] = []
+        synced: dict[str, set[str]] = {}
+        for abs_dir, line in batch:
+            if line.startswith(EVENT_PREFIX):
+                try:
+                    event = json.loads(line[len(EVENT_PREFIX) :])
+                except Exception:
+                    continue
+                if not isinstance(event, dict):
+                    continue
+                if event.get("type") == "span":
+                    _TRACE.add_cli_span(event, f"ol-sync watch {Path(abs_dir).name}")
+                elif event.get("type") == "http-stats":
+                    _HTTP_STATS.record(event)
+                else:
+                    events.append((abs_dir, event))
+                continue
+            if line.startswith("synced "):
+                rel = line[len("synced ") :].strip()
+                if rel:
+                    synced.setdefault(abs_dir, set()).add(rel)
+            log_lines.append(f"[watch:{Path(abs_dir).name or abs_dir}] {line}")
+
+        for abs_dir, rel_paths in synced.items():
+            self._mark_dirty(abs_dir, rel_paths)
+            info = self._linked.get(abs_dir)
+            if info:
+                self._mark_outgoing(info[2])
+        self.root.after(0, lambda: self._apply_watch_batch(log_lines, events))
+
+    def _apply_watch_batch(self, log_lines: list[str], events: list[tuple[str, dict]]) -> None:
+        if log_lines:
+            self._append_log("\n".join(log_lines))
+        changed = False
+        for abs_dir, event in events:
+            changed = self._on_watch_event(abs_dir, event) or changed
+        if changed:
+            self._refresh_watch_list()
 
-        label = Path(abs_dir).name or abs_dir
-
-        def pump() -> None:
-            assert proc.stdout is not None
-            for line in proc.stdout:
-                clean = line.rstrip("\n")
-                if clean.startswith("synced "):
-                    rel = clean[len("synced ") :].strip()
-                    if rel:
-                        self._dirty_files.setdefault(abs_dir, set()).add(rel)
-                        key = self._dir_project_key.get(abs_dir)
-                        if not key:
-                            info = self._sync_info_for_dir(abs_dir)
-                            key = info[2] if info else None
-                        if key:
-                            self._last_outgoing[key] = time.time()
-                self._append_log_safe(f"[watch:{label}] {clean}")
-            rc = proc.wait()
-            self._append_log_safe(f"[watch:{label} exited] code={rc}")
-            self._watches.pop(abs_dir, None)
-            self._watch_threads.pop(abs_dir, None)
-            self.root.after(0, self._refresh_watch_list)
+    def _on_watch_exit(self, abs_dir: str, proc: subprocess.Popen[bytes], rc: int) -> None:
+        def finish() -> None:
+            self._append_log(f"[watch:{Path(abs_dir).name or abs_dir} exited] code={rc}")
+            # A restarted watch for the same folder may already own these slots.
+            if self._watches.get(abs_dir) is proc:
+                self._watches.pop(abs_dir, None)
+                self._watch_stats.pop(abs_dir, None)
+            self._refresh_watch_list()
 
-        thread = threading.Thread(target=pump, daemon=True)
-        self._watch_threads[abs_dir] = thread
-        thread.start()
-        self._append_log_safe(f"[watch started] {abs_dir}")
+        self.root.after(0, finish)
+
+    def _on_watch_event(self, abs_dir: str, event: dict) -> bool:
+        stats = self._watch_stats.setdefault(abs_dir, {})
+        kind = event.get("type")
+        if kind == "watch-queue":
+            stats["depth"] = int(event.get("depth") or 0)
+            stats["inFlight"] = int(event.get("inFlight") or 0)
+        elif kind == "watch-drain":
+            stats["lastDrain"] = event
+        elif kind == "watch-outbox":
+            # Uploads waiting for the server to come back (see `ol-sync.mjs outbox`).
+            stats["outbox"] = int(event.get("depth") or 0)
+        else:
+            return False
+        return True
 
     def stop_watch(self) -> None:
         dir_path = self.local_dir.get().strip()
@@ -890,7 +3526,6 @@ class OverleafSyncGui:
         proc = self._watches.get(abs_dir)
         if proc is None or proc.poll() is not None:
             self._watches.pop(abs_dir, None)
-            self._watch_threads.pop(abs_dir, None)
             self._refresh_watch_list()
             return
         try:
@@ -908,17 +3543,38 @@ class OverleafSyncGui:
                 pass
 
     def _refresh_watch_list(self) -> None:
+        # Queue events refresh this list often; keep the user's selection.
+        selected = set(self.watch_tree.selection())
         for child in self.watch_tree.get_children():
             self.watch_tree.delete(child)
         for abs_dir, proc in sorted(self._watches.items(), key=lambda kv: kv[0]):
             if proc.poll() is not None:
                 continue
             pending = self._remote_pending_for_dir(abs_dir)
+            stats = self._watch_stats.get(abs_dir) or {}
+            queued = int(stats.get("depth") or 0) + int(stats.get("inFlight") or 0)
+            outbox = int(stats.get("outbox") or 0)
+            drain = stats.get("lastDrain") or {}
+            drain_text = ""
+            if drain:
+                drain_text = f"{drain.get('files', 0)} in {drain.get('ms', 0)}ms"
+                if drain.get("failed"):
+                    drain_text += f" ({drain['failed']} failed)"
             self.watch_tree.insert(
                 "",
                 "end",
-                values=(abs_dir, str(proc.pid or ""), str(pending) if pending else ""),
+                iid=abs_dir,
+                values=(
+                    abs_dir,
+                    str(proc.pid or ""),
+                    str(queued) if queued else "",
+                    drain_text,
+                    str(outbox) if outbox else "",
+                    str(pending) if pending else "",
+                ),
             )
+            if abs_dir in selected:
+                self.watch_tree.selection_add(abs_dir)
 
     def fetch_remote_changes(self) -> None:
         dir_path = self.local_dir.get().strip()
@@ -926,11 +3582,24 @@ class OverleafSyncGui:
             messagebox.showwarning("No local folder", "Please choose a local folder.")
             return
 
+        try:
+            abs_dir = str(Path(dir_path).resolve())
+        except Exception:
+            abs_dir = dir_path
+        info = self._sync_info_for_dir(abs_dir)
+        if info:
+            entry = self._remote_entry(info[2])
+            prefetched = self._prefetched_manifest(entry)
+            if prefetched is not None:
+                self._append_log(f"[inbox] using prefetched batch from {(entry.get('prefetched') or {}).get('fetchedAt')}")
+                self._show_inbox_manifest(prefetched)
+                return
+
         def work() -> None:
-            env = _build_env(self.email.get(), self.password.get())
-            base = self.base_url.get().strip()
-            args = ["fetch", "--base-url", base, "--dir", dir_path, "--json"]
-            code, out, err = _run_node(args, env)
+            env = self._cli_env()
+            base = self._setting("base_url")
+            args = ["fetch", "--base-url", base, "--dir", dir_path, "--json", "--delta"]
+            code, out, err = self._run_fetch(args, env, "check")
             if code != 0:
                 self._append_log_safe(err or out)
                 self.root.after(
@@ -954,29 +3623,32 @@ class OverleafSyncGui:
                 )
                 return
 
-            def update_ui() -> None:
-                self._inbox_manifest = manifest
-                for child in self.inbox_tree.get_children():
-                    self.inbox_tree.delete(child)
-                changes = (manifest or {}).get("changes") or {}
-                for p in changes.get("added") or []:
-                    self.inbox_tree.insert("", "end", values=(p, "added"))
-                for e in changes.get("modified") or []:
-                    self.inbox_tree.insert("", "end", values=(e.get("path", ""), "modified"))
-                for p in changes.get("deleted") or []:
-                    self.inbox_tree.insert("", "end", values=(p, "deleted (remote)"))
-
-                counts = (
-                    f"added={len(changes.get('added') or [])} "
-                    f"modified={len(changes.get('modified') or [])} "
-                    f"deleted={len(changes.get('deleted') or [])}"
-                )
-                self._append_log(f"[inbox] batch={manifest.get('batchId')} {counts}")
-
-            self.root.after(0, update_ui)
+            self.root.after(0, lambda: self._show_inbox_manifest(manifest))
 
         threading.Thread(target=work, daemon=True).start()
 
+    def _show_inbox_manifest(self, manifest: dict) -> None:
+        self._inbox_manifest = manifest
+        for child in self.inbox_tree.get_children():
+            self.inbox_tree.delete(child)
+        changes = (manifest or {}).get("changes") or {}
+        for p in changes.get("added") or []:
+            self.inbox_tree.insert("", "end", values=(p, "added"))
+        for e in changes.get("modified") or []:
+            self.inbox_tree.insert("", "end", values=(e.get("path", ""), "modified"))
+        for p in changes.get("deleted") or []:
+            self.inbox_tree.insert("", "end", values=(p, "deleted (remote)"))
+        for e in changes.get("renamed") or []:
+            self.inbox_tree.insert("", "end", values=(e.get("to", ""), f"renamed from {e.get('from', '')}"))
+
+        counts = (
+            f"added={len(changes.get('added') or [])} "
+            f"modified={len(changes.get('modified') or [])} "
+            f"deleted={len(changes.get('deleted') or [])} "
+            f"renamed={len(changes.get('renamed') or [])}"
+        )
+        self._append_log(f"[inbox] batch={manifest.get('batchId')} {counts}")
+
     def apply_remote_changes(self) -> None:
         dir_path = self.local_dir.get().strip()
         if not dir_path:
@@ -986,7 +3658,7 @@ class OverleafSyncGui:
         manifest = self._inbox_manifest or {}
         batch_id = manifest.get("batchId")
         changes = manifest.get("changes") or {}
-        n_apply = len(changes.get("added") or []) + len(changes.get("modified") or [])
+        n_apply = sum(len(changes.get(k) or []) for k in ("added", "modified", "renamed"))
 
         if batch_id:
             prompt = (
@@ -1007,14 +3679,15 @@ class OverleafSyncGui:
             return
 
         def work() -> None:
-            env = _build_env(self.email.get(), self.password.get())
-            base = self.base_url.get().strip()
+            env = self._cli_env()
+            base = self._setting("base_url")
             nonlocal manifest, batch_id, n_apply
 
             if not batch_id:
-                fetch_code, fetch_out, fetch_err = _run_node(
-                    ["fetch", "--base-url", base, "--dir", dir_path, "--json"],
+                fetch_code, fetch_out, fetch_err = self._run_fetch(
+                    ["fetch", "--base-url", base, "--dir", dir_path, "--json", "--delta"],
                     env,
+                    "apply",
                 )
                 self._append_log_safe(fetch_out or fetch_err)
                 if fetch_code != 0:
@@ -1039,7 +3712,7 @@ class OverleafSyncGui:
                     return
                 batch_id = manifest.get("batchId")
                 changes = manifest.get("changes") or {}
-                n_apply = len(changes.get("added") or []) + len(changes.get("modified") or [])
+                n_apply = sum(len(changes.get(k) or []) for k in ("added", "modified", "renamed"))
                 self._inbox_manifest = manifest
                 self.root.after(0, self._update_remote_ui)
 
@@ -1054,7 +3727,9 @@ class OverleafSyncGui:
                 return
 
             args = ["apply", "--base-url", base, "--dir", dir_path, "--batch", str(batch_id)]
+            task_id = self._begin_task("apply", dir=dir_path, batch=str(batch_id), baseUrl=base)
             code, out, err = _run_node(args, env)
+            self._end_task(task_id)
             self._append_log_safe(out or err)
             if code != 0:
                 self.root.after(
@@ -1069,17 +3744,264 @@ class OverleafSyncGui:
             project_id = str(manifest.get("projectId") or "").strip()
             if base_url and project_id:
                 key = _project_key(base_url, project_id)
-                remote_projects = self._state.setdefault("remote_projects", {})
-                entry = remote_projects.setdefault(key, {})
-                entry["pending"] = 0
-                entry["dirty"] = False
-                entry["lastAppliedAt"] = datetime.now(timezone.utc).isoformat()
-                remote_projects[key] = entry
-                _save_gui_state(self._state)
+                self._update_remote_entry(
+                    key,
+                    pending=0,
+                    dirty=False,
+                    prefetched=None,
+                    lastAppliedAt=datetime.now(timezone.utc).isoformat(),
+                )
                 self.root.after(0, self._update_remote_ui)
 
         threading.Thread(target=work, daemon=True).start()
 
+    def _toggle_trace(self) -> None:
+        _TRACE.enabled = bool(self.record_trace.get())
+        if _TRACE.enabled:
+            self._append_log("[trace] recording; watches started from now on are traced too")
+        else:
+            self._append_log(f"[trace] stopped ({len(_TRACE)} span(s) kept for export)")
+
+    def export_trace(self) -> None:
+        if not len(_TRACE):
+            messagebox.showinfo("No trace", "Nothing recorded yet. Tick 'Record trace' and run a command first.")
+            return
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = filedialog.asksaveasfilename(
+            title="Export Chrome trace",
+            defaultextension=".json",
+            initialfile=f"ol-sync-trace-{stamp}.json",
+            filetypes=[("Trace JSON", "*.json")],
+        )
+        if not path:
+            return
+        try:
+            count = _TRACE.export(Path(path))
+        except Exception as exc:  # noqa: BLE001 - UI surface
+            messagebox.showerror("Export failed", str(exc))
+            return
+        self._append_log(f"[trace] wrote {count} span(s) to {path} (open in chrome://tracing or Perfetto)")
+
+    def show_diagnostics(self) -> None:
+        if self._diagnostics_window is not None and self._diagnostics_window.winfo_exists():
+            self._diagnostics_window.lift()
+            return
+        win = tk.Toplevel(self.root)
+        win.title("Diagnostics")
+        win.geometry("900x520")
+        self._diagnostics_window = win
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+        frame.rowconfigure(0, weight=1)
+        frame.columnconfigure(0, weight=1)
+
+        text = tk.Text(frame, wrap="none", font="TkFixedFont")
+        text.grid(row=0, column=0, sticky="nsew")
+        scroll = ttk.Scrollbar(frame, orient="vertical", command=text.yview)
+        scroll.grid(row=0, column=1, sticky="ns")
+        text.configure(yscrollcommand=scroll.set)
+
+        sampling = tk.BooleanVar(value=self._loop.sampling)
+        row = ttk.Frame(frame)
+        row.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+        ttk.Checkbutton(
+            row,
+            text="Sample stacks during stalls",
+            variable=sampling,
+            command=lambda: self._loop.set_sampling(bool(sampling.get())),
+        ).pack(side="left")
+        ttk.Button(row, text="Export…", command=self.export_diagnostics).pack(side="right")
+        ttk.Button(row, text="Reset", command=lambda: (self._loop.reset(), _HTTP_STATS.clear())).pack(
+            side="right", padx=(0, 8)
+        )
+
+        def refresh() -> None:
+            if not win.winfo_exists():
+                return
+            top = text.yview()[0]
+            text.configure(state="normal")
+            text.delete("1.0", "end")
+            text.insert("end", self._loop.format_report())
+            text.insert("end", "\n\n" + _HTTP_STATS.format_report())
+            text.configure(state="disabled")
+            text.yview_moveto(top)
+            self.root.after(LOOP_DIAGNOSTICS_REFRESH_MS, refresh)
+
+        refresh()
+
+    def export_diagnostics(self) -> None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = filedialog.asksaveasfilename(
+            title="Export diagnostics",
+            defaultextension=".json",
+            initialfile=f"ol-sync-diagnostics-{stamp}.json",
+            filetypes=[("JSON", "*.json")],
+        )
+        if not path:
+            return
+        try:
+            self._loop.export(Path(path))
+        except Exception as exc:  # noqa: BLE001 - UI surface
+            messagebox.showerror("Export failed", str(exc))
+            return
+        self._append_log(f"[diagnostics] wrote main-loop report to {path}")
+
+    def show_file_history(self) -> None:
+        dir_path = self.local_dir.get().strip()
+        if not dir_path:
+            messagebox.showwarning("No local folder", "Please choose a local folder.")
+            return
+        abs_dir = Path(dir_path).resolve()
+        info = self._sync_info_for_dir(str(abs_dir))
+        if not info:
+            messagebox.showwarning("Not linked", "This folder has no .ol-sync.json yet.")
+            return
+        _base_url, project_id, _key, host = info
+        chosen = filedialog.askopenfilename(title="Show history of file", initialdir=str(abs_dir))
+        if not chosen:
+            return
+        try:
+            rel_posix = Path(chosen).resolve().relative_to(abs_dir).as_posix()
+        except ValueError:
+            messagebox.showerror("Outside project", f"Pick a file inside:\n{abs_dir}")
+            return
+
+        project = f"{host}/{project_id}"
+
+        # Scanning new backups and hashing the current file can take a while: keep them off the Tk thread.
+        def work() -> None:
+            started = time.perf_counter()
+            try:
+                self._versions.scan(project)
+                versions = self._versions.history(project, rel_posix)
+            except (sqlite3.Error, OSError) as exc:
+                message = str(exc)
+                self.root.after(0, lambda: messagebox.showerror("Version index", message))
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            local_path = abs_dir / Path(*rel_posix.split("/"))
+            try:
+                current_hash = _sha256_file(local_path) if local_path.is_file() else ""
+            except OSError:
+                current_hash = ""
+            self.root.after(
+                0, lambda: self._show_history_window(abs_dir, rel_posix, versions, current_hash, elapsed_ms, info)
+            )
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _show_history_window(
+        self,
+        abs_dir: Path,
+        rel_posix: str,
+        versions: list[dict],
+        current_hash: str,
+        elapsed_ms: float,
+        info: tuple[str, str, str, str],
+    ) -> None:
+        win = tk.Toplevel(self.root)
+        win.title(f"History: {rel_posix}")
+        win.geometry("760x360")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+        frame.rowconfigure(1, weight=1)
+        frame.columnconfigure(0, weight=1)
+        ttk.Label(
+            frame, text=f"{len(versions)} version(s) of {rel_posix} — looked up in {elapsed_ms:.1f} ms"
+        ).grid(row=0, column=0, columnspan=2, sticky="w")
+
+        cols = ("when", "source", "size", "hash")
+        tree = ttk.Treeview(frame, columns=cols, show="headings", selectmode="browse")
+        tree.heading("when", text="When")
+        tree.heading("source", text="Source")
+        tree.heading("size", text="Size")
+        tree.heading("hash", text="Content")
+        tree.column("when", width=180)
+        tree.column("source", width=80, anchor="center")
+        tree.column("size", width=90, anchor="e")
+        tree.column("hash", width=320)
+        tree.grid(row=1, column=0, sticky="nsew", pady=(8, 0))
+        scroll = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        scroll.grid(row=1, column=1, sticky="ns", pady=(8, 0))
+        tree.configure(yscrollcommand=scroll.set)
+        for i, version in enumerate(versions):
+            when = datetime.fromtimestamp(version["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+            label = version["hash"][:12] + ("  (current)" if version["hash"] == current_hash else "")
+            tree.insert("", "end", iid=str(i), values=(when, version["source"], _format_bytes(version["size"]), label))
+
+        def restore(_event: object = None) -> None:
+            sel = tree.selection()
+            if not sel:
+                return
+            self._restore_version(abs_dir, rel_posix, versions[int(sel[0])], info)
+            win.destroy()
+
+        tree.bind("<Double-1>", restore)
+        row = ttk.Frame(frame)
+        row.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+        ttk.Button(row, text="Restore selected", command=restore).pack(side="right")
+        ttk.Label(row, text="The file being replaced is backed up first.").pack(side="left")
+
+    def _restore_version(
+        self, abs_dir: Path, rel_posix: str, version: dict, info: tuple[str, str, str, str]
+    ) -> None:
+        _base_url, project_id, _key, host = info
+        rel_path = Path(*rel_posix.split("/"))
+        dst = abs_dir / rel_path
+
+        # Hashing, the backup copy and unpacking an LZMA member can all take a while: keep them off the Tk thread.
+        def work() -> None:
+            try:
+                src = self._versions.open_version(version["snapshot"], rel_posix)
+            except (OSError, zipfile.BadZipFile) as exc:
+                message = f"This version is no longer readable:\n{exc}"
+                self.root.after(0, lambda: messagebox.showerror("Restore failed", message))
+                return
+            tmp = dst.with_name(f"{dst.name}.tmp-{os.getpid()}")
+            try:
+                if dst.is_file():
+                    digest = _sha256_file(dst)
+                    if digest == version["hash"]:
+                        self.root.after(
+                            0, lambda: messagebox.showinfo("Restore", "The file already has this content.")
+                        )
+                        return
+                    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M-%SZ")
+                    dest_root = BACKUP_ROOT / host / project_id / "local" / timestamp
+                    kept = dest_root / rel_path
+                    kept.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(dst, kept)
+                    st = kept.stat()
+                    self._index_backup(dest_root, "local", [(rel_posix, digest, st.st_size, st.st_mtime)])
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                # Written next to dst and checked before it replaces anything, so a failed restore
+                # never leaves a truncated file. No metadata is copied: the fresh mtime lets watch and
+                # the change monitor see the edit.
+                restored = hashlib.sha256()
+                with open(tmp, "wb") as out:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                        restored.update(chunk)
+                        out.write(chunk)
+                    out.flush()
+                    os.fsync(out.fileno())
+                if restored.hexdigest() != version["hash"]:
+                    raise OSError(f"restored content does not match version {version['hash'][:12]}")
+                os.replace(tmp, dst)
+            except (OSError, zipfile.BadZipFile) as exc:
+                try:
+                    tmp.unlink()
+                except OSError:
+                    pass
+                message = str(exc)
+                self.root.after(0, lambda: messagebox.showerror("Restore failed", message))
+                return
+            finally:
+                src.close()
+            when = datetime.fromtimestamp(version["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+            self._append_log_safe(f"[restore] {rel_posix} <- {version['source']} version from {when}")
+
+        threading.Thread(target=work, daemon=True).start()
+
     def open_inbox_folder(self) -> None:
         manifest = self._inbox_manifest or {}
         inbox_dir = manifest.get("inboxDir")
@@ -1118,8 +4040,8 @@ class OverleafSyncGui:
         name = self.new_project_name.get().strip() or Path(dir_path).name
 
         def work() -> None:
-            env = _build_env(self.email.get(), self.password.get())
-            base = self.base_url.get().strip()
+            env = self._cli_env()
+            base = self._setting("base_url")
             args = ["create", "--base-url", base, "--dir", dir_path, "--name", name]
             if self.force.get():
                 args.append("--force")
@@ -1171,8 +4093,7 @@ class OverleafSyncGui:
         if not parent:
             return
         self.create_parent_dir.set(parent)
-        self._state["create_parent_dir"] = parent
-        _save_gui_state(self._state)
+        self._save_state(create_parent_dir=parent)
 
         raw_name = self.new_project_name.get().strip()
         if not raw_name:
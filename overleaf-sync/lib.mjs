@@ -1,9 +1,25 @@
 import path from 'node:path'
+import { createReadStream } from 'node:fs'
+import { copyFile, link, mkdir, open, readFile, readdir, rename, stat, unlink, utimes, writeFile } from 'node:fs/promises'
+import { createHash, randomBytes } from 'node:crypto'
+import http from 'node:http'
+import https from 'node:https'
+import os from 'node:os'
+import { Worker, isMainThread, parentPort, workerData } from 'node:worker_threads'
+import { crc32 } from 'node:zlib'
+import { Readable } from 'node:stream'
+import { pipeline } from 'node:stream/promises'
+import { setTimeout as sleep } from 'node:timers/promises'
 
 export const DEFAULT_BASE_URL = 'http://localhost'
 export const DEFAULT_CONTAINER = 'sharelatex'
 export const CONFIG_FILENAME = '.ol-sync.json'
 
+// Files are read in fixed-size chunks so memory stays flat regardless of size.
+export const DEFAULT_IO_CHUNK_SIZE = 1024 * 1024
+// Uploads above this size are streamed from disk instead of buffered in a Blob.
+export const DEFAULT_LARGE_FILE_THRESHOLD = 8 * 1024 * 1024
+
 export const DEFAULT_IGNORE_DIRS = new Set([
   '.git',
   '.vscode',
@@ -13,7 +29,9 @@ export const DEFAULT_IGNORE_DIRS = new Set([
   '__MACOSX',
 ])
 
-export const DEFAULT_IGNORE_FILES = new Set(['.DS_Store', CONFIG_FILENAME])
+export const IGNORE_FILENAME = '.olsyncignore'
+
+export const DEFAULT_IGNORE_FILES = new Set(['.DS_Store', CONFIG_FILENAME, IGNORE_FILENAME])
 
 export class CookieJar {
   /** @type {Map<string, string>} */
@@ -59,7 +77,7 @@ export function toPosix(relPath) {
   return relPath.split(path.sep).join('/')
 }
 
-export function shouldIgnore(relPath, isDir) {
+export function shouldIgnore(relPath, isDir, matcher) {
   const parts = toPosix(relPath).split('/').filter(Boolean)
   if (parts.length === 0) return true
   const last = parts[parts.length - 1]
@@ -68,7 +86,1848 @@ export function shouldIgnore(relPath, isDir) {
   for (const part of parts) {
     if (DEFAULT_IGNORE_DIRS.has(part)) return true
   }
-  return false
+  return matcher ? matcher.ignores(parts.join('/'), isDir) : false
+}
+
+function escapeRegExp(value) {
+  return value.replace(/[.*+?^${}()|[\]\\/]/g, '\\$&')
+}
+
+function globToRegExpSource(glob) {
+  let out = ''
+  for (let i = 0; i < glob.length; i++) {
+    const c = glob[i]
+    if (c === '*') {
+      if (glob[i + 1] === '*') {
+        const atStart = i === 0 || glob[i - 1] === '/'
+        const atEnd = i + 2 === glob.length || glob[i + 2] === '/'
+        if (atStart && atEnd) {
+          if (i + 2 === glob.length) {
+            out += '.*'
+            i += 1
+          } else {
+            out += '(?:.*/)?'
+            i += 2
+          }
+          continue
+        }
+        i += 1
+      }
+      out += '[^/]*'
+    } else if (c === '?') {
+      out += '[^/]'
+    } else if (c === '[') {
+      const close = glob.indexOf(']', i + 2)
+      if (close === -1) {
+        out += '\\['
+        continue
+      }
+      let body = glob.slice(i + 1, close).replace(/\\/g, '\\\\')
+      if (body.startsWith('!')) body = `^${body.slice(1)}`
+      out += `[${body}]`
+      i = close
+    } else if (c === '\\' && i + 1 < glob.length) {
+      i += 1
+      out += escapeRegExp(glob[i])
+    } else {
+      out += escapeRegExp(c)
+    }
+  }
+  return out
+}
+
+function compileIgnoreRule(rawLine) {
+  let line = rawLine.replace(/\r$/, '')
+  if (!line.trim() || line.startsWith('#')) return null
+  let negate = false
+  if (line.startsWith('!')) {
+    negate = true
+    line = line.slice(1)
+  } else if (line.startsWith('\\!') || line.startsWith('\\#')) {
+    line = line.slice(1)
+  }
+  line = line.replace(/(?<!\\)\s+$/, '')
+  const dirOnly = line.endsWith('/')
+  if (dirOnly) line = line.replace(/\/+$/, '')
+  if (!line) return null
+  const anchored = line.includes('/')
+  if (anchored) line = line.replace(/^\/+/, '')
+
+  const rule = { negate, dirOnly, anchored, literal: null, suffix: null, regex: null }
+  if (!anchored && !/[*?[\\]/.test(line)) {
+    rule.literal = line
+  } else if (!anchored && /^\*\.[^*?[\\/]+$/.test(line)) {
+    rule.suffix = line.slice(1)
+  } else {
+    rule.regex = new RegExp(`^${globToRegExpSource(line)}$`)
+  }
+  return rule
+}
+
+/**
+ * gitignore-style rules from a project's .olsyncignore, compiled once.
+ * Later rules win, `!` re-includes, a trailing `/` matches directories only and
+ * a `/` anywhere else anchors the pattern to the project root. As in git, a
+ * path inside an ignored directory cannot be re-included.
+ */
+export class IgnoreMatcher {
+  #rules
+  /** @type {Map<string, boolean>} */
+  #dirCache = new Map()
+
+  constructor(rules = []) {
+    this.#rules = rules
+  }
+
+  get size() {
+    return this.#rules.length
+  }
+
+  static compile(text) {
+    const rules = []
+    for (const line of String(text || '').split('\n')) {
+      const rule = compileIgnoreRule(line)
+      if (rule) rules.push(rule)
+    }
+    return new IgnoreMatcher(rules)
+  }
+
+  /** Decide a single path without looking at its ancestors. */
+  matches(relPosix, isDir) {
+    if (this.#rules.length === 0) return false
+    const slash = relPosix.lastIndexOf('/')
+    const base = slash === -1 ? relPosix : relPosix.slice(slash + 1)
+    for (let i = this.#rules.length - 1; i >= 0; i--) {
+      const rule = this.#rules[i]
+      if (rule.dirOnly && !isDir) continue
+      let hit
+      if (rule.literal !== null) hit = base === rule.literal
+      else if (rule.suffix !== null) hit = base.endsWith(rule.suffix)
+      else hit = rule.regex.test(rule.anchored ? relPosix : base)
+      if (hit) return !rule.negate
+    }
+    return false
+  }
+
+  ignores(relPosix, isDir) {
+    if (this.#rules.length === 0) return false
+    const parts = relPosix.split('/')
+    let prefix = ''
+    for (let i = 0; i < parts.length - 1; i++) {
+      prefix = prefix ? `${prefix}/${parts[i]}` : parts[i]
+      let ignored = this.#dirCache.get(prefix)
+      if (ignored === undefined) {
+        ignored = this.matches(prefix, true)
+        this.#dirCache.set(prefix, ignored)
+      }
+      if (ignored) return true
+    }
+    return this.matches(relPosix, isDir)
+  }
+}
+
+export async function loadIgnoreMatcher(rootDir) {
+  try {
+    return IgnoreMatcher.compile(await readFile(path.join(rootDir, IGNORE_FILENAME), 'utf8'))
+  } catch {
+    return new IgnoreMatcher()
+  }
+}
+
+export async function sha256File(absPath, { chunkSize = DEFAULT_IO_CHUNK_SIZE } = {}) {
+  const hash = createHash('sha256')
+  for await (const chunk of createReadStream(absPath, { highWaterMark: chunkSize })) {
+    hash.update(chunk)
+  }
+  return hash.digest('hex')
+}
+
+/**
+ * Digests an index can be built with. SHA-256 is what remote indexes, backup
+ * manifests and the mirror store record; crc32 (plus the size) is several
+ * times cheaper and good enough to tell whether two freshly read copies of a
+ * file differ, so it is only used when both sides of a diff are hashed in the
+ * same run.
+ */
+export const INDEX_DIGESTS = ['sha256', 'crc32']
+
+export async function fileDigest(absPath, digest = 'sha256', { chunkSize = DEFAULT_IO_CHUNK_SIZE } = {}) {
+  let size = 0
+  if (digest === 'crc32') {
+    let value = 0
+    for await (const chunk of createReadStream(absPath, { highWaterMark: chunkSize })) {
+      value = crc32(chunk, value)
+      size += chunk.length
+    }
+    return { hash: `crc32-${size}-${value.toString(16).padStart(8, '0')}`, size }
+  }
+  if (digest !== 'sha256') throw new Error(`Unknown digest: ${digest} (expected ${INDEX_DIGESTS.join(' or ')})`)
+  const hash = createHash('sha256')
+  for await (const chunk of createReadStream(absPath, { highWaterMark: chunkSize })) {
+    hash.update(chunk)
+    size += chunk.length
+  }
+  return { hash: hash.digest('hex'), size }
+}
+
+export function defaultHashThreads(env = process.env) {
+  const fromEnv = Number.parseInt(String(env.OL_SYNC_HASH_THREADS || ''), 10)
+  if (fromEnv > 0) return fromEnv
+  return os.availableParallelism?.() ?? os.cpus().length
+}
+
+const HASH_WORKER_ROLE = 'ol-sync-hash'
+
+/**
+ * Hashes files on worker threads, one file per worker at a time. Workers are
+ * started lazily as work arrives, so a pool sized to the CPU count costs
+ * nothing on a tree of three files. With size 1 files are hashed on the
+ * calling thread and no worker is started.
+ */
+export class HashPool {
+  #workers = []
+  #idle = []
+  #waiting = []
+  #jobs = new Map()
+  #nextId = 0
+
+  constructor({ size = defaultHashThreads() } = {}) {
+    this.size = Math.max(1, Number(size) || 1)
+  }
+
+  hash(absPath, digest = 'sha256') {
+    if (this.size === 1) return fileDigest(absPath, digest)
+    return new Promise((resolve, reject) => {
+      this.#waiting.push({ absPath, digest, resolve, reject })
+      this.#dispatch()
+    })
+  }
+
+  #dispatch() {
+    while (this.#waiting.length > 0) {
+      let worker = this.#idle.pop()
+      if (!worker && this.#workers.length < this.size) worker = this.#spawn()
+      if (!worker) return
+      const job = this.#waiting.shift()
+      const id = this.#nextId++
+      this.#jobs.set(id, { ...job, worker })
+      worker.ref()
+      worker.postMessage({ id, absPath: job.absPath, digest: job.digest })
+    }
+  }
+
+  #spawn() {
+    const worker = new Worker(new URL(import.meta.url), { workerData: { role: HASH_WORKER_ROLE } })
+    worker.on('message', ({ id, hash, size, error }) => {
+      const job = this.#jobs.get(id)
+      this.#jobs.delete(id)
+      // An idle worker must not keep the process alive if close() is never reached.
+      worker.unref()
+      this.#idle.push(worker)
+      if (error) job.reject(new Error(error))
+      else job.resolve({ hash, size })
+      this.#dispatch()
+    })
+    worker.on('error', err => {
+      this.#workers = this.#workers.filter(w => w !== worker)
+      this.#idle = this.#idle.filter(w => w !== worker)
+      for (const [id, job] of this.#jobs) {
+        if (job.worker !== worker) continue
+        this.#jobs.delete(id)
+        job.reject(err)
+      }
+      this.#dispatch()
+    })
+    this.#workers.push(worker)
+    return worker
+  }
+
+  async close() {
+    const workers = this.#workers
+    this.#workers = []
+    this.#idle = []
+    await Promise.all(workers.map(w => w.terminate()))
+  }
+}
+
+if (!isMainThread && workerData?.role === HASH_WORKER_ROLE) {
+  parentPort.on('message', async ({ id, absPath, digest }) => {
+    try {
+      parentPort.postMessage({ id, ...(await fileDigest(absPath, digest)) })
+    } catch (err) {
+      parentPort.postMessage({ id, error: String(err?.message || err) })
+    }
+  })
+}
+
+export async function* walkFiles(rootDir, { matcher, relDir = '' } = {}) {
+  const entries = await readdir(path.join(rootDir, relDir), { withFileTypes: true })
+  for (const entry of entries) {
+    const rel = relDir ? `${relDir}/${entry.name}` : entry.name
+    // Ignored directories are pruned here, so their subtrees are never read.
+    if (shouldIgnore(rel, entry.isDirectory(), matcher)) continue
+    if (entry.isDirectory()) {
+      yield* walkFiles(rootDir, { matcher, relDir: rel })
+    } else if (entry.isFile()) {
+      yield path.join(rootDir, ...rel.split('/'))
+    }
+  }
+}
+
+/**
+ * Map of relative posix path -> { hash } for every file under absDir. The
+ * walk keeps going while earlier files are hashed on the pool; at most twice
+ * the pool size are in flight so a huge tree does not queue every path.
+ */
+export async function buildFileIndex(absDir, { matcher, digest = 'sha256', pool } = {}) {
+  const ownPool = pool ? null : new HashPool({ size: 1 })
+  const hasher = pool || ownPool
+  const hashes = new Map()
+  const inFlight = new Set()
+  const limit = hasher.size * 2
+  let bytes = 0
+  let failure = null
+  try {
+    for await (const absPath of walkFiles(absDir, { matcher })) {
+      if (failure) break
+      const rel = toPosix(path.relative(absDir, absPath))
+      const job = hasher
+        .hash(absPath, digest)
+        .then(
+          result => {
+            hashes.set(rel, { hash: result.hash })
+            bytes += result.size
+          },
+          err => {
+            failure ??= err
+          }
+        )
+        .finally(() => inFlight.delete(job))
+      inFlight.add(job)
+      if (inFlight.size >= limit) await Promise.race(inFlight)
+    }
+    await Promise.all(inFlight)
+  } finally {
+    await ownPool?.close()
+  }
+  if (failure) throw failure
+  const index = new Map(Array.from(hashes).sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0)))
+  return { index, bytes }
+}
+
+export function parseByteSize(value, fallback) {
+  if (value == null || value === '' || value === true) return fallback
+  const match = String(value).trim().match(/^(\d+(?:\.\d+)?)\s*([kmg]i?b?|b)?$/i)
+  if (!match) return fallback
+  const units = { k: 1024, m: 1024 ** 2, g: 1024 ** 3 }
+  const unit = (match[2] || '').charAt(0).toLowerCase()
+  return Math.floor(Number(match[1]) * (units[unit] || 1))
+}
+
+// Same escaping undici's FormData applies to multipart names and filenames.
+function escapeMultipartName(value) {
+  return String(value)
+    .replace(/\n/g, '%0A')
+    .replace(/\r/g, '%0D')
+    .replace(/"/g, '%22')
+}
+
+/**
+ * Build a multipart/form-data body whose file part is streamed from disk.
+ * The returned `body()` yields the preamble, the file in `chunkSize` pieces
+ * and the closing boundary, so at most one chunk per upload is in memory.
+ */
+export function multipartFileBody({
+  fields = {},
+  fileField,
+  fileName,
+  filePath,
+  fileSize,
+  chunkSize = DEFAULT_IO_CHUNK_SIZE,
+}) {
+  const boundary = `----ol-sync-${randomBytes(12).toString('hex')}`
+  let preamble = ''
+  for (const [name, value] of Object.entries(fields)) {
+    preamble +=
+      `--${boundary}\r\n` +
+      `Content-Disposition: form-data; name="${escapeMultipartName(name)}"\r\n\r\n` +
+      `${String(value)}\r\n`
+  }
+  preamble +=
+    `--${boundary}\r\n` +
+    `Content-Disposition: form-data; name="${escapeMultipartName(fileField)}"; filename="${escapeMultipartName(fileName)}"\r\n` +
+    'Content-Type: application/octet-stream\r\n\r\n'
+  const head = Buffer.from(preamble, 'utf8')
+  const tail = Buffer.from(`\r\n--${boundary}--\r\n`, 'utf8')
+  return {
+    contentType: `multipart/form-data; boundary=${boundary}`,
+    contentLength: head.length + fileSize + tail.length,
+    async *body() {
+      yield head
+      yield* createReadStream(filePath, { highWaterMark: chunkSize })
+      yield tail
+    },
+  }
+}
+
+/**
+ * Send a request whose body is an async iterable, honouring socket backpressure.
+ * (Global fetch drains async-iterable bodies eagerly, which buffers large uploads.)
+ */
+export function streamRequest(url, { method = 'POST', headers = {}, body, agent }) {
+  const target = new URL(url)
+  const transport = target.protocol === 'https:' ? https : http
+  return new Promise((resolve, reject) => {
+    const req = transport.request(target, { method, headers, agent }, res => {
+      const chunks = []
+      res.on('data', chunk => chunks.push(chunk))
+      res.on('error', reject)
+      res.on('end', () => {
+        const status = res.statusCode || 0
+        const setCookie = res.headers['set-cookie']
+        resolve({
+          status,
+          ok: status >= 200 && status < 300,
+          setCookie: Array.isArray(setCookie) ? setCookie : setCookie ? [setCookie] : [],
+          headers: res.headers,
+          bodyText: Buffer.concat(chunks).toString('utf8'),
+        })
+      })
+    })
+    req.on('error', reject)
+    pipeline(Readable.from(body), req).catch(err => {
+      req.destroy(err)
+      reject(err)
+    })
+  })
+}
+
+// Statuses a request is retried on; a non-idempotent one only on the
+// statuses that say the server did not act on it.
+const RETRY_STATUSES = new Set([408, 429, 502, 503, 504])
+const RETRY_STATUSES_UNSAFE = new Set([429, 503])
+const IDEMPOTENT_METHODS = new Set(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+const LATENCY_SAMPLES = 256
+
+/**
+ * Milliseconds a Retry-After header asks to wait, given as seconds or as an
+ * HTTP date; null when absent or unparsable.
+ */
+export function parseRetryAfter(value, now = Date.now()) {
+  const text = String(value ?? '').trim()
+  if (!text) return null
+  if (/^\d+$/.test(text)) return Number(text) * 1000
+  const at = Date.parse(text)
+  return Number.isNaN(at) ? null : Math.max(0, at - now)
+}
+
+// Method plus path with object ids folded, so per-project routes share stats.
+export function httpRoute(method, url) {
+  const { pathname } = new URL(url)
+  return `${method} ${pathname.replace(/\/[0-9a-f]{24}(?=\/|$)/gi, '/:id')}`
+}
+
+function percentile(sorted, p) {
+  if (!sorted.length) return 0
+  return sorted[Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1)]
+}
+
+function headerValue(res, name) {
+  return typeof res.headers?.get === 'function' ? res.headers.get(name) : res.headers?.[name]
+}
+
+/**
+ * The HTTP layer for one server. At most maxConnections requests are in
+ * flight at once: built-in fetch already keeps connections alive per origin,
+ * so capping what is in flight is what bounds its pool, and streamed uploads
+ * go through a keep-alive agent with the same socket limit. A request counts
+ * as in flight until its response body is read to the end, fails or is
+ * cancelled, so callers must always do one of those.
+ *
+ * Requests are retried with jittered exponential backoff, or after the
+ * server's Retry-After: idempotent ones on network errors and 408/429/502-504,
+ * others only on 429/503 or a refused connection, where the server cannot
+ * have acted on them. A body given as a function is rebuilt per attempt.
+ * Latency per route (see httpRoute) is kept for stats().
+ */
+export class HttpClient {
+  #active = 0
+  #peak = 0
+  #waiting = []
+  /** @type {Map<string, {count:number, errors:number, retries:number, samples:number[], totalMs:number, maxMs:number}>} */
+  #routes = new Map()
+
+  constructor(
+    baseUrl,
+    {
+      maxConnections = 6,
+      retries = 3,
+      retryMinMs = 250,
+      retryMaxMs = 10 * 1000,
+      fetch: fetchImpl = (...args) => globalThis.fetch(...args),
+      sleep: sleepImpl = sleep,
+      random = Math.random,
+    } = {}
+  ) {
+    const target = new URL(baseUrl)
+    this.origin = target.origin
+    this.maxConnections = Math.max(1, maxConnections)
+    this.retries = Math.max(0, retries)
+    this.retryMinMs = retryMinMs
+    this.retryMaxMs = retryMaxMs
+    this.fetchImpl = fetchImpl
+    this.sleep = sleepImpl
+    this.random = random
+    const Agent = target.protocol === 'https:' ? https.Agent : http.Agent
+    this.agent = new Agent({ keepAlive: true, maxSockets: this.maxConnections })
+  }
+
+  /** fetch() with the connection cap and retries; the slot is held until the body is consumed. */
+  fetch(url, init = {}, options = {}) {
+    return this.#send(url, init, options, body => this.fetchImpl(url, { ...init, body }))
+  }
+
+  /** streamRequest() through the keep-alive agent; resolves once the reply is read. */
+  stream(url, init = {}, options = {}) {
+    return this.#send(url, { method: 'POST', ...init }, options, body =>
+      streamRequest(url, { ...init, body, agent: this.agent })
+    )
+  }
+
+  async #send(url, init, { idempotent, retries = this.retries } = {}, send) {
+    const method = String(init.method || 'GET').toUpperCase()
+    const safe = idempotent ?? IDEMPOTENT_METHODS.has(method)
+    const route = httpRoute(method, url)
+    for (let attempt = 1; ; attempt++) {
+      const body = typeof init.body === 'function' ? init.body() : init.body
+      await this.#acquire()
+      const started = performance.now()
+      let res
+      let error
+      let handedOver = false
+      let delay
+      try {
+        try {
+          res = await send(body)
+        } catch (err) {
+          error = err
+        }
+        const retry =
+          attempt <= retries &&
+          !init.signal?.aborted &&
+          (error
+            ? safe || (error.cause?.code ?? error.code) === 'ECONNREFUSED'
+            : (safe ? RETRY_STATUSES : RETRY_STATUSES_UNSAFE).has(res.status))
+        this.#record(route, performance.now() - started, Boolean(error) || res.status >= 500, retry)
+        if (!retry) {
+          if (error) throw error
+          handedOver = true
+          return this.#releaseWhenRead(res)
+        }
+        const asked = res ? parseRetryAfter(headerValue(res, 'retry-after')) : null
+        await res?.body?.cancel?.().catch(() => {})
+        delay = asked ?? backoffDelay(attempt, { minMs: this.retryMinMs, maxMs: this.retryMaxMs, random: this.random })
+      } finally {
+        if (!handedOver) this.#release()
+      }
+      await this.sleep(Math.min(delay, this.retryMaxMs))
+    }
+  }
+
+  async #acquire() {
+    while (this.#active >= this.maxConnections) {
+      await new Promise(resolve => this.#waiting.push(resolve))
+    }
+    this.#active++
+    this.#peak = Math.max(this.#peak, this.#active)
+  }
+
+  #release() {
+    this.#active--
+    this.#waiting.shift()?.()
+  }
+
+  // The same response with a body that gives the slot back once it ends, fails or is cancelled.
+  #releaseWhenRead(res) {
+    const source = res.body
+    if (!(source instanceof ReadableStream)) {
+      this.#release()
+      return res
+    }
+    let held = true
+    const release = () => {
+      if (!held) return
+      held = false
+      this.#release()
+    }
+    const reader = source.getReader()
+    const body = new ReadableStream({
+      async pull(controller) {
+        let chunk
+        try {
+          chunk = await reader.read()
+        } catch (err) {
+          release()
+          controller.error(err)
+          return
+        }
+        if (chunk.done) {
+          release()
+          controller.close()
+        } else {
+          controller.enqueue(chunk.value)
+        }
+      },
+      cancel(reason) {
+        release()
+        return reader.cancel(reason)
+      },
+    })
+    const wrapped = new Response(body, { status: res.status, statusText: res.statusText, headers: res.headers })
+    Object.defineProperty(wrapped, 'url', { value: res.url })
+    return wrapped
+  }
+
+  #record(route, ms, failed, retried) {
+    let entry = this.#routes.get(route)
+    if (!entry) {
+      entry = { count: 0, errors: 0, retries: 0, samples: [], totalMs: 0, maxMs: 0 }
+      this.#routes.set(route, entry)
+    }
+    entry.count++
+    if (failed) entry.errors++
+    if (retried) entry.retries++
+    entry.totalMs += ms
+    entry.maxMs = Math.max(entry.maxMs, ms)
+    entry.samples.push(ms)
+    if (entry.samples.length > LATENCY_SAMPLES) entry.samples.shift()
+  }
+
+  /**
+   * { origin, inFlight, peakInFlight, requests, routes: [{ route, count,
+   * errors, retries, meanMs, p50Ms, p95Ms, maxMs }] }, busiest route first.
+   * Percentiles cover the last LATENCY_SAMPLES requests of a route.
+   */
+  stats() {
+    const routes = [...this.#routes].map(([route, entry]) => {
+      const sorted = [...entry.samples].sort((a, b) => a - b)
+      return {
+        route,
+        count: entry.count,
+        errors: entry.errors,
+        retries: entry.retries,
+        meanMs: Math.round(entry.totalMs / entry.count),
+        p50Ms: Math.round(percentile(sorted, 50)),
+        p95Ms: Math.round(percentile(sorted, 95)),
+        maxMs: Math.round(entry.maxMs),
+      }
+    })
+    routes.sort((a, b) => b.count - a.count || a.route.localeCompare(b.route))
+    return {
+      origin: this.origin,
+      inFlight: this.#active,
+      peakInFlight: this.#peak,
+      requests: routes.reduce((sum, r) => sum + r.count, 0),
+      routes,
+    }
+  }
+
+  close() {
+    this.agent.destroy()
+  }
+}
+
+// Last remote state seen by a delta fetch, kept in the project's inbox directory.
+export const REMOTE_INDEX_FILENAME = '.ol-sync.remote-index.json'
+
+function isSafeEntityName(name) {
+  return Boolean(name) && name !== '.' && name !== '..' && !/[\\/]/.test(name)
+}
+
+/**
+ * Flatten an Overleaf rootFolder tree (from Mongo or the private join API)
+ * into a Map of posix path -> { kind: 'doc'|'file', id, fileHash?, rev? }.
+ * The root folder's own name is not part of the path.
+ */
+export function flattenProjectTree(rootFolder) {
+  /** @type {Map<string, {kind:'doc'|'file', id:string, fileHash?:string, rev?:number}>} */
+  const out = new Map()
+  const add = (prefix, entity, kind) => {
+    const name = String(entity?.name || '')
+    const id = String(entity?._id || '')
+    if (!isSafeEntityName(name) || !id) return
+    const entry = { kind, id }
+    if (kind === 'file' && entity.hash) entry.fileHash = String(entity.hash)
+    if (kind === 'doc' && Number.isInteger(entity.rev)) entry.rev = entity.rev
+    out.set(prefix + name, entry)
+  }
+  const walk = (folder, prefix) => {
+    for (const doc of folder?.docs || []) add(prefix, doc, 'doc')
+    for (const file of folder?.fileRefs || []) add(prefix, file, 'file')
+    for (const sub of folder?.folders || []) {
+      const name = String(sub?.name || '')
+      if (isSafeEntityName(name)) walk(sub, `${prefix}${name}/`)
+    }
+  }
+  walk(Array.isArray(rootFolder) ? rootFolder[0] : rootFolder, '')
+  return out
+}
+
+/**
+ * The folder ids of the same tree, by posix path ('' is the root folder).
+ * Folders without an id are left out, with everything below them.
+ */
+export function flattenProjectFolders(rootFolder) {
+  /** @type {Map<string, string>} */
+  const out = new Map()
+  const walk = (folder, relPosix) => {
+    const id = String(folder?._id || '')
+    if (!id) return
+    out.set(relPosix, id)
+    for (const sub of folder?.folders || []) {
+      const name = String(sub?.name || '')
+      if (isSafeEntityName(name)) walk(sub, relPosix ? `${relPosix}/${name}` : name)
+    }
+  }
+  walk(Array.isArray(rootFolder) ? rootFolder[0] : rootFolder, '')
+  return out
+}
+
+/**
+ * Pair paths that disappeared with paths that appeared holding the same
+ * content. `added` and `deleted` are [{ path, hash }]. Where several
+ * candidates share a hash, one with the same file name (a move) is taken
+ * first, then the rest in path order. Returns { renamed: [{ from, to,
+ * hash }], added, deleted } with the unpaired paths, all sorted.
+ */
+export function matchRenames(added, deleted) {
+  /** @type {Map<string, string[]>} */
+  const gone = new Map()
+  for (const { path: relPosix, hash } of [...deleted].sort((a, b) => a.path.localeCompare(b.path))) {
+    if (!hash) continue
+    if (!gone.has(hash)) gone.set(hash, [])
+    gone.get(hash).push(relPosix)
+  }
+  const renamed = []
+  const unmatched = []
+  for (const { path: relPosix, hash } of [...added].sort((a, b) => a.path.localeCompare(b.path))) {
+    const candidates = gone.get(hash)
+    if (!candidates?.length) {
+      unmatched.push(relPosix)
+      continue
+    }
+    const base = path.posix.basename(relPosix)
+    const same = candidates.findIndex(from => path.posix.basename(from) === base)
+    const [from] = candidates.splice(same >= 0 ? same : 0, 1)
+    renamed.push({ from, to: relPosix, hash })
+  }
+  const paired = new Set(renamed.map(r => r.from))
+  return {
+    renamed: renamed.sort((a, b) => a.to.localeCompare(b.to)),
+    added: unmatched,
+    deleted: deleted.map(d => d.path).filter(p => !paired.has(p)).sort(),
+  }
+}
+
+/**
+ * Decide which remote entries a delta fetch must download.
+ *
+ * Binary files whose id and filestore hash match the previous remote index
+ * keep their recorded content hash and are only downloaded when the local
+ * copy differs (apply needs the bytes). Docs carry no version in the tree,
+ * so they are always downloaded; they are text and small next to assets.
+ *
+ * A binary file that is new at its path but whose filestore hash the
+ * previous index knows (it was moved or renamed on the server) is copied
+ * from a local file with that content which is gone from the tree,
+ * instead of downloaded. Those are listed in `copy` as { path, from, hash }.
+ */
+export function planDeltaFetch({ tree, previous, localIndex, matcher }) {
+  /** @type {Map<string, string>} */
+  const reuse = new Map()
+  const download = []
+  for (const [relPosix, entry] of tree) {
+    if (shouldIgnore(relPosix, false, matcher)) continue
+    const prev = previous?.[relPosix]
+    const unchanged =
+      entry.kind === 'file' &&
+      prev?.kind === 'file' &&
+      prev.id === entry.id &&
+      (prev.fileHash || '') === (entry.fileHash || '') &&
+      Boolean(prev.hash)
+    if (unchanged) {
+      reuse.set(relPosix, prev.hash)
+      if (localIndex.get(relPosix)?.hash === prev.hash) continue
+    }
+    download.push({ path: relPosix, ...entry })
+  }
+  download.sort((a, b) => a.path.localeCompare(b.path))
+
+  /** @type {Map<string, string>} filestore hash -> content hash */
+  const known = new Map()
+  for (const prev of Object.values(previous || {})) {
+    if (prev?.kind === 'file' && prev.fileHash && prev.hash) known.set(prev.fileHash, prev.hash)
+  }
+  /** @type {Map<string, string[]>} content hash -> local paths gone from the tree */
+  const orphans = new Map()
+  for (const relPosix of [...localIndex.keys()].sort()) {
+    if (tree.has(relPosix)) continue
+    const { hash } = localIndex.get(relPosix)
+    if (!orphans.has(hash)) orphans.set(hash, [])
+    orphans.get(hash).push(relPosix)
+  }
+  const copy = []
+  const fetched = []
+  for (const entry of download) {
+    const hash = entry.kind === 'file' && !localIndex.has(entry.path) ? known.get(entry.fileHash) : undefined
+    const from = hash && orphans.get(hash)?.shift()
+    if (!from) {
+      fetched.push(entry)
+      continue
+    }
+    reuse.set(entry.path, hash)
+    copy.push({ path: entry.path, from, hash })
+  }
+  return { reuse, download: fetched, copy }
+}
+
+export async function loadRemoteIndex(projectInboxDir) {
+  try {
+    const raw = await readFile(path.join(projectInboxDir, REMOTE_INDEX_FILENAME), 'utf8')
+    const parsed = JSON.parse(raw)
+    return parsed?.version === 1 && parsed.files && typeof parsed.files === 'object'
+      ? parsed.files
+      : {}
+  } catch {
+    return {}
+  }
+}
+
+export async function saveRemoteIndex(projectInboxDir, files) {
+  const target = path.join(projectInboxDir, REMOTE_INDEX_FILENAME)
+  const tmp = `${target}.tmp-${process.pid}`
+  const payload = { version: 1, updatedAt: new Date().toISOString(), files }
+  await writeFile(tmp, JSON.stringify(payload) + '\n', 'utf8')
+  await rename(tmp, target)
+}
+
+// What this machine last uploaded per path (content hashes), kept next to the
+// remote index so a poll can tell our own edits from someone else's.
+export const OUTGOING_LEDGER_FILENAME = '.ol-sync.outgoing.json'
+
+/**
+ * SHA-256 plus the git blob SHA-1 (what Overleaf records as a file ref's
+ * `hash`) of a buffer or file, in one read. Returns { hash, blob, size }.
+ */
+export async function contentDigests(source, { chunkSize = DEFAULT_IO_CHUNK_SIZE } = {}) {
+  const sha256 = createHash('sha256')
+  const blob = createHash('sha1')
+  if (Buffer.isBuffer(source)) {
+    sha256.update(source)
+    blob.update(`blob ${source.length}\0`).update(source)
+    return { hash: sha256.digest('hex'), blob: blob.digest('hex'), size: source.length }
+  }
+  const { size } = await stat(source)
+  blob.update(`blob ${size}\0`)
+  let read = 0
+  const chunks = size > 0 ? createReadStream(source, { highWaterMark: chunkSize, end: size - 1 }) : []
+  for await (const chunk of chunks) {
+    sha256.update(chunk)
+    blob.update(chunk)
+    read += chunk.length
+  }
+  if (read !== size) throw new Error(`${source} changed while it was hashed`)
+  return { hash: sha256.digest('hex'), blob: blob.digest('hex'), size }
+}
+
+/**
+ * The outgoing ledger of one project: { relPosix: { hash, blob, size, at } }.
+ * Uploads are recorded in memory and written shortly after, so a push of many
+ * files rewrites the file a few times rather than once per file; the pending
+ * timer keeps the process alive until the write has happened. Each write
+ * merges into the file under a lease on `<file>.lock`, so a push and a watch
+ * on the same project keep each other's entries.
+ */
+export class OutgoingLedger {
+  #chain = Promise.resolve()
+  #recorded = new Map()
+  #forgotten = new Map()
+  #timer = null
+
+  constructor(projectInboxDir, { flushMs = 250 } = {}) {
+    this.file = path.join(projectInboxDir, OUTGOING_LEDGER_FILENAME)
+    this.flushMs = flushMs
+  }
+
+  async load() {
+    try {
+      const parsed = JSON.parse(await readFile(this.file, 'utf8'))
+      if (parsed?.version === 1 && parsed.files && typeof parsed.files === 'object') return parsed.files
+    } catch {
+      // nothing uploaded yet
+    }
+    return {}
+  }
+
+  record(relPosix, { hash, blob, size }) {
+    this.#recorded.set(relPosix, { hash, blob, size, at: Date.now() })
+    this.#forgotten.delete(relPosix)
+    this.#schedule()
+  }
+
+  /** Drop entries recorded at or before `before` (ms): the remote index covers them now. */
+  forget(paths, before) {
+    for (const relPosix of paths) this.#forgotten.set(relPosix, before)
+    return this.flush()
+  }
+
+  #schedule() {
+    if (this.#timer) return
+    this.#timer = setTimeout(() => {
+      this.flush().catch(() => {})
+    }, this.flushMs)
+  }
+
+  flush() {
+    clearTimeout(this.#timer)
+    this.#timer = null
+    const recorded = this.#recorded
+    const forgotten = this.#forgotten
+    this.#recorded = new Map()
+    this.#forgotten = new Map()
+    const run = async () => {
+      if (recorded.size === 0 && forgotten.size === 0) return
+      const lease = await acquireFileLease(`${this.file}.lock`)
+      try {
+        const files = await this.load()
+        for (const [relPosix, before] of forgotten) {
+          if (files[relPosix] && files[relPosix].at <= before) delete files[relPosix]
+        }
+        for (const [relPosix, entry] of recorded) files[relPosix] = entry
+        const tmp = `${this.file}.tmp-${process.pid}`
+        await writeFile(tmp, JSON.stringify({ version: 1, files }) + '\n', 'utf8')
+        await rename(tmp, this.file)
+      } finally {
+        await lease.release()
+      }
+    }
+    const result = this.#chain.then(run)
+    this.#chain = result.catch(() => {})
+    return result
+  }
+}
+
+// Paths this machine has had in step with the server, kept next to the ledger.
+export const SYNCED_PATHS_FILENAME = '.ol-sync.synced-paths.json'
+
+/**
+ * The paths of one project that this machine has pulled, applied, found
+ * identical on both sides in a fetch, uploaded or moved. A server path that
+ * push no longer finds locally only counts as moved or renamed away when it
+ * is in this set; a path added on the web and never applied here is not.
+ * Changes are written in batches like the ledger, under a file lease so
+ * concurrent runs on the same project keep each other's entries.
+ */
+export class SyncedPaths {
+  #chain = Promise.resolve()
+  #added = new Set()
+  #removed = new Set()
+  #timer = null
+
+  constructor(projectInboxDir, { flushMs = 250 } = {}) {
+    this.file = path.join(projectInboxDir, SYNCED_PATHS_FILENAME)
+    this.flushMs = flushMs
+  }
+
+  async load() {
+    try {
+      const parsed = JSON.parse(await readFile(this.file, 'utf8'))
+      if (parsed?.version === 1 && Array.isArray(parsed.paths)) return new Set(parsed.paths)
+    } catch {
+      // nothing recorded yet
+    }
+    return new Set()
+  }
+
+  add(paths) {
+    for (const relPosix of paths) {
+      this.#added.add(relPosix)
+      this.#removed.delete(relPosix)
+    }
+    this.#schedule()
+  }
+
+  remove(paths) {
+    for (const relPosix of paths) {
+      this.#removed.add(relPosix)
+      this.#added.delete(relPosix)
+    }
+    this.#schedule()
+  }
+
+  #schedule() {
+    if (this.#timer) return
+    this.#timer = setTimeout(() => {
+      this.flush().catch(() => {})
+    }, this.flushMs)
+  }
+
+  flush() {
+    clearTimeout(this.#timer)
+    this.#timer = null
+    const added = this.#added
+    const removed = this.#removed
+    this.#added = new Set()
+    this.#removed = new Set()
+    const run = async () => {
+      if (added.size === 0 && removed.size === 0) return
+      const lease = await acquireFileLease(`${this.file}.lock`)
+      try {
+        const paths = await this.load()
+        for (const relPosix of removed) paths.delete(relPosix)
+        for (const relPosix of added) paths.add(relPosix)
+        const tmp = `${this.file}.tmp-${process.pid}`
+        await writeFile(tmp, JSON.stringify({ version: 1, paths: [...paths].sort() }) + '\n', 'utf8')
+        await rename(tmp, this.file)
+      } finally {
+        await lease.release()
+      }
+    }
+    const result = this.#chain.then(run)
+    this.#chain = result.catch(() => {})
+    return result
+  }
+}
+
+/**
+ * First step of telling who changed a project: settle what the tree alone
+ * shows and list the entries whose content must be downloaded and hashed.
+ * A binary file is unchanged when its id and filestore hash match the
+ * remote index, and ours when its filestore hash is the blob hash we
+ * uploaded. A doc is unchanged when its id and revision match the remote
+ * index; docs without a revision (a tree from the private join API) are
+ * always hashed.
+ */
+export function planOriginCheck({ tree, previous = {}, ledger = {}, matcher }) {
+  /** @type {Map<string, {hash:string, origin:'unchanged'|'own'}>} */
+  const resolved = new Map()
+  const download = []
+  for (const [relPosix, entry] of tree) {
+    if (shouldIgnore(relPosix, false, matcher)) continue
+    const prev = previous[relPosix]
+    const own = ledger[relPosix]
+    if (entry.kind === 'doc' && entry.rev !== undefined) {
+      if (prev?.kind === 'doc' && prev.id === entry.id && prev.rev === entry.rev && prev.hash) {
+        resolved.set(relPosix, { hash: prev.hash, origin: 'unchanged' })
+        continue
+      }
+    }
+    if (entry.kind === 'file' && entry.fileHash) {
+      if (prev?.kind === 'file' && prev.id === entry.id && prev.fileHash === entry.fileHash && prev.hash) {
+        resolved.set(relPosix, { hash: prev.hash, origin: 'unchanged' })
+        continue
+      }
+      if (own?.blob === entry.fileHash && own.hash) {
+        resolved.set(relPosix, { hash: own.hash, origin: 'own' })
+        continue
+      }
+    }
+    download.push({ path: relPosix, ...entry })
+  }
+  download.sort((a, b) => a.path.localeCompare(b.path))
+  return { resolved, download }
+}
+
+/**
+ * Classify every remote path once the planned downloads are hashed
+ * (`downloaded`: relPosix -> sha256). Content equal to the last remote
+ * index is unchanged, equal to our last upload is our own, and equal to the
+ * local file (`localHash(relPosix)` -> sha256 | null) needs nothing either;
+ * anything else, and any path removed remotely that still exists locally,
+ * is a foreign change. Returns { foreign: [{ path, change }], own, unchanged,
+ * files } where `files` is the new remote index.
+ */
+export async function classifyOrigin({ tree, previous = {}, ledger = {}, matcher, resolved, downloaded, localHash }) {
+  const foreign = []
+  const own = []
+  let unchanged = 0
+  const files = {}
+  for (const [relPosix, entry] of tree) {
+    if (shouldIgnore(relPosix, false, matcher)) continue
+    const known = resolved.get(relPosix)
+    const hash = known?.hash || downloaded.get(relPosix)
+    if (!hash) continue
+    files[relPosix] = { ...entry, hash }
+    let origin = known?.origin
+    if (!origin) {
+      if (previous[relPosix]?.hash === hash) origin = 'unchanged'
+      else if (ledger[relPosix]?.hash === hash) origin = 'own'
+      else if ((await localHash(relPosix)) === hash) origin = 'local'
+    }
+    if (origin === 'unchanged' || origin === 'local') unchanged += 1
+    else if (origin === 'own') own.push(relPosix)
+    else foreign.push({ path: relPosix, change: previous[relPosix] ? 'modified' : 'added' })
+  }
+  for (const relPosix of Object.keys(previous)) {
+    if (tree.has(relPosix) || shouldIgnore(relPosix, false, matcher)) continue
+    if ((await localHash(relPosix)) !== null) foreign.push({ path: relPosix, change: 'removed' })
+  }
+  foreign.sort((a, b) => a.path.localeCompare(b.path))
+  own.sort()
+  return { foreign, own, unchanged, files }
+}
+
+// Uploads that failed for a transient reason (server down, network error),
+// kept per project next to the remote index until a later run delivers them.
+export const OUTBOX_FILENAME = '.ol-sync.outbox.json'
+
+/**
+ * Whether an upload failure is worth queueing: network errors and
+ * 408/429/5xx responses. Other HTTP errors (a rejected file, a bad folder)
+ * would fail the same way on replay, and a vanished local file has nothing
+ * left to deliver.
+ */
+export function isTransientUploadError(err) {
+  if (err?.code === 'ENOENT' || err?.code === 'EISDIR') return false
+  const status = Number(err?.status)
+  if (!status) return true
+  return status === 408 || status === 429 || status >= 500
+}
+
+/**
+ * Exponential backoff with jitter for the attempt-th consecutive failure
+ * (1-based): a random delay in [base/2, base], base doubling from minMs up
+ * to maxMs.
+ */
+export function backoffDelay(attempt, { minMs = 1000, maxMs = 60000, random = Math.random } = {}) {
+  const base = Math.min(maxMs, minMs * 2 ** Math.max(0, attempt - 1))
+  return Math.round(base / 2 + random() * (base / 2))
+}
+
+/**
+ * The outbound queue of one project, scoped to the local folder `dir`.
+ * Entries are keyed by path: a replay uploads whatever the file holds
+ * by then, so the latest version of a path always wins and repeated
+ * failures never grow the queue. Every change re-reads the file and
+ * replaces it atomically while holding a lease on `<file>.lock`, so a
+ * push and a watch on the same project keep each other's entries.
+ */
+export class Outbox {
+  #chain = Promise.resolve()
+  #paths = null
+
+  constructor(projectInboxDir, dir) {
+    this.file = path.join(projectInboxDir, OUTBOX_FILENAME)
+    this.dir = dir
+  }
+
+  // { dir: { relPosix: entry } } for every folder linked to the project.
+  async #read() {
+    try {
+      const parsed = JSON.parse(await readFile(this.file, 'utf8'))
+      if (parsed?.version === 1 && parsed.folders && typeof parsed.folders === 'object') return parsed.folders
+    } catch {
+      // nothing queued yet
+    }
+    return {}
+  }
+
+  #remember(folders) {
+    this.#paths = new Set(Object.keys(folders[this.dir] || {}))
+  }
+
+  /** Queued entries of this folder as { path, queuedAt, attempts, error }, oldest first. */
+  async list() {
+    const entries = (await this.#read())[this.dir] || {}
+    this.#paths = new Set(Object.keys(entries))
+    return Object.entries(entries)
+      .map(([relPosix, entry]) => ({ path: relPosix, ...entry }))
+      .sort((a, b) => String(a.queuedAt).localeCompare(String(b.queuedAt)) || a.path.localeCompare(b.path))
+  }
+
+  /** Queued paths of this folder, oldest first; always read from disk. */
+  async pending() {
+    return (await this.list()).map(entry => entry.path)
+  }
+
+  /** Number of queued paths as of the last read or change. */
+  get size() {
+    return this.#paths ? this.#paths.size : 0
+  }
+
+  has(relPosix) {
+    return Boolean(this.#paths?.has(relPosix))
+  }
+
+  /**
+   * Queue `queued` ([relPosix, error] pairs) and drop `done` (paths that were
+   * delivered or no longer exist). Returns the new queue length.
+   */
+  update({ queued = [], done = [] } = {}) {
+    const run = async () => {
+      if (this.#paths && queued.length === 0 && !done.some(relPosix => this.#paths.has(relPosix))) {
+        return this.#paths.size
+      }
+      const lease = await acquireFileLease(`${this.file}.lock`)
+      try {
+        const folders = await this.#read()
+        const entries = folders[this.dir] || {}
+        const now = new Date().toISOString()
+        for (const relPosix of done) delete entries[relPosix]
+        for (const [relPosix, err] of queued) {
+          const prev = entries[relPosix]
+          entries[relPosix] = {
+            queuedAt: prev?.queuedAt || now,
+            lastAttemptAt: now,
+            attempts: (prev?.attempts || 0) + 1,
+            error: String(err?.message || err || '').slice(0, 300),
+          }
+        }
+        if (Object.keys(entries).length) folders[this.dir] = entries
+        else delete folders[this.dir]
+        const tmp = `${this.file}.tmp-${process.pid}`
+        await writeFile(tmp, JSON.stringify({ version: 1, folders }, null, 2) + '\n', 'utf8')
+        await rename(tmp, this.file)
+        this.#remember(folders)
+        return this.#paths.size
+      } finally {
+        await lease.release()
+      }
+    }
+    const result = this.#chain.then(run)
+    this.#chain = result.catch(() => {})
+    return result
+  }
+}
+
+// Written into each pre-apply backup directory so the GUI's version index can
+// pick the backup up without re-hashing it.
+export const BACKUP_MANIFEST_FILENAME = '.ol-sync.backup.json'
+
+/**
+ * Record the files of a backup directory as { relPosix: { hash, size, mtimeMs } },
+ * where mtimeMs is when the backed-up content was last current. Entries from an
+ * earlier, interrupted run into the same directory are kept as they are.
+ */
+export async function writeBackupManifest(backupDir, meta, files) {
+  const target = path.join(backupDir, BACKUP_MANIFEST_FILENAME)
+  let previous = {}
+  try {
+    const parsed = JSON.parse(await readFile(target, 'utf8'))
+    if (parsed?.version === 1 && parsed.files && typeof parsed.files === 'object') previous = parsed.files
+  } catch {
+    // no earlier run
+  }
+  const payload = {
+    version: 1,
+    ...meta,
+    createdAt: new Date().toISOString(),
+    files: { ...files, ...previous },
+  }
+  const tmp = `${target}.tmp-${process.pid}`
+  await writeFile(tmp, JSON.stringify(payload, null, 2) + '\n', 'utf8')
+  await rename(tmp, target)
+}
+
+// Structured progress/trace events share stderr with human-readable output;
+// consumers (gui.py) recognise them by this prefix.
+export const EVENT_PREFIX = '@ol-sync-event '
+
+export function eventsEnabled(opts, env = process.env) {
+  return Boolean(opts?.events) || env.OL_SYNC_EVENTS === '1'
+}
+
+export function formatEvent(type, fields = {}) {
+  return `${EVENT_PREFIX}${JSON.stringify({ type, ts: Date.now(), ...fields })}\n`
+}
+
+export function writeEvent(type, fields, { enabled = true, stream = process.stderr } = {}) {
+  if (!enabled) return
+  stream.write(formatEvent(type, fields))
+}
+
+/**
+ * A stream.pipeline() stage that passes chunks through and reports the
+ * running byte count, at most once per intervalMs plus once at the end.
+ */
+export function progressCounter(onProgress, { intervalMs = 200 } = {}) {
+  return async function* (source) {
+    let bytes = 0
+    let lastReport = 0
+    for await (const chunk of source) {
+      bytes += chunk.length
+      const now = Date.now()
+      if (now - lastReport >= intervalMs) {
+        lastReport = now
+        onProgress(bytes, false)
+      }
+      yield chunk
+    }
+    onProgress(bytes, true)
+  }
+}
+
+// An unfinished project zip download, kept in the project's inbox dir so the
+// next run can resume it with a Range request.
+export const ZIP_PART_FILENAME = '.ol-sync.download.zip.part'
+
+// Local write failures that a retry from the network side can't fix.
+const DISK_ERROR_CODES = new Set(['ENOSPC', 'EDQUOT', 'EACCES', 'EPERM', 'EROFS'])
+
+async function fileSize(absPath) {
+  try {
+    return (await stat(absPath)).size
+  } catch {
+    return 0
+  }
+}
+
+/**
+ * Download `url` to destPath by way of partPath, which survives a failed
+ * run. A partial file is resumed with a Range request carrying the ETag (or
+ * Last-Modified) of the response that started it as If-Range, so a server
+ * without Range support, or whose content changed since, answers with the
+ * whole body and the download restarts cleanly. A dropped connection is
+ * retried from where it stopped, `attempts` times in all.
+ *
+ * onProgress gets { bytes, total, resumedFrom, attempt, bytesPerSec, done },
+ * `bytes` counting what is on disk. HTTP errors are thrown with `status`.
+ * `fetch` stands in for the global one, e.g. an HttpClient's.
+ * Resolves to { bytes, resumedFrom, attempts }.
+ */
+export async function resumableDownload(
+  url,
+  destPath,
+  {
+    headers = {},
+    partPath = `${destPath}.part`,
+    onProgress,
+    attempts = 4,
+    retryMinMs = 500,
+    setCookie,
+    fetch: fetchImpl = (...args) => globalThis.fetch(...args),
+  } = {}
+) {
+  const metaPath = `${partPath}.json`
+  let meta = null
+  try {
+    meta = JSON.parse(await readFile(metaPath, 'utf8'))
+    if (meta?.url !== url || !meta.validator) meta = null
+  } catch {
+    // no earlier partial download
+  }
+  let have = meta ? await fileSize(partPath) : 0
+  let resumedFrom = 0
+  await mkdir(path.dirname(partPath), { recursive: true })
+
+  for (let attempt = 1; ; attempt++) {
+    const request = new Headers(headers)
+    if (have > 0 && meta) {
+      request.set('range', `bytes=${have}-`)
+      request.set('if-range', meta.validator)
+    }
+    let res
+    try {
+      res = await fetchImpl(url, { headers: request })
+    } catch (err) {
+      if (attempt >= attempts) throw err
+      await sleep(backoffDelay(attempt, { minMs: retryMinMs, maxMs: retryMinMs * 8 }))
+      continue
+    }
+    setCookie?.(res.headers.getSetCookie?.() || [])
+    if (res.status === 416 && have > 0) {
+      // The partial file is not a prefix of what the server has now.
+      await res.body?.cancel()
+      have = 0
+      meta = null
+      continue
+    }
+    if (!res.ok || !res.body) {
+      const bodyText = await res.text().catch(() => '')
+      const err = new Error(`Download failed: HTTP ${res.status} ${url} ${bodyText}`.trim())
+      err.status = res.status
+      throw err
+    }
+
+    const range = res.status === 206 ? /^bytes (\d+)-\d+\/(\d+|\*)$/.exec(res.headers.get('content-range') || '') : null
+    const resumed = Boolean(range) && Number(range[1]) === have
+    if (!resumed) {
+      if (res.status === 206) {
+        await res.body.cancel()
+        throw new Error(`Download failed: unexpected Content-Range from ${url}`)
+      }
+      have = 0
+    } else if (!resumedFrom) {
+      resumedFrom = have
+    }
+    const length = Number.parseInt(res.headers.get('content-length') || '', 10)
+    // Project zips are usually streamed without a content-length.
+    const total = resumed ? Number(range[2]) || null : Number.isFinite(length) ? length : null
+    const etag = res.headers.get('etag')
+    const validator = etag && !etag.startsWith('W/') ? etag : res.headers.get('last-modified')
+    meta = validator ? { url, validator, total } : null
+
+    const startedAt = Date.now()
+    const offset = have
+    const count = progressCounter((bytes, done) => {
+      const seconds = (Date.now() - startedAt) / 1000
+      onProgress?.({
+        bytes: offset + bytes,
+        total,
+        resumedFrom,
+        attempt,
+        bytesPerSec: seconds > 0 ? Math.round(bytes / seconds) : null,
+        done,
+      })
+    })
+    // Each chunk is written before the next is read, so the partial file
+    // holds everything that got past fetch's own buffer when a connection drops.
+    let handle
+    try {
+      if (meta) await writeFile(metaPath, JSON.stringify(meta) + '\n', 'utf8')
+      else await unlink(metaPath).catch(() => {})
+      handle = await open(partPath, resumed ? 'a' : 'w')
+    } catch (err) {
+      // The body is never read: cancel it so the connection is given back.
+      await res.body.cancel().catch(() => {})
+      throw err
+    }
+    try {
+      for await (const chunk of count(Readable.fromWeb(res.body))) await handle.write(chunk)
+    } catch (err) {
+      if (DISK_ERROR_CODES.has(err?.code) || attempt >= attempts) throw err
+      have = await fileSize(partPath)
+      await sleep(backoffDelay(attempt, { minMs: retryMinMs, maxMs: retryMinMs * 8 }))
+      continue
+    } finally {
+      await handle.close()
+    }
+    have = await fileSize(partPath)
+    if (total !== null && have !== total) {
+      if (attempt >= attempts) throw new Error(`Download incomplete: ${have} of ${total} bytes from ${url}`)
+      continue
+    }
+    await unlink(metaPath).catch(() => {})
+    try {
+      await rename(partPath, destPath)
+    } catch (err) {
+      if (err?.code !== 'EXDEV') throw err
+      await copyFile(partPath, destPath)
+      await unlink(partPath)
+    }
+    return { bytes: have, resumedFrom, attempts: attempt }
+  }
+}
+
+export function traceEnabled(opts, env = process.env) {
+  return Boolean(opts?.trace) || env.OL_SYNC_TRACE === '1'
+}
+
+function epochMs() {
+  return performance.timeOrigin + performance.now()
+}
+
+/**
+ * Timed phase spans, written as 'span' events (start/dur in epoch ms).
+ * Sequential phases share lane 0 so nested spans stack; spans started with
+ * { concurrent: true } (parallel uploads) get a lane of their own so they
+ * never overlap a sibling on the same track.
+ */
+export class Tracer {
+  #freeLanes = []
+  #nextLane = 1
+
+  constructor({ enabled = false, stream = process.stderr } = {}) {
+    this.enabled = enabled
+    this.stream = stream
+  }
+
+  start(name, fields = {}, { concurrent = false } = {}) {
+    if (!this.enabled) return { set() {}, end() {} }
+    const lane = concurrent ? this.#freeLanes.pop() ?? this.#nextLane++ : 0
+    const startedAt = epochMs()
+    const attrs = { ...fields }
+    let ended = false
+    return {
+      set: extra => Object.assign(attrs, extra),
+      end: extra => {
+        if (ended) return
+        ended = true
+        if (concurrent) this.#freeLanes.push(lane)
+        Object.assign(attrs, extra)
+        this.#emit(name, startedAt, epochMs() - startedAt, lane, attrs)
+      },
+    }
+  }
+
+  async run(name, fields, fn, options) {
+    const span = this.start(name, fields, options)
+    try {
+      const result = await fn(span)
+      span.end()
+      return result
+    } catch (err) {
+      span.end({ error: String(err?.message || err) })
+      throw err
+    }
+  }
+
+  // Node bootstrap and module loading happen before any code here runs.
+  markStartup(name = 'node-startup') {
+    if (!this.enabled) return
+    this.#emit(name, performance.timeOrigin, performance.now(), 0, {})
+  }
+
+  #emit(name, start, dur, lane, attrs) {
+    writeEvent(
+      'span',
+      { name, start, dur, lane, pid: process.pid, attrs },
+      { stream: this.stream }
+    )
+  }
+}
+
+/**
+ * Coalesce bursts of file events into change sets and upload them with
+ * bounded parallelism. A path is never uploaded twice at once: if it changes
+ * while in flight it is re-queued behind the running upload, so the last
+ * write always lands last.
+ */
+export class WatchPipeline {
+  #pending = new Set()
+  #ready = []
+  #queued = new Set()
+  #inFlight = new Set()
+  #rerun = new Set()
+  #burstTimer = null
+  #burstStartedAt = 0
+  #drainStartedAt = 0
+  #drainFiles = 0
+  #drainFailed = 0
+
+  constructor({ upload, concurrency = 4, quietMs = 300, maxWaitMs = 2000, onBatch, onQueue, onDrain, onError }) {
+    this.upload = upload
+    this.concurrency = Math.max(1, concurrency)
+    this.quietMs = quietMs
+    this.maxWaitMs = maxWaitMs
+    this.onBatch = onBatch || (() => {})
+    this.onQueue = onQueue || (() => {})
+    this.onDrain = onDrain || (() => {})
+    this.onError = onError || (() => {})
+  }
+
+  get depth() {
+    return this.#ready.length + this.#pending.size
+  }
+
+  get inFlight() {
+    return this.#inFlight.size
+  }
+
+  get idle() {
+    return this.depth === 0 && this.#inFlight.size === 0
+  }
+
+  add(relPosix) {
+    const now = Date.now()
+    this.#pending.add(relPosix)
+    if (!this.#burstStartedAt) this.#burstStartedAt = now
+    clearTimeout(this.#burstTimer)
+    // Wait for a quiet window, but never hold a long burst past maxWaitMs.
+    const wait = Math.min(this.quietMs, this.maxWaitMs - (now - this.#burstStartedAt))
+    this.#burstTimer = setTimeout(() => this.flush(), Math.max(0, wait))
+  }
+
+  flush() {
+    clearTimeout(this.#burstTimer)
+    this.#burstTimer = null
+    this.#burstStartedAt = 0
+    if (this.#pending.size === 0) return
+    const batch = Array.from(this.#pending).sort()
+    this.#pending.clear()
+    for (const relPosix of batch) this.#enqueue(relPosix)
+    this.onBatch(batch)
+    this.#report()
+    this.#pump()
+  }
+
+  #enqueue(relPosix) {
+    if (this.#inFlight.has(relPosix)) {
+      this.#rerun.add(relPosix)
+      return
+    }
+    if (this.#queued.has(relPosix)) return
+    this.#queued.add(relPosix)
+    this.#ready.push(relPosix)
+  }
+
+  #report() {
+    this.onQueue({ depth: this.depth, inFlight: this.#inFlight.size })
+  }
+
+  #pump() {
+    while (this.#inFlight.size < this.concurrency && this.#ready.length > 0) {
+      const relPosix = this.#ready.shift()
+      this.#queued.delete(relPosix)
+      this.#inFlight.add(relPosix)
+      if (!this.#drainStartedAt) {
+        this.#drainStartedAt = Date.now()
+        this.#drainFiles = 0
+        this.#drainFailed = 0
+      }
+      Promise.resolve()
+        .then(() => this.upload(relPosix))
+        .catch(err => {
+          this.#drainFailed += 1
+          this.onError(err, relPosix)
+        })
+        .finally(() => {
+          this.#inFlight.delete(relPosix)
+          this.#drainFiles += 1
+          if (this.#rerun.delete(relPosix)) this.#enqueue(relPosix)
+          this.#report()
+          if (this.#inFlight.size === 0 && this.#ready.length === 0) {
+            this.onDrain({
+              files: this.#drainFiles,
+              failed: this.#drainFailed,
+              ms: Date.now() - this.#drainStartedAt,
+            })
+            this.#drainStartedAt = 0
+          }
+          this.#pump()
+        })
+    }
+  }
+}
+
+export const PROJECT_BULK_ACTIONS = ['archive', 'unarchive', 'trash', 'untrash', 'delete']
+
+/**
+ * Parse one line of project-bulk input: a bare project id, or an NDJSON
+ * object with projectId (or id/_id) and an optional per-line action.
+ * Returns null for blank lines and # comments.
+ */
+export function parseBulkLine(line, defaultAction) {
+  const text = String(line || '').trim()
+  if (!text || text.startsWith('#')) return null
+  let projectId = text
+  let action = defaultAction
+  if (text.startsWith('{')) {
+    const obj = JSON.parse(text)
+    projectId = String(obj?.projectId || obj?.id || obj?._id || '')
+    action = obj?.action || defaultAction
+  }
+  if (!/^[A-Za-z0-9_-]+$/.test(projectId)) {
+    throw new Error(`Invalid project id: ${JSON.stringify(projectId)}`)
+  }
+  if (!PROJECT_BULK_ACTIONS.includes(action)) {
+    throw new Error(
+      `Invalid action for ${projectId}: ${JSON.stringify(action ?? null)} (expected ${PROJECT_BULK_ACTIONS.join('|')})`
+    )
+  }
+  return { projectId, action }
+}
+
+// Whole-instance mirror: per-run state at the mirror root, content-addressed
+// objects shared by every snapshot through hard links.
+export const MIRROR_STATE_FILENAME = '.ol-sync.mirror.json'
+export const MIRROR_OBJECTS_DIRNAME = '.objects'
+
+/**
+ * Split a project listing into projects a mirror run must download and
+ * projects whose lastUpdated matches the last completed snapshot.
+ * `previous` is the `projects` map of the mirror state.
+ */
+export function planMirror(projects, previous = {}) {
+  const sync = []
+  const skip = []
+  const seen = new Set()
+  for (const project of projects) {
+    const id = String(project?.id || project?._id || '')
+    if (!id) continue
+    seen.add(id)
+    const prev = previous[id]
+    const lastUpdated = project.lastUpdated ? String(project.lastUpdated) : ''
+    let reason = null
+    if (!prev?.snapshot) reason = 'new'
+    else if (!lastUpdated || prev.lastUpdated !== lastUpdated) reason = 'updated'
+    if (reason) sync.push({ project, reason })
+    else skip.push(project)
+  }
+  const removed = Object.keys(previous)
+    .filter(id => !seen.has(id))
+    .sort()
+  return { sync, skip, removed }
+}
+
+export async function loadMirrorState(mirrorRoot) {
+  try {
+    const parsed = JSON.parse(await readFile(path.join(mirrorRoot, MIRROR_STATE_FILENAME), 'utf8'))
+    if (parsed?.version === 1 && parsed.projects && typeof parsed.projects === 'object') {
+      return parsed
+    }
+  } catch {
+    // first run or unreadable state: mirror everything
+  }
+  return { version: 1, projects: {} }
+}
+
+export async function saveMirrorState(mirrorRoot, state) {
+  const target = path.join(mirrorRoot, MIRROR_STATE_FILENAME)
+  const tmp = `${target}.tmp-${process.pid}`
+  await writeFile(tmp, JSON.stringify({ ...state, version: 1 }, null, 2) + '\n', 'utf8')
+  await rename(tmp, target)
+}
+
+/**
+ * Move a freshly downloaded file into the object store. If an object with
+ * the same content already exists, the file is replaced by a hard link to
+ * it (deduplicated); otherwise the file itself becomes the object.
+ * Returns { hash, size, deduplicated }.
+ */
+export async function storeDeduplicated(objectsDir, absPath) {
+  const [hash, { size }] = await Promise.all([sha256File(absPath), stat(absPath)])
+  const objectPath = path.join(objectsDir, hash.slice(0, 2), hash)
+  await mkdir(path.dirname(objectPath), { recursive: true })
+  try {
+    await link(absPath, objectPath)
+    return { hash, size, deduplicated: false }
+  } catch (err) {
+    if (err?.code !== 'EEXIST') throw err
+  }
+  const tmp = `${absPath}.ol-sync-link`
+  await link(objectPath, tmp)
+  await rename(tmp, absPath)
+  return { hash, size, deduplicated: true }
+}
+
+/** Remove objects no snapshot links to any more (link count 1). */
+export async function pruneObjectStore(objectsDir) {
+  let removed = 0
+  let bytes = 0
+  let shards = []
+  try {
+    shards = await readdir(objectsDir)
+  } catch {
+    return { removed, bytes }
+  }
+  for (const shard of shards) {
+    const shardDir = path.join(objectsDir, shard)
+    for (const name of await readdir(shardDir).catch(() => [])) {
+      const objectPath = path.join(shardDir, name)
+      const info = await stat(objectPath)
+      if (info.nlink > 1) continue
+      await unlink(objectPath)
+      removed += 1
+      bytes += info.size
+    }
+  }
+  return { removed, bytes }
+}
+
+// The lock file's content if its holder is gone or it has not been touched for
+// staleMs; null while the lease is live (or the file vanished).
+async function staleLease(lockPath, staleMs) {
+  let raw
+  let info
+  try {
+    ;[raw, info] = await Promise.all([readFile(lockPath, 'utf8'), stat(lockPath)])
+  } catch {
+    return null
+  }
+  if (Date.now() - info.mtimeMs > staleMs) return raw
+  try {
+    const { pid, host } = JSON.parse(raw)
+    if (host !== os.hostname() || !pid) return null
+    process.kill(pid, 0)
+    return null
+  } catch (err) {
+    // ESRCH: the holder died without releasing. Anything else (EPERM, or a lock
+    // file still being written) means we can't tell yet.
+    return err?.code === 'ESRCH' ? raw : null
+  }
+}
+
+// Run fn holding `<lockPath>.guard`. Removing a lock file (a release or a
+// takeover) only happens under it, so checking whose lock it is and removing
+// it can't be split by another process. The guard is held for a read and an
+// unlink; one older than staleMs was left by a process that died holding it.
+async function withLeaseGuard(lockPath, staleMs, fn) {
+  const guard = `${lockPath}.guard`
+  while (true) {
+    try {
+      await writeFile(guard, String(process.pid), { flag: 'wx', mode: 0o600 })
+      break
+    } catch (err) {
+      if (err.code !== 'EEXIST') throw err
+    }
+    try {
+      if (Date.now() - (await stat(guard)).mtimeMs > staleMs) await unlink(guard)
+    } catch {
+      // released meanwhile
+    }
+    await sleep(1 + Math.random() * 4)
+  }
+  try {
+    return await fn()
+  } finally {
+    await unlink(guard).catch(() => {})
+  }
+}
+
+/**
+ * Hold `lockPath` exclusively across processes: an O_EXCL lock file naming
+ * the holder, whose mtime the holder keeps fresh. A lock whose holder has
+ * exited, or that has not been touched for staleMs, is taken over. Waiters
+ * poll with jitter. Resolves to { waited, release() }.
+ */
+export async function acquireFileLease(
+  lockPath,
+  { staleMs = 30 * 1000, pollMs = 100, heartbeatMs = 5 * 1000, timeoutMs = 2 * 60 * 1000 } = {}
+) {
+  await mkdir(path.dirname(lockPath), { recursive: true })
+  const token = randomBytes(8).toString('hex')
+  const content = JSON.stringify({ pid: process.pid, host: os.hostname(), token, acquiredAt: new Date().toISOString() })
+  const deadline = Date.now() + timeoutMs
+  let waited = false
+  while (true) {
+    try {
+      await writeFile(lockPath, content, { flag: 'wx', mode: 0o600 })
+      break
+    } catch (err) {
+      if (err.code !== 'EEXIST') throw err
+    }
+    const stale = await staleLease(lockPath, staleMs)
+    if (stale !== null) {
+      // Remove it only if it still is the lock judged stale: another process
+      // may have taken over (and locked again) in between.
+      await withLeaseGuard(lockPath, staleMs, async () => {
+        if ((await readFile(lockPath, 'utf8').catch(() => null)) === stale) await unlink(lockPath)
+      })
+      continue
+    }
+    if (Date.now() > deadline) throw new Error(`Timed out waiting for ${lockPath}`)
+    waited = true
+    await sleep(pollMs / 2 + Math.random() * pollMs)
+  }
+  const heartbeat = setInterval(() => {
+    const now = new Date()
+    utimes(lockPath, now, now).catch(() => {})
+  }, heartbeatMs)
+  heartbeat.unref()
+  return {
+    waited,
+    release: async () => {
+      clearInterval(heartbeat)
+      await withLeaseGuard(lockPath, staleMs, async () => {
+        try {
+          if (JSON.parse(await readFile(lockPath, 'utf8')).token === token) await unlink(lockPath)
+        } catch {
+          // already gone, or taken over
+        }
+      })
+    },
+  }
 }
 
 export function extractCsrfToken(html) {
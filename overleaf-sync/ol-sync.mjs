@@ -6,30 +6,78 @@ import {
   readdir,
   rename,
   rm,
+  rmdir,
   stat,
   writeFile,
 } from 'node:fs/promises'
-import { createWriteStream } from 'node:fs'
+import { constants as fsConstants, createWriteStream } from 'node:fs'
 import os from 'node:os'
 import path from 'node:path'
 import process from 'node:process'
 import { execFile } from 'node:child_process'
+import { createHash } from 'node:crypto'
 import { promisify } from 'node:util'
 import readline from 'node:readline'
 import { Readable } from 'node:stream'
 import { pipeline } from 'node:stream/promises'
-import { createHash } from 'node:crypto'
 
 import {
   CookieJar,
+  acquireFileLease,
+  Outbox,
+  OutgoingLedger,
+  SyncedPaths,
   DEFAULT_BASE_URL,
   DEFAULT_CONTAINER,
   CONFIG_FILENAME,
+  DEFAULT_LARGE_FILE_THRESHOLD,
+  IGNORE_FILENAME,
+  EVENT_PREFIX,
+  PROJECT_BULK_ACTIONS,
+  buildFileIndex,
+  classifyOrigin,
+  contentDigests,
+  defaultHashThreads,
+  flattenProjectFolders,
+  flattenProjectTree,
+  HashPool,
+  INDEX_DIGESTS,
+  loadMirrorState,
+  loadRemoteIndex,
+  MIRROR_OBJECTS_DIRNAME,
+  MIRROR_STATE_FILENAME,
+  OUTBOX_FILENAME,
+  OUTGOING_LEDGER_FILENAME,
+  parseBulkLine,
+  planMirror,
+  pruneObjectStore,
+  planDeltaFetch,
+  matchRenames,
+  planOriginCheck,
+  resumableDownload,
+  saveMirrorState,
+  saveRemoteIndex,
+  storeDeduplicated,
+  Tracer,
+  WatchPipeline,
+  ZIP_PART_FILENAME,
+  eventsEnabled,
   extractCsrfToken as extractCsrfTokenFromHtml,
+  loadIgnoreMatcher,
+  multipartFileBody,
+  parseByteSize,
+  sha256File,
   shouldIgnore,
+  HttpClient,
   toPosix,
+  traceEnabled,
+  walkFiles,
+  backoffDelay,
   basicAuthHeader,
+  isTransientUploadError,
+  writeBackupManifest,
   writeCliNotice,
+  writeEvent,
 } from './lib.mjs'
 
 const execFileAsync = promisify(execFile)
@@ -40,8 +88,27 @@ const DEFAULT_SESSION_PATH = path.join(
   'session.json'
 )
 const DEFAULT_MONGO_CONTAINER = 'mongo'
+// A cached session checked this recently is used without asking the server
+// (OL_SYNC_SESSION_VALIDATE_SEC overrides; 0 checks on every run).
+const SESSION_VALIDATE_INTERVAL_MS = 2 * 60 * 1000
+// Resolved rootFolderIds keyed by "<baseUrl> <projectId>", shared by every CLI run.
+const DEFAULT_ROOT_FOLDER_CACHE_PATH = path.join(
+  os.homedir(),
+  '.config',
+  'overleaf-sync',
+  'root-folders.json'
+)
 const DEFAULT_INBOX_ROOT = path.join(os.homedir(), '.config', 'overleaf-sync', 'inbox')
 const DEFAULT_BACKUP_ROOT = path.join(os.homedir(), '.config', 'overleaf-sync', 'backups')
+// Queued uploads are replayed at most this many at a time, once /login answers again.
+const OUTBOX_REPLAY_BATCH = 20
+const OUTBOX_RETRY_MIN_MS = 2000
+const OUTBOX_RETRY_MAX_MS = 60 * 1000
+const SERVER_PROBE_TIMEOUT_MS = 5000
+// Watch reports per-route HTTP latency this often when asked to (see httpStatsEnabled).
+const HTTP_STATS_INTERVAL_MS = 30 * 1000
+// Enabled in main() by --trace / OL_SYNC_TRACE=1; a no-op otherwise.
+const tracer = new Tracer()
 
 function normalizeBaseUrl(baseUrl) {
   return String(baseUrl || '').replace(/\/+$/, '')
@@ -93,52 +160,148 @@ async function loadCachedSession(baseUrl, sessionPath) {
   if (!entry || typeof entry !== 'object') return null
   const jar = CookieJar.fromObject(entry.cookies || {})
   const csrfToken = typeof entry.csrfToken === 'string' ? entry.csrfToken : ''
-  return { jar, csrfToken }
+  return {
+    jar,
+    csrfToken,
+    savedAt: String(entry.savedAt || ''),
+    validatedAt: String(entry.validatedAt || entry.savedAt || ''),
+  }
+}
+
+// Held while a process logs in and whenever the store is rewritten, so
+// concurrent CLI runs neither log in together nor overwrite each other.
+function sessionLockPath(sessionPath) {
+  return `${sessionPath}.lock`
 }
 
 async function saveCachedSession(baseUrl, sessionPath, session) {
   const normalized = normalizeBaseUrl(baseUrl)
   const store = await loadSessionStore(sessionPath)
+  const now = new Date().toISOString()
   store.sessions[normalized] = {
     cookies: session.jar.toObject(),
     csrfToken: session.csrfToken,
-    savedAt: new Date().toISOString(),
+    savedAt: now,
+    validatedAt: now,
   }
   await saveSessionStore(sessionPath, store)
+  session.savedAt = now
+  session.validatedAt = now
 }
 
-async function refreshCsrfToken(baseUrl, session) {
+// Record a successful check, unless the stored session was replaced meanwhile.
+// `locked`: the caller already holds the session lease.
+async function markSessionValidated(baseUrl, sessionPath, session, { locked } = {}) {
   const normalized = normalizeBaseUrl(baseUrl)
-  const { body } = await readText(`${normalized}/login`, session.jar)
-  const csrf = extractCsrfTokenFromHtml(body)
-  if (!csrf) {
-    throw new Error('Could not find CSRF token on /login')
+  const lease = locked ? null : await acquireFileLease(sessionLockPath(sessionPath))
+  try {
+    const store = await loadSessionStore(sessionPath)
+    const entry = store.sessions[normalized]
+    if (!entry || String(entry.savedAt || '') !== session.savedAt) return
+    entry.validatedAt = new Date().toISOString()
+    await saveSessionStore(sessionPath, store)
+  } finally {
+    await lease?.release()
+  }
+}
+
+function sessionValidateIntervalMs() {
+  const sec = Number.parseFloat(process.env.OL_SYNC_SESSION_VALIDATE_SEC ?? '')
+  return Number.isFinite(sec) && sec >= 0 ? sec * 1000 : SESSION_VALIDATE_INTERVAL_MS
+}
+
+/**
+ * Whether a stored session is still logged in: /user/personal_info answers
+ * with the user (returned) or with a 401/403 or a redirect to the login
+ * page (null). Other failures are thrown; logging in would not help.
+ */
+async function validateSession(baseUrl, session) {
+  const { res, body } = await tracer.run('session-validate', {}, () =>
+    readJson(`${baseUrl}/user/personal_info`, session.jar)
+  )
+  if (res.ok && body?.id) return body
+  if (res.ok || res.status === 401 || res.status === 403) return null
+  throw new Error(`Session check failed: HTTP ${res.status}`)
+}
+
+/**
+ * Reuse a stored session. One checked within the validate interval is
+ * trusted as is (unless user info is needed anyway); an older one is
+ * checked first. Returns { session, me } or null when it has expired.
+ */
+async function reuseCachedSession(baseUrl, sessionPath, session, { requireUserInfo, locked } = {}) {
+  const stale = Date.now() - (Date.parse(session.validatedAt) || 0) > sessionValidateIntervalMs()
+  let me = null
+  if (stale || requireUserInfo) {
+    me = await validateSession(baseUrl, session)
+    if (!me) return null
+    if (stale) await markSessionValidated(baseUrl, sessionPath, session, { locked })
   }
-  session.csrfToken = csrf
+  if (!session.csrfToken) await refreshCsrfToken(baseUrl, session)
+  return { session, me }
+}
+
+async function refreshCsrfToken(baseUrl, session) {
+  const normalized = normalizeBaseUrl(baseUrl)
+  await tracer.run('csrf-refresh', {}, async () => {
+    const { body } = await readText(`${normalized}/login`, session.jar)
+    const csrf = extractCsrfTokenFromHtml(body)
+    if (!csrf) {
+      throw new Error('Could not find CSRF token on /login')
+    }
+    session.csrfToken = csrf
+  })
 }
 
 async function ensureAuthenticated(baseUrl, opts, { requireUserInfo } = {}) {
+  return await tracer.run('auth', {}, async span => {
+    const result = await authenticate(baseUrl, opts, { requireUserInfo })
+    span.set({ reusedSession: result.reusedSession })
+    return result
+  })
+}
+
+async function authenticate(baseUrl, opts, { requireUserInfo } = {}) {
   const normalized = normalizeBaseUrl(baseUrl)
   const sessionPath = resolveSessionPath(opts)
   const noSessionCache = Boolean(opts?.['no-session-cache'])
 
-  if (!noSessionCache) {
-    const cached = await loadCachedSession(normalized, sessionPath)
-    if (cached) {
-      try {
-        await refreshCsrfToken(normalized, cached)
-        let me = null
-        if (requireUserInfo) {
-          me = await getPersonalInfo(normalized, cached)
-        }
-        await saveCachedSession(normalized, sessionPath, cached)
-        return { session: cached, me, reusedSession: true, sessionPath }
-      } catch {
-        // fall through to password login
-      }
+  if (noSessionCache) {
+    const { session, me } = await passwordLogin(normalized, opts, { requireUserInfo })
+    return { session, me, reusedSession: false, sessionPath }
+  }
+
+  const cached = await tracer.run('session-load', {}, () =>
+    loadCachedSession(normalized, sessionPath)
+  )
+  const reused = cached && (await reuseCachedSession(normalized, sessionPath, cached, { requireUserInfo }))
+  if (reused) return { ...reused, reusedSession: true, sessionPath }
+
+  // Missing or expired: whoever holds the lease logs in; the others wait for
+  // it and then pick up the session it stored.
+  const lease = await tracer.run('session-lease', {}, async span => {
+    const held = await acquireFileLease(sessionLockPath(sessionPath))
+    span.set({ waited: held.waited })
+    return held
+  })
+  try {
+    const latest = await loadCachedSession(normalized, sessionPath)
+    if (latest && latest.savedAt !== (cached?.savedAt || '')) {
+      const fresh = await reuseCachedSession(normalized, sessionPath, latest, { requireUserInfo, locked: true })
+      if (fresh) return { ...fresh, reusedSession: true, sessionPath }
     }
+    const { session, me } = await passwordLogin(normalized, opts, { requireUserInfo })
+    await saveCachedSession(normalized, sessionPath, session)
+    writeCliNotice(`Session cached at ${sessionPath}`, {
+      machineReadable: Boolean(opts?.json),
+    })
+    return { session, me, reusedSession: false, sessionPath }
+  } finally {
+    await lease.release()
   }
+}
 
+async function passwordLogin(normalized, opts, { requireUserInfo } = {}) {
   const providedEmail =
     (typeof opts?.email === 'string' && opts.email.trim()) ||
     (typeof process.env.OVERLEAF_SYNC_EMAIL === 'string' &&
@@ -171,17 +334,9 @@ async function ensureAuthenticated(baseUrl, opts, { requireUserInfo } = {}) {
       'Cannot prompt for Overleaf password (non-interactive). Provide --password or set OVERLEAF_SYNC_PASSWORD.'
     )
   }
-  const session = await login(normalized, email, password)
+  const session = await tracer.run('login', {}, () => login(normalized, email, password))
   const me = requireUserInfo ? await getPersonalInfo(normalized, session) : null
-
-  if (!noSessionCache) {
-    await saveCachedSession(normalized, sessionPath, session)
-    writeCliNotice(`Session cached at ${sessionPath}`, {
-      machineReadable: Boolean(opts?.json),
-    })
-  }
-
-  return { session, me, reusedSession: false, sessionPath }
+  return { session, me }
 }
 
 function usage(exitCode = 0) {
@@ -193,19 +348,77 @@ Usage:
   node overleaf-sync/ol-sync.mjs project-trash --project-id <id> [--base-url ...] [--json]
   node overleaf-sync/ol-sync.mjs project-untrash --project-id <id> [--base-url ...] [--json]
   node overleaf-sync/ol-sync.mjs project-delete --project-id <id> [--base-url ...] [--json]
+  node overleaf-sync/ol-sync.mjs project-bulk --action archive|unarchive|trash|untrash|delete [--project-ids <id,id,...>] [--stdin] [--concurrency 4] [--base-url ...] [--json]
   node overleaf-sync/ol-sync.mjs link --project-id <id> --dir <path> [--base-url ...] [--mongo-container mongo] [--container sharelatex] [--force]
   node overleaf-sync/ol-sync.mjs create --dir <path> [--name <projectName>] [--base-url ...] [--mongo-container mongo] [--force]
-  node overleaf-sync/ol-sync.mjs pull --project-id <id> --dir <path> [--base-url ...] [--mongo-container mongo]
-  node overleaf-sync/ol-sync.mjs fetch --dir <path> [--project-id <id>] [--base-url ...] [--debug] [--json] [--skip-empty]
+  node overleaf-sync/ol-sync.mjs pull --project-id <id> --dir <path> [--base-url ...] [--mongo-container mongo] [--events]
+  node overleaf-sync/ol-sync.mjs mirror [--dir <mirrorRoot>] [--base-url ...] [--concurrency 3] [--keep 3] [--json] [--events]
+  node overleaf-sync/ol-sync.mjs root-folders [--dir <path>] [--stdin] [--refresh] [--base-url ...] [--json]
+  node overleaf-sync/ol-sync.mjs fetch --dir <path> [--project-id <id>] [--base-url ...] [--debug] [--json] [--skip-empty] [--delta] [--concurrency 4] [--digest sha256|crc32] [--hash-threads N] [--mongo-container mongo] [--container sharelatex] [--events]
   node overleaf-sync/ol-sync.mjs apply --dir <path> [--project-id <id>] [--base-url ...] [--batch <batchId>]
-  node overleaf-sync/ol-sync.mjs push --dir <path> [--project-id <id>] [--base-url ...] [--mongo-container mongo] [--concurrency 4] [--dry-run]
-  node overleaf-sync/ol-sync.mjs watch --dir <path> [--project-id <id>] [--base-url ...] [--mongo-container mongo] [--dry-run]
+  node overleaf-sync/ol-sync.mjs push --dir <path> [--project-id <id>] [--base-url ...] [--mongo-container mongo] [--concurrency 4] [--large-file-threshold 8MiB] [--dry-run]
+  node overleaf-sync/ol-sync.mjs remote-status --dir <path> [--project-id <id>] [--base-url ...] [--mongo-container mongo] [--concurrency 4] [--json]
+  node overleaf-sync/ol-sync.mjs outbox --dir <path> [--project-id <id>] [--base-url ...] [--replay] [--concurrency 4] [--json]
+  node overleaf-sync/ol-sync.mjs watch --dir <path> [--project-id <id>] [--base-url ...] [--mongo-container mongo] [--large-file-threshold 8MiB] [--concurrency 4] [--quiet-ms 300] [--events] [--dry-run]
 
 Notes:
   - "link" writes ${CONFIG_FILENAME} into the target directory (no passwords stored).
   - "watch" reads ${CONFIG_FILENAME} if present; otherwise requires --project-id.
+  - "watch" groups a burst of changes into one change set after --quiet-ms of quiet (at most 2s),
+    then uploads it with --concurrency parallel uploads. --events (or OL_SYNC_EVENTS=1) adds
+    "${EVENT_PREFIX.trim()} {json}" lines on stderr with queue depth and drain times.
+  - "project-bulk" runs one action over many projects with a single login and --concurrency parallel
+    requests. With --stdin it reads one project id or NDJSON object per line, e.g.
+    {"projectId":"<id>","action":"trash"} (a per-line action overrides --action). --json streams one
+    result object per project, then {"done":true,"ok":N,"failed":M}. Exits 1 if any item failed.
+  - "fetch --delta" (or OL_SYNC_FETCH_DELTA=1) reads the project tree (via Mongo, or the private join API
+    with WEB_API credentials from the container or OVERLEAF_SYNC_WEB_API_USER/_PASSWORD) and downloads only
+    docs and changed files instead of the whole zip. It falls back to the zip when the tree is unavailable.
+  - "fetch" hashes both trees on --hash-threads worker threads (or OL_SYNC_HASH_THREADS; default: one per
+    CPU). --digest crc32 compares file contents by size + CRC-32 instead of SHA-256, which is much cheaper
+    on large trees; it applies to zip fetches only, since delta fetches compare against recorded SHA-256 hashes.
+  - "mirror" snapshots every project on the instance (archived and trashed included) under
+    <mirrorRoot>/<projectId>/mirror/<snapshot>/, re-downloading only projects whose lastUpdated changed
+    since the last run. Files are hard-linked into <mirrorRoot>/${MIRROR_OBJECTS_DIRNAME}/ so identical content is
+    stored once; --keep snapshots are kept per project. Default root: ${DEFAULT_BACKUP_ROOT}/<host>.
+    The run summary (bytes transferred vs. skipped) is printed and kept in ${MIRROR_STATE_FILENAME}.
+  - push/watch/pull/link look up the project's root folder id (needed for uploads) when ${CONFIG_FILENAME} has none,
+    via Mongo or the private join API, and keep it in ${DEFAULT_ROOT_FOLDER_CACHE_PATH}. A cached id is
+    looked up again if an upload using it is rejected. "root-folders" fills the cache for many linked
+    folders (one per --stdin line) with one Mongo query; --refresh ignores what is cached.
+  - push/watch keep uploads that fail because the server is unreachable (network errors, 408/429/5xx)
+    in a per-project outbox (${OUTBOX_FILENAME} in the project's inbox folder), one entry per path, so
+    the file's latest content is what gets sent. "watch" probes <base-url>/login with backoff and
+    replays the outbox ${OUTBOX_REPLAY_BATCH} files at a time once it answers; "push" clears what it
+    delivers. "outbox" lists the queue, or delivers it with --replay.
+  - Every upload records the SHA-256 and git blob hash of what was sent in ${OUTGOING_LEDGER_FILENAME}
+    (project inbox folder). "remote-status" reads the project tree like "fetch --delta" and sorts remote
+    changes into our own uploads and foreign edits by content, downloading only docs and files the
+    tree can't settle (docs whose revision in Mongo is unchanged are settled); --json prints {available, foreign:[{path,change}], own, unchanged, ...}.
+  - "fetch" reports a path gone on one side and a new path with the same content on the other as one
+    entry in changes.renamed {from, to, hash} (SHA-256 digests only); "apply" renames the local file.
+    "push" moves/renames the matching entities on the server (docs and files keep their ids) instead of
+    uploading them; it reads the project tree for this only when such a pair is possible.
+  - All requests to a server share one client: at most OL_SYNC_HTTP_CONNECTIONS (default 6) in flight
+    (a download until its body is read), keep-alive connections for streamed uploads, and up to
+    OL_SYNC_HTTP_RETRIES (default 3) retries after Retry-After or a jittered backoff from
+    OL_SYNC_HTTP_RETRY_MS (default 250). Reads and uploads retry on network errors and
+    408/429/502/503/504, other POSTs only on 429/503. With --events (or
+    OL_SYNC_HTTP_STATS=1) a run ends with an http-stats event of per-route counts, retries and latency
+    percentiles; "watch" reports every ${HTTP_STATS_INTERVAL_MS / 1000}s.
+  - pull/fetch/mirror download the project zip via ${ZIP_PART_FILENAME} in the project's inbox folder. A
+    dropped connection is retried, and an interrupted run is resumed by the next one with a Range request
+    (If-Range on the zip's ETag); a server that ignores Range sends the whole zip and the download starts
+    over. --events adds "download-progress" events {op, projectId, bytes, total, resumedFrom, bytesPerSec}.
+  - push/watch/fetch skip paths matched by gitignore-style rules in <dir>/${IGNORE_FILENAME}.
   - Session cookies are cached by default to avoid repeated logins. Disable via --no-session-cache.
+    A cached session older than ${SESSION_VALIDATE_INTERVAL_MS / 1000}s (OL_SYNC_SESSION_VALIDATE_SEC) is checked before use; when it
+    has expired, concurrent runs wait on <session-path>.lock so that only one of them logs in.
     Default session cache path: ${DEFAULT_SESSION_PATH}
+  - Files larger than --large-file-threshold (or OL_SYNC_LARGE_FILE_THRESHOLD) are hashed and
+    uploaded as fixed-size chunks streamed from disk.
+  - Any command accepts --trace (or OL_SYNC_TRACE=1) to emit timed "span" events for each phase
+    (login, project listing, download, unzip, hashing, uploads) on stderr.
 `
   process.stdout.write(text.trimStart() + '\n')
   process.exit(exitCode)
@@ -282,17 +495,38 @@ function mustString(opts, key) {
   return value
 }
 
-async function* walkFiles(rootDir) {
-  const entries = await readdir(rootDir, { withFileTypes: true })
-  for (const entry of entries) {
-    const abs = path.join(rootDir, entry.name)
-    const rel = path.relative(rootDir, abs)
-    if (shouldIgnore(rel, entry.isDirectory())) continue
-    if (entry.isDirectory()) {
-      yield* walkFiles(abs)
-    } else if (entry.isFile()) {
-      yield abs
-    }
+// One HTTP client per server, shared by every request of this process.
+const httpClients = new Map()
+
+function httpClient(url) {
+  const { origin } = new URL(url)
+  let client = httpClients.get(origin)
+  if (!client) {
+    const env = process.env
+    const int = value => Number.parseInt(value || '', 10)
+    client = new HttpClient(origin, {
+      maxConnections: int(env.OL_SYNC_HTTP_CONNECTIONS) || 6,
+      retries: Number.isNaN(int(env.OL_SYNC_HTTP_RETRIES)) ? 3 : int(env.OL_SYNC_HTTP_RETRIES),
+      retryMinMs: int(env.OL_SYNC_HTTP_RETRY_MS) || 250,
+    })
+    httpClients.set(origin, client)
+  }
+  return client
+}
+
+function httpFetch(url, init, options) {
+  return httpClient(url).fetch(url, init, options)
+}
+
+// --events reports them along with everything else; OL_SYNC_HTTP_STATS=1 asks for just these.
+function httpStatsEnabled(opts) {
+  return eventsEnabled(opts) || process.env.OL_SYNC_HTTP_STATS === '1'
+}
+
+function writeHttpStats(enabled) {
+  for (const client of httpClients.values()) {
+    const stats = client.stats()
+    if (stats.requests) writeEvent('http-stats', stats, { enabled })
   }
 }
 
@@ -300,18 +534,38 @@ async function readText(url, jar, extraHeaders) {
   const headers = new Headers(extraHeaders || {})
   const cookie = jar?.headerValue?.() || ''
   if (cookie) headers.set('cookie', cookie)
-  const res = await fetch(url, { headers })
+  const res = await httpFetch(url, { headers })
   jar?.addFromSetCookie?.(res.headers.getSetCookie?.() || [])
   const body = await res.text()
   return { res, body }
 }
 
+// Whether the instance answers at all; any non-5xx reply from /login counts.
+async function probeServer(baseUrl) {
+  try {
+    const url = `${baseUrl}/login`
+    const res = await httpFetch(
+      url,
+      { redirect: 'manual', signal: AbortSignal.timeout(SERVER_PROBE_TIMEOUT_MS) },
+      { retries: 0 }
+    )
+    await res.body?.cancel()
+    return res.status < 500
+  } catch {
+    return false
+  }
+}
+
+function outboxRetryMinMs() {
+  return Number.parseInt(process.env.OL_SYNC_OUTBOX_RETRY_MS || '', 10) || OUTBOX_RETRY_MIN_MS
+}
+
 async function readJson(url, jar, extraHeaders) {
   const headers = new Headers(extraHeaders || {})
   headers.set('accept', 'application/json')
   const cookie = jar?.headerValue?.() || ''
   if (cookie) headers.set('cookie', cookie)
-  const res = await fetch(url, { headers })
+  const res = await httpFetch(url, { headers })
   jar?.addFromSetCookie?.(res.headers.getSetCookie?.() || [])
   const bodyText = await res.text()
   let body
@@ -329,7 +583,7 @@ async function postForm(url, jar, form, extraHeaders) {
   headers.set('content-type', 'application/x-www-form-urlencoded')
   const cookie = jar?.headerValue?.() || ''
   if (cookie) headers.set('cookie', cookie)
-  const res = await fetch(url, {
+  const res = await httpFetch(url, {
     method: 'POST',
     headers,
     body: new URLSearchParams(form).toString(),
@@ -349,7 +603,7 @@ async function postJson(url, headersInit, jsonBody) {
   const headers = new Headers(headersInit || {})
   headers.set('accept', 'application/json')
   headers.set('content-type', 'application/json')
-  const res = await fetch(url, {
+  const res = await httpFetch(url, {
     method: 'POST',
     headers,
     body: JSON.stringify(jsonBody),
@@ -372,7 +626,7 @@ async function postJsonSession(url, session, jsonBody) {
   const cookie = session.jar.headerValue()
   if (cookie) headers.set('cookie', cookie)
 
-  const res = await fetch(url, {
+  const res = await httpFetch(url, {
     method: 'POST',
     headers,
     body: JSON.stringify(jsonBody),
@@ -396,7 +650,7 @@ async function requestSession(url, session, { method, headers: extraHeaders, bod
   const cookie = session.jar.headerValue()
   if (cookie) headers.set('cookie', cookie)
 
-  const res = await fetch(url, {
+  const res = await httpFetch(url, {
     method: method || 'GET',
     headers,
     body,
@@ -485,9 +739,8 @@ async function login(baseUrl, email, password) {
 }
 
 async function getPersonalInfo(baseUrl, session) {
-  const { res, body, bodyText } = await readJson(
-    `${baseUrl}/user/personal_info`,
-    session.jar
+  const { res, body, bodyText } = await tracer.run('personal-info', {}, () =>
+    readJson(`${baseUrl}/user/personal_info`, session.jar)
   )
   if (!res.ok || !body?.id) {
     throw new Error(
@@ -584,6 +837,35 @@ async function deleteProjectPermanently(baseUrl, session, projectId) {
   }
 }
 
+async function moveEntity(baseUrl, session, projectId, { kind, id }, folderId) {
+  const { res, bodyText } = await postJsonSession(
+    `${baseUrl}/project/${projectId}/${kind}/${id}/move`,
+    session,
+    { folder_id: folderId }
+  )
+  if (!res.ok) throw new Error(`Failed to move ${kind} ${id}: HTTP ${res.status} ${bodyText}`.trim())
+}
+
+async function renameEntity(baseUrl, session, projectId, { kind, id }, name) {
+  const { res, bodyText } = await postJsonSession(
+    `${baseUrl}/project/${projectId}/${kind}/${id}/rename`,
+    session,
+    { name }
+  )
+  if (!res.ok) throw new Error(`Failed to rename ${kind} ${id}: HTTP ${res.status} ${bodyText}`.trim())
+}
+
+async function createFolder(baseUrl, session, projectId, parentFolderId, name) {
+  const { res, body, bodyText } = await postJsonSession(`${baseUrl}/project/${projectId}/folder`, session, {
+    name,
+    parent_folder_id: parentFolderId,
+  })
+  if (!res.ok || !body?._id) {
+    throw new Error(`Failed to create folder ${name}: HTTP ${res.status} ${bodyText}`.trim())
+  }
+  return String(body._id)
+}
+
 function normalizeProjectId(project) {
   if (!project || typeof project !== 'object') return null
   const raw = project.id ?? project._id
@@ -631,13 +913,21 @@ async function fetchProjectsPaged(
   while (pageCount < maxPages) {
     const page = { size, number: pageNumber }
     if (lastId) page.lastId = lastId
-    const { res, body, bodyText } = await postJsonSession(
-      `${baseUrl}/api/project`,
-      session,
-      {
-        filters: filters || {},
-        sort: sort || { by: 'lastUpdated', order: 'desc' },
-        page,
+    const { res, body, bodyText } = await tracer.run(
+      'list-projects-page',
+      { label: label || '', page: pageNumber },
+      async span => {
+        const result = await postJsonSession(`${baseUrl}/api/project`, session, {
+          filters: filters || {},
+          sort: sort || { by: 'lastUpdated', order: 'desc' },
+          page,
+        })
+        span.set({
+          status: result.res.status,
+          bytes: result.bodyText?.length || 0,
+          returned: result.body?.projects?.length || 0,
+        })
+        return result
       }
     )
     if (!res.ok || !body?.projects) {
@@ -688,7 +978,15 @@ async function fetchProjectsPaged(
   return projects
 }
 
-async function listProjects(baseUrl, session, { activeOnly, debug } = {}) {
+async function listProjects(baseUrl, session, options = {}) {
+  return await tracer.run('list-projects', {}, async span => {
+    const projects = await collectProjects(baseUrl, session, options)
+    span.set({ count: projects.length })
+    return projects
+  })
+}
+
+async function collectProjects(baseUrl, session, { activeOnly, debug } = {}) {
   const projectsById = new Map()
   const sort = { by: 'lastUpdated', order: 'desc' }
 
@@ -769,21 +1067,29 @@ async function listProjects(baseUrl, session, { activeOnly, debug } = {}) {
 }
 
 async function detectWebApiCredentials(containerName) {
+  const envUser = process.env.OVERLEAF_SYNC_WEB_API_USER
+  const envPass = process.env.OVERLEAF_SYNC_WEB_API_PASSWORD
+  if (envUser && envPass) return { user: envUser, pass: envPass }
   try {
     // On some Overleaf images, secrets are stored under /etc/container_environment/
     // and not exported as process env vars.
-    const { stdout } = await execFileAsync('docker', [
-      'exec',
-      containerName,
-      'sh',
-      '-lc',
-      [
-        'if [ -n "${WEB_API_USER:-}" ]; then echo "WEB_API_USER=$WEB_API_USER";',
-        'elif [ -f /etc/container_environment/WEB_API_USER ]; then echo "WEB_API_USER=$(cat /etc/container_environment/WEB_API_USER)"; fi;',
-        'if [ -n "${WEB_API_PASSWORD:-}" ]; then echo "WEB_API_PASSWORD=$WEB_API_PASSWORD";',
-        'elif [ -f /etc/container_environment/WEB_API_PASSWORD ]; then echo "WEB_API_PASSWORD=$(cat /etc/container_environment/WEB_API_PASSWORD)"; fi;',
-      ].join(' '),
-    ])
+    const { stdout } = await tracer.run(
+      'docker-web-api-creds',
+      { container: containerName },
+      () =>
+        execFileAsync('docker', [
+          'exec',
+          containerName,
+          'sh',
+          '-lc',
+          [
+            'if [ -n "${WEB_API_USER:-}" ]; then echo "WEB_API_USER=$WEB_API_USER";',
+            'elif [ -f /etc/container_environment/WEB_API_USER ]; then echo "WEB_API_USER=$(cat /etc/container_environment/WEB_API_USER)"; fi;',
+            'if [ -n "${WEB_API_PASSWORD:-}" ]; then echo "WEB_API_PASSWORD=$WEB_API_PASSWORD";',
+            'elif [ -f /etc/container_environment/WEB_API_PASSWORD ]; then echo "WEB_API_PASSWORD=$(cat /etc/container_environment/WEB_API_PASSWORD)"; fi;',
+          ].join(' '),
+        ])
+    )
     const lines = stdout.split('\n').map(s => s.trim())
     const userLine = lines.find(l => l.startsWith('WEB_API_USER='))
     const passLine = lines.find(l => l.startsWith('WEB_API_PASSWORD='))
@@ -800,26 +1106,43 @@ async function detectWebApiCredentials(containerName) {
   }
 }
 
-async function getRootFolderIdViaMongo(mongoContainerName, projectId) {
+// Project ids go into mongosh scripts, so only a plain ObjectId hex string is accepted.
+function isProjectId(id) {
+  return /^[a-f0-9]{24}$/i.test(String(id))
+}
+
+/**
+ * rootFolderIds for many projects from one `docker exec mongosh` call, keyed
+ * by lowercase project id. Projects Mongo does not know are missing from the
+ * returned map.
+ */
+async function getRootFolderIdsViaMongo(mongoContainerName, projectIds) {
   const container = mongoContainerName || DEFAULT_MONGO_CONTAINER
+  const ids = Array.from(new Set(projectIds.map(id => String(id).toLowerCase())))
+  const invalid = ids.find(id => !isProjectId(id))
+  if (invalid) throw new Error(`Not a project id: ${invalid}`)
   const script = [
-    `const p=db.projects.findOne({_id:ObjectId("${projectId}")},{rootFolder:1});`,
-    `if(!p||!p.rootFolder||!p.rootFolder[0]||!p.rootFolder[0]._id){quit(2)}`,
-    `print(p.rootFolder[0]._id.toHexString())`,
+    `const out={};`,
+    `db.projects.find({_id:{$in:${JSON.stringify(ids)}.map(i=>ObjectId(i))}},{rootFolder:1}).forEach(p=>{`,
+    `if(p.rootFolder&&p.rootFolder[0]&&p.rootFolder[0]._id){out[p._id.toHexString()]=p.rootFolder[0]._id.toHexString()}});`,
+    `print(JSON.stringify(out))`,
   ].join(' ')
   try {
-    const { stdout } = await execFileAsync('docker', [
-      'exec',
-      container,
-      'mongosh',
-      'sharelatex',
-      '--quiet',
-      '--eval',
-      script,
-    ])
-    const out = String(stdout || '').trim()
-    if (!/^[a-f0-9]{24}$/i.test(out)) {
-      throw new Error(`unexpected output: ${out}`)
+    const { stdout } = await tracer.run('mongo-root-folder', { container, projects: ids.length }, () =>
+      execFileAsync('docker', [
+        'exec',
+        container,
+        'mongosh',
+        'sharelatex',
+        '--quiet',
+        '--eval',
+        script,
+      ])
+    )
+    const found = JSON.parse(String(stdout || '').trim())
+    const out = new Map()
+    for (const [projectId, rootFolderId] of Object.entries(found || {})) {
+      if (/^[a-f0-9]{24}$/i.test(String(rootFolderId))) out.set(projectId, String(rootFolderId))
     }
     return out
   } catch (err) {
@@ -829,44 +1152,392 @@ async function getRootFolderIdViaMongo(mongoContainerName, projectId) {
   }
 }
 
-async function getRootFolderIdViaPrivateJoin(baseUrl, projectId, userId, creds) {
-  const { res, body, bodyText } = await postJson(
-    `${baseUrl}/project/${projectId}/join`,
-    { authorization: basicAuthHeader(creds.user, creds.pass) },
-    { userId }
+async function getRootFolderIdViaMongo(mongoContainerName, projectId) {
+  const rootFolderId = (await getRootFolderIdsViaMongo(mongoContainerName, [projectId])).get(
+    String(projectId).toLowerCase()
+  )
+  if (!rootFolderId) {
+    throw new Error(
+      `Could not read root folder id from Mongo via docker exec (${mongoContainerName || DEFAULT_MONGO_CONTAINER}): project not found`
+    )
+  }
+  return rootFolderId
+}
+
+async function privateJoinProject(baseUrl, projectId, userId, creds) {
+  const { res, body, bodyText } = await tracer.run('private-join', {}, () =>
+    postJson(
+      `${baseUrl}/project/${projectId}/join`,
+      { authorization: basicAuthHeader(creds.user, creds.pass) },
+      { userId }
+    )
   )
   if (!res.ok) {
     throw new Error(
       `Private join failed: HTTP ${res.status} ${bodyText || ''}`.trim()
     )
   }
-  const rootFolderId = body?.project?.rootFolder?.[0]?._id
+  return body?.project
+}
+
+async function getRootFolderIdViaPrivateJoin(baseUrl, projectId, userId, creds) {
+  const project = await privateJoinProject(baseUrl, projectId, userId, creds)
+  const rootFolderId = project?.rootFolder?.[0]?._id
   if (!rootFolderId) {
     throw new Error('Private join did not return project.rootFolder[0]._id')
   }
   return rootFolderId
 }
 
-async function uploadOne({
+function rootFolderCacheKey(baseUrl, projectId) {
+  return `${normalizeBaseUrl(baseUrl)} ${projectId}`
+}
+
+async function loadRootFolderCache(cachePath = DEFAULT_ROOT_FOLDER_CACHE_PATH) {
+  try {
+    const parsed = JSON.parse(await readFile(cachePath, 'utf8'))
+    const entries = parsed?.entries && typeof parsed.entries === 'object' ? parsed.entries : {}
+    return { version: 1, entries }
+  } catch {
+    return { version: 1, entries: {} }
+  }
+}
+
+/**
+ * Merge `changes` (key -> entry, or null to drop it) into the cache file.
+ * The file is re-read right before the atomic replace so concurrent runs
+ * (the GUI starts one watch per folder) mostly keep each other's entries;
+ * a lost entry only costs one more lookup.
+ */
+async function updateRootFolderCache(changes, cachePath = DEFAULT_ROOT_FOLDER_CACHE_PATH) {
+  const cache = await loadRootFolderCache(cachePath)
+  for (const [key, entry] of Object.entries(changes)) {
+    if (entry) cache.entries[key] = entry
+    else delete cache.entries[key]
+  }
+  await mkdir(path.dirname(cachePath), { recursive: true })
+  const tmpPath = `${cachePath}.tmp-${process.pid}-${Date.now()}`
+  await writeFile(tmpPath, JSON.stringify(cache, null, 2) + '\n', 'utf8')
+  await rename(tmpPath, cachePath)
+}
+
+/**
+ * rootFolderId for uploads into a project: the shared cache first, then
+ * Mongo, then the private join API (WEB_API credentials). What is found is
+ * cached per (base URL, project id). `fresh` skips the cache; a project that
+ * can no longer be resolved is then dropped from it. Returns
+ * { rootFolderId, via } with via 'cache' | 'mongo' | 'join'.
+ */
+async function resolveRootFolderId({
+  baseUrl,
+  projectId,
+  session,
+  me,
+  mongoContainer,
+  container,
+  debug,
+  fresh = false,
+}) {
+  const key = rootFolderCacheKey(baseUrl, projectId)
+  if (!fresh) {
+    const cached = (await loadRootFolderCache()).entries[key]
+    if (cached?.rootFolderId) {
+      debugLog(debug, `rootFolderId from cache: ${cached.rootFolderId}`)
+      return { rootFolderId: String(cached.rootFolderId), via: 'cache' }
+    }
+  }
+  let rootFolderId
+  let via
+  try {
+    try {
+      rootFolderId = await getRootFolderIdViaMongo(mongoContainer, projectId)
+      via = 'mongo'
+    } catch (err) {
+      debugLog(debug, `rootFolderId mongo lookup failed (${String(err?.message || err)})`)
+      const creds = await detectWebApiCredentials(container || DEFAULT_CONTAINER)
+      const user = me || (await getPersonalInfo(baseUrl, session))
+      rootFolderId = await getRootFolderIdViaPrivateJoin(baseUrl, projectId, user.id, creds)
+      via = 'join'
+    }
+  } catch (err) {
+    if (fresh) await updateRootFolderCache({ [key]: null }).catch(() => {})
+    throw err
+  }
+  debugLog(debug, `rootFolderId resolved via ${via === 'join' ? 'private join' : via}: ${rootFolderId}`)
+  await updateRootFolderCache({
+    [key]: { rootFolderId, via, resolvedAt: new Date().toISOString() },
+  })
+  return { rootFolderId, via }
+}
+
+/**
+ * uploadOne bound to a project's root folder. If an upload is rejected while
+ * the id came from the cache, the id is looked up again once (shared by all
+ * in-flight uploads) and the upload retried if it changed.
+ */
+function rootFolderUploader(target, resolveFresh) {
+  let revalidation = null
+  return async args => {
+    const rootFolderId = target.rootFolderId
+    try {
+      return await uploadOne({ ...args, rootFolderId })
+    } catch (err) {
+      if (target.rootFolderId === rootFolderId) {
+        if (target.via !== 'cache' || args.dryRun) throw err
+        revalidation ??= resolveFresh().then(next => Object.assign(target, next))
+        await revalidation.catch(() => {})
+        if (target.rootFolderId === rootFolderId) throw err
+      }
+      return await uploadOne({ ...args, rootFolderId: target.rootFolderId })
+    }
+  }
+}
+
+async function getRootFolderViaMongo(mongoContainerName, projectId) {
+  const container = mongoContainerName || DEFAULT_MONGO_CONTAINER
+  if (!isProjectId(projectId)) throw new Error(`Not a project id: ${projectId}`)
+  // Ids are converted in mongosh so the output is plain JSON. Doc revisions come
+  // from the docs collection in the same call; they move when docs are flushed.
+  const script = [
+    `const p=db.projects.findOne({_id:ObjectId("${projectId}")},{rootFolder:1});`,
+    `if(!p||!p.rootFolder||!p.rootFolder[0]){quit(2)}`,
+    `const id=v=>v&&v.toHexString?v.toHexString():String(v);`,
+    `const revs={};db.docs.find({project_id:p._id},{rev:1}).forEach(d=>{revs[id(d._id)]=d.rev});`,
+    `const conv=f=>({_id:id(f._id),name:f.name,docs:(f.docs||[]).map(d=>({_id:id(d._id),name:d.name,rev:revs[id(d._id)]??null})),`,
+    `fileRefs:(f.fileRefs||[]).map(r=>({_id:id(r._id),name:r.name,hash:r.hash||null})),`,
+    `folders:(f.folders||[]).map(conv)});`,
+    `print(JSON.stringify(conv(p.rootFolder[0])))`,
+  ].join(' ')
+  try {
+    const { stdout } = await tracer.run('mongo-project-tree', { container }, () =>
+      execFileAsync(
+        'docker',
+        ['exec', container, 'mongosh', 'sharelatex', '--quiet', '--eval', script],
+        { maxBuffer: 64 * 1024 * 1024 }
+      )
+    )
+    return JSON.parse(String(stdout || '').trim())
+  } catch (err) {
+    throw new Error(
+      `Could not read project tree from Mongo via docker exec (${container}): ${err.message}`
+    )
+  }
+}
+
+/**
+ * Read the project's rootFolder (entity and folder ids, filestore hashes).
+ * Returns null when neither Mongo nor the private join API is usable.
+ */
+async function readRemoteRootFolder({ baseUrl, session, projectId, mongoContainer, container, debug }) {
+  try {
+    return await getRootFolderViaMongo(mongoContainer, projectId)
+  } catch (err) {
+    debugLog(debug, `project tree mongo lookup failed (${String(err?.message || err)})`)
+  }
+  try {
+    const creds = await detectWebApiCredentials(container)
+    const me = await getPersonalInfo(baseUrl, session)
+    const project = await privateJoinProject(baseUrl, projectId, me.id, creds)
+    if (!project?.rootFolder) throw new Error('private join returned no rootFolder')
+    return project.rootFolder
+  } catch (err) {
+    debugLog(debug, `project tree private join failed (${String(err?.message || err)})`)
+  }
+  return null
+}
+
+// The same tree flattened to path -> entity, as a delta fetch reads it.
+async function readRemoteTree(options) {
+  const rootFolder = await readRemoteRootFolder(options)
+  return rootFolder ? flattenProjectTree(rootFolder) : null
+}
+
+async function requestEntity(baseUrl, session, projectId, entry) {
+  const headers = new Headers()
+  headers.set('x-csrf-token', session.csrfToken)
+  const cookie = session.jar.headerValue()
+  if (cookie) headers.set('cookie', cookie)
+  const url =
+    entry.kind === 'doc'
+      ? `${baseUrl}/Project/${projectId}/doc/${entry.id}/download`
+      : `${baseUrl}/Project/${projectId}/file/${entry.id}`
+  const res = await httpFetch(url, { headers })
+  session.jar.addFromSetCookie(res.headers.getSetCookie?.() || [])
+  if (!res.ok || !res.body) {
+    const bodyText = await res.text().catch(() => '')
+    throw new Error(`Download failed: HTTP ${res.status} ${url} ${bodyText}`.trim())
+  }
+  return res
+}
+
+async function downloadEntity(baseUrl, session, projectId, entry, destPath) {
+  await mkdir(path.dirname(destPath), { recursive: true })
+  const res = await requestEntity(baseUrl, session, projectId, entry)
+  await pipeline(Readable.fromWeb(res.body), createWriteStream(destPath))
+  return (await stat(destPath)).size
+}
+
+/**
+ * Download only the entities that differ from the last remote index (or
+ * from the local copy) into batchDir and return the full remote index.
+ */
+async function fetchDelta({
   baseUrl,
   session,
   projectId,
-  rootFolderId,
-  absPath,
-  relPath,
-  dryRun,
+  tree,
+  localIndex,
+  localDir,
+  matcher,
+  projectInboxDir,
+  batchDir,
+  concurrency,
 }) {
+  const previous = await loadRemoteIndex(projectInboxDir)
+  const { reuse, download, copy } = planDeltaFetch({ tree, previous, localIndex, matcher })
+  const downloaded = new Map()
+  let bytes = 0
+  let nextIndex = 0
+
+  // Files moved on the server are taken from their old local path; one
+  // edited locally since the index was built is downloaded after all.
+  let copied = 0
+  for (const { path: relPosix, from, hash } of copy) {
+    const destPath = path.join(batchDir, fromPosix(relPosix))
+    await mkdir(path.dirname(destPath), { recursive: true })
+    const same = await copyFile(path.join(localDir, fromPosix(from)), destPath).then(
+      async () => (await sha256File(destPath)) === hash,
+      () => false
+    )
+    if (same) {
+      copied += 1
+    } else {
+      reuse.delete(relPosix)
+      download.push({ path: relPosix, ...tree.get(relPosix) })
+    }
+  }
+
+  // After one failed download the other workers take no new entries; the caller
+  // only resets batchDir once all of them have stopped writing into it.
+  let aborted = false
+  const worker = async () => {
+    while (!aborted && nextIndex < download.length) {
+      const entry = download[nextIndex++]
+      const destPath = path.join(batchDir, fromPosix(entry.path))
+      if (!destPath.startsWith(batchDir + path.sep)) {
+        throw new Error(`Refusing to write outside the inbox batch: ${entry.path}`)
+      }
+      await tracer.run(
+        'download-entity',
+        { path: entry.path, kind: entry.kind },
+        async span => {
+          const size = await downloadEntity(baseUrl, session, projectId, entry, destPath)
+          span.set({ bytes: size })
+          bytes += size
+        },
+        { concurrent: true }
+      )
+      downloaded.set(entry.path, await sha256File(destPath))
+    }
+  }
+  const settled = await Promise.allSettled(
+    Array.from({ length: Math.max(1, concurrency) }, () =>
+      worker().catch(err => {
+        aborted = true
+        throw err
+      })
+    )
+  )
+  const failed = settled.find(result => result.status === 'rejected')
+  if (failed) throw failed.reason
+
+  /** @type {Map<string, {hash:string}>} */
+  const remoteIndex = new Map()
+  const files = {}
+  for (const [relPosix, entry] of tree) {
+    const hash = downloaded.get(relPosix) || reuse.get(relPosix)
+    if (!hash) continue
+    remoteIndex.set(relPosix, { hash })
+    files[relPosix] = { ...entry, hash }
+  }
+  await saveRemoteIndex(projectInboxDir, files)
+  return {
+    remoteIndex,
+    transfer: { mode: 'delta', bytes, files: download.length, reused: reuse.size - copied, copied },
+  }
+}
+
+// One ledger per project inbox, shared by every upload of this process.
+const outgoingLedgers = new Map()
+
+function outgoingLedger(baseUrl, projectId) {
+  const dir = inboxProjectDir(baseUrl, projectId)
+  let ledger = outgoingLedgers.get(dir)
+  if (!ledger) {
+    ledger = new OutgoingLedger(dir)
+    outgoingLedgers.set(dir, ledger)
+  }
+  return ledger
+}
+
+const syncedPathSets = new Map()
+
+function syncedPaths(baseUrl, projectId) {
+  const dir = inboxProjectDir(baseUrl, projectId)
+  let synced = syncedPathSets.get(dir)
+  if (!synced) {
+    synced = new SyncedPaths(dir)
+    syncedPathSets.set(dir, synced)
+  }
+  return synced
+}
+
+// SHA-256 of a doc or file as the server holds it, without keeping the bytes.
+async function hashEntity(baseUrl, session, projectId, entry) {
+  const res = await requestEntity(baseUrl, session, projectId, entry)
+  const hash = createHash('sha256')
+  let size = 0
+  for await (const chunk of Readable.fromWeb(res.body)) {
+    hash.update(chunk)
+    size += chunk.length
+  }
+  return { hash: hash.digest('hex'), size }
+}
+
+async function uploadOne(args) {
+  // Each in-flight upload gets its own trace lane.
+  const digests = await tracer.run(
+    'upload',
+    { path: toPosix(args.relPath) },
+    span => uploadFile(args, span),
+    { concurrent: true }
+  )
+  if (digests) {
+    outgoingLedger(args.baseUrl, args.projectId).record(toPosix(args.relPath), digests)
+    syncedPaths(args.baseUrl, args.projectId).add([toPosix(args.relPath)])
+  }
+  return digests
+}
+
+async function uploadFile(
+  {
+    baseUrl,
+    session,
+    projectId,
+    rootFolderId,
+    absPath,
+    relPath,
+    dryRun,
+    largeFileThreshold = DEFAULT_LARGE_FILE_THRESHOLD,
+  },
+  span
+) {
   const name = path.basename(relPath)
   const relativePath = toPosix(relPath)
   if (dryRun) {
     process.stdout.write(`[dry-run] upload ${relativePath}\\n`)
     return
   }
-  const fileBytes = await readFile(absPath)
-  const form = new FormData()
-  form.set('name', name)
-  form.set('relativePath', relativePath)
-  form.set('qqfile', new Blob([fileBytes]), name)
 
   const headers = new Headers()
   headers.set('accept', 'application/json')
@@ -877,9 +1548,47 @@ async function uploadOne({
   const url = `${baseUrl}/project/${projectId}/upload?folder_id=${encodeURIComponent(
     rootFolderId
   )}`
-  const res = await fetch(url, { method: 'POST', headers, body: form })
-  session.jar.addFromSetCookie(res.headers.getSetCookie?.() || [])
-  const bodyText = await res.text()
+  const { size } = await stat(absPath)
+  span.set({ bytes: size, streamed: size > largeFileThreshold })
+  let res
+  let bodyText
+  let digests
+  if (size > largeFileThreshold) {
+    digests = await contentDigests(absPath)
+    // Stream large assets from disk so concurrent uploads don't buffer whole files.
+    const multipart = multipartFileBody({
+      fields: { name, relativePath },
+      fileField: 'qqfile',
+      fileName: name,
+      filePath: absPath,
+      fileSize: size,
+    })
+    headers.set('content-type', multipart.contentType)
+    headers.set('content-length', String(multipart.contentLength))
+    const streamed = await httpClient(url).stream(
+      url,
+      {
+        method: 'POST',
+        headers: Object.fromEntries(headers.entries()),
+        body: () => multipart.body(),
+      },
+      { idempotent: true }
+    )
+    session.jar.addFromSetCookie(streamed.setCookie)
+    res = streamed
+    bodyText = streamed.bodyText
+  } else {
+    const fileBytes = await readFile(absPath)
+    digests = await contentDigests(fileBytes)
+    const form = new FormData()
+    form.set('name', name)
+    form.set('relativePath', relativePath)
+    form.set('qqfile', new Blob([fileBytes]), name)
+    // Replacing a path's content is safe to repeat.
+    res = await httpFetch(url, { method: 'POST', headers, body: form }, { idempotent: true })
+    session.jar.addFromSetCookie(res.headers.getSetCookie?.() || [])
+    bodyText = await res.text()
+  }
   let body
   try {
     body = bodyText ? JSON.parse(bodyText) : null
@@ -887,10 +1596,11 @@ async function uploadOne({
     body = null
   }
   if (!res.ok || !body?.success) {
-    throw new Error(
-      `Upload failed (${relativePath}): HTTP ${res.status} ${bodyText}`.trim()
-    )
+    const err = new Error(`Upload failed (${relativePath}): HTTP ${res.status} ${bodyText}`.trim())
+    err.status = res.status
+    throw err
   }
+  return digests
 }
 
 async function loadConfig(dir) {
@@ -931,7 +1641,47 @@ async function ensureEmptyDirectory(absDir) {
   }
 }
 
-async function downloadProjectZip(baseUrl, session, projectId, zipPath) {
+/**
+ * Download the project zip to zipPath. The partial file lives in the
+ * project's inbox dir so an interrupted download is resumed by the next
+ * run; when another process is already downloading the same project this
+ * run uses a private partial file next to zipPath instead. With `events`,
+ * byte progress and throughput go out as `download-progress` events tagged
+ * with `op`.
+ */
+async function downloadProjectZip(baseUrl, session, projectId, zipPath, { onProgress, events = false, op = 'download' } = {}) {
+  return await tracer.run('download-zip', {}, async span => {
+    const sharedPartPath = path.join(inboxProjectDir(baseUrl, projectId), ZIP_PART_FILENAME)
+    let lease = null
+    try {
+      lease = await acquireFileLease(`${sharedPartPath}.lock`, { timeoutMs: 0 })
+    } catch {
+      // someone else is resuming the shared partial file
+    }
+    // Without the lease this run gets a partial of its own next to the shared
+    // one (never in the target folder), and nobody resumes it if it fails.
+    const partPath = lease ? sharedPartPath : `${sharedPartPath}-${process.pid}`
+    const report = progress => {
+      writeEvent('download-progress', { op, projectId, ...progress }, { enabled: events })
+      onProgress?.(progress)
+    }
+    try {
+      const result = await fetchProjectZip(baseUrl, session, projectId, zipPath, {
+        partPath,
+        onProgress: events || onProgress ? report : undefined,
+      })
+      span.set(result)
+      return result
+    } catch (err) {
+      if (!lease) await Promise.all([rm(partPath, { force: true }), rm(`${partPath}.json`, { force: true })])
+      throw err
+    } finally {
+      await lease?.release()
+    }
+  })
+}
+
+async function fetchProjectZip(baseUrl, session, projectId, zipPath, { partPath, onProgress } = {}) {
   const cookie = session.jar.headerValue()
   const headers = new Headers()
   headers.set('accept', 'application/zip,application/octet-stream')
@@ -946,20 +1696,19 @@ async function downloadProjectZip(baseUrl, session, projectId, zipPath) {
   /** @type {{url:string, status:number, bodyText?:string}|null} */
   let lastError = null
   for (const url of candidates) {
-    const res = await fetch(url, { headers })
-    session.jar.addFromSetCookie(res.headers.getSetCookie?.() || [])
-
-    if (!res.ok) {
-      if (res.status === 404) {
-        lastError = { url, status: res.status }
-        continue
-      }
-      const bodyText = await res.text().catch(() => '')
-      throw new Error(`Download failed: HTTP ${res.status} ${url} ${bodyText}`.trim())
+    try {
+      const { bytes, resumedFrom } = await resumableDownload(url, zipPath, {
+        headers,
+        partPath,
+        onProgress,
+        setCookie: values => session.jar.addFromSetCookie(values),
+        fetch: httpFetch,
+      })
+      return { url, bytes, resumedFrom }
+    } catch (err) {
+      if (err?.status !== 404) throw err
+      lastError = { url, status: err.status }
     }
-    if (!res.body) throw new Error(`Download failed: empty response body (${url})`)
-    await pipeline(Readable.fromWeb(res.body), createWriteStream(zipPath))
-    return { url }
   }
 
   const msg = lastError
@@ -969,10 +1718,13 @@ async function downloadProjectZip(baseUrl, session, projectId, zipPath) {
 }
 
 async function unzipInto(zipPath, destDir) {
+  const span = tracer.start('unzip', { zipBytes: (await stat(zipPath)).size })
   try {
     await execFileAsync('unzip', ['-q', zipPath, '-d', destDir])
+    span.end()
   } catch (err) {
     const stderr = String(err?.stderr || err?.message || err)
+    span.end({ error: stderr })
     throw new Error(`unzip failed: ${stderr}`)
   }
 }
@@ -998,23 +1750,20 @@ async function maybeFlattenSingleRootFolder(destDir, { keepZipName } = {}) {
   return { flattened: true, wrapper: only.name }
 }
 
-async function sha256File(absPath) {
-  const buf = await readFile(absPath)
-  return createHash('sha256').update(buf).digest('hex')
-}
-
-async function buildIndex(absDir) {
-  /** @type {Map<string, {hash:string}>} */
-  const out = new Map()
-  for await (const absPath of walkFiles(absDir)) {
-    const rel = toPosix(path.relative(absDir, absPath))
-    const hash = await sha256File(absPath)
-    out.set(rel, { hash })
-  }
-  return out
+async function buildIndex(absDir, { matcher, pool, digest = 'sha256' } = {}) {
+  const span = tracer.start('build-index', { dir: absDir, digest, threads: pool?.size ?? 1 })
+  const { index, bytes } = await buildFileIndex(absDir, { matcher, pool, digest })
+  span.end({ files: index.size, bytes })
+  return index
 }
 
-function diffIndexes(localIndex, remoteIndex) {
+/**
+ * Compare the local and remote trees by path. With `renames`, a local-only
+ * path and a remote-only path holding the same content are reported as one
+ * entry in `renamed` ({ from: local path, to: remote path, hash }) instead of
+ * a deletion plus an addition; only use it with collision-free digests.
+ */
+function diffIndexes(localIndex, remoteIndex, { renames = false } = {}) {
   const added = []
   const modified = []
   const deleted = []
@@ -1022,21 +1771,25 @@ function diffIndexes(localIndex, remoteIndex) {
   for (const [p, r] of remoteIndex.entries()) {
     const l = localIndex.get(p)
     if (!l) {
-      added.push(p)
+      added.push({ path: p, hash: r.hash })
       continue
     }
     if (l.hash !== r.hash) {
       modified.push({ path: p, localHash: l.hash, remoteHash: r.hash })
     }
   }
-  for (const [p] of localIndex.entries()) {
-    if (!remoteIndex.has(p)) deleted.push(p)
+  for (const [p, l] of localIndex.entries()) {
+    if (!remoteIndex.has(p)) deleted.push({ path: p, hash: l.hash })
   }
 
-  added.sort()
   modified.sort((a, b) => a.path.localeCompare(b.path))
-  deleted.sort()
-  return { added, modified, deleted }
+  const paired = matchRenames(added, renames ? deleted : [])
+  return {
+    added: paired.added,
+    modified,
+    deleted: renames ? paired.deleted : deleted.map(d => d.path).sort(),
+    renamed: paired.renamed,
+  }
 }
 
 async function cmdProjects({ baseUrl, activeOnly, debug, json, authOpts }) {
@@ -1148,42 +1901,177 @@ async function cmdProjectDelete({ baseUrl, projectId, json, authOpts }) {
   }
 }
 
-async function cmdPull({ baseUrl, projectId, dir, mongoContainer, authOpts }) {
-  const normalizedBaseUrl = normalizeBaseUrl(baseUrl)
-  const absDir = path.resolve(dir)
-  await ensureEmptyDirectory(absDir)
-
-  const debug = Boolean(authOpts?.debug)
-  const { session, me } = await ensureAuthenticated(normalizedBaseUrl, authOpts, {
-    requireUserInfo: true,
-  })
+const PROJECT_ACTIONS = {
+  archive: { run: archiveProject, verb: 'archive', done: 'Archived' },
+  unarchive: { run: unarchiveProject, verb: 'unarchive', done: 'Unarchived' },
+  trash: { run: trashProject, verb: 'trash', done: 'Trashed' },
+  untrash: { run: untrashProject, verb: 'untrash', done: 'Untrashed' },
+  delete: { run: deleteProjectPermanently, verb: 'delete', done: 'Deleted' },
+}
+
+async function* bulkItems({ projectIds, stdin, action }) {
+  const parse = (text, where) => {
+    try {
+      return parseBulkLine(text, action)
+    } catch (err) {
+      return { error: `${where}: ${String(err?.message || err)}` }
+    }
+  }
+  for (const id of String(projectIds || '').split(/[\s,]+/)) {
+    const item = parse(id, '--project-ids')
+    if (item) yield item
+  }
+  if (!stdin) return
+  // Items are handed to workers as lines arrive, so a producer piping in
+  // NDJSON sees results stream back before it has finished writing.
+  const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity })
+  let line = 0
+  for await (const text of rl) {
+    line += 1
+    const item = parse(text, `stdin line ${line}`)
+    if (item) yield item
+  }
+}
+
+async function cmdProjectBulk({ baseUrl, action, projectIds, stdin, concurrency, json, authOpts }) {
+  if (action != null && !PROJECT_ACTIONS[action]) {
+    throw new Error(`Unknown --action ${action} (expected ${PROJECT_BULK_ACTIONS.join('|')})`)
+  }
+  if (!String(projectIds || '').trim() && !stdin) {
+    throw new Error('Provide --project-ids <id,id,...> and/or --stdin.')
+  }
+  const normalizedBaseUrl = normalizeBaseUrl(baseUrl)
+  // One login for the whole batch; every worker shares this session.
+  const { session } = await ensureAuthenticated(normalizedBaseUrl, authOpts)
+
+  const startedAt = Date.now()
+  const items = bulkItems({ projectIds, stdin, action })
+  const seen = new Set()
+  let ok = 0
+  let failed = 0
+  let csrfRefresh = null
+
+  const runAction = async item => {
+    const { run } = PROJECT_ACTIONS[item.action]
+    try {
+      await run(normalizedBaseUrl, session, item.projectId)
+    } catch (err) {
+      // A CSRF token can expire during a long batch; refresh once and retry.
+      if (!/HTTP 403\b/.test(String(err?.message))) throw err
+      csrfRefresh ??= refreshCsrfToken(normalizedBaseUrl, session).finally(() => {
+        csrfRefresh = null
+      })
+      await csrfRefresh
+      await run(normalizedBaseUrl, session, item.projectId)
+    }
+  }
+
+  const report = result => {
+    if (result.ok) ok += 1
+    else failed += 1
+    if (json) {
+      process.stdout.write(JSON.stringify(result) + '\n')
+    } else if (result.ok) {
+      process.stdout.write(`${PROJECT_ACTIONS[result.action].done} ${result.projectId}\n`)
+    } else {
+      const what = result.projectId
+        ? `${PROJECT_ACTIONS[result.action].verb} ${result.projectId}`
+        : 'parse input'
+      process.stderr.write(`Failed to ${what}: ${result.error}\n`)
+    }
+  }
+
+  const worker = async () => {
+    while (true) {
+      const { value: item, done } = await items.next()
+      if (done) return
+      if (item.error) {
+        report({ ok: false, error: item.error })
+        continue
+      }
+      const key = `${item.action}:${item.projectId}`
+      if (seen.has(key)) continue
+      seen.add(key)
+      const itemStartedAt = Date.now()
+      try {
+        await tracer.run(
+          'project-action',
+          { action: item.action, projectId: item.projectId },
+          () => runAction(item),
+          { concurrent: true }
+        )
+        report({ ok: true, ...item, ms: Date.now() - itemStartedAt })
+      } catch (err) {
+        report({
+          ok: false,
+          ...item,
+          ms: Date.now() - itemStartedAt,
+          error: String(err?.message || err),
+        })
+      }
+    }
+  }
+
+  const poolSize = Math.max(1, Number.parseInt(String(concurrency || ''), 10) || 4)
+  await Promise.all(Array.from({ length: poolSize }, worker))
+
+  if (json) {
+    process.stdout.write(
+      JSON.stringify({ done: true, ok, failed, ms: Date.now() - startedAt }) + '\n'
+    )
+  } else {
+    process.stdout.write(`Done. ok=${ok} failed=${failed}\n`)
+  }
+  if (failed > 0) process.exitCode = 1
+}
+
+async function cmdPull({ baseUrl, projectId, dir, mongoContainer, events, authOpts }) {
+  const normalizedBaseUrl = normalizeBaseUrl(baseUrl)
+  const absDir = path.resolve(dir)
+  await ensureEmptyDirectory(absDir)
+
+  const debug = Boolean(authOpts?.debug)
+  const { session } = await ensureAuthenticated(normalizedBaseUrl, authOpts)
 
   const zipName = '.ol-sync.download.zip'
   const zipPath = path.join(absDir, zipName)
-  const { url: downloadUrl } = await downloadProjectZip(normalizedBaseUrl, session, projectId, zipPath)
+  const { url: downloadUrl } = await downloadProjectZip(
+    normalizedBaseUrl,
+    session,
+    projectId,
+    zipPath,
+    {
+      events,
+      op: 'pull',
+      onProgress: events
+        ? ({ bytes, total }) =>
+            writeEvent('pull-progress', { projectId, phase: 'download', bytes, total })
+        : undefined,
+    }
+  )
   debugLog(debug, `downloaded zip via ${downloadUrl}`)
 
+  writeEvent('pull-progress', { projectId, phase: 'unzip' }, { enabled: events })
   await unzipInto(zipPath, absDir)
   const flattened = await maybeFlattenSingleRootFolder(absDir, { keepZipName: zipName })
   if (flattened.flattened) {
     debugLog(debug, `flattened wrapper folder: ${flattened.wrapper}`)
   }
-
-  let rootFolderId
-  try {
-    rootFolderId = await getRootFolderIdViaMongo(mongoContainer, projectId)
-    debugLog(debug, `rootFolderId resolved via mongo: ${rootFolderId}`)
-  } catch (err) {
-    debugLog(debug, `rootFolderId mongo lookup failed (${String(err?.message || err)})`)
-    const creds = await detectWebApiCredentials(DEFAULT_CONTAINER)
-    rootFolderId = await getRootFolderIdViaPrivateJoin(
-      normalizedBaseUrl,
-      projectId,
-      me.id,
-      creds
-    )
-    debugLog(debug, `rootFolderId resolved via private join: ${rootFolderId}`)
+  const pulled = []
+  for await (const absPath of walkFiles(absDir, { matcher: await loadIgnoreMatcher(absDir) })) {
+    const relPosix = toPosix(path.relative(absDir, absPath))
+    if (relPosix !== zipName) pulled.push(relPosix)
   }
+  syncedPaths(normalizedBaseUrl, projectId).add(pulled)
+
+  const { rootFolderId } = await resolveRootFolderId({
+    baseUrl: normalizedBaseUrl,
+    projectId,
+    session,
+    mongoContainer,
+    container: DEFAULT_CONTAINER,
+    debug,
+  })
 
   const cfg = {
     baseUrl: normalizedBaseUrl,
@@ -1198,11 +2086,334 @@ async function cmdPull({ baseUrl, projectId, dir, mongoContainer, authOpts }) {
   process.stdout.write(`Pulled ${projectId} -> ${absDir}\nWrote ${writtenCfgPath}\n`)
 }
 
-async function cmdFetch({ baseUrl, projectId, dir, debug, json, authOpts }) {
+function mirrorRootDir(baseUrl) {
+  let host = ''
+  try {
+    host = new URL(baseUrl).host
+  } catch {
+    host = baseUrl
+  }
+  return path.join(DEFAULT_BACKUP_ROOT, safePathComponent(host))
+}
+
+// Snapshot ids are ISO timestamps (newBatchId), so they sort chronologically.
+async function pruneMirrorSnapshots(projectMirrorDir, keep) {
+  const entries = await readdir(projectMirrorDir, { withFileTypes: true }).catch(() => [])
+  const snapshots = entries
+    .filter(e => e.isDirectory() && !e.name.endsWith('.partial'))
+    .map(e => e.name)
+    .sort()
+  const stale = [
+    ...snapshots.slice(0, Math.max(0, snapshots.length - keep)),
+    ...entries.filter(e => e.isDirectory() && e.name.endsWith('.partial')).map(e => e.name),
+  ]
+  for (const name of stale) {
+    await rm(path.join(projectMirrorDir, name), { recursive: true, force: true })
+  }
+  return stale.length
+}
+
+async function mirrorProject({ baseUrl, session, project, mirrorRoot, objectsDir, keep, events }) {
+  const projectId = String(project.id)
+  const projectMirrorDir = path.join(mirrorRoot, projectId, 'mirror')
+  const snapshot = newBatchId()
+  const snapshotDir = path.join(projectMirrorDir, snapshot)
+  const partialDir = `${snapshotDir}.partial`
+  await mkdir(partialDir, { recursive: true })
+
+  const zipName = '.ol-sync.download.zip'
+  const zipPath = path.join(partialDir, zipName)
+  const { bytes: zipBytes } = await downloadProjectZip(baseUrl, session, projectId, zipPath, {
+    events,
+    op: 'mirror',
+  })
+  await unzipInto(zipPath, partialDir)
+  await rm(zipPath, { force: true })
+  await maybeFlattenSingleRootFolder(partialDir)
+
+  let files = 0
+  let bytes = 0
+  let dedupedBytes = 0
+  await tracer.run('mirror-store', { projectId }, async span => {
+    for await (const absPath of walkFiles(partialDir)) {
+      const stored = await storeDeduplicated(objectsDir, absPath)
+      files += 1
+      bytes += stored.size
+      if (stored.deduplicated) dedupedBytes += stored.size
+    }
+    span.set({ files, bytes, dedupedBytes })
+  })
+  // Only complete snapshots get their final name; a run cut short leaves a
+  // .partial directory that the next run removes.
+  await rename(partialDir, snapshotDir)
+  await pruneMirrorSnapshots(projectMirrorDir, keep)
+  return { snapshot, snapshotDir, zipBytes, files, bytes, dedupedBytes }
+}
+
+async function cmdMirror({ baseUrl, dir, concurrency, keep, json, authOpts }) {
+  const normalizedBaseUrl = normalizeBaseUrl(baseUrl)
+  const mirrorRoot = dir ? path.resolve(dir) : mirrorRootDir(normalizedBaseUrl)
+  const objectsDir = path.join(mirrorRoot, MIRROR_OBJECTS_DIRNAME)
+  const keepSnapshots = Math.max(1, Number.parseInt(String(keep || ''), 10) || 3)
+  await mkdir(objectsDir, { recursive: true })
+
+  const startedAt = Date.now()
+  const { session } = await ensureAuthenticated(normalizedBaseUrl, authOpts)
+  const projects = await listProjects(normalizedBaseUrl, session, {
+    activeOnly: false,
+    debug: Boolean(authOpts?.debug),
+  })
+  const state = await loadMirrorState(mirrorRoot)
+  const { sync, skip, removed } = planMirror(projects, state.projects)
+
+  const summary = {
+    projects: projects.length,
+    synced: 0,
+    skipped: skip.length,
+    failed: 0,
+    removed: removed.length,
+    transferredBytes: 0,
+    // What re-downloading the unchanged projects would have cost (their last zip size).
+    skippedBytes: skip.reduce((sum, p) => sum + (state.projects[p.id]?.zipBytes || 0), 0),
+    storedBytes: 0,
+    dedupedBytes: 0,
+  }
+  for (const id of removed) {
+    // Projects gone from the instance keep their snapshots; they are only flagged.
+    state.projects[id] = { ...state.projects[id], removedAt: state.projects[id].removedAt || new Date().toISOString() }
+  }
+
+  let saving = Promise.resolve()
+  const saveState = () => {
+    saving = saving.then(() => saveMirrorState(mirrorRoot, state))
+    return saving
+  }
+
+  const report = result => {
+    if (json) {
+      process.stdout.write(JSON.stringify(result) + '\n')
+    } else if (result.ok) {
+      process.stdout.write(
+        `Mirrored ${result.projectId} (${result.name}) files=${result.files} downloaded=${result.zipBytes}B new=${result.bytes - result.dedupedBytes}B\n`
+      )
+    } else {
+      process.stderr.write(`Failed to mirror ${result.projectId} (${result.name}): ${result.error}\n`)
+    }
+  }
+
+  const queue = [...sync]
+  const worker = async () => {
+    while (queue.length) {
+      const { project, reason } = queue.shift()
+      const itemStartedAt = Date.now()
+      const base = { projectId: project.id, name: project.name, reason }
+      try {
+        const result = await tracer.run(
+          'mirror-project',
+          { projectId: project.id, reason },
+          () =>
+            mirrorProject({
+              baseUrl: normalizedBaseUrl,
+              session,
+              project,
+              mirrorRoot,
+              objectsDir,
+              keep: keepSnapshots,
+              events: eventsEnabled(authOpts),
+            }),
+          { concurrent: true }
+        )
+        summary.synced += 1
+        summary.transferredBytes += result.zipBytes
+        summary.storedBytes += result.bytes - result.dedupedBytes
+        summary.dedupedBytes += result.dedupedBytes
+        state.projects[project.id] = {
+          name: project.name,
+          lastUpdated: project.lastUpdated ? String(project.lastUpdated) : '',
+          snapshot: result.snapshot,
+          files: result.files,
+          bytes: result.bytes,
+          zipBytes: result.zipBytes,
+          syncedAt: new Date().toISOString(),
+        }
+        await saveState()
+        report({
+          ok: true,
+          ...base,
+          snapshot: result.snapshotDir,
+          files: result.files,
+          bytes: result.bytes,
+          zipBytes: result.zipBytes,
+          dedupedBytes: result.dedupedBytes,
+          ms: Date.now() - itemStartedAt,
+        })
+      } catch (err) {
+        summary.failed += 1
+        report({ ok: false, ...base, ms: Date.now() - itemStartedAt, error: String(err?.message || err) })
+      }
+    }
+  }
+
+  const poolSize = Math.max(1, Number.parseInt(String(concurrency || ''), 10) || 3)
+  await Promise.all(Array.from({ length: poolSize }, worker))
+  const pruned = await pruneObjectStore(objectsDir)
+
+  summary.ms = Date.now() - startedAt
+  summary.prunedObjects = pruned.removed
+  state.lastRun = { finishedAt: new Date().toISOString(), baseUrl: normalizedBaseUrl, ...summary }
+  await saveState()
+
+  if (json) {
+    process.stdout.write(JSON.stringify({ done: true, mirrorRoot, ...summary }) + '\n')
+  } else {
+    process.stdout.write(
+      `Done. synced=${summary.synced} skipped=${summary.skipped} failed=${summary.failed} ` +
+        `transferred=${summary.transferredBytes}B skipped=${summary.skippedBytes}B ` +
+        `stored=${summary.storedBytes}B deduplicated=${summary.dedupedBytes}B -> ${mirrorRoot}\n`
+    )
+  }
+  if (summary.failed) process.exitCode = 1
+}
+
+async function* rootFolderDirs({ dir, stdin }) {
+  if (dir) yield dir
+  if (!stdin) return
+  const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity })
+  for await (const line of rl) {
+    if (line.trim()) yield line.trim()
+  }
+}
+
+/**
+ * Resolve and cache rootFolderIds for many linked folders at once: cache
+ * hits first, then one Mongo query per container for everything else, then
+ * the private join API per project for what Mongo could not answer.
+ */
+async function cmdRootFolders({ baseUrl, dir, stdin, refresh, json, authOpts }) {
+  if (!dir && !stdin) throw new Error('Provide --dir <path> and/or --stdin.')
+  const startedAt = Date.now()
+  const debug = Boolean(authOpts?.debug)
+  const cache = refresh ? { entries: {} } : await loadRootFolderCache()
+  const results = []
+  const pending = []
+  for await (const entryDir of rootFolderDirs({ dir, stdin })) {
+    const absDir = path.resolve(entryDir)
+    const { cfg } = await loadConfig(absDir)
+    if (!cfg?.projectId) {
+      results.push({ dir: absDir, error: `no ${CONFIG_FILENAME} with a projectId` })
+      continue
+    }
+    if (!isProjectId(cfg.projectId)) {
+      results.push({ dir: absDir, projectId: String(cfg.projectId), error: `Not a project id: ${cfg.projectId}` })
+      continue
+    }
+    const item = {
+      dir: absDir,
+      baseUrl: normalizeBaseUrl(cfg.baseUrl || baseUrl),
+      projectId: String(cfg.projectId),
+      mongoContainer: cfg.mongoContainer || DEFAULT_MONGO_CONTAINER,
+      container: cfg.container || DEFAULT_CONTAINER,
+    }
+    const cached = cache.entries[rootFolderCacheKey(item.baseUrl, item.projectId)]
+    if (cfg.rootFolderId) results.push({ ...item, rootFolderId: String(cfg.rootFolderId), via: 'config' })
+    else if (cached?.rootFolderId) results.push({ ...item, rootFolderId: String(cached.rootFolderId), via: 'cache' })
+    else pending.push(item)
+  }
+
+  const found = {}
+  const byContainer = new Map()
+  for (const item of pending) {
+    if (!byContainer.has(item.mongoContainer)) byContainer.set(item.mongoContainer, [])
+    byContainer.get(item.mongoContainer).push(item)
+  }
+  const unresolved = []
+  for (const [container, items] of byContainer) {
+    let ids = new Map()
+    try {
+      ids = await getRootFolderIdsViaMongo(container, items.map(item => item.projectId.toLowerCase()))
+    } catch (err) {
+      debugLog(debug, String(err?.message || err))
+    }
+    for (const item of items) {
+      const rootFolderId = ids.get(item.projectId.toLowerCase())
+      if (!rootFolderId) {
+        unresolved.push(item)
+        continue
+      }
+      results.push({ ...item, rootFolderId, via: 'mongo' })
+      found[rootFolderCacheKey(item.baseUrl, item.projectId)] = {
+        rootFolderId,
+        via: 'mongo',
+        resolvedAt: new Date().toISOString(),
+      }
+    }
+  }
+  if (Object.keys(found).length > 0) await updateRootFolderCache(found)
+
+  // Projects Mongo could not answer need a session per instance and the
+  // container's WEB_API credentials; both are looked up once.
+  const sessions = new Map()
+  const credentials = new Map()
+  const joined = {}
+  for (const item of unresolved) {
+    try {
+      if (!sessions.has(item.baseUrl)) {
+        sessions.set(item.baseUrl, ensureAuthenticated(item.baseUrl, authOpts, { requireUserInfo: true }))
+      }
+      const { me } = await sessions.get(item.baseUrl)
+      if (!credentials.has(item.container)) {
+        credentials.set(item.container, detectWebApiCredentials(item.container))
+      }
+      const creds = await credentials.get(item.container)
+      const rootFolderId = await getRootFolderIdViaPrivateJoin(item.baseUrl, item.projectId, me.id, creds)
+      results.push({ ...item, rootFolderId, via: 'join' })
+      joined[rootFolderCacheKey(item.baseUrl, item.projectId)] = {
+        rootFolderId,
+        via: 'join',
+        resolvedAt: new Date().toISOString(),
+      }
+    } catch (err) {
+      results.push({ ...item, error: String(err?.message || err) })
+    }
+  }
+  if (Object.keys(joined).length > 0) await updateRootFolderCache(joined)
+
+  let failed = 0
+  for (const { baseUrl: _baseUrl, mongoContainer: _mongo, container: _container, ...result } of results) {
+    if (result.error) failed += 1
+    if (json) process.stdout.write(JSON.stringify(result) + '\n')
+    else if (result.error) process.stdout.write(`${result.dir}: ${result.error}\n`)
+    else process.stdout.write(`${result.dir}: ${result.rootFolderId} (${result.via})\n`)
+  }
+  const summary = { resolved: results.length - failed, failed, ms: Date.now() - startedAt }
+  if (json) process.stdout.write(JSON.stringify({ done: true, ...summary }) + '\n')
+  else process.stdout.write(`Done. resolved=${summary.resolved} failed=${summary.failed}\n`)
+  if (failed > 0) process.exitCode = 1
+}
+
+async function cmdFetch({
+  baseUrl,
+  projectId,
+  dir,
+  debug,
+  json,
+  delta,
+  container,
+  mongoContainer,
+  concurrency,
+  digest = 'sha256',
+  hashThreads,
+  authOpts,
+}) {
+  if (!INDEX_DIGESTS.includes(digest)) {
+    throw new Error(`Invalid --digest: ${digest} (expected ${INDEX_DIGESTS.join(' or ')})`)
+  }
   const absDir = path.resolve(dir)
   const { cfg } = await loadConfig(absDir)
   const effectiveBaseUrl = normalizeBaseUrl(cfg?.baseUrl || baseUrl)
   const effectiveProjectId = cfg?.projectId || projectId
+  const effectiveContainer = cfg?.container || container
+  const effectiveMongoContainer = cfg?.mongoContainer || mongoContainer
   const skipEmpty = Boolean(authOpts?.['skip-empty'])
 
   if (!effectiveProjectId) {
@@ -1218,30 +2429,95 @@ async function cmdFetch({ baseUrl, projectId, dir, debug, json, authOpts }) {
   const batchDir = path.join(projectInboxDir, batchId)
   await mkdir(batchDir, { recursive: true })
 
-  const zipName = '.ol-sync.remote.zip'
-  const zipPath = path.join(batchDir, zipName)
-  const { url: downloadUrl } = await downloadProjectZip(
-    effectiveBaseUrl,
-    session,
-    effectiveProjectId,
-    zipPath
-  )
-  debugLog(debug, `downloaded zip via ${downloadUrl}`)
+  // The local ignore rules apply to both sides so build outputs never show up as changes.
+  const matcher = await loadIgnoreMatcher(absDir)
+  const pool = new HashPool({ size: hashThreads ?? defaultHashThreads() })
+  let localIndex = null
+  let remoteIndex = null
+  let transfer = null
 
-  await unzipInto(zipPath, batchDir)
-  const flattened = await maybeFlattenSingleRootFolder(batchDir, { keepZipName: zipName })
-  if (flattened.flattened) {
-    debugLog(debug, `flattened wrapper folder: ${flattened.wrapper}`)
+  if (delta) {
+    const tree = await readRemoteTree({
+      baseUrl: effectiveBaseUrl,
+      session,
+      projectId: effectiveProjectId,
+      mongoContainer: effectiveMongoContainer,
+      container: effectiveContainer,
+      debug,
+    })
+    if (tree) {
+      try {
+        // Compared against the SHA-256 hashes kept in the remote index, so never crc32.
+        localIndex = await buildIndex(absDir, { matcher, pool })
+        ;({ remoteIndex, transfer } = await fetchDelta({
+          baseUrl: effectiveBaseUrl,
+          session,
+          projectId: effectiveProjectId,
+          tree,
+          localIndex,
+          localDir: absDir,
+          matcher,
+          projectInboxDir,
+          batchDir,
+          concurrency,
+        }))
+        debugLog(
+          debug,
+          `delta fetch: downloaded=${transfer.files} reused=${transfer.reused} bytes=${transfer.bytes}`
+        )
+      } catch (err) {
+        debugLog(debug, `delta fetch failed, falling back to zip (${String(err?.message || err)})`)
+        await rm(batchDir, { recursive: true, force: true })
+        await mkdir(batchDir, { recursive: true })
+      }
+    } else {
+      debugLog(debug, 'delta fetch: project tree unavailable, falling back to zip')
+    }
   }
 
-  const remoteIndex = await buildIndex(batchDir)
-  const localIndex = await buildIndex(absDir)
-  const changes = diffIndexes(localIndex, remoteIndex)
+  if (!remoteIndex) {
+    const zipName = '.ol-sync.remote.zip'
+    const zipPath = path.join(batchDir, zipName)
+    const { url: downloadUrl, bytes } = await downloadProjectZip(
+      effectiveBaseUrl,
+      session,
+      effectiveProjectId,
+      zipPath,
+      { events: eventsEnabled(authOpts), op: 'fetch' }
+    )
+    debugLog(debug, `downloaded zip via ${downloadUrl}`)
+
+    await unzipInto(zipPath, batchDir)
+    const flattened = await maybeFlattenSingleRootFolder(batchDir, { keepZipName: zipName })
+    if (flattened.flattened) {
+      debugLog(debug, `flattened wrapper folder: ${flattened.wrapper}`)
+    }
+    remoteIndex = await buildIndex(batchDir, { matcher, pool, digest })
+    transfer = { mode: 'zip', bytes, files: remoteIndex.size }
+    if (localIndex && digest !== 'sha256') localIndex = null
+  }
+  localIndex ??= await buildIndex(absDir, { matcher, pool, digest })
+  await pool.close()
+  const changes = await tracer.run('diff', {}, async span => {
+    const result = diffIndexes(localIndex, remoteIndex, { renames: digest === 'sha256' })
+    span.set({
+      added: result.added.length,
+      modified: result.modified.length,
+      deleted: result.deleted.length,
+      renamed: result.renamed.length,
+    })
+    return result
+  })
+  // Paths identical on both sides are in step here, even if never pulled or pushed.
+  syncedPaths(effectiveBaseUrl, effectiveProjectId).add(
+    [...remoteIndex].filter(([relPosix, r]) => localIndex.get(relPosix)?.hash === r.hash).map(([relPosix]) => relPosix)
+  )
 
   const isEmpty =
     changes.added.length === 0 &&
     changes.modified.length === 0 &&
-    changes.deleted.length === 0
+    changes.deleted.length === 0 &&
+    changes.renamed.length === 0
 
   const manifest = {
     version: 1,
@@ -1252,6 +2528,7 @@ async function cmdFetch({ baseUrl, projectId, dir, debug, json, authOpts }) {
     inboxDir: skipEmpty && isEmpty ? null : batchDir,
     createdAt: new Date().toISOString(),
     changes,
+    transfer,
     saved: !(skipEmpty && isEmpty),
   }
 
@@ -1276,7 +2553,7 @@ async function cmdFetch({ baseUrl, projectId, dir, debug, json, authOpts }) {
   }
 
   process.stdout.write(
-    `Fetched remote snapshot into ${batchDir}\nadded=${changes.added.length} modified=${changes.modified.length} deleted=${changes.deleted.length}\n`
+    `Fetched remote snapshot into ${batchDir}\nadded=${changes.added.length} modified=${changes.modified.length} deleted=${changes.deleted.length} renamed=${changes.renamed.length}\n`
   )
   process.stdout.write(`Manifest: ${manifestPath}\n`)
 }
@@ -1311,12 +2588,44 @@ async function cmdApply({ baseUrl, projectId, dir, batch, authOpts }) {
   const backupRoot = path.join(backupProjectDir(effectiveBaseUrl, effectiveProjectId), batchId)
   await mkdir(backupRoot, { recursive: true })
 
+  // Renames move the local file, so its content is neither copied nor lost.
+  // One whose source changed since the fetch, or whose target now exists,
+  // is copied from the batch like an addition.
+  const synced = syncedPaths(effectiveBaseUrl, effectiveProjectId)
+  let renamed = 0
+  const unrenamed = []
+  const renameSpan = tracer.start('apply-rename', { files: changes.renamed?.length || 0 })
+  for (const { from, to, hash } of changes.renamed || []) {
+    const src = path.join(absDir, fromPosix(from))
+    const dst = path.join(absDir, fromPosix(to))
+    const taken = await stat(dst).then(() => true, () => false)
+    const movable = !taken && (await sha256File(src).then(h => h === hash, () => false))
+    if (!movable) {
+      unrenamed.push(to)
+      continue
+    }
+    await mkdir(path.dirname(dst), { recursive: true })
+    await rename(src, dst)
+    // Leave no empty folders behind where a whole folder was moved.
+    let parent = path.dirname(src)
+    while (parent.startsWith(absDir + path.sep) && (await rmdir(parent).then(() => true, () => false))) {
+      parent = path.dirname(parent)
+    }
+    synced.remove([from])
+    synced.add([to])
+    renamed++
+  }
+  renameSpan.end({ renamed })
+
   const files = [
     ...changes.added.map(p => ({ path: p, kind: 'add' })),
     ...changes.modified.map(e => ({ path: e.path, kind: 'modify' })),
+    ...unrenamed.map(p => ({ path: p, kind: 'add' })),
   ]
 
   let applied = 0
+  const backedUp = {}
+  const applySpan = tracer.start('apply-copy', { files: files.length })
   for (const file of files) {
     const rel = fromPosix(file.path)
     const src = path.join(batchDir, rel)
@@ -1327,7 +2636,20 @@ async function cmdApply({ baseUrl, projectId, dir, batch, authOpts }) {
       if (st.isFile()) {
         const backupPath = path.join(backupRoot, rel)
         await mkdir(path.dirname(backupPath), { recursive: true })
-        await copyFile(dst, backupPath)
+        // COPYFILE_EXCL keeps the pre-apply original when an interrupted apply is re-run.
+        const fresh = await copyFile(dst, backupPath, fsConstants.COPYFILE_EXCL).then(
+          () => true,
+          err => {
+            if (err?.code !== 'EEXIST') throw err
+            return false
+          }
+        )
+        const kept = fresh ? st : await stat(backupPath)
+        backedUp[file.path] = {
+          hash: await sha256File(backupPath),
+          size: kept.size,
+          mtimeMs: Math.round(kept.mtimeMs),
+        }
       }
     } catch {
       // dst doesn't exist; nothing to backup
@@ -1335,12 +2657,21 @@ async function cmdApply({ baseUrl, projectId, dir, batch, authOpts }) {
 
     await mkdir(path.dirname(dst), { recursive: true })
     await copyFile(src, dst)
+    synced.add([file.path])
     applied++
   }
+  applySpan.end({ applied })
+  await synced.flush()
+  await writeBackupManifest(
+    backupRoot,
+    { source: 'apply', baseUrl: effectiveBaseUrl, projectId: effectiveProjectId, batchId },
+    backedUp
+  )
 
   process.stdout.write(
     `Applied ${applied} file(s) (last-write-wins).\nBackup: ${backupRoot}\n`
   )
+  if (renamed) process.stdout.write(`Renamed ${renamed} file(s) locally.\n`)
   if (changes.deleted?.length) {
     process.stdout.write(
       `Note: ${changes.deleted.length} file(s) missing on remote were NOT deleted locally.\n`
@@ -1365,25 +2696,16 @@ async function cmdLink({
     )
   }
   const debug = Boolean(authOpts?.debug)
-  const { session, me } = await ensureAuthenticated(normalizedBaseUrl, authOpts, {
-    requireUserInfo: true,
-  })
+  const { session } = await ensureAuthenticated(normalizedBaseUrl, authOpts)
 
-  let rootFolderId
-  try {
-    rootFolderId = await getRootFolderIdViaMongo(mongoContainer, projectId)
-    debugLog(debug, `rootFolderId resolved via mongo: ${rootFolderId}`)
-  } catch (err) {
-    debugLog(debug, `rootFolderId mongo lookup failed (${String(err?.message || err)})`)
-    const creds = await detectWebApiCredentials(container)
-    rootFolderId = await getRootFolderIdViaPrivateJoin(
-      normalizedBaseUrl,
-      projectId,
-      me.id,
-      creds
-    )
-    debugLog(debug, `rootFolderId resolved via private join: ${rootFolderId}`)
-  }
+  const { rootFolderId } = await resolveRootFolderId({
+    baseUrl: normalizedBaseUrl,
+    projectId,
+    session,
+    mongoContainer,
+    container,
+    debug,
+  })
   const cfg = {
     baseUrl: normalizedBaseUrl,
     projectId,
@@ -1447,6 +2769,7 @@ async function cmdPush({
   container,
   mongoContainer,
   concurrency,
+  largeFileThreshold,
   authOpts,
 }) {
   const absDir = path.resolve(dir)
@@ -1464,70 +2787,428 @@ async function cmdPush({
   }
 
   const debug = Boolean(authOpts?.debug)
-  const { session, me } = await ensureAuthenticated(effectiveBaseUrl, authOpts, {
-    requireUserInfo: !effectiveRootFolderId,
-  })
+  const { session } = await ensureAuthenticated(effectiveBaseUrl, authOpts)
 
-  let rootFolderId = effectiveRootFolderId
-  if (!rootFolderId) {
-    try {
-      rootFolderId = await getRootFolderIdViaMongo(
-        effectiveMongoContainer,
-        effectiveProjectId
-      )
-      debugLog(debug, `rootFolderId resolved via mongo: ${rootFolderId}`)
-    } catch (err) {
-      debugLog(debug, `rootFolderId mongo lookup failed (${String(err?.message || err)})`)
-      const creds = await detectWebApiCredentials(effectiveContainer)
-      rootFolderId = await getRootFolderIdViaPrivateJoin(
-        effectiveBaseUrl,
-        effectiveProjectId,
-        me.id,
-        creds
-      )
-      debugLog(debug, `rootFolderId resolved via private join: ${rootFolderId}`)
-    }
+  const resolveOptions = {
+    baseUrl: effectiveBaseUrl,
+    projectId: effectiveProjectId,
+    session,
+    mongoContainer: effectiveMongoContainer,
+    container: effectiveContainer,
+    debug,
   }
+  const rootFolder = effectiveRootFolderId
+    ? { rootFolderId: effectiveRootFolderId, via: 'config' }
+    : await resolveRootFolderId(resolveOptions)
+  const upload = rootFolderUploader(rootFolder, () =>
+    resolveRootFolderId({ ...resolveOptions, fresh: true })
+  )
+
+  const outbox = new Outbox(inboxProjectDir(effectiveBaseUrl, effectiveProjectId), absDir)
+  const earlier = dryRun ? [] : await outbox.pending()
 
+  const matcher = await loadIgnoreMatcher(absDir)
   const tasks = []
-  for await (const absPath of walkFiles(absDir)) {
+  const walkSpan = tracer.start('walk', { dir: absDir })
+  for await (const absPath of walkFiles(absDir, { matcher })) {
     tasks.push({
       absPath,
       relPath: path.relative(absDir, absPath),
     })
   }
+  walkSpan.end({ files: tasks.length })
+
+  // The project tree is only read when a rename is possible: some path this
+  // machine had is gone locally and some walked path is new.
+  const had = await pathsHadHere(effectiveBaseUrl, effectiveProjectId)
+  const walkedPaths = new Set(tasks.map(task => toPosix(task.relPath)))
+  const renameCandidates =
+    tasks.some(task => !had.has(toPosix(task.relPath))) &&
+    [...had].some(relPosix => !walkedPaths.has(relPosix) && !shouldIgnore(relPosix, false, matcher))
+  const rootFolderTree = renameCandidates ? await readRemoteRootFolder(resolveOptions) : null
+  const { moved, stuck } = rootFolderTree
+    ? await pushRenames({
+        baseUrl: effectiveBaseUrl,
+        session,
+        projectId: effectiveProjectId,
+        rootFolder: rootFolderTree,
+        tasks,
+        had,
+        matcher,
+        dryRun,
+      })
+    : { moved: new Set(), stuck: new Set() }
+  const uploads = tasks.filter(task => !moved.has(toPosix(task.relPath)) && !stuck.has(toPosix(task.relPath)))
 
   const poolSize = Math.max(1, Number.parseInt(String(concurrency || ''), 10) || 4)
   let ok = 0
-  let failed = 0
+  let failed = stuck.size
   let nextIndex = 0
+  const delivered = [...moved]
+  const queued = []
 
   const worker = async () => {
     while (true) {
       const idx = nextIndex
       nextIndex += 1
-      if (idx >= tasks.length) return
-      const task = tasks[idx]
+      if (idx >= uploads.length) return
+      const task = uploads[idx]
       try {
-        await uploadOne({
+        await upload({
           baseUrl: effectiveBaseUrl,
           session,
           projectId: effectiveProjectId,
-          rootFolderId,
           absPath: task.absPath,
           relPath: task.relPath,
           dryRun,
+          largeFileThreshold,
+        })
+        ok += 1
+        delivered.push(toPosix(task.relPath))
+      } catch (err) {
+        failed += 1
+        process.stderr.write(String(err.message || err) + '\n')
+        if (isTransientUploadError(err)) queued.push([toPosix(task.relPath), err])
+      }
+    }
+  }
+
+  const uploadsSpan = tracer.start('uploads', { files: uploads.length, concurrency: poolSize })
+  await Promise.all(Array.from({ length: Math.min(poolSize, uploads.length || 1) }, worker))
+  uploadsSpan.end({ ok, failed })
+  let summary = `Done. uploaded=${ok} failed=${failed}`
+  if (moved.size) summary += ` moved=${moved.size}`
+  if (!dryRun) {
+    // Queued paths that were deleted or are now ignored have nothing left to deliver.
+    const gone = earlier.filter(relPosix => !walkedPaths.has(relPosix))
+    const depth = await outbox.update({ queued, done: [...delivered, ...gone] })
+    if (depth) summary += ` queued=${depth}`
+  }
+  process.stdout.write(summary + '\n')
+}
+
+// Paths the last fetch saw on the server or that this machine uploaded.
+// Server paths this machine has had: synced at some point, or uploaded since the last origin check.
+async function pathsHadHere(baseUrl, projectId) {
+  const [synced, recorded] = await Promise.all([
+    syncedPaths(baseUrl, projectId).load(),
+    outgoingLedger(baseUrl, projectId).load(),
+  ])
+  return new Set([...synced, ...Object.keys(recorded)])
+}
+
+/**
+ * Carry out local renames and moves on the server before a push uploads
+ * anything, so the content is not sent again. A walked path missing from
+ * the project tree is matched with a tree entry whose path this machine had
+ * (see SyncedPaths) and is gone locally: binary files by git blob hash
+ * against the file ref, docs by SHA-256 against the remote index or the
+ * outgoing ledger. Paths added on the web and never applied here are left
+ * alone. Matched entities are moved (creating folders as needed) and
+ * renamed. Returns { moved, stuck }: the walked paths that need no upload,
+ * and those whose entity was moved but could be neither renamed nor moved
+ * back, which must not be uploaded next to it. Any other failure falls
+ * back to uploading.
+ */
+async function pushRenames({ baseUrl, session, projectId, rootFolder, tasks, had, matcher, dryRun }) {
+  const tree = flattenProjectTree(rootFolder)
+  const walked = new Map(tasks.map(task => [toPosix(task.relPath), task.absPath]))
+  const localOnly = [...walked.keys()].filter(relPosix => !tree.has(relPosix))
+  const gone = [...tree].filter(
+    ([relPosix]) => had.has(relPosix) && !walked.has(relPosix) && !shouldIgnore(relPosix, false, matcher)
+  )
+  const moved = new Set()
+  const stuck = new Set()
+  if (localOnly.length === 0 || gone.length === 0) return { moved, stuck }
+
+  const projectInboxDir = inboxProjectDir(baseUrl, projectId)
+  const ledger = outgoingLedger(baseUrl, projectId)
+  const synced = syncedPaths(baseUrl, projectId)
+  const [previous, recorded] = await Promise.all([loadRemoteIndex(projectInboxDir), ledger.load()])
+  const digests = new Map()
+  for (const relPosix of localOnly) digests.set(relPosix, await contentDigests(walked.get(relPosix)))
+
+  const files = matchRenames(
+    localOnly.map(relPosix => ({ path: relPosix, hash: digests.get(relPosix).blob })),
+    gone.filter(([, entry]) => entry.kind === 'file').map(([relPosix, entry]) => ({ path: relPosix, hash: entry.fileHash }))
+  )
+  const docHash = (relPosix, entry) => {
+    const prev = previous[relPosix]
+    return prev?.kind === 'doc' && prev.id === entry.id && prev.hash ? prev.hash : recorded[relPosix]?.hash
+  }
+  const docs = matchRenames(
+    files.added.map(relPosix => ({ path: relPosix, hash: digests.get(relPosix).hash })),
+    gone.filter(([, entry]) => entry.kind === 'doc').map(([relPosix, entry]) => ({ path: relPosix, hash: docHash(relPosix, entry) }))
+  )
+
+  const folders = flattenProjectFolders(rootFolder)
+  const folderId = async dir => {
+    if (folders.has(dir)) return folders.get(dir)
+    const parent = path.posix.dirname(dir)
+    const id = await createFolder(
+      baseUrl,
+      session,
+      projectId,
+      await folderId(parent === '.' ? '' : parent),
+      path.posix.basename(dir)
+    )
+    folders.set(dir, id)
+    return id
+  }
+  for (const { from, to } of [...files.renamed, ...docs.renamed]) {
+    if (dryRun) {
+      process.stdout.write(`[dry-run] move ${from} -> ${to}\n`)
+      moved.add(to)
+      continue
+    }
+    const entity = tree.get(from)
+    const fromDir = path.posix.dirname(from)
+    const toDir = path.posix.dirname(to)
+    let relocated = false
+    try {
+      await tracer.run('move', { from, to, kind: entity.kind }, async () => {
+        if (toDir !== fromDir) {
+          await moveEntity(baseUrl, session, projectId, entity, await folderId(toDir === '.' ? '' : toDir))
+          relocated = true
+        }
+        const name = path.posix.basename(to)
+        if (name !== path.posix.basename(from)) await renameEntity(baseUrl, session, projectId, entity, name)
+      })
+      ledger.record(to, digests.get(to))
+      synced.remove([from])
+      synced.add([to])
+      moved.add(to)
+    } catch (err) {
+      // Uploading next to a half-moved entity would leave the content twice.
+      const restored =
+        !relocated ||
+        (await moveEntity(baseUrl, session, projectId, entity, folders.get(fromDir === '.' ? '' : fromDir)).then(
+          () => true,
+          () => false
+        ))
+      if (restored) {
+        process.stderr.write(`${String(err.message || err)} (uploading ${to} instead)\n`)
+      } else {
+        process.stderr.write(`${String(err.message || err)} (${from} is now in ${toDir}/ under its old name)\n`)
+        stuck.add(to)
+      }
+    }
+  }
+  return { moved, stuck }
+}
+
+/**
+ * List the uploads queued for a linked folder, or with `replay` deliver
+ * them now (after checking the server answers). Without --json, prints one
+ * line per queued path.
+ */
+async function cmdOutbox({
+  baseUrl,
+  projectId,
+  dir,
+  replay,
+  json,
+  container,
+  mongoContainer,
+  concurrency,
+  largeFileThreshold,
+  authOpts,
+}) {
+  const absDir = path.resolve(dir)
+  const { cfg } = await loadConfig(absDir)
+  const effectiveBaseUrl = normalizeBaseUrl(cfg?.baseUrl || baseUrl)
+  const effectiveProjectId = cfg?.projectId || projectId
+  if (!effectiveProjectId) {
+    throw new Error(
+      `Missing project id. Provide --project-id or run 'link' to create ${CONFIG_FILENAME}.`
+    )
+  }
+  const outbox = new Outbox(inboxProjectDir(effectiveBaseUrl, effectiveProjectId), absDir)
+  const entries = await outbox.list()
+
+  if (!replay || entries.length === 0) {
+    for (const { path: relPosix, queuedAt, attempts, error } of entries) {
+      if (json) {
+        process.stdout.write(JSON.stringify({ path: relPosix, queuedAt, attempts, error }) + '\n')
+      } else {
+        process.stdout.write(`${relPosix}\t${queuedAt}\t${attempts} attempt(s)\t${error}\n`)
+      }
+    }
+    if (json) process.stdout.write(JSON.stringify({ done: true, queued: entries.length }) + '\n')
+    else if (entries.length === 0) process.stdout.write('No queued uploads.\n')
+    return
+  }
+
+  if (!(await probeServer(effectiveBaseUrl))) {
+    throw new Error(`${effectiveBaseUrl} is unreachable; ${entries.length} upload(s) stay queued.`)
+  }
+  const debug = Boolean(authOpts?.debug)
+  const { session } = await ensureAuthenticated(effectiveBaseUrl, authOpts)
+  const resolveOptions = {
+    baseUrl: effectiveBaseUrl,
+    projectId: effectiveProjectId,
+    session,
+    mongoContainer: cfg?.mongoContainer || mongoContainer,
+    container: cfg?.container || container,
+    debug,
+  }
+  const rootFolder = cfg?.rootFolderId
+    ? { rootFolderId: cfg.rootFolderId, via: 'config' }
+    : await resolveRootFolderId(resolveOptions)
+  const upload = rootFolderUploader(rootFolder, () =>
+    resolveRootFolderId({ ...resolveOptions, fresh: true })
+  )
+
+  const poolSize = Math.max(1, Number.parseInt(String(concurrency || ''), 10) || 4)
+  const done = []
+  const queued = []
+  let ok = 0
+  let failed = 0
+  let nextIndex = 0
+  const report = result => {
+    if (json) process.stdout.write(JSON.stringify(result) + '\n')
+    else if (result.ok) process.stdout.write(`synced ${result.path}\n`)
+    else if (result.error) process.stderr.write(`${result.error}\n`)
+  }
+
+  const worker = async () => {
+    while (nextIndex < entries.length) {
+      const relPosix = entries[nextIndex++].path
+      const relPath = fromPosix(relPosix)
+      const absPath = path.join(absDir, relPath)
+      try {
+        await upload({
+          baseUrl: effectiveBaseUrl,
+          session,
+          projectId: effectiveProjectId,
+          absPath,
+          relPath,
+          largeFileThreshold,
         })
         ok += 1
+        done.push(relPosix)
+        report({ path: relPosix, ok: true })
       } catch (err) {
+        if (err?.code === 'ENOENT') {
+          done.push(relPosix)
+          report({ path: relPosix, ok: true, skipped: 'missing' })
+          continue
+        }
         failed += 1
-        process.stderr.write(String(err.message || err) + '\\n')
+        const transient = isTransientUploadError(err)
+        if (transient) queued.push([relPosix, err])
+        else done.push(relPosix)
+        report({ path: relPosix, ok: false, queued: transient, error: String(err.message || err) })
       }
     }
   }
 
-  await Promise.all(Array.from({ length: Math.min(poolSize, tasks.length || 1) }, worker))
-  process.stdout.write(`Done. uploaded=${ok} failed=${failed}\\n`)
+  await Promise.all(Array.from({ length: Math.min(poolSize, entries.length) }, worker))
+  const depth = await outbox.update({ queued, done })
+  if (json) process.stdout.write(JSON.stringify({ done: true, uploaded: ok, failed, queued: depth }) + '\n')
+  else process.stdout.write(`Done. uploaded=${ok} failed=${failed} queued=${depth}\n`)
+}
+
+/**
+ * Tell who changed a linked project since the last check. The project tree
+ * is compared with the remote index and the outgoing ledger; only docs and
+ * files the tree can't settle are downloaded, hashed and dropped. The
+ * remote index is then updated, so the next check (and fetch --delta)
+ * starts from what the server holds now.
+ */
+async function cmdRemoteStatus({
+  baseUrl,
+  projectId,
+  dir,
+  json,
+  container,
+  mongoContainer,
+  concurrency,
+  authOpts,
+}) {
+  const absDir = path.resolve(dir)
+  const { cfg } = await loadConfig(absDir)
+  const effectiveBaseUrl = normalizeBaseUrl(cfg?.baseUrl || baseUrl)
+  const effectiveProjectId = cfg?.projectId || projectId
+  if (!effectiveProjectId) {
+    throw new Error(
+      `Missing project id. Provide --project-id or run 'link' to create ${CONFIG_FILENAME}.`
+    )
+  }
+  const debug = Boolean(authOpts?.debug)
+  const { session } = await ensureAuthenticated(effectiveBaseUrl, authOpts)
+  const startedAt = Date.now()
+  const tree = await readRemoteTree({
+    baseUrl: effectiveBaseUrl,
+    session,
+    projectId: effectiveProjectId,
+    mongoContainer: cfg?.mongoContainer || mongoContainer,
+    container: cfg?.container || container,
+    debug,
+  })
+  if (!tree) {
+    // Without the tree the caller has to fall back to timing heuristics.
+    if (json) process.stdout.write(JSON.stringify({ projectId: effectiveProjectId, available: false }) + '\n')
+    else process.stdout.write('Project tree unavailable (no Mongo access or WEB_API credentials).\n')
+    return
+  }
+
+  const projectInboxDir = inboxProjectDir(effectiveBaseUrl, effectiveProjectId)
+  const ledger = outgoingLedger(effectiveBaseUrl, effectiveProjectId)
+  const matcher = await loadIgnoreMatcher(absDir)
+  const [previous, recorded] = await Promise.all([loadRemoteIndex(projectInboxDir), ledger.load()])
+  const { resolved, download } = planOriginCheck({ tree, previous, ledger: recorded, matcher })
+
+  const downloaded = new Map()
+  let bytes = 0
+  let nextIndex = 0
+  const worker = async () => {
+    while (nextIndex < download.length) {
+      const entry = download[nextIndex++]
+      const { hash, size } = await hashEntity(effectiveBaseUrl, session, effectiveProjectId, entry)
+      downloaded.set(entry.path, hash)
+      bytes += size
+    }
+  }
+  const poolSize = Math.max(1, Number.parseInt(String(concurrency || ''), 10) || 4)
+  await Promise.all(Array.from({ length: Math.min(poolSize, download.length) }, worker))
+
+  const { foreign, own, unchanged, files } = await classifyOrigin({
+    tree,
+    previous,
+    ledger: recorded,
+    matcher,
+    resolved,
+    downloaded,
+    localHash: async relPosix => {
+      try {
+        return await sha256File(path.join(absDir, fromPosix(relPosix)))
+      } catch {
+        return null
+      }
+    },
+  })
+  await mkdir(projectInboxDir, { recursive: true })
+  await saveRemoteIndex(projectInboxDir, files)
+  await ledger.forget([...tree.keys(), ...Object.keys(previous)], startedAt)
+
+  const result = {
+    projectId: effectiveProjectId,
+    available: true,
+    foreign,
+    own,
+    unchanged,
+    downloaded: download.length,
+    bytes,
+  }
+  if (json) {
+    process.stdout.write(JSON.stringify(result) + '\n')
+    return
+  }
+  process.stdout.write(
+    `foreign=${foreign.length} own=${own.length} unchanged=${unchanged} downloaded=${download.length} (${bytes} bytes)\n`
+  )
+  for (const { path: relPosix, change } of foreign) process.stdout.write(`${change}\t${relPosix}\n`)
 }
 
 async function cmdWatch({
@@ -1537,6 +3218,9 @@ async function cmdWatch({
   dryRun,
   container,
   mongoContainer,
+  largeFileThreshold,
+  concurrency,
+  quietMs,
   authOpts,
 }) {
   const absDir = path.resolve(dir)
@@ -1554,73 +3238,143 @@ async function cmdWatch({
   }
 
   const debug = Boolean(authOpts?.debug)
-  const { session, me } = await ensureAuthenticated(effectiveBaseUrl, authOpts, {
-    requireUserInfo: !effectiveRootFolderId,
-  })
+  const { session } = await ensureAuthenticated(effectiveBaseUrl, authOpts)
 
-  let rootFolderId = effectiveRootFolderId
-  if (!rootFolderId) {
-    try {
-      rootFolderId = await getRootFolderIdViaMongo(
-        effectiveMongoContainer,
-        effectiveProjectId
-      )
-      debugLog(debug, `rootFolderId resolved via mongo: ${rootFolderId}`)
-    } catch (err) {
-      debugLog(debug, `rootFolderId mongo lookup failed (${String(err?.message || err)})`)
-      const creds = await detectWebApiCredentials(effectiveContainer)
-      rootFolderId = await getRootFolderIdViaPrivateJoin(
-        effectiveBaseUrl,
-        effectiveProjectId,
-        me.id,
-        creds
-      )
-      debugLog(debug, `rootFolderId resolved via private join: ${rootFolderId}`)
-    }
+  const resolveOptions = {
+    baseUrl: effectiveBaseUrl,
+    projectId: effectiveProjectId,
+    session,
+    mongoContainer: effectiveMongoContainer,
+    container: effectiveContainer,
+    debug,
   }
+  const rootFolder = effectiveRootFolderId
+    ? { rootFolderId: effectiveRootFolderId, via: 'config' }
+    : await resolveRootFolderId(resolveOptions)
+  const upload = rootFolderUploader(rootFolder, () =>
+    resolveRootFolderId({ ...resolveOptions, fresh: true })
+  )
 
   process.stdout.write(
-    `Watching ${absDir}\\n→ ${effectiveBaseUrl} project=${effectiveProjectId}\\n`
+    `Watching ${absDir}\n→ ${effectiveBaseUrl} project=${effectiveProjectId}\n`
   )
 
-  /** @type {Map<string, NodeJS.Timeout>} */
-  const debounce = new Map()
-  let queue = Promise.resolve()
+  const events = eventsEnabled(authOpts)
+  let matcher = await loadIgnoreMatcher(absDir)
+
+  // Uploads that fail while the server is unreachable wait in the outbox;
+  // a probe with backoff decides when to replay them, a batch at a time.
+  const outbox = new Outbox(inboxProjectDir(effectiveBaseUrl, effectiveProjectId), absDir)
+  let replayAttempt = 0
+  let replayTimer = null
+  let replayMore = false
+  const reportOutbox = depth => {
+    writeEvent('watch-outbox', { depth }, { enabled: events })
+  }
+  const settle = async (change, relPosix) => {
+    if (dryRun) return
+    const had = outbox.has(relPosix)
+    const depth = await outbox.update(change)
+    if (had || change.queued) reportOutbox(depth)
+  }
+  const scheduleReplay = delayMs => {
+    if (dryRun || replayTimer) return
+    replayTimer = setTimeout(() => {
+      replayTimer = null
+      replayOutbox().catch(err => {
+        process.stderr.write(`outbox replay failed: ${String(err.message || err)}\n`)
+      })
+    }, delayMs)
+  }
+  const replayOutbox = async () => {
+    const pending = await outbox.pending()
+    reportOutbox(pending.length)
+    if (pending.length === 0) {
+      replayAttempt = 0
+      return
+    }
+    if (!(await probeServer(effectiveBaseUrl))) {
+      replayAttempt += 1
+      const delayMs = backoffDelay(replayAttempt, { minMs: outboxRetryMinMs(), maxMs: OUTBOX_RETRY_MAX_MS })
+      process.stdout.write(
+        `server unreachable; ${pending.length} upload(s) queued, retrying in ${Math.ceil(delayMs / 1000)}s\n`
+      )
+      scheduleReplay(delayMs)
+      return
+    }
+    const batch = pending.slice(0, OUTBOX_REPLAY_BATCH)
+    replayMore = pending.length > batch.length
+    process.stdout.write(`replaying ${batch.length} of ${pending.length} queued upload(s)\n`)
+    for (const relPosix of batch) pipeline.add(relPosix)
+  }
+
+  const pipeline = new WatchPipeline({
+    concurrency,
+    quietMs,
+    upload: async relPosix => {
+      const relPath = fromPosix(relPosix)
+      const absPath = path.join(absDir, relPath)
+      let st
+      try {
+        st = await stat(absPath)
+      } catch {
+        // removed; ignore for now (no remote delete by default)
+        await settle({ done: [relPosix] }, relPosix)
+        return
+      }
+      if (!st.isFile()) return
+      try {
+        await upload({
+          baseUrl: effectiveBaseUrl,
+          session,
+          projectId: effectiveProjectId,
+          absPath,
+          relPath,
+          dryRun,
+          largeFileThreshold,
+        })
+      } catch (err) {
+        // Only failures a later attempt can fix are kept for replay.
+        const change = isTransientUploadError(err) ? { queued: [[relPosix, err]] } : { done: [relPosix] }
+        await settle(change, relPosix)
+        throw err
+      }
+      await settle({ done: [relPosix] }, relPosix)
+      process.stdout.write(`synced ${relPosix}\n`)
+    },
+    onBatch: batch => {
+      writeEvent('watch-batch', { files: batch.length }, { enabled: events })
+    },
+    onQueue: ({ depth, inFlight }) => {
+      writeEvent('watch-queue', { depth, inFlight }, { enabled: events })
+    },
+    onDrain: ({ files, failed, ms }) => {
+      writeEvent('watch-drain', { files, failed, ms }, { enabled: events })
+      if (files > 1) process.stdout.write(`drained ${files} file(s) in ${ms}ms\n`)
+      if (outbox.size === 0) {
+        replayAttempt = 0
+      } else if (failed) {
+        replayAttempt += 1
+        scheduleReplay(backoffDelay(replayAttempt, { minMs: outboxRetryMinMs(), maxMs: OUTBOX_RETRY_MAX_MS }))
+      } else if (replayMore) {
+        replayMore = false
+        scheduleReplay(0)
+      }
+    },
+    onError: err => {
+      process.stderr.write(String(err.message || err) + '\n')
+    },
+  })
 
   const scheduleUpload = relPath => {
-    if (shouldIgnore(relPath, false)) return
-    clearTimeout(debounce.get(relPath))
-    debounce.set(
-      relPath,
-      setTimeout(() => {
-        debounce.delete(relPath)
-        const absPath = path.join(absDir, relPath)
-        queue = queue
-          .then(async () => {
-            let st
-            try {
-              st = await stat(absPath)
-            } catch {
-              // removed; ignore for now (no remote delete by default)
-              return
-            }
-            if (!st.isFile()) return
-            await uploadOne({
-              baseUrl: effectiveBaseUrl,
-              session,
-              projectId: effectiveProjectId,
-              rootFolderId,
-              absPath,
-              relPath,
-              dryRun,
-            })
-            process.stdout.write(`synced ${toPosix(relPath)}\\n`)
-          })
-          .catch(err => {
-            process.stderr.write(String(err.message || err) + '\\n')
-          })
-      }, 250)
-    )
+    if (toPosix(relPath) === IGNORE_FILENAME) {
+      loadIgnoreMatcher(absDir).then(next => {
+        matcher = next
+      })
+      return
+    }
+    if (shouldIgnore(relPath, false, matcher)) return
+    pipeline.add(toPosix(relPath))
   }
 
   const watcher = (await import('node:fs')).watch(absDir, { recursive: true })
@@ -1629,8 +3383,18 @@ async function cmdWatch({
     scheduleUpload(filename)
   })
   watcher.on('error', err => {
-    process.stderr.write(`watch error: ${String(err.message || err)}\\n`)
+    process.stderr.write(`watch error: ${String(err.message || err)}\n`)
   })
+  if (httpStatsEnabled(authOpts)) setInterval(() => writeHttpStats(true), HTTP_STATS_INTERVAL_MS).unref()
+
+  if (!dryRun) {
+    const depth = (await outbox.pending()).length
+    reportOutbox(depth)
+    if (depth) {
+      process.stdout.write(`${depth} upload(s) queued from an earlier run\n`)
+      scheduleReplay(0)
+    }
+  }
 
   await new Promise(() => {})
 }
@@ -1640,6 +3404,9 @@ async function main() {
   if (command === '--help' || command === '-h') usage(0)
   if (!command || opts.help || opts.h) usage(0)
 
+  tracer.enabled = traceEnabled(opts)
+  tracer.markStartup()
+  const commandSpan = tracer.start(`command:${command}`)
   try {
     if (command === 'projects') {
       await cmdProjects({
@@ -1696,6 +3463,18 @@ async function main() {
       })
       return
     }
+    if (command === 'project-bulk') {
+      await cmdProjectBulk({
+        baseUrl: opts['base-url'] || DEFAULT_BASE_URL,
+        action: typeof opts.action === 'string' ? opts.action : undefined,
+        projectIds: typeof opts['project-ids'] === 'string' ? opts['project-ids'] : '',
+        stdin: Boolean(opts.stdin),
+        concurrency: opts.concurrency,
+        json: Boolean(opts.json),
+        authOpts: opts,
+      })
+      return
+    }
     if (command === 'link') {
       await cmdLink({
         baseUrl: opts['base-url'] || DEFAULT_BASE_URL,
@@ -1725,6 +3504,29 @@ async function main() {
         projectId: mustString(opts, 'project-id'),
         dir: path.resolve(mustString(opts, 'dir')),
         mongoContainer: opts['mongo-container'] || DEFAULT_MONGO_CONTAINER,
+        events: eventsEnabled(opts),
+        authOpts: opts,
+      })
+      return
+    }
+    if (command === 'mirror') {
+      await cmdMirror({
+        baseUrl: opts['base-url'] || DEFAULT_BASE_URL,
+        dir: typeof opts.dir === 'string' ? opts.dir : '',
+        concurrency: opts.concurrency,
+        keep: opts.keep,
+        json: Boolean(opts.json),
+        authOpts: opts,
+      })
+      return
+    }
+    if (command === 'root-folders') {
+      await cmdRootFolders({
+        baseUrl: opts['base-url'] || DEFAULT_BASE_URL,
+        dir: typeof opts.dir === 'string' ? opts.dir : '',
+        stdin: Boolean(opts.stdin),
+        refresh: Boolean(opts.refresh),
+        json: Boolean(opts.json),
         authOpts: opts,
       })
       return
@@ -1736,6 +3538,12 @@ async function main() {
         dir: path.resolve(opts.dir || '.'),
         debug: Boolean(opts.debug),
         json: Boolean(opts.json),
+        delta: Boolean(opts.delta) || process.env.OL_SYNC_FETCH_DELTA === '1',
+        container: opts.container || DEFAULT_CONTAINER,
+        mongoContainer: opts['mongo-container'] || DEFAULT_MONGO_CONTAINER,
+        concurrency: Math.max(1, Number.parseInt(String(opts.concurrency || ''), 10) || 4),
+        digest: typeof opts.digest === 'string' ? opts.digest : 'sha256',
+        hashThreads: Number.parseInt(String(opts['hash-threads'] || ''), 10) || undefined,
         authOpts: opts,
       })
       return
@@ -1750,6 +3558,37 @@ async function main() {
       })
       return
     }
+    if (command === 'remote-status') {
+      await cmdRemoteStatus({
+        baseUrl: opts['base-url'] || DEFAULT_BASE_URL,
+        projectId: opts['project-id'],
+        dir: path.resolve(opts.dir || '.'),
+        json: Boolean(opts.json),
+        container: opts.container || DEFAULT_CONTAINER,
+        mongoContainer: opts['mongo-container'] || DEFAULT_MONGO_CONTAINER,
+        concurrency: opts.concurrency,
+        authOpts: opts,
+      })
+      return
+    }
+    if (command === 'outbox') {
+      await cmdOutbox({
+        baseUrl: opts['base-url'] || DEFAULT_BASE_URL,
+        projectId: opts['project-id'],
+        dir: path.resolve(opts.dir || '.'),
+        replay: Boolean(opts.replay),
+        json: Boolean(opts.json),
+        container: opts.container || DEFAULT_CONTAINER,
+        mongoContainer: opts['mongo-container'] || DEFAULT_MONGO_CONTAINER,
+        concurrency: opts.concurrency,
+        largeFileThreshold: parseByteSize(
+          opts['large-file-threshold'] || process.env.OL_SYNC_LARGE_FILE_THRESHOLD,
+          DEFAULT_LARGE_FILE_THRESHOLD
+        ),
+        authOpts: opts,
+      })
+      return
+    }
     if (command === 'push') {
       await cmdPush({
         baseUrl: opts['base-url'] || DEFAULT_BASE_URL,
@@ -1759,6 +3598,10 @@ async function main() {
         container: opts.container || DEFAULT_CONTAINER,
         mongoContainer: opts['mongo-container'] || DEFAULT_MONGO_CONTAINER,
         concurrency: opts.concurrency,
+        largeFileThreshold: parseByteSize(
+          opts['large-file-threshold'] || process.env.OL_SYNC_LARGE_FILE_THRESHOLD,
+          DEFAULT_LARGE_FILE_THRESHOLD
+        ),
         authOpts: opts,
       })
       return
@@ -1771,14 +3614,25 @@ async function main() {
         dryRun: Boolean(opts['dry-run']),
         container: opts.container || DEFAULT_CONTAINER,
         mongoContainer: opts['mongo-container'] || DEFAULT_MONGO_CONTAINER,
+        largeFileThreshold: parseByteSize(
+          opts['large-file-threshold'] || process.env.OL_SYNC_LARGE_FILE_THRESHOLD,
+          DEFAULT_LARGE_FILE_THRESHOLD
+        ),
+        concurrency: Math.max(1, Number.parseInt(String(opts.concurrency || ''), 10) || 4),
+        quietMs: Math.max(0, Number.parseInt(String(opts['quiet-ms'] || ''), 10) || 300),
         authOpts: opts,
       })
       return
     }
     usage(1)
   } catch (err) {
-    process.stderr.write(String(err.message || err) + '\\n')
+    commandSpan.end({ error: String(err.message || err) })
+    writeHttpStats(httpStatsEnabled(opts))
+    process.stderr.write(String(err.message || err) + '\n')
     process.exit(1)
+  } finally {
+    commandSpan.end()
+    writeHttpStats(httpStatsEnabled(opts))
   }
 }
 
@@ -0,0 +1,43 @@
+"""Append to a gui._Journal until killed, compacting it from a second thread.
+
+Usage: journal-writer.py <gui.py> <journal> <first record number>
+Prints "ack N" once record N is appended, the point from which the GUI
+relies on it; a compaction thread rewrites the journal as a snapshot the
+way OverleafSyncGui._compact_journal does. With only <gui.py> <journal>,
+prints the replayed outgoing keys as JSON instead.
+"""
+
+import importlib.util
+import json
+import sys
+import threading
+from pathlib import Path
+
+spec = importlib.util.spec_from_file_location("gui", sys.argv[1])
+gui = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(gui)
+journal = gui._Journal(Path(sys.argv[2]))
+
+if len(sys.argv) < 4:
+    print(json.dumps(sorted(journal.replay()["outgoing"])))
+    sys.exit(0)
+
+lock = threading.RLock()
+state = journal.replay()
+
+
+def compactor() -> None:
+    while True:
+        with lock:
+            journal.compact({"dirty": {}, "outgoing": dict(state["outgoing"]), "tasks": {}})
+
+
+threading.Thread(target=compactor, daemon=True).start()
+n = int(sys.argv[3])
+while True:
+    key = f"k{n}"
+    with lock:
+        journal.append({"op": "outgoing", "key": key, "ts": float(n)})
+        state["outgoing"][key] = float(n)
+    print(f"ack {n}", flush=True)
+    n += 1
@@ -0,0 +1,418 @@
+// A small stand-in for the Overleaf web endpoints ol-sync.mjs talks to, so CLI
+// commands can be exercised end to end without a real instance.
+
+import { createHash } from 'node:crypto'
+import http from 'node:http'
+import { crc32 } from 'node:zlib'
+
+export const CSRF_TOKEN = 'stand-in-csrf'
+export const WEB_API_USER = 'stand-in-api'
+export const WEB_API_PASSWORD = 'stand-in-secret'
+
+function objectId(n) {
+  return n.toString(16).padStart(24, '0')
+}
+
+// Minimal "stored" (uncompressed) zip writer; enough for `unzip`.
+export function buildStoredZip(entries) {
+  const locals = []
+  const centrals = []
+  let offset = 0
+  for (const { name, content } of entries) {
+    const nameBuf = Buffer.from(name, 'utf8')
+    const crc = crc32(content)
+    const local = Buffer.alloc(30)
+    local.writeUInt32LE(0x04034b50, 0)
+    local.writeUInt16LE(20, 4)
+    local.writeUInt32LE(crc, 14)
+    local.writeUInt32LE(content.length, 18)
+    local.writeUInt32LE(content.length, 22)
+    local.writeUInt16LE(nameBuf.length, 26)
+    const central = Buffer.alloc(46)
+    central.writeUInt32LE(0x02014b50, 0)
+    central.writeUInt16LE(20, 4)
+    central.writeUInt16LE(20, 6)
+    central.writeUInt32LE(crc, 16)
+    central.writeUInt32LE(content.length, 20)
+    central.writeUInt32LE(content.length, 24)
+    central.writeUInt16LE(nameBuf.length, 28)
+    central.writeUInt32LE(offset, 42)
+    locals.push(local, nameBuf, content)
+    centrals.push(central, nameBuf)
+    offset += local.length + nameBuf.length + content.length
+  }
+  const centralDir = Buffer.concat(centrals)
+  const end = Buffer.alloc(22)
+  end.writeUInt32LE(0x06054b50, 0)
+  end.writeUInt16LE(entries.length, 8)
+  end.writeUInt16LE(entries.length, 10)
+  end.writeUInt32LE(centralDir.length, 12)
+  end.writeUInt32LE(offset, 16)
+  return Buffer.concat([...locals, centralDir, end])
+}
+
+export class StandInProject {
+  constructor(projectId = objectId(0xabc), name = 'Stand-in project') {
+    this.projectId = projectId
+    this.name = name
+    this.lastUpdated = new Date(0).toISOString()
+    this.rootFolderId = objectId(0xf00)
+    /** @type {Map<string, {kind:'doc'|'file', id:string, content:Buffer, hash?:string}>} */
+    this.entities = new Map()
+    /** @type {Map<string, string>} folder path -> id; folders stay when emptied */
+    this.folders = new Map([['', this.rootFolderId]])
+    this.nextId = 1
+  }
+
+  folderId(relPosix) {
+    if (!this.folders.has(relPosix)) {
+      const parent = relPosix.includes('/') ? relPosix.slice(0, relPosix.lastIndexOf('/')) : ''
+      this.folderId(parent)
+      this.folders.set(relPosix, objectId(this.nextId++))
+    }
+    return this.folders.get(relPosix)
+  }
+
+  folderPath(id) {
+    for (const [relPosix, folderId] of this.folders) if (folderId === id) return relPosix
+    return null
+  }
+
+  // Move an entity to another path, keeping its id (and file hash).
+  relocate(kind, id, relPosix) {
+    const from = [...this.entities].find(([, e]) => e.kind === kind && e.id === id)?.[0]
+    if (from === undefined || this.entities.has(relPosix)) return false
+    const entity = this.entities.get(from)
+    if (relPosix.includes('/')) this.folderId(relPosix.slice(0, relPosix.lastIndexOf('/')))
+    this.entities.delete(from)
+    this.entities.set(relPosix, entity)
+    this.touch()
+    return true
+  }
+
+  // Docs keep their id across edits; replacing a binary file creates a new
+  // file ref whose hash is the git blob SHA-1 of the content, as Overleaf does.
+  set(relPosix, content, kind = relPosix.endsWith('.tex') ? 'doc' : 'file') {
+    const buf = Buffer.isBuffer(content) ? content : Buffer.from(String(content), 'utf8')
+    if (relPosix.includes('/')) this.folderId(relPosix.slice(0, relPosix.lastIndexOf('/')))
+    const existing = this.entities.get(relPosix)
+    const id = existing && kind === 'doc' ? existing.id : objectId(this.nextId++)
+    const entry = { kind, id, content: buf }
+    if (kind === 'file') {
+      entry.hash = createHash('sha1').update(`blob ${buf.length}\0`).update(buf).digest('hex')
+    }
+    this.entities.set(relPosix, entry)
+    this.touch()
+  }
+
+  touch() {
+    const now = Date.now()
+    const last = Date.parse(this.lastUpdated)
+    this.lastUpdated = new Date(Math.max(now, last + 1)).toISOString()
+  }
+
+  rootFolder() {
+    const nodes = new Map()
+    for (const [relPosix, id] of [...this.folders].sort(([a], [b]) => a.length - b.length)) {
+      const node = { _id: id, name: relPosix ? relPosix.split('/').pop() : 'rootFolder', folders: [], docs: [], fileRefs: [] }
+      nodes.set(relPosix, node)
+      if (relPosix) nodes.get(relPosix.includes('/') ? relPosix.slice(0, relPosix.lastIndexOf('/')) : '').folders.push(node)
+    }
+    for (const [relPosix, entity] of this.entities) {
+      const cut = relPosix.lastIndexOf('/')
+      const folder = nodes.get(cut < 0 ? '' : relPosix.slice(0, cut))
+      const name = relPosix.slice(cut + 1)
+      if (entity.kind === 'doc') folder.docs.push({ _id: entity.id, name })
+      else folder.fileRefs.push({ _id: entity.id, name, hash: entity.hash })
+    }
+    return [nodes.get('')]
+  }
+
+  byId(kind, id) {
+    for (const entity of this.entities.values()) {
+      if (entity.kind === kind && entity.id === id) return entity
+    }
+    return null
+  }
+}
+
+const PROJECT_ACTION_ROUTES = [
+  ['POST', /^\/Project\/([^/]+)\/archive$/, 'archive'],
+  ['DELETE', /^\/Project\/([^/]+)\/archive$/, 'unarchive'],
+  ['POST', /^\/project\/([^/]+)\/trash$/, 'trash'],
+  ['DELETE', /^\/project\/([^/]+)\/trash$/, 'untrash'],
+  ['DELETE', /^\/Project\/([^/]+)$/, 'delete'],
+]
+
+/**
+ * Start the server on an ephemeral port. `stats` counts requests per route
+ * kind and the bytes of project content served. Project actions (archive,
+ * trash, ...) are accepted for ids in `state.projectIds`, take
+ * `state.actionDelayMs`, and require the current `state.csrf` token.
+ * `state.projects` is what /api/project lists and /download/zip serves;
+ * add more StandInProjects to it for whole-instance commands.
+ * Uploads succeed only into a project's root folder and replace the
+ * content at their relativePath; anything else is counted in
+ * `stats.uploadsRejected`. While `state.uploadsDown` is set,
+ * uploads get a 503 (counted in `stats.uploadsUnavailable`), as from a
+ * proxy in front of an instance that is down. With `state.discardUploads`
+ * upload bodies are only counted (`stats.uploadBytes`), not kept, so
+ * pushing large files doesn't grow the server.
+ * Each login (taking `state.loginDelayMs`) starts a session; the
+ * `sid` cookies in `state.sessions` are logged in, and
+ * /user/personal_info answers 401 for anything else. Clear the set to
+ * expire every session.
+ * Docs and files can be moved (`stats.moves`) and renamed
+ * (`stats.renames`), keeping their ids, and folders created
+ * (`stats.foldersCreated`); all three need the CSRF token. The next
+ * `state.renameFailures` renames fail with a 500.
+ * Project zips carry a strong ETag and honour `Range: bytes=N-` with a
+ * matching If-Range (206, counted in `stats.zipRanges`) unless
+ * `state.zipRange` is cleared. The next `state.zipCuts` zip responses drop
+ * the connection after `state.zipCutBytes` bytes of body (`stats.zipCut`).
+ * Doc and file downloads take `state.entityDelayMs`; ids in
+ * `state.goneIds` answer 404, as for an entity deleted on the web after
+ * the tree was read.
+ * The next `state.throttle` requests of any kind get a 429 with
+ * `Retry-After: state.throttleRetryAfter` (`stats.throttled`).
+ */
+export async function startStandInServer(project, { joinEnabled = true } = {}) {
+  const state = {
+    joinEnabled,
+    csrf: CSRF_TOKEN,
+    projectIds: new Set([project.projectId]),
+    actionDelayMs: 0,
+    projects: new Map([[project.projectId, project]]),
+    uploadsDown: false,
+    discardUploads: false,
+    loginDelayMs: 0,
+    sessions: new Set(),
+    zipRange: true,
+    zipCuts: 0,
+    zipCutBytes: 64 * 1024,
+    throttle: 0,
+    renameFailures: 0,
+    entityDelayMs: 0,
+    goneIds: new Set(),
+    throttleRetryAfter: '0',
+  }
+  const stats = {
+    zip: 0,
+    zipByProject: {},
+    zipRanges: 0,
+    zipCut: 0,
+    doc: 0,
+    file: 0,
+    join: 0,
+    bytes: 0,
+    logins: 0,
+    personalInfo: 0,
+    uploads: 0,
+    uploadsRejected: 0,
+    uploadsUnavailable: 0,
+    uploadBytes: 0,
+    moves: 0,
+    renames: 0,
+    foldersCreated: 0,
+    actions: [],
+    actionsInFlight: 0,
+    actionsPeak: 0,
+    csrfRejected: 0,
+    throttled: 0,
+  }
+
+  const send = (res, status, body, type = 'application/json', headers = {}) => {
+    const buf = Buffer.isBuffer(body) ? body : Buffer.from(typeof body === 'string' ? body : JSON.stringify(body))
+    res.writeHead(status, { 'content-type': type, 'content-length': buf.length, ...headers })
+    res.end(buf)
+  }
+  const sessionOf = req => /(?:^|;\s*)sid=([^;]+)/.exec(req.headers.cookie || '')?.[1]
+
+  const server = http.createServer((req, res) => {
+    const chunks = []
+    const discard = state.discardUploads && /\/upload$/.test(req.url.split('?')[0])
+    req.on('data', c => {
+      if (discard) stats.uploadBytes += c.length
+      else chunks.push(c)
+    })
+    req.on('end', () => {
+      const url = new URL(req.url, 'http://stand-in')
+      const p = url.pathname
+      const pid = project.projectId
+      if (state.throttle > 0) {
+        state.throttle -= 1
+        stats.throttled += 1
+        return send(res, 429, 'Too Many Requests', 'text/plain', { 'retry-after': state.throttleRetryAfter })
+      }
+      if (p === '/login' && req.method === 'GET') {
+        return send(res, 200, `<meta name="ol-csrfToken" content="${state.csrf}">`, 'text/html')
+      }
+      if (p === '/login') {
+        stats.logins += 1
+        const sid = `session-${stats.logins}`
+        return setTimeout(() => {
+          state.sessions.add(sid)
+          send(res, 200, { redir: '/project' }, 'application/json', { 'set-cookie': `sid=${sid}; Path=/` })
+        }, state.loginDelayMs)
+      }
+      for (const [method, pattern, action] of PROJECT_ACTION_ROUTES) {
+        const match = req.method === method && p.match(pattern)
+        if (!match) continue
+        if (req.headers['x-csrf-token'] !== state.csrf) {
+          stats.csrfRejected += 1
+          return send(res, 403, 'Forbidden', 'text/plain')
+        }
+        if (!state.projectIds.has(match[1])) return send(res, 404, 'Not found', 'text/plain')
+        stats.actionsInFlight += 1
+        stats.actionsPeak = Math.max(stats.actionsPeak, stats.actionsInFlight)
+        return setTimeout(() => {
+          stats.actionsInFlight -= 1
+          stats.actions.push({ action, projectId: match[1] })
+          res.writeHead(204)
+          res.end()
+        }, state.actionDelayMs)
+      }
+      if (p === '/api/project' && req.method === 'POST') {
+        // One page holds everything; later pages (lastId set) are empty.
+        const body = JSON.parse(Buffer.concat(chunks).toString('utf8') || '{}')
+        const listed = body.page?.lastId ? [] : Array.from(state.projects.values())
+        return send(res, 200, {
+          totalSize: state.projects.size,
+          projects: listed.map(item => ({
+            id: item.projectId,
+            name: item.name,
+            accessLevel: 'owner',
+            lastUpdated: item.lastUpdated,
+          })),
+        })
+      }
+      let m = p.match(/^\/project\/([^/]+)\/upload$/)
+      if (m && req.method === 'POST' && state.projects.has(m[1])) {
+        if (state.uploadsDown) {
+          stats.uploadsUnavailable += 1
+          return send(res, 503, 'Service Unavailable', 'text/plain')
+        }
+        const target = state.projects.get(m[1])
+        if (url.searchParams.get('folder_id') !== target.rootFolderId) {
+          stats.uploadsRejected += 1
+          return send(res, 422, { success: false, error: 'invalid folder' })
+        }
+        if (discard) {
+          stats.uploads += 1
+          return send(res, 200, { success: true, entity_id: `discarded-${stats.uploads}` })
+        }
+        const body = new Request('http://stand-in/', {
+          method: 'POST',
+          headers: { 'content-type': req.headers['content-type'] },
+          body: Buffer.concat(chunks),
+        })
+        return body
+          .formData()
+          .then(async form => {
+            const relPosix = String(form.get('relativePath') || form.get('name'))
+            target.set(relPosix, Buffer.from(await form.get('qqfile').arrayBuffer()))
+            stats.uploads += 1
+            send(res, 200, { success: true, entity_id: target.entities.get(relPosix).id })
+          })
+          .catch(() => send(res, 400, { success: false, error: 'bad upload' }))
+      }
+      m = req.method === 'POST' && p.match(/^\/project\/([^/]+)\/(?:(doc|file)\/([^/]+)\/(move|rename)|folder)$/)
+      if (m && state.projects.has(m[1])) {
+        if (req.headers['x-csrf-token'] !== state.csrf) {
+          stats.csrfRejected += 1
+          return send(res, 403, 'Forbidden', 'text/plain')
+        }
+        const target = state.projects.get(m[1])
+        const body = JSON.parse(Buffer.concat(chunks).toString('utf8') || '{}')
+        if (!m[4]) {
+          const parent = target.folderPath(body.parent_folder_id)
+          const relPosix = parent ? `${parent}/${body.name}` : String(body.name)
+          if (parent === null || target.folders.has(relPosix)) return send(res, 400, 'Bad request', 'text/plain')
+          stats.foldersCreated += 1
+          return send(res, 200, { _id: target.folderId(relPosix), name: body.name })
+        }
+        if (m[4] === 'rename' && state.renameFailures > 0) {
+          state.renameFailures -= 1
+          return send(res, 500, 'Internal Server Error', 'text/plain')
+        }
+        const from = [...target.entities].find(([, e]) => e.kind === m[2] && e.id === m[3])?.[0]
+        if (from === undefined) return send(res, 404, 'Not found', 'text/plain')
+        const dir = from.includes('/') ? from.slice(0, from.lastIndexOf('/')) : ''
+        const name = from.slice(from.lastIndexOf('/') + 1)
+        const folder = m[4] === 'move' ? target.folderPath(body.folder_id) : dir
+        const to = m[4] === 'move' ? (folder ? `${folder}/${name}` : name) : dir ? `${dir}/${body.name}` : String(body.name)
+        if (folder === null || !target.relocate(m[2], m[3], to)) return send(res, 400, 'Bad request', 'text/plain')
+        stats[m[4] === 'move' ? 'moves' : 'renames'] += 1
+        res.writeHead(204)
+        return res.end()
+      }
+      if (p === '/user/personal_info') {
+        stats.personalInfo += 1
+        if (!state.sessions.has(sessionOf(req))) return send(res, 401, 'Unauthorized', 'text/plain')
+        return send(res, 200, { id: objectId(0x123), email: 'me@example.com' })
+      }
+      if (p === `/project/${pid}/join`) {
+        stats.join += 1
+        const expected = `Basic ${Buffer.from(`${WEB_API_USER}:${WEB_API_PASSWORD}`).toString('base64')}`
+        if (!state.joinEnabled || req.headers.authorization !== expected) return send(res, 403, 'Forbidden', 'text/plain')
+        return send(res, 200, { project: { _id: pid, rootFolder: project.rootFolder() } })
+      }
+      m = p.match(/^\/Project\/([^/]+)\/doc\/([^/]+)\/download$/)
+      if (m && m[1] === pid) {
+        const entity = project.byId('doc', m[2])
+        if (!entity || state.goneIds.has(m[2])) return send(res, 404, 'Not found', 'text/plain')
+        stats.doc += 1
+        stats.bytes += entity.content.length
+        return setTimeout(() => send(res, 200, entity.content, 'text/plain'), state.entityDelayMs)
+      }
+      m = p.match(/^\/Project\/([^/]+)\/file\/([^/]+)$/)
+      if (m && m[1] === pid) {
+        const entity = project.byId('file', m[2])
+        if (!entity || state.goneIds.has(m[2])) return send(res, 404, 'Not found', 'text/plain')
+        stats.file += 1
+        stats.bytes += entity.content.length
+        return setTimeout(() => send(res, 200, entity.content, 'application/octet-stream'), state.entityDelayMs)
+      }
+      m = p.match(/^\/project\/([^/]+)\/download\/zip$/)
+      if (m && state.projects.has(m[1])) {
+        const zip = buildStoredZip(
+          Array.from(state.projects.get(m[1]).entities, ([name, entity]) => ({ name, content: entity.content }))
+        )
+        stats.zip += 1
+        stats.zipByProject[m[1]] = (stats.zipByProject[m[1]] || 0) + 1
+        const etag = `"${createHash('sha1').update(zip).digest('hex')}"`
+        const range = /^bytes=(\d+)-$/.exec(req.headers.range || '')
+        let start = 0
+        if (state.zipRange && range && req.headers['if-range'] === etag) {
+          start = Number(range[1])
+          if (start >= zip.length) {
+            return send(res, 416, '', 'text/plain', { 'content-range': `bytes */${zip.length}` })
+          }
+          stats.zipRanges += 1
+        }
+        const body = zip.subarray(start)
+        const headers = { 'content-type': 'application/zip', 'content-length': body.length, etag }
+        if (start > 0) headers['content-range'] = `bytes ${start}-${zip.length - 1}/${zip.length}`
+        res.writeHead(start > 0 ? 206 : 200, headers)
+        if (state.zipCuts > 0 && body.length > state.zipCutBytes) {
+          state.zipCuts -= 1
+          stats.zipCut += 1
+          stats.bytes += state.zipCutBytes
+          return res.write(body.subarray(0, state.zipCutBytes), () => res.socket.end())
+        }
+        stats.bytes += body.length
+        return res.end(body)
+      }
+      send(res, 404, 'Not found', 'text/plain')
+    })
+  })
+
+  await new Promise(resolve => server.listen(0, '127.0.0.1', resolve))
+  const { port } = server.address()
+  return {
+    baseUrl: `http://127.0.0.1:${port}`,
+    stats,
+    state,
+    close: () => new Promise(resolve => server.close(resolve)),
+  }
+}
@@ -0,0 +1,77 @@
+"""Drive gui._WatchIO with many chatty children and report what arrived.
+
+Usage: watch-io-stress.py <gui.py> <children> <lines per child>
+Besides the chatty children, one child closes its stdout but keeps
+running until the others have exited. Prints JSON: lines received per
+child, exits in order, how many batches on_batch got and how long it took.
+"""
+
+import importlib.util
+import json
+import subprocess
+import sys
+import threading
+import time
+
+spec = importlib.util.spec_from_file_location("gui", sys.argv[1])
+gui = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(gui)
+children, lines = int(sys.argv[2]), int(sys.argv[3])
+
+received: dict[str, list[str]] = {}
+exits: list[str] = []
+batches = 0
+largest = 0
+done = threading.Event()
+
+
+def on_batch(batch):
+    global batches, largest
+    batches += 1
+    largest = max(largest, len(batch))
+    for key, line in batch:
+        received.setdefault(key, []).append(line)
+
+
+def on_exit(key, _proc, _rc):
+    exits.append(key)
+    if len(exits) == children:
+        done.set()
+
+
+io = gui._WatchIO(on_batch, on_exit)
+chatty = (
+    "import sys, time\n"
+    f"for burst in range(20):\n"
+    f"    sys.stdout.write(''.join(f'{{burst}}-{{i}}\\n' for i in range({lines} // 20)))\n"
+    "    sys.stdout.flush()\n"
+    "    time.sleep(0.01)\n"
+)
+lingering = subprocess.Popen(
+    [sys.executable, "-c", "import os, time; os.close(1); time.sleep(60)"], stdout=subprocess.PIPE
+)
+io.add("lingering", lingering)
+started = time.monotonic()
+for n in range(children):
+    io.add(f"child-{n}", subprocess.Popen([sys.executable, "-c", chatty], stdout=subprocess.PIPE))
+others_done = done.wait(60)
+elapsed = time.monotonic() - started
+lingering.kill()
+deadline = time.monotonic() + 5
+while "lingering" not in exits and time.monotonic() < deadline:
+    time.sleep(0.05)
+io.stop()
+print(
+    json.dumps(
+        {
+            "othersDone": others_done,
+            "received": {key: len(got) for key, got in received.items()},
+            "ordered": all(got == sorted(got, key=lambda s: tuple(map(int, s.split("-")))) for got in received.values()),
+            "exits": exits,
+            "batches": batches,
+            "largestBatch": largest,
+            "elapsed": elapsed,
+            "batchSec": gui.WATCH_IO_BATCH_SEC,
+        }
+    )
+)
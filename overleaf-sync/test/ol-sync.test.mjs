@@ -1,20 +1,70 @@
 import test from 'node:test'
 import assert from 'node:assert/strict'
-import { readFile } from 'node:fs/promises'
+import { mkdir, mkdtemp, open, readFile, readdir, rename, rm, stat, writeFile } from 'node:fs/promises'
+import { execFile, spawn } from 'node:child_process'
+import { createHash, randomBytes } from 'node:crypto'
+import os from 'node:os'
 
 import path from 'node:path'
+import { fileURLToPath } from 'node:url'
+import { promisify } from 'node:util'
 
 import {
+  BACKUP_MANIFEST_FILENAME,
   CookieJar,
   CONFIG_FILENAME,
   DEFAULT_IGNORE_DIRS,
   DEFAULT_IGNORE_FILES,
+  EVENT_PREFIX,
+  HashPool,
+  HttpClient,
+  IGNORE_FILENAME,
+  IgnoreMatcher,
+  MIRROR_OBJECTS_DIRNAME,
+  MIRROR_STATE_FILENAME,
+  OUTBOX_FILENAME,
+  OUTGOING_LEDGER_FILENAME,
+  Outbox,
+  Tracer,
+  WatchPipeline,
+  ZIP_PART_FILENAME,
+  acquireFileLease,
+  backoffDelay,
   basicAuthHeader,
+  buildFileIndex,
+  classifyOrigin,
+  contentDigests,
+  eventsEnabled,
   extractCsrfToken,
+  flattenProjectTree,
+  formatEvent,
+  httpRoute,
+  isTransientUploadError,
+  loadIgnoreMatcher,
+  matchRenames,
+  multipartFileBody,
+  parseRetryAfter,
+  parseBulkLine,
+  parseByteSize,
+  planDeltaFetch,
+  planMirror,
+  planOriginCheck,
+  pruneObjectStore,
+  resumableDownload,
+  sha256File,
   shouldIgnore,
+  storeDeduplicated,
   toPosix,
+  traceEnabled,
   writeCliNotice,
 } from '../lib.mjs'
+import {
+  StandInProject,
+  buildStoredZip,
+  WEB_API_PASSWORD,
+  WEB_API_USER,
+  startStandInServer,
+} from './fixtures/stand-in-server.mjs'
 
 // Minimal regression tests for parsing helpers used by overleaf-sync/ol-sync.mjs
 
@@ -114,3 +164,1789 @@ test('writeCliNotice uses stdout for normal interactive notices', () => {
   assert.deepEqual(stdout.chunks, ['Session cached at /tmp/session.json\n'])
   assert.deepEqual(stderr.chunks, [])
 })
+
+test('parseByteSize accepts plain numbers and binary units', () => {
+  assert.equal(parseByteSize('4096', 1), 4096)
+  assert.equal(parseByteSize('8MiB', 1), 8 * 1024 * 1024)
+  assert.equal(parseByteSize('1g', 1), 1024 ** 3)
+  assert.equal(parseByteSize(undefined, 7), 7)
+  assert.equal(parseByteSize('lots', 7), 7)
+})
+
+test('sha256File matches an in-memory digest across chunk boundaries', async () => {
+  const dir = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-hash-'))
+  try {
+    const bytes = Buffer.alloc(3 * 1024 + 17, 'ab')
+    const file = path.join(dir, 'a.bin')
+    await writeFile(file, bytes)
+    const expected = createHash('sha256').update(bytes).digest('hex')
+    assert.equal(await sha256File(file, { chunkSize: 1024 }), expected)
+  } finally {
+    await rm(dir, { recursive: true, force: true })
+  }
+})
+
+test('buildFileIndex on a worker pool matches sequential hashing', async () => {
+  const dir = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-pool-'))
+  const pool = new HashPool({ size: 3 })
+  try {
+    for (let i = 0; i < 40; i++) {
+      await mkdir(path.join(dir, `d${i % 4}`), { recursive: true })
+      await writeFile(path.join(dir, `d${i % 4}`, `f${i}.bin`), Buffer.alloc(1000 + i, i))
+    }
+    await writeFile(path.join(dir, 'skip.log'), 'ignored')
+    const matcher = IgnoreMatcher.compile('*.log\n')
+
+    const sequential = await buildFileIndex(dir, { matcher })
+    const parallel = await buildFileIndex(dir, { matcher, pool })
+    assert.equal(parallel.index.size, 40)
+    assert.deepEqual(Array.from(parallel.index), Array.from(sequential.index))
+    assert.equal(parallel.bytes, sequential.bytes)
+    const first = path.join(dir, 'd0', 'f0.bin')
+    assert.equal(parallel.index.get('d0/f0.bin').hash, await sha256File(first))
+
+    const fast = await buildFileIndex(dir, { matcher, pool, digest: 'crc32' })
+    assert.match(fast.index.get('d0/f0.bin').hash, /^crc32-1000-[0-9a-f]{8}$/)
+    await writeFile(first, Buffer.alloc(1000, 1))
+    const changed = await buildFileIndex(dir, { matcher, pool, digest: 'crc32' })
+    assert.notEqual(changed.index.get('d0/f0.bin').hash, fast.index.get('d0/f0.bin').hash)
+    assert.equal(changed.index.get('d1/f1.bin').hash, fast.index.get('d1/f1.bin').hash)
+
+    await rm(path.join(dir, 'd2'), { recursive: true })
+    await assert.rejects(pool.hash(path.join(dir, 'd2', 'f2.bin')), /ENOENT/)
+  } finally {
+    await pool.close()
+    await rm(dir, { recursive: true, force: true })
+  }
+})
+
+test('multipartFileBody frames fields and file with an exact content length', async () => {
+  const dir = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-multipart-'))
+  try {
+    const file = path.join(dir, 'fig "1".pdf')
+    await writeFile(file, 'PDFDATA')
+    const multipart = multipartFileBody({
+      fields: { name: 'fig "1".pdf', relativePath: 'img/fig "1".pdf' },
+      fileField: 'qqfile',
+      fileName: 'fig "1".pdf',
+      filePath: file,
+      fileSize: 7,
+      chunkSize: 2,
+    })
+    const chunks = []
+    for await (const chunk of multipart.body()) chunks.push(Buffer.from(chunk))
+    const body = Buffer.concat(chunks)
+    assert.equal(body.length, multipart.contentLength)
+    const boundary = multipart.contentType.split('boundary=')[1]
+    const text = body.toString('utf8')
+    assert.ok(text.startsWith(`--${boundary}\r\n`))
+    assert.ok(text.endsWith(`\r\n--${boundary}--\r\n`))
+    assert.match(text, /name="qqfile"; filename="fig %221%22\.pdf"/)
+    assert.match(text, /\r\n\r\nimg\/fig "1"\.pdf\r\n/)
+    assert.match(text, /\r\n\r\nPDFDATA\r\n/)
+  } finally {
+    await rm(dir, { recursive: true, force: true })
+  }
+})
+
+test('push streams 1 GB of assets with a bounded peak RSS', { timeout: 600_000 }, async () => {
+  const totalBytes = Number(process.env.OL_SYNC_TEST_STREAM_BYTES || 1024 ** 3)
+  const fileCount = 4
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-large-'))
+  const project = new StandInProject()
+  const server = await startStandInServer(project)
+  server.state.discardUploads = true
+  const dir = path.join(home, 'project')
+  try {
+    await mkdir(dir, { recursive: true })
+    for (let i = 0; i < fileCount; i++) {
+      // Sparse files: large on paper, cheap on disk.
+      const handle = await open(path.join(dir, `asset-${i}.bin`), 'w')
+      await handle.truncate(Math.floor(totalBytes / fileCount))
+      await handle.close()
+    }
+    await writeFile(
+      path.join(dir, CONFIG_FILENAME),
+      JSON.stringify({ baseUrl: server.baseUrl, projectId: project.projectId, rootFolderId: project.rootFolderId })
+    )
+    // The child reports its own peak RSS (KiB) as it exits.
+    const reportMaxRss = `data:text/javascript,process.on('exit', () => process.stderr.write('max-rss-kib ' + process.resourceUsage().maxRSS + '\\n'))`
+    const { stdout, stderr } = await execFileAsync(
+      process.execPath,
+      [
+        '--import', reportMaxRss,
+        OL_SYNC,
+        'push',
+        '--dir', dir,
+        '--base-url', server.baseUrl,
+        '--mongo-container', 'ol-sync-test-no-such-container',
+        '--no-session-cache',
+      ],
+      { env: { ...process.env, HOME: home, OVERLEAF_SYNC_EMAIL: 'me@example.com', OVERLEAF_SYNC_PASSWORD: 'pw' } }
+    )
+    assert.match(stdout, new RegExp(`uploaded=${fileCount} failed=0`))
+    assert.equal(server.stats.uploads, fileCount)
+    assert.ok(server.stats.uploadBytes > totalBytes - fileCount)
+    const peakMiB = Number(/max-rss-kib (\d+)/.exec(stderr)[1]) / 1024
+    assert.ok(peakMiB < 200, `push peaked at ${peakMiB.toFixed(1)} MiB RSS`)
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('IgnoreMatcher follows gitignore negation and anchoring', () => {
+  const matcher = IgnoreMatcher.compile(
+    ['# latexmk output', '*.aux', '*.log', '!keep.log', 'out/', '/build', 'docs/**/*.tmp', 'fig[0-9].pdf', ''].join('\n')
+  )
+  assert.equal(matcher.size, 7)
+  assert.equal(matcher.ignores('main.aux', false), true)
+  assert.equal(matcher.ignores('chapters/intro.aux', false), true)
+  assert.equal(matcher.ignores('keep.log', false), false)
+  assert.equal(matcher.ignores('out', true), true)
+  assert.equal(matcher.ignores('out', false), false)
+  assert.equal(matcher.ignores('sub/out/main.pdf', false), true)
+  assert.equal(matcher.ignores('build/main.pdf', false), true)
+  assert.equal(matcher.ignores('sub/build/main.pdf', false), false)
+  assert.equal(matcher.ignores('docs/a/b/x.tmp', false), true)
+  assert.equal(matcher.ignores('docs/x.tmp', false), true)
+  assert.equal(matcher.ignores('fig1.pdf', false), true)
+  assert.equal(matcher.ignores('figA.pdf', false), false)
+  assert.equal(matcher.ignores('main.tex', false), false)
+})
+
+test('IgnoreMatcher cannot re-include files inside an ignored directory', () => {
+  const matcher = IgnoreMatcher.compile('out/\n!out/keep.tex\n')
+  assert.equal(matcher.ignores('out/keep.tex', false), true)
+})
+
+test('shouldIgnore applies a project matcher after the default rules', async () => {
+  const dir = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-ignore-'))
+  try {
+    await writeFile(path.join(dir, IGNORE_FILENAME), '*.synctex.gz\n')
+    const matcher = await loadIgnoreMatcher(dir)
+    assert.equal(shouldIgnore(`out${path.sep}main.synctex.gz`, false, matcher), true)
+    assert.equal(shouldIgnore('main.tex', false, matcher), false)
+    assert.equal(shouldIgnore(IGNORE_FILENAME, false, matcher), true)
+    const missing = await loadIgnoreMatcher(path.join(dir, 'nope'))
+    assert.equal(missing.size, 0)
+  } finally {
+    await rm(dir, { recursive: true, force: true })
+  }
+})
+
+test('formatEvent emits one prefixed JSON line', () => {
+  const line = formatEvent('watch-queue', { depth: 3, inFlight: 1 })
+  assert.ok(line.startsWith(EVENT_PREFIX))
+  assert.ok(line.endsWith('\n'))
+  const event = JSON.parse(line.slice(EVENT_PREFIX.length))
+  assert.equal(event.type, 'watch-queue')
+  assert.equal(event.depth, 3)
+  assert.equal(event.inFlight, 1)
+  assert.equal(eventsEnabled({}, {}), false)
+  assert.equal(eventsEnabled({ events: true }, {}), true)
+  assert.equal(eventsEnabled({}, { OL_SYNC_EVENTS: '1' }), true)
+})
+
+function waitForDrain(pipeline) {
+  return new Promise(resolve => {
+    const previous = pipeline.onDrain
+    pipeline.onDrain = info => {
+      previous(info)
+      resolve(info)
+    }
+  })
+}
+
+test('WatchPipeline coalesces a burst and uploads with bounded parallelism', async () => {
+  let running = 0
+  let peak = 0
+  const uploaded = []
+  const batches = []
+  const pipeline = new WatchPipeline({
+    concurrency: 4,
+    quietMs: 20,
+    upload: async relPosix => {
+      running += 1
+      peak = Math.max(peak, running)
+      await new Promise(resolve => setTimeout(resolve, 15))
+      uploaded.push(relPosix)
+      running -= 1
+    },
+    onBatch: batch => batches.push(batch),
+  })
+  const drained = waitForDrain(pipeline)
+  for (let i = 0; i < 20; i++) pipeline.add(`sections/s${i % 10}.tex`)
+  const info = await drained
+
+  assert.equal(batches.length, 1)
+  assert.equal(batches[0].length, 10)
+  assert.equal(uploaded.length, 10)
+  assert.equal(peak, 4)
+  assert.equal(info.files, 10)
+  assert.equal(info.failed, 0)
+  assert.ok(pipeline.idle)
+})
+
+test('WatchPipeline re-uploads a path that changes while in flight', async () => {
+  const calls = []
+  let release
+  const gate = new Promise(resolve => {
+    release = resolve
+  })
+  const pipeline = new WatchPipeline({
+    concurrency: 2,
+    quietMs: 0,
+    upload: async relPosix => {
+      calls.push(relPosix)
+      if (calls.length === 1) await gate
+    },
+  })
+  const drained = waitForDrain(pipeline)
+  pipeline.add('main.tex')
+  pipeline.flush()
+  assert.equal(pipeline.inFlight, 1)
+  pipeline.add('main.tex')
+  pipeline.flush()
+  // Never two uploads of the same path at once.
+  assert.equal(pipeline.inFlight, 1)
+  release()
+  await drained
+  assert.deepEqual(calls, ['main.tex', 'main.tex'])
+})
+
+test('WatchPipeline reports failures without stalling the queue', async () => {
+  const errors = []
+  const pipeline = new WatchPipeline({
+    concurrency: 1,
+    quietMs: 0,
+    upload: async relPosix => {
+      if (relPosix === 'bad.tex') throw new Error('boom')
+    },
+    onError: (err, relPosix) => errors.push([relPosix, err.message]),
+  })
+  const drained = waitForDrain(pipeline)
+  pipeline.add('bad.tex')
+  pipeline.add('good.tex')
+  pipeline.flush()
+  const info = await drained
+  assert.deepEqual(errors, [['bad.tex', 'boom']])
+  assert.equal(info.files, 2)
+  assert.equal(info.failed, 1)
+})
+
+test('WatchPipeline flushes a long burst after maxWaitMs', async () => {
+  const batches = []
+  const pipeline = new WatchPipeline({
+    quietMs: 50,
+    maxWaitMs: 120,
+    upload: async () => {},
+    onBatch: batch => batches.push(batch),
+  })
+  const started = Date.now()
+  const timer = setInterval(() => pipeline.add('figure.pdf'), 10)
+  while (batches.length === 0 && Date.now() - started < 2000) {
+    await new Promise(resolve => setTimeout(resolve, 10))
+  }
+  clearInterval(timer)
+  pipeline.flush()
+  assert.ok(batches.length >= 1)
+  assert.ok(Date.now() - started < 1000)
+})
+
+function captureSpans() {
+  const stream = { lines: [], write(chunk) { this.lines.push(String(chunk)) } }
+  const spans = () =>
+    stream.lines.map(line => JSON.parse(line.slice(EVENT_PREFIX.length)))
+  return { stream, spans }
+}
+
+test('Tracer emits nothing unless enabled', async () => {
+  const { stream } = captureSpans()
+  const tracer = new Tracer({ stream })
+  const result = await tracer.run('login', {}, async () => 42)
+  tracer.start('unzip').end()
+  tracer.markStartup()
+  assert.equal(result, 42)
+  assert.deepEqual(stream.lines, [])
+  assert.equal(traceEnabled({}, {}), false)
+  assert.equal(traceEnabled({ trace: true }, {}), true)
+  assert.equal(traceEnabled({}, { OL_SYNC_TRACE: '1' }), true)
+})
+
+test('Tracer spans carry attributes, errors and per-upload lanes', async () => {
+  const { stream, spans } = captureSpans()
+  const tracer = new Tracer({ enabled: true, stream })
+
+  await tracer.run('download-zip', { project: 'p' }, async span => {
+    span.set({ bytes: 1234 })
+  })
+  await assert.rejects(
+    tracer.run('unzip', {}, async () => {
+      throw new Error('bad zip')
+    }),
+    /bad zip/
+  )
+  const a = tracer.start('upload', { path: 'a.tex' }, { concurrent: true })
+  const b = tracer.start('upload', { path: 'b.tex' }, { concurrent: true })
+  a.end()
+  const c = tracer.start('upload', { path: 'c.tex' }, { concurrent: true })
+  b.end()
+  c.end()
+  c.end()
+
+  const [download, unzip, upA, upB, upC] = spans()
+  assert.equal(spans().length, 5)
+  assert.equal(download.type, 'span')
+  assert.equal(download.name, 'download-zip')
+  assert.deepEqual(download.attrs, { project: 'p', bytes: 1234 })
+  assert.equal(download.lane, 0)
+  assert.equal(download.pid, process.pid)
+  assert.ok(download.dur >= 0)
+  assert.ok(download.start > 1e12)
+  assert.equal(unzip.attrs.error, 'bad zip')
+  assert.notEqual(upA.lane, 0)
+  assert.notEqual(upA.lane, upB.lane)
+  // a's lane is free again once it ended, so c reuses it.
+  assert.equal(upC.lane, upA.lane)
+})
+
+test('flattenProjectTree maps nested folders to posix paths', () => {
+  const tree = flattenProjectTree([
+    {
+      _id: 'root',
+      name: 'rootFolder',
+      docs: [{ _id: 'd1', name: 'main.tex', rev: 12 }],
+      fileRefs: [{ _id: 'f1', name: 'logo.png', hash: 'abc' }],
+      folders: [
+        {
+          _id: 'sub',
+          name: 'chapters',
+          docs: [{ _id: 'd2', name: 'intro.tex', rev: null }],
+          fileRefs: [{ _id: 'f2', name: '..' }],
+          folders: [],
+        },
+      ],
+    },
+  ])
+  assert.deepEqual(Array.from(tree), [
+    ['main.tex', { kind: 'doc', id: 'd1', rev: 12 }],
+    ['logo.png', { kind: 'file', id: 'f1', fileHash: 'abc' }],
+    ['chapters/intro.tex', { kind: 'doc', id: 'd2' }],
+  ])
+})
+
+test('planDeltaFetch skips unchanged files and always refreshes docs', async () => {
+  const tree = new Map([
+    ['main.tex', { kind: 'doc', id: 'd1' }],
+    ['same.png', { kind: 'file', id: 'f1', fileHash: 'h1' }],
+    ['edited-locally.png', { kind: 'file', id: 'f2', fileHash: 'h2' }],
+    ['replaced.png', { kind: 'file', id: 'f9', fileHash: 'h9' }],
+    ['new.pdf', { kind: 'file', id: 'f4', fileHash: 'h4' }],
+    ['build/out.pdf', { kind: 'file', id: 'f5', fileHash: 'h5' }],
+  ])
+  const previous = {
+    'same.png': { kind: 'file', id: 'f1', fileHash: 'h1', hash: 'sha-same' },
+    'edited-locally.png': { kind: 'file', id: 'f2', fileHash: 'h2', hash: 'sha-remote' },
+    'replaced.png': { kind: 'file', id: 'f3', fileHash: 'h3', hash: 'sha-old' },
+  }
+  const localIndex = new Map([
+    ['same.png', { hash: 'sha-same' }],
+    ['edited-locally.png', { hash: 'sha-local' }],
+  ])
+  const matcher = IgnoreMatcher.compile('build/\n')
+  const { reuse, download } = planDeltaFetch({ tree, previous, localIndex, matcher })
+
+  assert.deepEqual(
+    download.map(d => d.path),
+    ['edited-locally.png', 'main.tex', 'new.pdf', 'replaced.png']
+  )
+  assert.deepEqual(Array.from(reuse), [
+    ['same.png', 'sha-same'],
+    ['edited-locally.png', 'sha-remote'],
+  ])
+})
+
+test('matchRenames pairs equal content, preferring moves that keep the file name', () => {
+  const { renamed, added, deleted } = matchRenames(
+    [
+      { path: 'img/a.png', hash: 'ha' },
+      { path: 'img/copy.png', hash: 'ha' },
+      { path: 'notes.tex', hash: 'hn' },
+      { path: 'new.bib', hash: 'hb' },
+    ],
+    [
+      { path: 'figures/a.png', hash: 'ha' },
+      { path: 'draft.tex', hash: 'hn' },
+      { path: 'old.sty', hash: 'hs' },
+    ]
+  )
+  assert.deepEqual(renamed, [
+    { from: 'figures/a.png', to: 'img/a.png', hash: 'ha' },
+    { from: 'draft.tex', to: 'notes.tex', hash: 'hn' },
+  ])
+  assert.deepEqual(added, ['img/copy.png', 'new.bib'])
+  assert.deepEqual(deleted, ['old.sty'])
+})
+
+test('planDeltaFetch copies files moved on the server from their old local path', () => {
+  const tree = new Map([
+    ['img/a.png', { kind: 'file', id: 'f1', fileHash: 'h1' }],
+    ['img/b.png', { kind: 'file', id: 'f2', fileHash: 'h2' }],
+    ['img/c.png', { kind: 'file', id: 'f3', fileHash: 'h3' }],
+  ])
+  const previous = {
+    'figures/a.png': { kind: 'file', id: 'f1', fileHash: 'h1', hash: 'sha-a' },
+    'figures/b.png': { kind: 'file', id: 'f2', fileHash: 'h2', hash: 'sha-b' },
+  }
+  // b.png was edited locally before the move, so there is nothing to copy it from.
+  const localIndex = new Map([
+    ['figures/a.png', { hash: 'sha-a' }],
+    ['figures/b.png', { hash: 'sha-b-edited' }],
+  ])
+  const { reuse, download, copy } = planDeltaFetch({ tree, previous, localIndex, matcher: null })
+  assert.deepEqual(copy, [{ path: 'img/a.png', from: 'figures/a.png', hash: 'sha-a' }])
+  assert.deepEqual(download.map(d => d.path), ['img/b.png', 'img/c.png'])
+  assert.equal(reuse.get('img/a.png'), 'sha-a')
+})
+
+const execFileAsync = promisify(execFile)
+const OL_SYNC = fileURLToPath(new URL('../ol-sync.mjs', import.meta.url))
+const GUI = fileURLToPath(new URL('../gui.py', import.meta.url))
+const PYTHON = process.env.PYTHON || 'python3'
+const fixture = name => fileURLToPath(new URL(`./fixtures/${name}`, import.meta.url))
+
+test('fetch --delta downloads only changed entities and falls back to the zip', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-delta-'))
+  const project = new StandInProject()
+  const figure = Buffer.alloc(256 * 1024, 7)
+  project.set('main.tex', '\\documentclass{article}\n')
+  project.set('figures/plot.pdf', figure)
+  const server = await startStandInServer(project)
+  const localDir = path.join(home, 'local')
+  await mkdir(path.join(localDir, 'figures'), { recursive: true })
+  await writeFile(path.join(localDir, 'main.tex'), '\\documentclass{article}\n')
+  await writeFile(path.join(localDir, 'figures', 'plot.pdf'), figure)
+
+  const run = async (...args) => {
+    const { stdout } = await execFileAsync(
+      process.execPath,
+      [
+        OL_SYNC,
+        ...args,
+        '--base-url', server.baseUrl,
+        '--project-id', project.projectId,
+        '--dir', localDir,
+        '--mongo-container', 'ol-sync-test-no-such-container',
+        '--no-session-cache',
+      ],
+      {
+        env: {
+          ...process.env,
+          HOME: home,
+          OVERLEAF_SYNC_EMAIL: 'me@example.com',
+          OVERLEAF_SYNC_PASSWORD: 'pw',
+          OVERLEAF_SYNC_WEB_API_USER: WEB_API_USER,
+          OVERLEAF_SYNC_WEB_API_PASSWORD: WEB_API_PASSWORD,
+        },
+      }
+    )
+    return stdout
+  }
+  const fetchDelta = async () => JSON.parse(await run('fetch', '--delta', '--json'))
+
+  try {
+    // First run has no remote index yet, so everything is downloaded once.
+    let manifest = await fetchDelta()
+    assert.equal(manifest.transfer.mode, 'delta')
+    assert.deepEqual(manifest.changes, { added: [], modified: [], deleted: [], renamed: [] })
+    assert.equal(server.stats.file, 1)
+    assert.equal(server.stats.zip, 0)
+
+    // A web edit to one doc: only docs are fetched, the figure is reused.
+    project.set('main.tex', '\\documentclass{article}\n% edited on the web\n')
+    project.set('refs.bib', '@book{x}\n', 'doc')
+    manifest = await fetchDelta()
+    assert.equal(manifest.transfer.mode, 'delta')
+    assert.equal(server.stats.file, 1)
+    assert.equal(manifest.transfer.reused, 1)
+    assert.ok(manifest.transfer.bytes < figure.length)
+    assert.deepEqual(manifest.changes.added, ['refs.bib'])
+    assert.deepEqual(manifest.changes.modified.map(m => m.path), ['main.tex'])
+
+    // Replacing the figure on the web changes its file ref, so it is fetched.
+    project.set('figures/plot.pdf', Buffer.alloc(1024, 9))
+    manifest = await fetchDelta()
+    assert.equal(server.stats.file, 2)
+    assert.deepEqual(manifest.changes.modified.map(m => m.path), ['figures/plot.pdf', 'main.tex'])
+
+    // Same inbox format: apply works unchanged on a delta batch.
+    const applyOut = await run('apply')
+    assert.match(await readFile(path.join(localDir, 'main.tex'), 'utf8'), /edited on the web/)
+    assert.equal((await readFile(path.join(localDir, 'figures', 'plot.pdf'))).length, 1024)
+
+    // The pre-apply originals are listed in the backup manifest with their hashes.
+    const backupDir = applyOut.match(/^Backup: (.+)$/m)[1]
+    const backup = JSON.parse(await readFile(path.join(backupDir, BACKUP_MANIFEST_FILENAME), 'utf8'))
+    assert.equal(backup.source, 'apply')
+    assert.deepEqual(Object.keys(backup.files).sort(), ['figures/plot.pdf', 'main.tex'])
+    assert.equal(backup.files['figures/plot.pdf'].hash, createHash('sha256').update(figure).digest('hex'))
+    assert.equal(backup.files['figures/plot.pdf'].size, figure.length)
+
+    // Without a readable tree the zip is used and produces the same diff.
+    server.state.joinEnabled = false
+    project.set('main.tex', '\\documentclass{book}\n')
+    manifest = await fetchDelta()
+    assert.equal(manifest.transfer.mode, 'zip')
+    assert.equal(server.stats.zip, 1)
+    assert.deepEqual(manifest.changes.added, [])
+    assert.deepEqual(manifest.changes.modified.map(m => m.path), ['main.tex'])
+
+    // A zip fetch can hash both trees with crc32 on worker threads; the diff is the same.
+    manifest = JSON.parse(await run('fetch', '--json', '--digest', 'crc32', '--hash-threads', '2'))
+    assert.equal(manifest.transfer.mode, 'zip')
+    assert.deepEqual(manifest.changes.modified.map(m => m.path), ['main.tex'])
+    assert.match(manifest.changes.modified[0].remoteHash, /^crc32-\d+-[0-9a-f]{8}$/)
+
+    // A doc deleted on the web after the tree was read answers 404: the other
+    // workers stop taking entries, and the zip batch is built once they have.
+    server.state.joinEnabled = true
+    server.state.entityDelayMs = 50
+    project.set('a-gone.tex', 'gone\n', 'doc')
+    for (let i = 0; i < 12; i++) project.set(`chapters/${String(i).padStart(2, '0')}.tex`, `chapter ${i}\n`, 'doc')
+    server.state.goneIds.add(project.entities.get('a-gone.tex').id)
+    const docsBefore = server.stats.doc
+    const zipsBefore = server.stats.zip
+    manifest = await fetchDelta()
+    assert.equal(manifest.transfer.mode, 'zip')
+    assert.equal(server.stats.zip, zipsBefore + 1)
+    // Only what was already in flight finished; the rest of the 14 docs were never requested.
+    assert.ok(server.stats.doc - docsBefore < 4, `${server.stats.doc - docsBefore} docs downloaded after the 404`)
+    assert.equal(manifest.changes.added.length, 13)
+    assert.equal(await readFile(path.join(manifest.inboxDir, 'chapters', '11.tex'), 'utf8'), 'chapter 11\n')
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('pull --events reports download progress as the zip streams in', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-pull-'))
+  const project = new StandInProject()
+  project.set('main.tex', '\\documentclass{article}\n')
+  project.set('figures/plot.pdf', Buffer.alloc(2 * 1024 * 1024, 3))
+  const server = await startStandInServer(project)
+  const dir = path.join(home, 'project')
+
+  try {
+    const { stdout, stderr } = await execFileAsync(
+      process.execPath,
+      [
+        OL_SYNC,
+        'pull',
+        '--events',
+        '--base-url', server.baseUrl,
+        '--project-id', project.projectId,
+        '--dir', dir,
+        '--mongo-container', 'ol-sync-test-no-such-container',
+        '--no-session-cache',
+      ],
+      {
+        env: {
+          ...process.env,
+          HOME: home,
+          OVERLEAF_SYNC_EMAIL: 'me@example.com',
+          OVERLEAF_SYNC_PASSWORD: 'pw',
+          OVERLEAF_SYNC_WEB_API_USER: WEB_API_USER,
+          OVERLEAF_SYNC_WEB_API_PASSWORD: WEB_API_PASSWORD,
+        },
+      }
+    )
+    assert.match(stdout, new RegExp(`^Pulled ${project.projectId} -> `))
+    const events = stderr
+      .split('\n')
+      .filter(line => line.startsWith(EVENT_PREFIX))
+      .map(line => JSON.parse(line.slice(EVENT_PREFIX.length)))
+      .filter(event => event.type === 'pull-progress')
+    const downloads = events.filter(event => event.phase === 'download')
+    assert.ok(downloads.length >= 1)
+    for (let i = 1; i < downloads.length; i += 1) {
+      assert.ok(downloads[i].bytes >= downloads[i - 1].bytes)
+    }
+    const last = downloads[downloads.length - 1]
+    assert.equal(last.projectId, project.projectId)
+    assert.equal(last.bytes, server.stats.bytes)
+    assert.equal(last.total, server.stats.bytes)
+    assert.equal(events[events.length - 1].phase, 'unzip')
+    assert.equal((await readFile(path.join(dir, 'figures', 'plot.pdf'))).length, 2 * 1024 * 1024)
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('resumableDownload resumes over dropped connections and restarts when it cannot', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-resume-'))
+  const project = new StandInProject()
+  project.set('main.tex', '\\documentclass{article}\n')
+  project.set('figures/scan.pdf', randomBytes(1024 * 1024))
+  const server = await startStandInServer(project)
+  const url = `${server.baseUrl}/project/${project.projectId}/download/zip`
+  const zipOf = () => buildStoredZip(Array.from(project.entities, ([name, entity]) => ({ name, content: entity.content })))
+  const download = async (name, opts = {}) => {
+    const dest = path.join(home, name)
+    const progress = []
+    const result = await resumableDownload(url, dest, {
+      partPath: path.join(home, 'zip.part'),
+      retryMinMs: 10,
+      onProgress: p => progress.push(p),
+      ...opts,
+    })
+    assert.deepEqual(await readFile(dest), zipOf())
+    return { result, progress }
+  }
+
+  try {
+    const zipBytes = zipOf().length
+    const cut = server.state.zipCutBytes = 256 * 1024
+
+    // Every dropped connection is picked up where it stopped. Only what was
+    // still buffered in the client when the connection dropped is sent again.
+    server.state.zipCuts = 3
+    let { result, progress } = await download('a.zip')
+    assert.equal(result.attempts, 4)
+    assert.ok(result.resumedFrom > 0 && result.resumedFrom <= cut)
+    assert.equal(server.stats.zipRanges, 3)
+    assert.ok(server.stats.bytes < zipBytes + cut)
+    assert.deepEqual(progress.at(-1), { ...progress.at(-1), bytes: zipBytes, total: zipBytes, done: true })
+    for (let i = 1; i < progress.length; i += 1) assert.ok(progress[i].bytes >= progress[i - 1].bytes)
+
+    // A run that gives up leaves its partial file for the next one to resume.
+    server.stats.bytes = 0
+    server.state.zipCuts = 3
+    await assert.rejects(download('b.zip', { attempts: 2 }))
+    const kept = (await stat(path.join(home, 'zip.part'))).size
+    assert.ok(kept > cut && kept <= 2 * cut)
+    ;({ result } = await download('b.zip'))
+    assert.equal(result.resumedFrom, kept)
+    assert.ok(server.stats.bytes < zipBytes + cut)
+
+    // Without Range support the server answers 200 and the download starts over.
+    server.stats.bytes = 0
+    server.state.zipRange = false
+    server.state.zipCuts = 1
+    ;({ result } = await download('c.zip'))
+    assert.equal(result.resumedFrom, 0)
+    assert.equal(server.stats.bytes, cut + zipBytes)
+
+    // Nor is a partial file resumed once the project has changed (If-Range fails).
+    server.state.zipRange = true
+    server.state.zipCuts = 1
+    await assert.rejects(download('d.zip', { attempts: 1 }))
+    project.set('main.tex', '\\documentclass{book}\n')
+    server.stats.bytes = 0
+    const ranges = server.stats.zipRanges
+    ;({ result } = await download('d.zip'))
+    assert.equal(result.resumedFrom, 0)
+    assert.equal(server.stats.zipRanges, ranges)
+    assert.equal(server.stats.bytes, zipOf().length)
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('pull resumes a zip download that an earlier run left unfinished', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-pull-resume-'))
+  const project = new StandInProject()
+  project.set('main.tex', '\\documentclass{article}\n')
+  const scan = randomBytes(1024 * 1024)
+  project.set('figures/scan.pdf', scan)
+  const server = await startStandInServer(project)
+  const dir = path.join(home, 'project')
+  const pull = () =>
+    execFileAsync(
+      process.execPath,
+      [
+        OL_SYNC,
+        'pull',
+        '--events',
+        '--base-url', server.baseUrl,
+        '--project-id', project.projectId,
+        '--dir', dir,
+        '--mongo-container', 'ol-sync-test-no-such-container',
+        '--no-session-cache',
+      ],
+      {
+        env: {
+          ...process.env,
+          HOME: home,
+          OVERLEAF_SYNC_EMAIL: 'me@example.com',
+          OVERLEAF_SYNC_PASSWORD: 'pw',
+          OVERLEAF_SYNC_WEB_API_USER: WEB_API_USER,
+          OVERLEAF_SYNC_WEB_API_PASSWORD: WEB_API_PASSWORD,
+        },
+      }
+    )
+
+  try {
+    // While another run resumes the shared partial file, a pull downloads into a private
+    // one in the inbox. If it fails, nothing is left behind, in the target folder or the inbox.
+    const inbox = path.join(home, '.config', 'overleaf-sync', 'inbox', new URL(server.baseUrl).host.replace(/[^a-zA-Z0-9._-]+/g, '_'), project.projectId)
+    const other = await acquireFileLease(path.join(inbox, `${ZIP_PART_FILENAME}.lock`))
+    server.state.zipCutBytes = 128 * 1024
+    server.state.zipCuts = 5
+    await assert.rejects(pull())
+    await other.release()
+    assert.deepEqual(await readdir(dir), [])
+    assert.deepEqual(await readdir(inbox), [])
+
+    // More cuts than one run retries: the first pull fails part-way.
+    server.stats.bytes = 0
+    server.state.zipCuts = 5
+    await assert.rejects(pull())
+    assert.deepEqual(await readdir(dir), [])
+
+    const { stderr } = await pull()
+    const progress = stderr
+      .split('\n')
+      .filter(line => line.startsWith(EVENT_PREFIX))
+      .map(line => JSON.parse(line.slice(EVENT_PREFIX.length)))
+      .filter(event => event.type === 'download-progress')
+    const last = progress.at(-1)
+    assert.equal(last.op, 'pull')
+    assert.equal(last.projectId, project.projectId)
+    assert.ok(last.resumedFrom > 0)
+    assert.equal(last.bytes, last.total)
+    assert.equal(typeof last.bytesPerSec, 'number')
+    // Cheaper than starting over after each of the five cuts.
+    assert.ok(server.stats.bytes < last.total + 5 * 128 * 1024)
+    assert.deepEqual(await readFile(path.join(dir, 'figures', 'scan.pdf')), scan)
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('parseBulkLine accepts bare ids and NDJSON with per-line actions', () => {
+  assert.equal(parseBulkLine('   ', 'trash'), null)
+  assert.equal(parseBulkLine('# cleanup', 'trash'), null)
+  assert.deepEqual(parseBulkLine(' 64a1f0c2e4b0a1b2c3d4e5f6 ', 'trash'), {
+    projectId: '64a1f0c2e4b0a1b2c3d4e5f6',
+    action: 'trash',
+  })
+  assert.deepEqual(parseBulkLine('{"projectId":"abc","action":"archive"}', 'trash'), {
+    projectId: 'abc',
+    action: 'archive',
+  })
+  assert.deepEqual(parseBulkLine('{"id":"abc"}', 'untrash'), { projectId: 'abc', action: 'untrash' })
+  assert.throws(() => parseBulkLine('abc', undefined), /Invalid action/)
+  assert.throws(() => parseBulkLine('{"projectId":"abc","action":"explode"}', 'trash'), /Invalid action/)
+  assert.throws(() => parseBulkLine('../admin', 'trash'), /Invalid project id/)
+  assert.throws(() => parseBulkLine('{"projectId":', 'trash'))
+})
+
+test('project-bulk streams NDJSON results over one login with bounded concurrency', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-bulk-'))
+  const project = new StandInProject()
+  const server = await startStandInServer(project)
+  const ids = Array.from({ length: 30 }, (_, i) => (0x1000 + i).toString(16).padStart(24, '0'))
+  server.state.projectIds = new Set(ids)
+  server.state.actionDelayMs = 20
+
+  const child = spawn(
+    process.execPath,
+    [
+      OL_SYNC,
+      'project-bulk',
+      '--action', 'archive',
+      '--stdin',
+      '--json',
+      '--concurrency', '4',
+      '--base-url', server.baseUrl,
+      '--no-session-cache',
+    ],
+    {
+      env: {
+        ...process.env,
+        HOME: home,
+        OVERLEAF_SYNC_EMAIL: 'me@example.com',
+        OVERLEAF_SYNC_PASSWORD: 'pw',
+      },
+    }
+  )
+  const results = []
+  let firstResult
+  const gotFirst = new Promise(resolve => {
+    firstResult = resolve
+  })
+  let buffered = ''
+  child.stdout.on('data', chunk => {
+    buffered += chunk
+    let nl
+    while ((nl = buffered.indexOf('\n')) >= 0) {
+      results.push(JSON.parse(buffered.slice(0, nl)))
+      buffered = buffered.slice(nl + 1)
+      firstResult()
+    }
+  })
+  const exited = new Promise(resolve => child.on('close', resolve))
+
+  try {
+    child.stdin.write(ids.slice(0, 5).join('\n') + '\n')
+    // Results stream back while stdin is still open.
+    await gotFirst
+    assert.ok(results.length >= 1)
+    // Rotate the CSRF token mid-batch: the CLI refreshes it instead of failing.
+    server.state.csrf = 'rotated-token'
+    for (const id of ids.slice(5, 20)) child.stdin.write(JSON.stringify({ projectId: id }) + '\n')
+    for (const id of ids.slice(20)) child.stdin.write(JSON.stringify({ projectId: id, action: 'trash' }) + '\n')
+    child.stdin.write(ids[0] + '\n')
+    child.stdin.write('{"projectId":"ffffffffffffffffffffffff"}\n')
+    child.stdin.end('not json {\n')
+    // Some items failed, so the run exits 1 like mirror and root-folders.
+    assert.equal(await exited, 1)
+
+    const items = results.filter(r => !r.done)
+    const summary = results.at(-1)
+    assert.equal(summary.done, true)
+    assert.equal(summary.ok, 30)
+    assert.equal(summary.failed, 2)
+    assert.equal(items.length, 32)
+    assert.equal(server.stats.logins, 1)
+    assert.ok(server.stats.csrfRejected >= 1)
+    assert.ok(server.stats.actionsPeak > 1)
+    assert.ok(server.stats.actionsPeak <= 4)
+    assert.equal(server.stats.actions.filter(a => a.action === 'archive').length, 20)
+    assert.equal(server.stats.actions.filter(a => a.action === 'trash').length, 10)
+    const missing = items.find(r => r.projectId === 'ffffffffffffffffffffffff')
+    assert.equal(missing.ok, false)
+    assert.match(missing.error, /HTTP 404/)
+    assert.ok(items.some(r => r.ok === false && /stdin line/.test(r.error)))
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('planMirror re-syncs only new or updated projects', () => {
+  const previous = {
+    a: { lastUpdated: '2024-01-01T00:00:00.000Z', snapshot: 's1' },
+    b: { lastUpdated: '2024-01-01T00:00:00.000Z', snapshot: 's1' },
+    c: { lastUpdated: '2024-01-01T00:00:00.000Z' },
+    gone: { lastUpdated: '2024-01-01T00:00:00.000Z', snapshot: 's1' },
+  }
+  const { sync, skip, removed } = planMirror(
+    [
+      { id: 'a', lastUpdated: '2024-01-01T00:00:00.000Z' },
+      { id: 'b', lastUpdated: '2024-02-01T00:00:00.000Z' },
+      { id: 'c', lastUpdated: '2024-01-01T00:00:00.000Z' },
+      { _id: 'd' },
+    ],
+    previous
+  )
+  assert.deepEqual(
+    sync.map(item => [item.project.id || item.project._id, item.reason]),
+    [['b', 'updated'], ['c', 'new'], ['d', 'new']]
+  )
+  assert.deepEqual(skip.map(p => p.id), ['a'])
+  assert.deepEqual(removed, ['gone'])
+})
+
+test('storeDeduplicated hard-links identical content and pruneObjectStore drops orphans', async () => {
+  const root = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-objects-'))
+  const objects = path.join(root, 'objects')
+  try {
+    await writeFile(path.join(root, 'a.pdf'), 'same bytes')
+    await writeFile(path.join(root, 'b.pdf'), 'same bytes')
+    await writeFile(path.join(root, 'c.tex'), 'other')
+    const a = await storeDeduplicated(objects, path.join(root, 'a.pdf'))
+    const b = await storeDeduplicated(objects, path.join(root, 'b.pdf'))
+    await storeDeduplicated(objects, path.join(root, 'c.tex'))
+    assert.equal(a.deduplicated, false)
+    assert.equal(b.deduplicated, true)
+    assert.equal(b.hash, a.hash)
+    assert.equal((await stat(path.join(root, 'b.pdf'))).ino, (await stat(path.join(root, 'a.pdf'))).ino)
+    assert.equal((await stat(path.join(root, 'a.pdf'))).nlink, 3)
+    assert.equal(await readFile(path.join(root, 'b.pdf'), 'utf8'), 'same bytes')
+
+    await rm(path.join(root, 'c.tex'))
+    assert.deepEqual(await pruneObjectStore(objects), { removed: 1, bytes: 5 })
+    assert.deepEqual(await pruneObjectStore(objects), { removed: 0, bytes: 0 })
+  } finally {
+    await rm(root, { recursive: true, force: true })
+  }
+})
+
+test('mirror downloads only changed projects into a deduplicated store', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-mirror-'))
+  const shared = Buffer.alloc(512 * 1024, 5)
+  const thesis = new StandInProject('00000000000000000000aaa1', 'Thesis')
+  thesis.set('main.tex', '\\documentclass{book}\n')
+  thesis.set('logo.pdf', shared)
+  const paper = new StandInProject('00000000000000000000aaa2', 'Paper')
+  paper.set('main.tex', '\\documentclass{article}\n')
+  paper.set('logo.pdf', shared)
+  const server = await startStandInServer(thesis)
+  server.state.projects.set(paper.projectId, paper)
+  const mirrorRoot = path.join(home, 'mirror')
+
+  const mirror = async () => {
+    const { stdout } = await execFileAsync(
+      process.execPath,
+      [OL_SYNC, 'mirror', '--json', '--keep', '1', '--dir', mirrorRoot, '--base-url', server.baseUrl, '--no-session-cache'],
+      { env: { ...process.env, HOME: home, OVERLEAF_SYNC_EMAIL: 'me@example.com', OVERLEAF_SYNC_PASSWORD: 'pw' } }
+    )
+    const lines = stdout.trim().split('\n').map(line => JSON.parse(line))
+    return { items: lines.slice(0, -1), summary: lines[lines.length - 1] }
+  }
+  const snapshots = async projectId =>
+    (await readdir(path.join(mirrorRoot, projectId, 'mirror'))).sort()
+
+  try {
+    let { items, summary } = await mirror()
+    assert.equal(summary.done, true)
+    assert.deepEqual([summary.synced, summary.skipped, summary.failed], [2, 0, 0])
+    assert.deepEqual(items.map(item => item.reason), ['new', 'new'])
+    // The shared figure is stored once across both projects.
+    assert.equal(summary.dedupedBytes, shared.length)
+    const [thesisSnapshot] = await snapshots(thesis.projectId)
+    const logo = path.join(mirrorRoot, thesis.projectId, 'mirror', thesisSnapshot, 'logo.pdf')
+    assert.equal((await stat(logo)).nlink, 3)
+    assert.equal(server.stats.zip, 2)
+
+    // Nothing changed on the instance: nothing is downloaded.
+    ;({ items, summary } = await mirror())
+    assert.deepEqual(items, [])
+    assert.deepEqual([summary.synced, summary.skipped, summary.transferredBytes], [0, 2, 0])
+    assert.ok(summary.skippedBytes > 2 * shared.length)
+    assert.equal(server.stats.zip, 2)
+
+    // One project edited: only it is re-downloaded, and its unchanged files
+    // link to the objects already stored.
+    paper.set('main.tex', '\\documentclass{article}\n% revised\n')
+    ;({ items, summary } = await mirror())
+    assert.deepEqual(items.map(item => [item.projectId, item.reason]), [[paper.projectId, 'updated']])
+    assert.deepEqual(server.stats.zipByProject, { [thesis.projectId]: 1, [paper.projectId]: 2 })
+    assert.equal(summary.dedupedBytes, shared.length)
+    const paperSnapshots = await snapshots(paper.projectId)
+    assert.equal(paperSnapshots.length, 1)
+    assert.match(
+      await readFile(path.join(mirrorRoot, paper.projectId, 'mirror', paperSnapshots[0], 'main.tex'), 'utf8'),
+      /revised/
+    )
+    // The superseded main.tex object was pruned along with the old snapshot.
+    assert.equal(summary.prunedObjects, 1)
+    const shards = await readdir(path.join(mirrorRoot, MIRROR_OBJECTS_DIRNAME))
+    let objectCount = 0
+    for (const shard of shards) {
+      objectCount += (await readdir(path.join(mirrorRoot, MIRROR_OBJECTS_DIRNAME, shard))).length
+    }
+    assert.equal(objectCount, 3)
+
+    const state = JSON.parse(await readFile(path.join(mirrorRoot, MIRROR_STATE_FILENAME), 'utf8'))
+    assert.equal(state.projects[paper.projectId].lastUpdated, paper.lastUpdated)
+    assert.equal(state.lastRun.synced, 1)
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('push caches the resolved rootFolderId and re-resolves it when an upload is rejected', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-root-folder-'))
+  const project = new StandInProject()
+  const server = await startStandInServer(project)
+  const linked = path.join(home, 'linked')
+  const pinned = path.join(home, 'pinned')
+  const unlinked = path.join(home, 'unlinked')
+  const bogus = path.join(home, 'bogus')
+  const cachePath = path.join(home, '.config', 'overleaf-sync', 'root-folders.json')
+  const cacheKey = `${server.baseUrl} ${project.projectId}`
+  for (const dir of [linked, pinned, unlinked, bogus]) await mkdir(dir, { recursive: true })
+  await writeFile(path.join(linked, 'main.tex'), '\\documentclass{article}\n')
+  await writeFile(path.join(linked, CONFIG_FILENAME), JSON.stringify({ baseUrl: server.baseUrl, projectId: project.projectId }))
+  await writeFile(
+    path.join(pinned, CONFIG_FILENAME),
+    JSON.stringify({ baseUrl: server.baseUrl, projectId: project.projectId, rootFolderId: project.rootFolderId })
+  )
+  await writeFile(path.join(bogus, CONFIG_FILENAME), JSON.stringify({ baseUrl: server.baseUrl, projectId: '"]);db.dropDatabase();(["' }))
+
+  const run = (args, input) =>
+    new Promise((resolve, reject) => {
+      const child = execFile(
+        process.execPath,
+        [OL_SYNC, ...args, '--base-url', server.baseUrl, '--mongo-container', 'ol-sync-test-no-such-container', '--no-session-cache'],
+        {
+          env: {
+            ...process.env,
+            HOME: home,
+            OVERLEAF_SYNC_EMAIL: 'me@example.com',
+            OVERLEAF_SYNC_PASSWORD: 'pw',
+            OVERLEAF_SYNC_WEB_API_USER: WEB_API_USER,
+            OVERLEAF_SYNC_WEB_API_PASSWORD: WEB_API_PASSWORD,
+          },
+        },
+        (err, stdout) => (err && err.code !== 1 ? reject(err) : resolve(stdout))
+      )
+      child.stdin.end(input || '')
+    })
+  const readCache = async () => JSON.parse(await readFile(cachePath, 'utf8')).entries
+
+  try {
+    // No Mongo here, so the first push resolves through the private join and caches it.
+    assert.match(await run(['push', '--dir', linked]), /uploaded=1 failed=0/)
+    assert.equal(server.stats.join, 1)
+    assert.equal((await readCache())[cacheKey].rootFolderId, project.rootFolderId)
+    assert.equal((await readCache())[cacheKey].via, 'join')
+
+    // The next push reuses the cached id without another lookup.
+    assert.match(await run(['push', '--dir', linked]), /uploaded=1 failed=0/)
+    assert.equal(server.stats.join, 1)
+
+    // A stale cached id: the rejected upload triggers one fresh lookup and a retry.
+    await writeFile(cachePath, JSON.stringify({ version: 1, entries: { [cacheKey]: { rootFolderId: 'f'.repeat(24), via: 'join' } } }))
+    assert.match(await run(['push', '--dir', linked]), /uploaded=1 failed=0/)
+    assert.equal(server.stats.join, 2)
+    assert.equal(server.stats.uploadsRejected, 1)
+    assert.equal((await readCache())[cacheKey].rootFolderId, project.rootFolderId)
+
+    // root-folders resolves many folders at once; config and cache need no lookup,
+    // and a malformed project id fails only its own folder.
+    const lines = async args =>
+      (await run(['root-folders', '--stdin', '--json', ...args], [linked, pinned, unlinked, bogus].join('\n') + '\n'))
+        .trim()
+        .split('\n')
+        .map(line => JSON.parse(line))
+    let results = await lines([])
+    const byDir = Object.fromEntries(results.filter(r => r.dir).map(r => [r.dir, r]))
+    assert.equal(byDir[linked].via, 'cache')
+    assert.equal(byDir[pinned].via, 'config')
+    assert.match(byDir[unlinked].error, /no \.ol-sync\.json/)
+    assert.match(byDir[bogus].error, /Not a project id/)
+    assert.deepEqual(results.at(-1).done && [results.at(-1).resolved, results.at(-1).failed], [2, 2])
+    assert.equal(server.stats.join, 2)
+
+    results = await lines(['--refresh'])
+    assert.equal(results.find(r => r.dir === linked).via, 'join')
+    assert.equal(results.find(r => r.dir === linked).rootFolderId, project.rootFolderId)
+    assert.equal(server.stats.join, 3)
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('fetch and apply carry out web renames locally, push sends local ones as moves', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-renames-'))
+  const project = new StandInProject()
+  const plots = ['a', 'b', 'c'].map(name => [`figures/${name}.pdf`, randomBytes(64 * 1024)])
+  project.set('main.tex', '\\documentclass{article}\n')
+  for (const [relPosix, content] of plots) project.set(relPosix, content)
+  const server = await startStandInServer(project)
+  const dir = path.join(home, 'local')
+  await mkdir(path.join(dir, 'figures'), { recursive: true })
+  await writeFile(path.join(dir, 'main.tex'), '\\documentclass{article}\n')
+  for (const [relPosix, content] of plots) await writeFile(path.join(dir, relPosix), content)
+  await writeFile(
+    path.join(dir, CONFIG_FILENAME),
+    JSON.stringify({ baseUrl: server.baseUrl, projectId: project.projectId, rootFolderId: project.rootFolderId })
+  )
+  const run = async (...args) => {
+    const { stdout } = await execFileAsync(
+      process.execPath,
+      [OL_SYNC, ...args, '--dir', dir, '--mongo-container', 'ol-sync-test-no-such-container', '--no-session-cache'],
+      {
+        env: {
+          ...process.env,
+          HOME: home,
+          OVERLEAF_SYNC_EMAIL: 'me@example.com',
+          OVERLEAF_SYNC_PASSWORD: 'pw',
+          OVERLEAF_SYNC_WEB_API_USER: WEB_API_USER,
+          OVERLEAF_SYNC_WEB_API_PASSWORD: WEB_API_PASSWORD,
+        },
+      }
+    )
+    return stdout
+  }
+  const remotePaths = () => [...project.entities.keys()].sort()
+
+  try {
+    let manifest = JSON.parse(await run('fetch', '--delta', '--json'))
+    assert.equal(server.stats.file, 3)
+
+    // figures/ renamed to img/ on the web: nothing is downloaded again.
+    for (const [relPosix] of plots) {
+      const entity = project.entities.get(relPosix)
+      project.relocate('file', entity.id, relPosix.replace('figures/', 'img/'))
+    }
+    manifest = JSON.parse(await run('fetch', '--delta', '--json'))
+    assert.equal(server.stats.file, 3)
+    assert.equal(manifest.transfer.copied, 3)
+    assert.deepEqual(manifest.changes.added, [])
+    assert.deepEqual(manifest.changes.deleted, [])
+    assert.deepEqual(
+      manifest.changes.renamed.map(r => [r.from, r.to]),
+      plots.map(([relPosix]) => [relPosix, relPosix.replace('figures/', 'img/')])
+    )
+
+    // apply moves the local files and drops the emptied folder.
+    assert.match(await run('apply'), /Applied 0 file\(s\)[\s\S]*Renamed 3 file\(s\) locally/)
+    assert.deepEqual((await readdir(dir)).sort(), [CONFIG_FILENAME, 'img', 'main.tex'])
+    for (const [relPosix, content] of plots) {
+      assert.deepEqual(await readFile(path.join(dir, relPosix.replace('figures/', 'img/'))), content)
+    }
+
+    // Locally: img/ becomes art/ (a new folder), one plot is renamed in place, main.tex becomes paper.tex.
+    await mkdir(path.join(dir, 'art'))
+    for (const name of ['a', 'b']) await rename(path.join(dir, 'img', `${name}.pdf`), path.join(dir, 'art', `${name}.pdf`))
+    await rename(path.join(dir, 'img', 'c.pdf'), path.join(dir, 'img', 'c-final.pdf'))
+    await rename(path.join(dir, 'main.tex'), path.join(dir, 'paper.tex'))
+    const ids = Object.fromEntries([...project.entities].map(([relPosix, e]) => [relPosix, e.id]))
+    assert.match(await run('push'), /uploaded=0 failed=0 moved=4/)
+    assert.equal(server.stats.uploads, 0)
+    assert.deepEqual(
+      { moves: server.stats.moves, renames: server.stats.renames, folders: server.stats.foldersCreated },
+      { moves: 2, renames: 2, folders: 1 }
+    )
+    assert.deepEqual(remotePaths(), ['art/a.pdf', 'art/b.pdf', 'img/c-final.pdf', 'paper.tex'])
+    assert.equal(project.entities.get('art/a.pdf').id, ids['img/a.pdf'])
+    assert.equal(project.entities.get('paper.tex').id, ids['main.tex'])
+
+    // A new file with content the server doesn't have is still uploaded.
+    await writeFile(path.join(dir, 'art', 'd.pdf'), randomBytes(1024))
+    await rm(path.join(dir, 'art', 'b.pdf'))
+    assert.match(await run('push'), /uploaded=4 failed=0$/m)
+
+    // A file added on the web and never applied here is not ours to move,
+    // even when a new local file holds the same content.
+    const shared = randomBytes(2048)
+    project.set('web/notes.pdf', shared)
+    await writeFile(path.join(dir, 'mine.pdf'), shared)
+    const moves = server.stats.moves + server.stats.renames
+    assert.match(await run('push'), /uploaded=5 failed=0$/m)
+    assert.equal(server.stats.moves + server.stats.renames, moves)
+    assert.ok(project.entities.has('web/notes.pdf'))
+    await rm(path.join(dir, 'mine.pdf'))
+
+    // A move whose rename fails is moved back before the file is uploaded instead.
+    await mkdir(path.join(dir, 'final'))
+    await rename(path.join(dir, 'art', 'a.pdf'), path.join(dir, 'final', 'a-v2.pdf'))
+    server.state.renameFailures = 1
+    assert.match(await run('push'), /uploaded=4 failed=0$/m)
+    assert.ok(project.entities.has('art/a.pdf'))
+    assert.ok(project.entities.has('final/a-v2.pdf'))
+    assert.ok(!project.entities.has('final/a.pdf'))
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('outbox keeps one entry per path and folder, and only transient failures', async () => {
+  const tmp = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-outbox-'))
+  try {
+    const outbox = new Outbox(tmp, '/work/thesis')
+    const other = new Outbox(tmp, '/work/copy')
+    assert.deepEqual(await outbox.pending(), [])
+    assert.equal(await outbox.update({ queued: [['main.tex', new Error('fetch failed')]] }), 1)
+    assert.equal(await outbox.update({ queued: [['fig/a.pdf', 'HTTP 503'], ['main.tex', 'HTTP 502']] }), 2)
+    assert.equal(await other.update({ queued: [['main.tex', 'HTTP 503']] }), 1)
+    const listed = await outbox.list()
+    assert.deepEqual(listed.map(entry => [entry.path, entry.attempts]).sort(), [['fig/a.pdf', 1], ['main.tex', 2]])
+    assert.equal(listed.find(entry => entry.path === 'main.tex').error, 'HTTP 502')
+    assert.equal(await outbox.update({ done: ['main.tex', 'never-queued.tex'] }), 1)
+    assert.deepEqual(await other.pending(), ['main.tex'])
+    const raw = JSON.parse(await readFile(path.join(tmp, OUTBOX_FILENAME), 'utf8'))
+    assert.deepEqual(Object.keys(raw.folders['/work/thesis']), ['fig/a.pdf'])
+    assert.deepEqual(Object.keys(raw.folders['/work/copy']), ['main.tex'])
+
+    // Processes updating the same outbox at once (a push next to a watch) keep each other's entries.
+    const lib = new URL('../lib.mjs', import.meta.url).href
+    await Promise.all(
+      [0, 1, 2, 3].map(worker =>
+        execFileAsync(process.execPath, [
+          '--input-type=module',
+          '-e',
+          `import { Outbox } from ${JSON.stringify(lib)}
+          const outbox = new Outbox(${JSON.stringify(tmp)}, '/work/busy')
+          for (let n = 0; n < 25; n++) await outbox.update({ queued: [['w${worker}-' + n + '.tex', 'HTTP 503']] })`,
+        ])
+      )
+    )
+    assert.equal((await new Outbox(tmp, '/work/busy').pending()).length, 100)
+
+    const httpError = status => Object.assign(new Error(`HTTP ${status}`), { status })
+    assert.equal(isTransientUploadError(new TypeError('fetch failed')), true)
+    assert.equal(isTransientUploadError(httpError(503)), true)
+    assert.equal(isTransientUploadError(httpError(429)), true)
+    assert.equal(isTransientUploadError(httpError(422)), false)
+    assert.equal(isTransientUploadError(Object.assign(new Error('gone'), { code: 'ENOENT' })), false)
+
+    assert.equal(backoffDelay(1, { minMs: 1000, random: () => 0 }), 500)
+    assert.equal(backoffDelay(3, { minMs: 1000, random: () => 1 }), 4000)
+    assert.equal(backoffDelay(20, { minMs: 1000, maxMs: 60000, random: () => 1 }), 60000)
+  } finally {
+    await rm(tmp, { recursive: true, force: true })
+  }
+})
+
+test('uploads that fail while the server is down are queued and replayed', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-offline-'))
+  const project = new StandInProject()
+  const server = await startStandInServer(project)
+  const dir = path.join(home, 'thesis')
+  await mkdir(path.join(dir, 'fig'), { recursive: true })
+  await writeFile(path.join(dir, 'main.tex'), '\\documentclass{article}\n')
+  await writeFile(path.join(dir, 'fig', 'plot.pdf'), 'v1')
+  await writeFile(
+    path.join(dir, CONFIG_FILENAME),
+    JSON.stringify({ baseUrl: server.baseUrl, projectId: project.projectId, rootFolderId: project.rootFolderId })
+  )
+  const env = {
+    ...process.env,
+    HOME: home,
+    OVERLEAF_SYNC_EMAIL: 'me@example.com',
+    OVERLEAF_SYNC_PASSWORD: 'pw',
+    OL_SYNC_OUTBOX_RETRY_MS: '100',
+  }
+  const cliArgs = ['--dir', dir, '--base-url', server.baseUrl, '--no-session-cache']
+  const run = args =>
+    new Promise((resolve, reject) => {
+      execFile(process.execPath, [OL_SYNC, ...args, ...cliArgs], { env }, (err, stdout) =>
+        err && err.code !== 1 ? reject(err) : resolve(stdout)
+      )
+    })
+  const queue = async () =>
+    (await run(['outbox', '--json']))
+      .trim()
+      .split('\n')
+      .map(line => JSON.parse(line))
+
+  let watch
+  try {
+    server.state.uploadsDown = true
+    assert.match(await run(['push']), /uploaded=0 failed=2 queued=2/)
+    // A second failed push updates the entries instead of adding more.
+    await writeFile(path.join(dir, 'fig', 'plot.pdf'), 'v2')
+    assert.match(await run(['push']), /uploaded=0 failed=2 queued=2/)
+    let listed = await queue()
+    assert.deepEqual(listed.slice(0, -1).map(entry => [entry.path, entry.attempts]).sort(), [['fig/plot.pdf', 2], ['main.tex', 2]])
+    assert.deepEqual(listed.at(-1), { done: true, queued: 2 })
+
+    // The server comes back: --replay delivers what is still there.
+    await rm(path.join(dir, 'main.tex'))
+    server.state.uploadsDown = false
+    const replayed = (await run(['outbox', '--replay', '--json'])).trim().split('\n').map(line => JSON.parse(line))
+    assert.deepEqual(replayed.slice(0, -1).map(r => [r.path, r.ok, r.skipped]).sort(), [
+      ['fig/plot.pdf', true, undefined],
+      ['main.tex', true, 'missing'],
+    ])
+    assert.deepEqual(replayed.at(-1), { done: true, uploaded: 1, failed: 0, queued: 0 })
+    assert.equal(server.stats.uploads, 1)
+
+    // watch queues edits made while the server is down and replays them once it answers.
+    server.state.uploadsDown = true
+    watch = spawn(process.execPath, [OL_SYNC, 'watch', '--events', '--quiet-ms', '50', ...cliArgs], { env })
+    const depths = []
+    let stdout = ''
+    const waitFor = (predicate, what) =>
+      new Promise((resolve, reject) => {
+        const timer = setTimeout(() => reject(new Error(`timed out waiting for ${what}; stdout: ${stdout}`)), 20_000)
+        const check = () => {
+          if (!predicate()) return
+          clearTimeout(timer)
+          resolve()
+        }
+        watch.stdout.on('data', check)
+        watch.stderr.on('data', check)
+        check()
+      })
+    watch.stdout.on('data', chunk => {
+      stdout += chunk
+    })
+    let stderr = ''
+    watch.stderr.on('data', chunk => {
+      stderr += chunk
+      let nl
+      while ((nl = stderr.indexOf('\n')) >= 0) {
+        const line = stderr.slice(0, nl)
+        stderr = stderr.slice(nl + 1)
+        if (!line.startsWith(EVENT_PREFIX)) continue
+        const event = JSON.parse(line.slice(EVENT_PREFIX.length))
+        if (event.type === 'watch-outbox') depths.push(event.depth)
+      }
+    })
+    await waitFor(() => depths.length > 0, 'the initial outbox depth')
+    await writeFile(path.join(dir, 'notes.tex'), 'offline edit')
+    await waitFor(() => depths.at(-1) === 1, 'the edit to be queued')
+    await waitFor(() => /server unreachable|replaying/.test(stdout), 'a replay attempt')
+    server.state.uploadsDown = false
+    await waitFor(() => depths.at(-1) === 0 && /synced notes\.tex/.test(stdout), 'the replay')
+    assert.ok(server.stats.uploadsUnavailable >= 5)
+    assert.equal(server.stats.uploads, 2)
+    assert.deepEqual((await queue()).at(-1), { done: true, queued: 0 })
+  } finally {
+    watch?.kill()
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('origin check settles binary files and flushed docs from the tree and classifies the rest by content', async () => {
+  const digests = async text => contentDigests(Buffer.from(text))
+  const [ours, theirs, base, local] = await Promise.all(['ours', 'theirs', 'base', 'local'].map(digests))
+  const tree = new Map([
+    ['same.png', { kind: 'file', id: 'f1', fileHash: base.blob }],
+    ['ours.png', { kind: 'file', id: 'f2', fileHash: ours.blob }],
+    ['theirs.png', { kind: 'file', id: 'f3', fileHash: theirs.blob }],
+    ['main.tex', { kind: 'doc', id: 'd1' }],
+    ['intro.tex', { kind: 'doc', id: 'd2', rev: 4 }],
+    ['notes.tex', { kind: 'doc', id: 'd3' }],
+    ['kept.tex', { kind: 'doc', id: 'd5', rev: 7 }],
+    ['build/out.log', { kind: 'doc', id: 'd4' }],
+  ])
+  const previous = {
+    'same.png': { kind: 'file', id: 'f1', fileHash: base.blob, hash: base.hash },
+    'ours.png': { kind: 'file', id: 'f0', fileHash: base.blob, hash: base.hash },
+    'main.tex': { kind: 'doc', id: 'd1', hash: base.hash },
+    'intro.tex': { kind: 'doc', id: 'd2', rev: 3, hash: base.hash },
+    'kept.tex': { kind: 'doc', id: 'd5', rev: 7, hash: base.hash },
+    'gone.tex': { kind: 'doc', id: 'd9', hash: base.hash },
+    'gone-here-too.tex': { kind: 'doc', id: 'd8', hash: base.hash },
+  }
+  const ledger = { 'ours.png': ours, 'main.tex': ours }
+  const matcher = IgnoreMatcher.compile('*.log\n')
+  const { resolved, download } = planOriginCheck({ tree, previous, ledger, matcher })
+  assert.deepEqual(Object.fromEntries(resolved), {
+    'same.png': { hash: base.hash, origin: 'unchanged' },
+    'ours.png': { hash: ours.hash, origin: 'own' },
+    'kept.tex': { hash: base.hash, origin: 'unchanged' },
+  })
+  assert.deepEqual(download.map(entry => entry.path), ['intro.tex', 'main.tex', 'notes.tex', 'theirs.png'])
+
+  const downloaded = new Map([
+    ['main.tex', ours.hash],
+    ['intro.tex', theirs.hash],
+    ['notes.tex', local.hash],
+    ['theirs.png', theirs.hash],
+  ])
+  const localFiles = { 'notes.tex': local.hash, 'gone.tex': base.hash }
+  const result = await classifyOrigin({
+    tree,
+    previous,
+    ledger,
+    matcher,
+    resolved,
+    downloaded,
+    localHash: async relPosix => localFiles[relPosix] ?? null,
+  })
+  assert.deepEqual(result.own, ['main.tex', 'ours.png'])
+  assert.deepEqual(result.foreign, [
+    { path: 'gone.tex', change: 'removed' },
+    { path: 'intro.tex', change: 'modified' },
+    { path: 'theirs.png', change: 'added' },
+  ])
+  // same.png and kept.tex are unchanged; notes.tex already matches the local copy.
+  assert.equal(result.unchanged, 3)
+  assert.equal(result.files['kept.tex'].rev, 7)
+  assert.equal(result.files['main.tex'].hash, ours.hash)
+  assert.equal(result.files['build/out.log'], undefined)
+})
+
+test('remote-status tells our own uploads apart from edits made on the web', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-origin-'))
+  const project = new StandInProject()
+  project.set('main.tex', '\\documentclass{article}\n')
+  project.set('logo.png', Buffer.from('logo v1'))
+  const server = await startStandInServer(project)
+  const dir = path.join(home, 'thesis')
+  await mkdir(dir, { recursive: true })
+  await writeFile(path.join(dir, 'main.tex'), '\\documentclass{article}\n')
+  await writeFile(path.join(dir, 'logo.png'), 'logo v1')
+  await writeFile(
+    path.join(dir, CONFIG_FILENAME),
+    JSON.stringify({ baseUrl: server.baseUrl, projectId: project.projectId, rootFolderId: project.rootFolderId })
+  )
+  const run = args =>
+    new Promise((resolve, reject) => {
+      execFile(
+        process.execPath,
+        [OL_SYNC, ...args, '--dir', dir, '--base-url', server.baseUrl, '--mongo-container', 'ol-sync-test-no-such-container', '--no-session-cache'],
+        {
+          env: {
+            ...process.env,
+            HOME: home,
+            OVERLEAF_SYNC_EMAIL: 'me@example.com',
+            OVERLEAF_SYNC_PASSWORD: 'pw',
+            OVERLEAF_SYNC_WEB_API_USER: WEB_API_USER,
+            OVERLEAF_SYNC_WEB_API_PASSWORD: WEB_API_PASSWORD,
+          },
+        },
+        (err, stdout) => (err ? reject(err) : resolve(stdout))
+      )
+    })
+  const status = async () => JSON.parse(await run(['remote-status', '--json']))
+
+  try {
+    // First check: nothing recorded yet, but both files match the local copies.
+    let result = await status()
+    assert.deepEqual([result.available, result.foreign, result.own, result.unchanged], [true, [], [], 2])
+
+    // Our own push: the doc is hashed, the binary is recognised by its blob hash alone.
+    await writeFile(path.join(dir, 'main.tex'), '\\documentclass{article}\n% local edit\n')
+    await writeFile(path.join(dir, 'logo.png'), 'logo v2')
+    assert.match(await run(['push']), /uploaded=2 failed=0/)
+    const ledgerPath = path.join(home, '.config', 'overleaf-sync', 'inbox', new URL(server.baseUrl).host.replace(/[^a-zA-Z0-9._-]+/g, '_'), project.projectId, OUTGOING_LEDGER_FILENAME)
+    assert.deepEqual(Object.keys(JSON.parse(await readFile(ledgerPath, 'utf8')).files).sort(), ['logo.png', 'main.tex'])
+    const fileDownloads = server.stats.file
+    result = await status()
+    assert.deepEqual([result.foreign, result.own, result.downloaded], [[], ['logo.png', 'main.tex'], 1])
+    assert.equal(server.stats.file, fileDownloads)
+    // The ledger entries are folded into the remote index.
+    assert.deepEqual(JSON.parse(await readFile(ledgerPath, 'utf8')).files, {})
+
+    // Processes recording uploads at once (a push next to a watch) keep each other's entries.
+    const lib = new URL('../lib.mjs', import.meta.url).href
+    const spare = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-ledger-'))
+    await Promise.all(
+      [0, 1, 2, 3].map(worker =>
+        execFileAsync(process.execPath, [
+          '--input-type=module',
+          '-e',
+          `import { OutgoingLedger } from ${JSON.stringify(lib)}
+          const ledger = new OutgoingLedger(${JSON.stringify(spare)}, { flushMs: 0 })
+          for (let n = 0; n < 25; n++) {
+            ledger.record('w${worker}-' + n + '.tex', { hash: 'h', blob: 'b', size: 1 })
+            await ledger.flush()
+          }`,
+        ])
+      )
+    )
+    assert.equal(Object.keys(JSON.parse(await readFile(path.join(spare, OUTGOING_LEDGER_FILENAME), 'utf8')).files).length, 100)
+    await rm(spare, { recursive: true, force: true })
+
+    // Nothing new: everything is unchanged.
+    result = await status()
+    assert.deepEqual([result.foreign, result.own, result.unchanged], [[], [], 2])
+
+    // Edits on the web are foreign.
+    project.set('main.tex', '\\documentclass{article}\n% web edit\n')
+    project.set('figure.pdf', Buffer.from('%PDF'))
+    project.entities.delete('logo.png')
+    result = await status()
+    assert.deepEqual(result.foreign, [
+      { path: 'figure.pdf', change: 'added' },
+      { path: 'logo.png', change: 'removed' },
+      { path: 'main.tex', change: 'modified' },
+    ])
+    assert.deepEqual(result.own, [])
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('file lease is exclusive and taken over from a holder that died', async () => {
+  const tmp = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-lease-'))
+  const lockPath = path.join(tmp, 'session.json.lock')
+  try {
+    const first = await acquireFileLease(lockPath)
+    assert.equal(first.waited, false)
+    let second = null
+    const pending = acquireFileLease(lockPath, { pollMs: 10 }).then(lease => {
+      second = lease
+    })
+    await new Promise(resolve => setTimeout(resolve, 100))
+    assert.equal(second, null)
+    await first.release()
+    await pending
+    assert.equal(second.waited, true)
+    await second.release()
+
+    // A lock left behind by a process that no longer exists.
+    const dead = spawn(process.execPath, ['-e', ''])
+    await new Promise(resolve => dead.on('close', resolve))
+    await writeFile(lockPath, JSON.stringify({ pid: dead.pid, host: os.hostname(), token: 'x' }))
+    const third = await acquireFileLease(lockPath, { pollMs: 10, timeoutMs: 2000 })
+    assert.notEqual(JSON.parse(await readFile(lockPath, 'utf8')).token, 'x')
+    await third.release()
+    await assert.rejects(stat(lockPath), { code: 'ENOENT' })
+  } finally {
+    await rm(tmp, { recursive: true, force: true })
+  }
+})
+
+test('file lease stays exclusive while holders that died are taken over', { timeout: 60_000 }, async () => {
+  const tmp = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-lease-'))
+  const lockPath = path.join(tmp, 'counter.lock')
+  const counter = path.join(tmp, 'counter')
+  const lib = new URL('../lib.mjs', import.meta.url).href
+  await writeFile(counter, '0')
+  // Workers bump the counter with a read, a pause and a write; crashers take the lease and exit holding it.
+  const worker = `import { acquireFileLease } from ${JSON.stringify(lib)}
+    import { readFile, writeFile } from 'node:fs/promises'
+    for (let n = 0; n < 25; n++) {
+      const lease = await acquireFileLease(${JSON.stringify(lockPath)}, { pollMs: 5 })
+      const value = Number(await readFile(${JSON.stringify(counter)}, 'utf8'))
+      await new Promise(resolve => setTimeout(resolve, 1))
+      await writeFile(${JSON.stringify(counter)}, String(value + 1))
+      await lease.release()
+    }`
+  const crasher = `import { acquireFileLease } from ${JSON.stringify(lib)}
+    await acquireFileLease(${JSON.stringify(lockPath)}, { pollMs: 5 })
+    process.exit(0)`
+  const run = (code, delayMs = 0) =>
+    new Promise(resolve => setTimeout(resolve, delayMs)).then(() =>
+      execFileAsync(process.execPath, ['--input-type=module', '-e', code])
+    )
+  try {
+    await Promise.all([
+      ...Array.from({ length: 6 }, () => run(worker)),
+      ...Array.from({ length: 12 }, (_, n) => run(crasher, n * 40)),
+    ])
+    assert.equal(await readFile(counter, 'utf8'), '150')
+  } finally {
+    await rm(tmp, { recursive: true, force: true })
+  }
+})
+
+test('parseRetryAfter reads seconds and HTTP dates', () => {
+  assert.equal(parseRetryAfter('3'), 3000)
+  assert.equal(parseRetryAfter(new Date(10_000).toUTCString(), 4000), 6000)
+  assert.equal(parseRetryAfter(new Date(0).toUTCString(), 4000), 0)
+  assert.equal(parseRetryAfter(null), null)
+  assert.equal(parseRetryAfter('soon'), null)
+  assert.equal(httpRoute('POST', 'http://x/project/0123456789abcdef01234567/upload?folder_id=1'), 'POST /project/:id/upload')
+})
+
+test('HttpClient retries only what is safe to repeat and caps requests in flight until bodies are read', async () => {
+  const waits = []
+  const replies = []
+  let inFlight = 0
+  let peak = 0
+  const client = new HttpClient('http://stand-in', {
+    maxConnections: 2,
+    retries: 2,
+    retryMinMs: 100,
+    random: () => 1,
+    sleep: async ms => waits.push(ms),
+    fetch: async (url, init) => {
+      inFlight += 1
+      peak = Math.max(peak, inFlight)
+      await new Promise(resolve => setTimeout(resolve, 5))
+      inFlight -= 1
+      const next = replies.shift()
+      if (next instanceof Error) throw next
+      return new Response(init.body ?? 'ok', { status: next?.status ?? 200, headers: next?.headers })
+    },
+  })
+
+  // GET: a network error and a 503 with Retry-After, then success.
+  replies.push(new TypeError('fetch failed'), { status: 503, headers: { 'retry-after': '2' } })
+  let res = await client.fetch('http://stand-in/user/personal_info')
+  assert.equal(res.status, 200)
+  assert.deepEqual(waits, [100, 2000])
+  // The slot is held until the body has been read.
+  assert.equal(client.stats().inFlight, 1)
+  assert.equal(await res.text(), 'ok')
+  assert.equal(client.stats().inFlight, 0)
+
+  // POST: a 502 may have been acted on, so it is returned as is...
+  waits.length = 0
+  replies.push({ status: 502 })
+  res = await client.fetch('http://stand-in/login', { method: 'POST' })
+  assert.equal(res.status, 502)
+  assert.deepEqual(waits, [])
+  // Cancelling the body gives the slot back as well.
+  await res.body.cancel()
+  assert.equal(client.stats().inFlight, 0)
+  // ...unless the caller marks it idempotent; bodies given as functions are rebuilt per attempt.
+  let built = 0
+  replies.push({ status: 502 })
+  res = await client.fetch('http://stand-in/upload', { method: 'POST', body: () => `body-${++built}` }, { idempotent: true })
+  assert.equal(await res.text(), 'body-2')
+  // A 429 is retried even for a POST; the retry budget still runs out.
+  replies.push({ status: 429 }, { status: 429 }, { status: 429 })
+  res = await client.fetch('http://stand-in/login', { method: 'POST' })
+  assert.equal(res.status, 429)
+  assert.equal(replies.length, 0)
+  await res.text()
+
+  await Promise.all(Array.from({ length: 8 }, async () => (await client.fetch('http://stand-in/login')).text()))
+  assert.equal(peak, 2)
+
+  // Bodies still being streamed count against the cap: a third request waits for one of them.
+  const slow = []
+  const streaming = new HttpClient('http://stand-in', {
+    maxConnections: 2,
+    fetch: async () => {
+      let feed
+      const body = new ReadableStream({ start: controller => (feed = controller) })
+      slow.push(feed)
+      return new Response(body)
+    },
+  })
+  const first = await streaming.fetch('http://stand-in/a')
+  await streaming.fetch('http://stand-in/b')
+  let third = null
+  const pending = streaming.fetch('http://stand-in/c').then(r => (third = r))
+  await new Promise(resolve => setTimeout(resolve, 20))
+  assert.equal(third, null)
+  assert.equal(slow.length, 2)
+  slow[0].enqueue(new TextEncoder().encode('done'))
+  slow[0].close()
+  assert.equal(await first.text(), 'done')
+  await pending
+  assert.equal(slow.length, 3)
+  assert.equal(streaming.stats().peakInFlight, 2)
+  streaming.close()
+
+  const stats = client.stats()
+  assert.equal(stats.origin, 'http://stand-in')
+  assert.equal(stats.peakInFlight, 2)
+  assert.equal(stats.inFlight, 0)
+  const get = stats.routes.find(r => r.route === 'GET /user/personal_info')
+  assert.deepEqual([get.count, get.errors, get.retries], [3, 2, 2])
+  const login = stats.routes.find(r => r.route === 'POST /login')
+  assert.deepEqual([login.count, login.errors, login.retries], [4, 1, 2])
+  assert.equal(stats.routes[0].route, 'GET /login')
+  assert.ok(stats.routes.every(r => r.p50Ms <= r.p95Ms && r.p95Ms <= r.maxMs))
+  client.close()
+})
+
+test('projects rides out a throttling server and reports per-route latency', { timeout: 60_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-http-'))
+  const project = new StandInProject()
+  const server = await startStandInServer(project)
+  server.state.throttle = 3
+  try {
+    const { stdout, stderr } = await execFileAsync(
+      process.execPath,
+      [OL_SYNC, 'projects', '--json', '--events', '--base-url', server.baseUrl, '--session-path', path.join(home, 'session.json')],
+      { env: { ...process.env, HOME: home, OVERLEAF_SYNC_EMAIL: 'me@example.com', OVERLEAF_SYNC_PASSWORD: 'pw' } }
+    )
+    assert.equal(JSON.parse(stdout).length, 1)
+    assert.equal(server.stats.throttled, 3)
+    const events = stderr
+      .split('\n')
+      .filter(line => line.startsWith(EVENT_PREFIX))
+      .map(line => JSON.parse(line.slice(EVENT_PREFIX.length)))
+    const stats = events.find(event => event.type === 'http-stats')
+    assert.equal(stats.origin, server.baseUrl)
+    assert.equal(stats.routes.reduce((sum, r) => sum + r.retries, 0), 3)
+    // The first request (the login page) was the one throttled.
+    const loginPage = stats.routes.find(r => r.route === 'GET /login')
+    assert.deepEqual([loginPage.count, loginPage.retries], [4, 3])
+    assert.ok(stats.routes.some(r => r.route === 'POST /api/project'))
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('50 concurrent CLI runs share one login, also after the session expires', { timeout: 180_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-session-'))
+  const project = new StandInProject()
+  const server = await startStandInServer(project)
+  server.state.loginDelayMs = 200
+  const sessionPath = path.join(home, 'session.json')
+  const runAll = (count, extraEnv = {}) =>
+    Promise.all(
+      Array.from(
+        { length: count },
+        () =>
+          new Promise((resolve, reject) => {
+            execFile(
+              process.execPath,
+              [OL_SYNC, 'projects', '--json', '--base-url', server.baseUrl, '--session-path', sessionPath],
+              {
+                env: {
+                  ...process.env,
+                  HOME: home,
+                  OVERLEAF_SYNC_EMAIL: 'me@example.com',
+                  OVERLEAF_SYNC_PASSWORD: 'pw',
+                  ...extraEnv,
+                },
+              },
+              (err, stdout) => (err ? reject(err) : resolve(JSON.parse(stdout)))
+            )
+          })
+      )
+    )
+
+  try {
+    let listings = await runAll(50)
+    assert.equal(server.stats.logins, 1)
+    assert.ok(listings.every(listing => listing.length === 1))
+    const stored = JSON.parse(await readFile(sessionPath, 'utf8')).sessions[server.baseUrl]
+    assert.equal(stored.cookies.sid, 'session-1')
+    await assert.rejects(stat(`${sessionPath}.lock`), { code: 'ENOENT' })
+
+    // Every session expires; each run notices before using it, and one of them logs in again.
+    server.state.sessions.clear()
+    listings = await runAll(50, { OL_SYNC_SESSION_VALIDATE_SEC: '0' })
+    assert.equal(server.stats.logins, 2)
+    assert.ok(listings.every(listing => listing.length === 1))
+    assert.equal(JSON.parse(await readFile(sessionPath, 'utf8')).sessions[server.baseUrl].cookies.sid, 'session-2')
+  } finally {
+    await server.close()
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('GUI journal keeps every acknowledged record across SIGKILLs during appends and compaction', { timeout: 120_000 }, async () => {
+  const home = await mkdtemp(path.join(os.tmpdir(), 'ol-sync-journal-'))
+  const journal = path.join(home, 'journal.ndjson')
+  const acked = new Set()
+  let next = 0
+  try {
+    for (let round = 0; round < 20; round++) {
+      const child = spawn(PYTHON, [fixture('journal-writer.py'), GUI, journal, String(next)], {
+        stdio: ['ignore', 'pipe', 'inherit'],
+      })
+      let buffered = ''
+      child.stdout.on('data', chunk => {
+        buffered += chunk
+        const lines = buffered.split('\n')
+        buffered = lines.pop()
+        for (const line of lines) {
+          if (!line.startsWith('ack ')) continue
+          acked.add(`k${line.slice(4)}`)
+          next = Number(line.slice(4)) + 1
+        }
+      })
+      const exited = new Promise(resolve => child.on('exit', resolve))
+      await new Promise(resolve => setTimeout(resolve, 150 + Math.random() * 250))
+      child.kill('SIGKILL')
+      await exited
+      const { stdout } = await execFileAsync(PYTHON, [fixture('journal-writer.py'), GUI, journal])
+      const replayed = new Set(JSON.parse(stdout))
+      const lost = [...acked].filter(key => !replayed.has(key))
+      assert.deepEqual(lost, [], `round ${round}: acknowledged records missing after replay`)
+    }
+    assert.ok(acked.size > 100, `only ${acked.size} records were written`)
+  } finally {
+    await rm(home, { recursive: true, force: true })
+  }
+})
+
+test('GUI watch I/O delivers every line of 50 chatty watches in a bounded number of batches', { timeout: 120_000 }, async () => {
+  const children = 50
+  const lines = 4000
+  const { stdout } = await execFileAsync(PYTHON, [fixture('watch-io-stress.py'), GUI, String(children), String(lines)], {
+    maxBuffer: 16 * 1024 * 1024,
+  })
+  const report = JSON.parse(stdout)
+  // A child that closed stdout but is still running must not hold up the others.
+  assert.equal(report.othersDone, true)
+  assert.equal(report.exits.at(-1), 'lingering')
+  assert.equal(report.exits.length, children + 1)
+  for (let n = 0; n < children; n++) assert.equal(report.received[`child-${n}`], lines, `child-${n}`)
+  assert.equal(report.ordered, true)
+  // One Tk callback per batch: about one per batch interval plus one per exit, not one per line.
+  assert.ok(
+    report.batches <= Math.ceil(report.elapsed / report.batchSec) + children + 5,
+    `${report.batches} batches in ${report.elapsed}s`
+  )
+})